@@ -0,0 +1,114 @@
+"""
+Anomaly detection on the logs: feature preparation, PCA and Isolation Forest.
+"""
+import ipaddress
+import logging
+
+import numpy as np
+import pandas as pd
+import polars as pl
+from sklearn.decomposition import PCA
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from monitoring.profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+
+@profiled("ml.preprocess_logs")
+def preprocess_logs(logs):
+    df = logs.to_pandas()
+
+    # Convert date to datetime
+    df['Date'] = pd.to_datetime(df['Date'])
+
+    # Extract time features
+    df['hour'] = df['Date'].dt.hour
+    df['day_of_week'] = df['Date'].dt.dayofweek
+
+    # Convert IP addresses to numerical values
+    def ip_to_int(ip):
+        try:
+            return int(ipaddress.ip_address(ip))
+        except ValueError:
+            return np.nan
+
+    logger.debug("Converting IP addresses...")
+    df['IPsrc_int'] = df['IPsrc'].apply(ip_to_int)
+    df['IPdst_int'] = df['IPdst'].apply(ip_to_int)
+
+    # One-hot encode categorical features
+    logger.debug("Encoding categorical features...")
+    df = pd.get_dummies(df, columns=['Protocole', 'action'], drop_first=True)
+
+    # Handle missing values
+    df = df.fillna(0)
+
+    return df
+
+
+@profiled("ml.perform_pca")
+def perform_pca(df, n_components):
+    feature_cols = df.select_dtypes(include=[np.number]).columns
+    scaler = StandardScaler()
+    scaled_data = scaler.fit_transform(df[feature_cols])
+
+    pca = PCA(n_components=n_components)
+    pca_data = pca.fit_transform(scaled_data)
+
+    pca_df = pd.DataFrame(data=pca_data, columns=[f'PC{i+1}' for i in range(n_components)])
+
+    return pca_df, pca, scaler, feature_cols
+
+
+@profiled("ml.perform_isolation_forest")
+def perform_isolation_forest(pca_df, contamination=0.01):
+    logger.debug("Training Isolation Forest with contamination=%s...", contamination)
+
+    # Initialize and fit the model
+    iso_forest = IsolationForest(
+        n_estimators=100,
+        max_samples='auto',
+        contamination=contamination,
+        random_state=42
+    )
+
+    # Fit and predict
+    pca_df['anomaly'] = iso_forest.fit_predict(pca_df)
+
+    # Convert predictions: -1 for anomalies, 1 for normal points
+    # Convert to boolean for easier interpretation
+    pca_df['is_anomaly'] = pca_df['anomaly'] == -1
+
+    # Count anomalies
+    anomaly_count = pca_df['is_anomaly'].sum()
+    logger.debug(
+        "Detected %d anomalies out of %d data points (%.2f%%)",
+        anomaly_count, len(pca_df), anomaly_count / len(pca_df) * 100,
+    )
+
+    return pca_df, iso_forest
+
+
+@profiled("ml.detect_anomalies")
+def detect_anomalies(logs: pl.DataFrame, n_components: int = 5, contamination: float = 0.01) -> pl.DataFrame:
+    """
+    Rows of `logs` flagged as anomalous, most anomalous first, with their
+    Isolation Forest score (lower is more anomalous).
+    """
+    if logs.height <= n_components:
+        return logs.with_columns(pl.lit(None, pl.Float64).alias("anomaly_score")).clear()
+    pca_df, *_ = perform_pca(preprocess_logs(logs), n_components)
+    components = pca_df.columns.tolist()
+    pca_df, iso_forest = perform_isolation_forest(pca_df, contamination)
+    scores = iso_forest.score_samples(pca_df[components])
+    return (
+        logs.with_columns(
+            pl.Series("anomaly_score", scores),
+            pl.Series("is_anomaly", pca_df["is_anomaly"].to_numpy()),
+        )
+        .filter(pl.col("is_anomaly"))
+        .drop("is_anomaly")
+        .sort("anomaly_score")
+    )
@@ -0,0 +1,106 @@
+"""
+Approximate counterparts of the analytics.queries aggregations, answered
+from the merged sketch of the store (LogStore.sketch()) without reading the
+logs: the cost does not depend on the size of the store.
+
+Error bounds, returned with the results:
+
+- counts are upper bounds: the true count lies in [count - error, count];
+  sources and ports that are not tracked occurred at most `bound` times;
+- distinct counts have a relative standard error of `distinct_error`
+  (store-wide) or `per_source_error` (nb_destinations of ip_stats).
+
+Counts are exact (error 0) as long as a summary tracks fewer distinct values
+than its capacity, e.g. the permitted ports below 1024.
+"""
+from typing import Optional
+
+import polars as pl
+
+from analytics.queries import is_internal
+from storage.sketches import GLOBAL_PRECISION, SOURCE_PRECISION, LogSketch, relative_error
+
+
+def error_bounds(sketch: LogSketch) -> dict:
+    """Error bounds of the approximate results of a sketch."""
+    return {
+        "distinct_error": relative_error(GLOBAL_PRECISION),
+        "per_source_error": relative_error(SOURCE_PRECISION),
+        "sources_bound": sketch.summaries["sources"].bound,
+        "ports_bound": sketch.summaries["well_known_ports"].bound,
+    }
+
+
+def ip_stats(sketch: LogSketch, limit: Optional[int] = None) -> pl.DataFrame:
+    """ip_stats of the tracked sources, with the error of total_count."""
+    destinations = sketch.distinct_per_source("destinations")
+    permitted, denied = sketch.summaries["sources.PERMIT"], sketch.summaries["sources.DENY"]
+    rows = [
+        (ip, round(destinations.get(ip, 0.0)), permitted.get(ip)[0], denied.get(ip)[0], count, error)
+        for ip, count, error in sketch.summaries["sources"].top(limit)
+    ]
+    return pl.DataFrame(
+        rows,
+        schema={
+            "IPsrc": pl.Utf8,
+            "nb_destinations": pl.UInt32,
+            "permit_count": pl.UInt32,
+            "deny_count": pl.UInt32,
+            "total_count": pl.UInt32,
+            "total_error": pl.UInt32,
+        },
+        orient="row",
+    )
+
+
+def top_ports(sketch: LogSketch, max_port: int = 1024, limit: int = 10) -> pl.DataFrame:
+    """Most used permitted destination ports below max_port (at most 1024), with their error."""
+    if max_port > 1024:
+        raise ValueError("approximate top ports are only tracked below port 1024")
+    rows = [
+        (str(port), count, error)
+        for port, count, error in sketch.summaries["well_known_ports"].top()
+        if port < max_port
+    ][:limit]
+    return pl.DataFrame(rows, schema={"Port_dst": pl.Utf8, "count": pl.UInt32, "error": pl.UInt32}, orient="row")
+
+
+def external_sources(sketch: LogSketch, limit: Optional[int] = 1000) -> pl.DataFrame:
+    """Connection attempts per tracked external source and action, with their error."""
+    rows = [
+        (ip, action, count, error)
+        for action in ("PERMIT", "DENY")
+        for ip, count, error in sketch.summaries[f"sources.{action}"].top()
+    ]
+    sources = pl.DataFrame(
+        rows,
+        schema={"IPsrc": pl.Utf8, "action": pl.Utf8, "nombre_tentatives": pl.UInt32, "error": pl.UInt32},
+        orient="row",
+    )
+    sources = sources.filter(~is_internal(sources["IPsrc"])).sort(
+        ["nombre_tentatives", "IPsrc", "action"], descending=[True, False, False]
+    )
+    return sources.head(limit) if limit is not None else sources
+
+
+def flow_summary(sketch: LogSketch) -> dict:
+    """flow_summary of the whole store, plus its error bounds."""
+    flows = sketch.rows
+    summary = {
+        "flows": flows,
+        "sources": round(sketch.distinct["sources"].estimate()) if flows else 0,
+        "destinations": round(sketch.distinct["destinations"].estimate()) if flows else 0,
+        "actions": {},
+        "protocols": {},
+        "top_source": None,
+        "top_destination": None,
+        "errors": error_bounds(sketch),
+    }
+    if not flows:
+        return summary
+    for key, name in (("actions", "actions"), ("protocols", "protocols")):
+        summary[key] = {str(value): 100 * count / flows for value, count, _ in sketch.summaries[name].top()}
+    for key, name in (("top_source", "sources"), ("top_destination", "destinations")):
+        ip, count, _ = sketch.summaries[name].top(1)[0]
+        summary[key] = {"ip": str(ip), "share": 100 * count / flows}
+    return summary
@@ -0,0 +1,117 @@
+"""
+Clients of the analytics service, with the same `query(endpoint, **params)`
+interface:
+
+- AnalyticsClient talks to a remote analytics.server over HTTP, with a pool
+  of keep-alive connections shared by the threads of the caller;
+- LocalClient calls an in-process AnalyticsService.
+
+`default_client()` returns an AnalyticsClient when OPSIE_API_URL is set (e.g.
+http://127.0.0.1:8765), a LocalClient otherwise.
+"""
+import http.client
+import json
+import os
+import queue
+from datetime import date
+from typing import Any, Optional, Union
+from urllib.parse import urlencode, urlsplit
+
+import polars as pl
+
+from analytics.server import ARROW_STREAM, decode_arrow
+from analytics.service import AnalyticsService, ServiceError
+
+Result = Union[pl.DataFrame, dict]
+
+
+def _encode_params(params: dict) -> str:
+    values = {}
+    for name, value in params.items():
+        if value is None:
+            continue
+        values[name] = value.isoformat() if isinstance(value, date) else value
+    return urlencode(values)
+
+
+class AnalyticsClient:
+    """HTTP client of the analytics API with a bounded pool of persistent connections."""
+
+    def __init__(self, base_url: str, pool_size: int = 8, timeout: float = 60.0):
+        url = urlsplit(base_url)
+        if url.scheme != "http" or not url.hostname:
+            raise ValueError(f"Unsupported analytics API URL: {base_url}")
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+        self._pool: "queue.LifoQueue[Optional[http.client.HTTPConnection]]" = queue.LifoQueue()
+        # Slots: None means a connection may be opened lazily
+        for _ in range(pool_size):
+            self._pool.put(None)
+
+    def _request(self, connection: http.client.HTTPConnection, path: str):
+        connection.request("GET", path, headers={"Accept": f"{ARROW_STREAM}, application/json"})
+        response = connection.getresponse()
+        return response.status, response.getheader("Content-Type", ""), response.read()
+
+    def query(self, endpoint: str, **params: Any) -> Result:
+        """Run an endpoint; raises ServiceError on a 4xx answer, RuntimeError on a 5xx."""
+        path = f"{self.prefix}/v1/{endpoint}"
+        encoded = _encode_params(params)
+        if encoded:
+            path += f"?{encoded}"
+
+        # Blocks when every pooled connection is in use (bounded concurrency)
+        connection = self._pool.get()
+        try:
+            if connection is None:
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                status, content_type, body = self._request(connection, path)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server closed an idle keep-alive connection: retry once on a new one
+                connection.close()
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                status, content_type, body = self._request(connection, path)
+        except Exception:
+            if connection is not None:
+                connection.close()
+            self._pool.put(None)
+            raise
+        self._pool.put(connection)
+
+        if status >= 400:
+            message = json.loads(body).get("error", body.decode("utf-8", errors="replace"))
+            if status < 500:
+                raise ServiceError(message, status=status)
+            raise RuntimeError(f"Analytics API error {status}: {message}")
+        if content_type.startswith(ARROW_STREAM):
+            return decode_arrow(body)
+        return json.loads(body)
+
+    def close(self):
+        while not self._pool.empty():
+            connection = self._pool.get_nowait()
+            if connection is not None:
+                connection.close()
+
+
+class LocalClient:
+    """In-process client: same interface, no serialization."""
+
+    def __init__(self, service: Optional[AnalyticsService] = None):
+        self.service = service or AnalyticsService()
+
+    def query(self, endpoint: str, **params: Any) -> Result:
+        return self.service.call(endpoint, params)
+
+    def close(self):
+        pass
+
+
+def default_client() -> Union[AnalyticsClient, LocalClient]:
+    url = os.environ.get("OPSIE_API_URL")
+    if url:
+        return AnalyticsClient(url)
+    return LocalClient()
@@ -0,0 +1,300 @@
+"""
+Streaming detection rules over the firewall logs.
+
+A DetectionEngine consumes batches of logs in time order (the ingestion
+batches, or the files of the store for the history) and raises alerts when
+a source crosses the threshold of a rule within a sliding time window:
+
+- port_scan: `threshold` distinct destination ports from one IPsrc;
+- brute_force: `threshold` denied connections to SSH (22) / RDP (3389);
+- fan_out: `threshold` distinct destination IPs from one IPsrc.
+
+Batches are processed with vectorized polars expressions, without any
+per-event Python code (see DetectionEngine._evaluate). Between batches the
+engine only keeps, per rule and per source, the events of the last `window`
+seconds needed to continue the windows: the latest occurrence of each key
+for the distinct-count rules, capped to the `threshold` most recent ones,
+which is enough to decide every future crossing. Memory is therefore
+bounded by threshold entries per active source.
+
+An alert is raised once per episode: triggers of the same rule and source
+less than `window` seconds apart extend the same episode, even across
+batches. Events older than the engine watermark minus the window (late
+data) are still evaluated, against the state that remains.
+
+    engine = DetectionEngine(AlertStore())
+    engine.process(batch)        # after each append to the store
+    engine.scan_store(LogStore()) # replay the stored history
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import polars as pl
+
+from monitoring.metrics import ALERTS_RAISED
+from storage.alerts import ALERT_SCHEMA, AlertStore
+from storage.core import LOG_SCHEMA, LogStore, read_logs
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A sliding-window threshold on the events of one source."""
+
+    name: str
+    description: str
+    threshold: int
+    window: timedelta
+    # Distinct values of this column are counted (None: events are counted)
+    key: Optional[str] = None
+    # Events the rule looks at (None: every event)
+    condition: Optional[pl.Expr] = None
+    severity: str = "medium"
+
+
+DEFAULT_RULES = [
+    Rule(
+        "port_scan",
+        "Ports de destination distincts depuis une même source",
+        threshold=20,
+        window=timedelta(seconds=60),
+        key="Port_dst",
+        severity="high",
+    ),
+    Rule(
+        "brute_force",
+        "Connexions refusées répétées vers SSH (22) ou RDP (3389)",
+        threshold=30,
+        window=timedelta(seconds=60),
+        condition=(pl.col("action") == "DENY") & pl.col("Port_dst").is_in([22, 3389]),
+        severity="high",
+    ),
+    Rule(
+        "fan_out",
+        "Adresses de destination distinctes depuis une même source",
+        threshold=50,
+        window=timedelta(seconds=60),
+        key="IPdst",
+    ),
+]
+
+
+# Seed of the hashes used as sort keys
+HASH_SEED = 0x5EC7
+
+
+class DetectionEngine:
+    """Incremental evaluation of detection rules over batches of logs."""
+
+    def __init__(self, alerts: Optional[AlertStore] = None, rules: Iterable[Rule] = DEFAULT_RULES):
+        self.alerts = alerts
+        self.rules = list(rules)
+        if len({rule.name for rule in self.rules}) != len(self.rules):
+            raise ValueError("rule names must be unique")
+        # Recent events per rule: IPsrc, Date (and key)
+        self.state: Dict[str, pl.DataFrame] = {rule.name: self._empty(rule) for rule in self.rules}
+        # End of the last episode per rule and source
+        self.episodes: Dict[str, pl.DataFrame] = {
+            rule.name: pl.DataFrame(schema={"IPsrc": pl.Utf8, "last": pl.Datetime("us")}) for rule in self.rules
+        }
+        self.watermark: Optional[datetime] = None
+        self.events = 0
+
+    @staticmethod
+    def _columns(rule: Rule) -> List[str]:
+        return ["IPsrc", "Date"] + ([rule.key] if rule.key else [])
+
+    def _empty(self, rule: Rule) -> pl.DataFrame:
+        return pl.DataFrame(schema={name: LOG_SCHEMA[name] for name in self._columns(rule)})
+
+    def state_rows(self) -> int:
+        """Events kept between batches, all rules together."""
+        return sum(state.height for state in self.state.values())
+
+    def process(self, df: pl.DataFrame) -> pl.DataFrame:
+        """Evaluate a batch of logs; returns the new alerts (also appended to the alert store)."""
+        if df.height == 0:
+            return pl.DataFrame(schema=ALERT_SCHEMA)
+        batch_end = df["Date"].max()
+        if batch_end is not None:
+            self.watermark = batch_end if self.watermark is None else max(self.watermark, batch_end)
+        self.events += df.height
+        found = [self._evaluate(rule, df) for rule in self.rules]
+        alerts = pl.concat(found).sort(["start", "rule", "IPsrc"])
+        if self.alerts is not None and alerts.height:
+            self.alerts.append_alerts(alerts)
+        for rule, count in alerts.group_by("rule").len().iter_rows():
+            ALERTS_RAISED.inc(count, rule=rule)
+        return alerts
+
+    def scan_store(self, store: LogStore) -> int:
+        """Replay every file of a store through the rules; returns the number of alerts."""
+        # One snapshot for the whole replay, whatever is committed meanwhile
+        files = store.pin().files()
+        # The partitions of the firewalls cover the same period: replay their files by first event
+        first = {path: pl.scan_parquet(path).select(pl.col("Date").min()).collect().item() for path in files}
+        paths = sorted(first, key=lambda path: (first[path] is None, first[path] or datetime.min))
+        return sum(self.process(read_logs(path).sort("Date")).height for path in paths)
+
+    def _evaluate(self, rule: Rule, df: pl.DataFrame) -> pl.DataFrame:
+        columns = self._columns(rule)
+        window = rule.window
+        events = df.lazy()
+        if rule.condition is not None:
+            events = events.filter(rule.condition)
+        events = events.select(columns).drop_nulls(["IPsrc", "Date"]).with_columns(pl.lit(True).alias("_new"))
+        combined = pl.concat([self.state[rule.name].lazy().with_columns(pl.lit(False).alias("_new")), events])
+        # Sources are sorted on a 64-bit hash of the address rather than on the string.
+        # Buckets of `window` length are grouped on the hash plus the bucket number:
+        # a collision only merges groups, which can only raise their metric.
+        bucket = (pl.col("Date").dt.epoch("us") // int(window.total_seconds() * 1_000_000)).reinterpret(signed=False)
+        combined = (
+            combined.with_columns(pl.col("IPsrc").hash(HASH_SEED).alias("_src"))
+            .with_columns((pl.col("_src") + bucket).alias("_bucket"))
+            .collect()
+        )
+        self.state[rule.name] = self._next_state(rule, combined)
+
+        # Any window ending in bucket k lies within buckets k-1 and k, whose
+        # metrics add up to at least the metric of the window: only the buckets
+        # where this sum reaches the threshold are evaluated, with the previous
+        # bucket as context. Sorted, bucket k-1 of a source comes right before k.
+        metric = pl.col(rule.key).n_unique() if rule.key else pl.len()
+        buckets = combined.group_by("_bucket").agg(metric.alias("value")).sort("_bucket")
+        previous = pl.when(pl.col("_bucket") - pl.col("_bucket").shift(1) == 1).then(pl.col("value").shift(1))
+        ends = buckets.filter(pl.col("value") + previous.otherwise(0) >= rule.threshold).select("_bucket")
+        if ends.height == 0:
+            return pl.DataFrame(schema=ALERT_SCHEMA)
+        needed = pl.concat([ends, ends.with_columns(pl.col("_bucket") - 1)])
+        combined = combined.join(needed, on="_bucket", how="semi")
+
+        # A key is in the window (t - window, t] while t is in [occurrence, occurrence
+        # + window). Occurrences less than `window` apart merge into one coverage
+        # interval, and the metric at t is the number of intervals covering t: a
+        # running sum of +1 at each start and -1 at each end, in O(n log n) whatever
+        # the window size. Counting rules cover each event separately.
+        if rule.key:
+            occurrences = combined.with_columns(
+                pl.struct("_src", rule.key).hash(HASH_SEED).alias("_pair")
+            ).sort(["_pair", "Date"])
+            starts = (
+                (pl.col("_pair") != pl.col("_pair").shift(1))
+                | (pl.col("Date") - pl.col("Date").shift(1) >= window)
+            ).fill_null(True)
+            occurrences = occurrences.with_columns(starts.alias("_start"))
+            runs = pl.concat(
+                [
+                    occurrences.filter("_start").select("IPsrc", "_src", pl.col("Date").alias("start"), "_new"),
+                    occurrences.filter(pl.col("_start").shift(-1).fill_null(True)).select(pl.col("Date").alias("last")),
+                ],
+                how="horizontal",
+            )
+        else:
+            runs = combined.select("IPsrc", "_src", pl.col("Date").alias("start"), pl.col("Date").alias("last"), "_new")
+        points = (
+            pl.concat(
+                [
+                    runs.select(
+                        "IPsrc", "_src", pl.col("start").alias("Date"), pl.lit(1, pl.Int32).alias("_delta"), "_new"
+                    ),
+                    runs.select(
+                        "IPsrc",
+                        "_src",
+                        (pl.col("last") + window).alias("Date"),
+                        pl.lit(-1, pl.Int32).alias("_delta"),
+                        pl.lit(False).alias("_new"),
+                    ),
+                ]
+            )
+            # An interval ending at t no longer covers t: ends first, then the starts
+            # already seen by the previous batches. Every source sums to zero, so one
+            # running sum serves all the sources.
+            .sort(["_src", "Date", "_delta", "_new"])
+            .with_columns(pl.col("_delta").cum_sum().alias("value"))
+        )
+        triggers = points.filter(pl.col("_new") & (pl.col("_delta") == 1) & (pl.col("value") >= rule.threshold))
+        return self._alerts(rule, triggers.select("IPsrc", "Date", "value"))
+
+    def _next_state(self, rule: Rule, combined: pl.DataFrame) -> pl.DataFrame:
+        """Events still inside the window after this batch, bounded per source."""
+        if self.watermark is None:
+            return self._empty(rule)
+        recent = combined.filter(pl.col("Date") > self.watermark - rule.window).drop("_new")
+        if rule.key:
+            # Only the latest occurrence of each key matters for the distinct counts
+            recent = recent.group_by(["IPsrc", rule.key]).agg(pl.col("Date").max())
+        return (
+            recent.sort("Date", descending=True)
+            .group_by("IPsrc", maintain_order=True)
+            .head(rule.threshold)
+            .select(self._columns(rule))
+        )
+
+    def _alerts(self, rule: Rule, triggers: pl.DataFrame) -> pl.DataFrame:
+        """One alert per new episode of consecutive triggers of a source."""
+        previous = self.episodes[rule.name]
+        window = rule.window
+        if triggers.height == 0:
+            # Nothing new: only forget the expired episodes
+            self.episodes[rule.name] = previous.filter(pl.col("last") > self.watermark - window)
+            return pl.DataFrame(schema=ALERT_SCHEMA)
+        triggers = (
+            triggers.sort(["IPsrc", "Date"])
+            .join(previous, on="IPsrc", how="left")
+            .with_columns(pl.col("Date").shift(1).over("IPsrc").fill_null(pl.col("last")).alias("_previous"))
+            .with_columns(
+                (pl.col("_previous").is_null() | (pl.col("Date") - pl.col("_previous") > window)).alias("_starts")
+            )
+            .with_columns(pl.col("_starts").cum_sum().over("IPsrc").alias("_episode"))
+        )
+        episodes = triggers.group_by(["IPsrc", "_episode"]).agg(
+            pl.col("_starts").first().alias("_new_episode"),
+            pl.col("Date").min().alias("first"),
+            pl.col("Date").max().alias("end"),
+            pl.col("value").max().alias("value"),
+        )
+        # Remember where each source's last episode ends, forget the expired ones
+        last = episodes.group_by("IPsrc").agg(pl.col("end").max().alias("last"))
+        self.episodes[rule.name] = (
+            pl.concat([previous, last])
+            .group_by("IPsrc")
+            .agg(pl.col("last").max())
+            .filter(pl.col("last") > self.watermark - window)
+        )
+        return (
+            episodes.filter(pl.col("_new_episode"))
+            .select(
+                pl.lit(rule.name).alias("rule"),
+                pl.lit(rule.severity).alias("severity"),
+                "IPsrc",
+                (pl.col("first") - window).alias("start"),
+                "end",
+                pl.col("value").cast(pl.UInt32),
+                pl.lit(rule.threshold, pl.UInt32).alias("threshold"),
+                pl.lit(datetime.now()).cast(pl.Datetime("us")).alias("detected_at"),
+            )
+            .select(list(ALERT_SCHEMA))
+            .cast(ALERT_SCHEMA)
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the logs store through the detection rules")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--keep", action="store_true", help="Keep the existing alerts instead of replacing them")
+    args = parser.parse_args()
+
+    alerts = AlertStore(args.data_dir)
+    if not args.keep:
+        alerts.clear()
+    engine = DetectionEngine(alerts)
+    start = time.perf_counter()
+    raised = engine.scan_store(LogStore(args.data_dir))
+    elapsed = time.perf_counter() - start
+    print(f"{engine.events} events, {raised} alerts in {elapsed:.1f} s ({engine.events / max(elapsed, 1e-9):,.0f} events/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Incremental filtering of a dataset (the data explorer page).
+
+A FilterEngine is built once per dataset version. It computes the distinct
+values offered by the filter widgets once, composes the selected filters
+into a single polars expression, and remembers its last result: when the
+new filters only narrow the previous ones (a value picked where "all" was
+selected, a shorter date range), they are evaluated on the previous result
+instead of the whole dataset.
+
+    engine = FilterEngine(df, version)
+    engine.options("action")                       # ["DENY", "PERMIT"]
+    engine.apply(Filters(action="DENY", start=since))
+"""
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import polars as pl
+
+# Columns filtered by equality with a value chosen among their distinct values
+VALUE_COLUMNS = {"action": "action", "protocol": "Protocole", "port_dst": "Port_dst"}
+
+
+class Filters(NamedTuple):
+    """Filters of the explorer (None: no filter on the field); start and end are inclusive."""
+
+    action: Optional[str] = None
+    protocol: Optional[str] = None
+    port_dst: Optional[int] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+
+def filter_expression(filters: Filters, columns: List[str]) -> Optional[pl.Expr]:
+    """The filters as one expression (None: nothing to filter); filters on missing columns are ignored."""
+    conditions = [
+        pl.col(column) == getattr(filters, field)
+        for field, column in VALUE_COLUMNS.items()
+        if column in columns and getattr(filters, field) is not None
+    ]
+    if "Date" in columns:
+        if filters.start is not None:
+            conditions.append(pl.col("Date") >= filters.start)
+        if filters.end is not None:
+            conditions.append(pl.col("Date") <= filters.end)
+    return pl.all_horizontal(conditions) if conditions else None
+
+
+def narrows(new: Filters, old: Filters) -> bool:
+    """Whether every row matching `new` also matches `old`."""
+    for field in VALUE_COLUMNS:
+        before = getattr(old, field)
+        if before is not None and getattr(new, field) != before:
+            return False
+    if old.start is not None and (new.start is None or new.start < old.start):
+        return False
+    if old.end is not None and (new.end is None or new.end > old.end):
+        return False
+    return True
+
+
+class FilterEngine:
+    """Filters of one dataset version, reusing the last result when the filters are narrowed."""
+
+    def __init__(self, df: pl.DataFrame, version: Optional[str] = None):
+        self.df = df
+        self.version = version
+        self._options: Dict[str, list] = {}
+        self._last: Optional[Filters] = None
+        self._result = df
+        # Rows scanned by the last call to apply (the whole dataset or the previous result)
+        self.scanned_rows = 0
+
+    def options(self, column: str) -> list:
+        """Sorted distinct values of a column (without nulls), computed once."""
+        if column not in self._options:
+            self._options[column] = self.df[column].drop_nulls().unique().sort().to_list()
+        return self._options[column]
+
+    def date_bounds(self):
+        """Smallest and largest Date of the dataset."""
+        if "date_bounds" not in self._options:
+            self._options["date_bounds"] = [self.df["Date"].min(), self.df["Date"].max()]
+        return tuple(self._options["date_bounds"])
+
+    def apply(self, filters: Filters) -> pl.DataFrame:
+        if filters == self._last:
+            self.scanned_rows = 0
+            return self._result
+        base = self._result if self._last is not None and narrows(filters, self._last) else self.df
+        expression = filter_expression(filters, self.df.columns)
+        self.scanned_rows = base.height
+        self._result = base if expression is None else base.lazy().filter(expression).collect()
+        self._last = filters
+        return self._result
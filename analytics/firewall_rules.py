@@ -0,0 +1,112 @@
+"""
+Firewall rule (idRegle) analytics over the rule hit counters of the store.
+
+Every function takes the counters LazyFrame of LogStore.rule_counters()
+(storage.rule_counters.COUNTER_SCHEMA) and never reads the logs: the cost
+depends on the number of rules, days and ports, not on the number of logs.
+
+The firewall configuration is not part of the logs, so the known rules are
+the rules that hit at least once in the store: a rule is silent when it has
+no hit between `start` and `end`.
+"""
+from datetime import date
+from typing import Optional
+
+import polars as pl
+
+from analytics.queries import collect
+
+
+def _window(counters: pl.LazyFrame, start: Optional[date], end: Optional[date]) -> pl.LazyFrame:
+    if start is not None:
+        counters = counters.filter(pl.col("day") >= start)
+    if end is not None:
+        counters = counters.filter(pl.col("day") <= end)
+    return counters
+
+
+def _hits(action: Optional[str] = None, external: Optional[bool] = None) -> pl.Expr:
+    condition = pl.lit(True)
+    if action is not None:
+        condition = condition & (pl.col("action") == action)
+    if external is not None:
+        condition = condition & (pl.col("external") == external)
+    return pl.col("count").filter(condition).sum().cast(pl.UInt64)
+
+
+def rule_summary(counters: pl.LazyFrame, start: Optional[date] = None, end: Optional[date] = None) -> pl.DataFrame:
+    """
+    Hits of every known rule between start and end: total, PERMIT, DENY, DENY
+    of external sources, distinct protocols and ports, first and last day hit,
+    and the last day hit over the whole store. Busiest rules first, silent
+    rules (no hit in the window) last.
+    """
+    known = counters.group_by("idRegle").agg(pl.col("day").max().alias("last_seen"))
+    hits = (
+        _window(counters, start, end)
+        .group_by("idRegle")
+        .agg(
+            _hits().alias("hits"),
+            _hits("PERMIT").alias("PERMIT"),
+            _hits("DENY").alias("DENY"),
+            _hits("DENY", external=True).alias("external_DENY"),
+            pl.col("Protocole").n_unique().cast(pl.UInt32).alias("protocols"),
+            pl.col("Port_dst").n_unique().cast(pl.UInt32).alias("ports"),
+            pl.col("day").min().alias("first_day"),
+            pl.col("day").max().alias("last_day"),
+        )
+    )
+    counts = ["hits", "PERMIT", "DENY", "external_DENY", "protocols", "ports"]
+    summary = (
+        known.join(hits, on="idRegle", how="left")
+        .with_columns(pl.col(counts).fill_null(0))
+        .with_columns(
+            (pl.col("hits") / pl.col("hits").sum()).fill_nan(0.0).alias("share"),
+            (pl.col("hits") == 0).alias("silent"),
+        )
+        .select("idRegle", *counts, "share", "first_day", "last_day", "last_seen", "silent")
+        .sort(["hits", "idRegle"], descending=[True, False])
+    )
+    return collect([summary])[0]
+
+
+def rule_activity(
+    counters: pl.LazyFrame, rule: int, start: Optional[date] = None, end: Optional[date] = None
+) -> pl.DataFrame:
+    """PERMIT, DENY and external DENY hits of one rule per day."""
+    daily = (
+        _window(counters, start, end)
+        .filter(pl.col("idRegle") == rule)
+        .group_by("day")
+        .agg(
+            _hits("PERMIT").alias("PERMIT"),
+            _hits("DENY").alias("DENY"),
+            _hits("DENY", external=True).alias("external_DENY"),
+        )
+        .sort("day")
+    )
+    return collect([daily])[0]
+
+
+def rule_ports(
+    counters: pl.LazyFrame,
+    rule: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: Optional[int] = 20,
+) -> pl.DataFrame:
+    """Destination ports and protocols matched by one rule, busiest first."""
+    ports = (
+        _window(counters, start, end)
+        .filter(pl.col("idRegle") == rule)
+        .group_by("Protocole", "Port_dst")
+        .agg(
+            _hits().alias("hits"),
+            _hits("DENY").alias("DENY"),
+            _hits("DENY", external=True).alias("external_DENY"),
+        )
+        .sort(["hits", "Protocole", "Port_dst"], descending=[True, False, False])
+    )
+    if limit is not None:
+        ports = ports.head(limit)
+    return collect([ports])[0]
@@ -0,0 +1,172 @@
+"""
+Sparse connection graph of the logs store.
+
+ConnectionGraph indexes the IPsrc → IPdst edges of the store (LogStore.edges(),
+see storage.edges) in compressed sparse row form: node ids are the positions
+of the addresses in the sorted node array, and the edges of node i are the
+slice indptr[i]:indptr[i + 1] of the edge arrays. The same edges are indexed
+twice, by source (fan-out) and by destination (fan-in), so every query only
+touches the neighbours it returns, whatever the size of the store:
+
+- fan_out(ip) / fan_in(ip): the edges leaving / reaching an address;
+- top_degree(): the addresses with the most distinct peers (or connections);
+- neighborhood(ip, hops): the subgraph within k hops of an address, bounded
+  to `max_nodes` nodes (the heaviest edges are followed first).
+
+Unlike the dense IPsrc × IPdst matrix of the former heatmap, memory grows
+with the number of edges, not with the square of the number of addresses.
+"""
+from typing import Optional
+
+import numpy as np
+import polars as pl
+
+from storage.edges import EDGE_SCHEMA
+
+DIRECTIONS = ("out", "in", "both")
+
+
+def _gather(indptr: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """Positions of the CSR entries of several nodes, concatenated."""
+    starts, ends = indptr[nodes], indptr[nodes + 1]
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    # arange over every slice: offset of each entry inside its slice, plus the slice start
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
+
+
+class ConnectionGraph:
+    """CSR adjacency index of the connection edges (EDGE_SCHEMA rows)."""
+
+    def __init__(self, edges: pl.DataFrame):
+        edges = edges.drop_nulls(["IPsrc", "IPdst"])
+        self.nodes = pl.concat([edges["IPsrc"], edges["IPdst"]]).unique().sort()
+        ids = pl.DataFrame({"ip": self.nodes, "id": np.arange(self.nodes.len(), dtype=np.int64)})
+        edges = (
+            edges.join(ids.rename({"ip": "IPsrc", "id": "src"}), on="IPsrc")
+            .join(ids.rename({"ip": "IPdst", "id": "dst"}), on="IPdst")
+            .sort(["src", "dst"])
+        )
+        # Edge attributes in fan-out order: the out index points straight into them
+        self.edges = edges
+        n = self.nodes.len()
+        self.src = edges["src"].to_numpy()
+        self.dst = edges["dst"].to_numpy()
+        self.count = edges["count"].to_numpy().astype(np.int64)
+        self.out_indptr = np.concatenate([[0], np.cumsum(np.bincount(self.src, minlength=n))])
+        # Fan-in index: edge positions sorted by destination
+        self.in_edges = np.lexsort((self.src, self.dst))
+        self.in_indptr = np.concatenate([[0], np.cumsum(np.bincount(self.dst, minlength=n))])
+
+    @property
+    def node_count(self) -> int:
+        return self.nodes.len()
+
+    @property
+    def edge_count(self) -> int:
+        return self.edges.height
+
+    def node_id(self, ip: str) -> Optional[int]:
+        position = self.nodes.search_sorted(ip)
+        if position < self.nodes.len() and self.nodes[position] == ip:
+            return int(position)
+        return None
+
+    def _edge_positions(self, nodes: np.ndarray, direction: str) -> np.ndarray:
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {DIRECTIONS}")
+        positions = []
+        if direction in ("out", "both"):
+            positions.append(_gather(self.out_indptr, nodes))
+        if direction in ("in", "both"):
+            positions.append(self.in_edges[_gather(self.in_indptr, nodes)])
+        return np.concatenate(positions)
+
+    def _rows(self, positions: np.ndarray) -> pl.DataFrame:
+        return self.edges[positions].select(list(EDGE_SCHEMA))
+
+    def fan_out(self, ip: str, limit: Optional[int] = None) -> pl.DataFrame:
+        """Edges leaving `ip`, busiest first."""
+        return self._neighbors(ip, "out", limit)
+
+    def fan_in(self, ip: str, limit: Optional[int] = None) -> pl.DataFrame:
+        """Edges reaching `ip`, busiest first."""
+        return self._neighbors(ip, "in", limit)
+
+    def _neighbors(self, ip: str, direction: str, limit: Optional[int]) -> pl.DataFrame:
+        node = self.node_id(ip)
+        if node is None:
+            return pl.DataFrame(schema=EDGE_SCHEMA)
+        edges = self._rows(self._edge_positions(np.array([node]), direction))
+        edges = edges.sort(["count", "IPsrc", "IPdst"], descending=[True, False, False])
+        return edges.head(limit) if limit is not None else edges
+
+    def degrees(self) -> pl.DataFrame:
+        """Distinct peers and connections of every address, as source and as destination."""
+        n = self.node_count
+        return pl.DataFrame(
+            {
+                "ip": self.nodes,
+                "out_degree": np.diff(self.out_indptr),
+                "in_degree": np.diff(self.in_indptr),
+                "out_count": np.bincount(self.src, weights=self.count, minlength=n).astype(np.int64),
+                "in_count": np.bincount(self.dst, weights=self.count, minlength=n).astype(np.int64),
+            }
+        )
+
+    def top_degree(self, direction: str = "out", limit: int = 20, weighted: bool = False) -> pl.DataFrame:
+        """
+        Addresses with the most distinct destinations (out), sources (in) or
+        both; by number of connections rather than of peers when `weighted`.
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {DIRECTIONS}")
+        degrees = self.degrees()
+        measure = "count" if weighted else "degree"
+        if direction == "both":
+            key = pl.col(f"out_{measure}") + pl.col(f"in_{measure}")
+        else:
+            key = pl.col(f"{direction}_{measure}")
+        return (
+            degrees.with_columns(key.alias("rank_value"))
+            .sort(["rank_value", "ip"], descending=[True, False])
+            .head(limit)
+            .drop("rank_value")
+        )
+
+    def neighborhood(self, ip: str, hops: int = 1, direction: str = "both", max_nodes: int = 100) -> pl.DataFrame:
+        """
+        Edges of the subgraph within `hops` hops of `ip`, with the hop of both
+        ends (0 for `ip`). Each hop keeps the neighbours reached by the
+        heaviest edges, up to `max_nodes` nodes overall.
+        """
+        node = self.node_id(ip)
+        if node is None or hops < 0 or max_nodes < 1:
+            return pl.DataFrame(schema={**EDGE_SCHEMA, "src_hop": pl.Int32, "dst_hop": pl.Int32})
+        hop = np.full(self.node_count, -1, dtype=np.int32)
+        hop[node] = 0
+        frontier, selected = np.array([node]), 1
+        for depth in range(1, hops + 1):
+            if selected >= max_nodes or frontier.size == 0:
+                break
+            positions = self._edge_positions(frontier, direction)
+            peers = np.where(hop[self.src[positions]] == depth - 1, self.dst[positions], self.src[positions])
+            new = hop[peers] < 0
+            peers, weights = peers[new], self.count[positions][new]
+            # Heaviest edge first, each peer once
+            order = np.argsort(-weights, kind="stable")
+            peers = peers[order]
+            _, first = np.unique(peers, return_index=True)
+            frontier = peers[np.sort(first)][: max_nodes - selected]
+            hop[frontier] = depth
+            selected += frontier.size
+        inside = np.flatnonzero(hop >= 0)
+        positions = np.unique(self._edge_positions(inside, direction))
+        positions = positions[(hop[self.src[positions]] >= 0) & (hop[self.dst[positions]] >= 0)]
+        return self._rows(positions).with_columns(
+            pl.Series("src_hop", hop[self.src[positions]]),
+            pl.Series("dst_hop", hop[self.dst[positions]]),
+        )
@@ -0,0 +1,206 @@
+"""
+Scatter-gather execution of aggregations over the files of the logs store.
+
+One polars query decodes its files in one process, and the Python glue
+around it (casts, concat of the scans, collect) holds the GIL. For long
+date ranges, ScatterGather splits the files of the window into tasks of
+about the same number of rows, runs partial aggregations of every task in a
+pool of worker processes, each with its share of the cores, and merges the
+partial results:
+
+- Count: number of rows;
+- GroupBy: rows and column sums per group (merged by summing);
+- TopK: most frequent values of a column (exact: partial value counts are
+  summed before the top k is taken);
+- Distinct: approximate distinct count from mergeable HyperLogLog sketches
+  (storage.sketches).
+
+    with ScatterGather(store, workers=8) as pool:
+        result = pool.run({"rows": Count(), "top": TopK("IPsrc", 10)}, since=datetime(2025, 1, 1))
+
+Aggregations are plain picklable objects with a `partial` step (a query run
+in a worker over the files of its task) and a `merge` step (run in the
+caller).
+"""
+import multiprocessing
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import polars as pl
+
+from storage.core import LOG_SCHEMA, LogStore, file_stats, scan_logs
+from storage.sketches import GLOBAL_PRECISION, HyperLogLog, hash_values
+
+# Tasks per worker: more, smaller tasks balance uneven files better
+TASKS_PER_WORKER = 4
+
+
+class Aggregation:
+    """
+    An aggregation split into a partial step per task and a merge step. The
+    partial query of every aggregation of a task is collected in one pass
+    over its files, then `finish` turns its result into the partial value
+    sent back to the caller.
+    """
+
+    def partial(self, logs: pl.LazyFrame) -> pl.LazyFrame:
+        raise NotImplementedError
+
+    def finish(self, partial: pl.DataFrame) -> Any:
+        return partial
+
+    def merge(self, partials: List[Any]) -> Any:
+        raise NotImplementedError
+
+
+class Count(Aggregation):
+    def partial(self, logs: pl.LazyFrame) -> pl.LazyFrame:
+        return logs.select(pl.len())
+
+    def finish(self, partial: pl.DataFrame) -> int:
+        return partial.item()
+
+    def merge(self, partials: List[int]) -> int:
+        return sum(partials)
+
+
+class GroupBy(Aggregation):
+    """Rows (`count`) and sums of `sums` columns per value of the `by` columns."""
+
+    def __init__(self, by: Sequence[str], sums: Sequence[str] = ()):
+        self.by = list(by)
+        self.sums = list(sums)
+
+    def partial(self, logs: pl.LazyFrame) -> pl.LazyFrame:
+        sums = [pl.col(column).sum().cast(pl.Int64) for column in self.sums]
+        return logs.group_by(self.by).agg(pl.len().cast(pl.Int64).alias("count"), *sums)
+
+    def merge(self, partials: List[pl.DataFrame]) -> pl.DataFrame:
+        merged = pl.concat(partials).group_by(self.by).agg(pl.col("count").sum(), *[pl.col(c).sum() for c in self.sums])
+        return merged.sort(["count"] + self.by, descending=[True] + [False] * len(self.by))
+
+
+class TopK(Aggregation):
+    """The `k` most frequent values of a column, with their exact counts."""
+
+    def __init__(self, column: str, k: int = 10):
+        self.column = column
+        self.k = k
+
+    def partial(self, logs: pl.LazyFrame) -> pl.LazyFrame:
+        return GroupBy([self.column]).partial(logs.filter(pl.col(self.column).is_not_null()))
+
+    def merge(self, partials: List[pl.DataFrame]) -> pl.DataFrame:
+        return GroupBy([self.column]).merge(partials).head(self.k)
+
+
+class Distinct(Aggregation):
+    """Approximate number of distinct values of a column (relative error 1.04 / sqrt(2 ** precision))."""
+
+    def __init__(self, column: str, precision: int = GLOBAL_PRECISION):
+        self.column = column
+        self.precision = precision
+
+    def partial(self, logs: pl.LazyFrame) -> pl.LazyFrame:
+        return logs.select(pl.col(self.column).unique())
+
+    def finish(self, partial: pl.DataFrame) -> HyperLogLog:
+        sketch = HyperLogLog(self.precision)
+        sketch.add_hashes(hash_values(partial.to_series()))
+        return sketch
+
+    def merge(self, partials: List[HyperLogLog]) -> float:
+        merged = HyperLogLog(self.precision)
+        for sketch in partials:
+            merged.merge(sketch)
+        return merged.estimate()
+
+
+def _run_task(files: List[str], where: Optional[pl.Expr], aggregations: Dict[str, Aggregation]) -> Dict[str, Any]:
+    """Partial results of every aggregation over some files of the store (in a worker process)."""
+    frames = [scan_logs(Path(path)) for path in files]
+    logs = pl.concat(frames, how="vertical") if frames else pl.LazyFrame(schema=LOG_SCHEMA)
+    if where is not None:
+        logs = logs.filter(where)
+    # One pass over the files for every aggregation (common subplans are shared)
+    results = pl.collect_all([aggregation.partial(logs) for aggregation in aggregations.values()])
+    return {
+        name: aggregation.finish(result) for (name, aggregation), result in zip(aggregations.items(), results)
+    }
+
+
+def split_files(files: List[Path], tasks: int) -> List[List[Path]]:
+    """Split files into at most `tasks` lists of about the same number of rows (largest file first)."""
+    bins: List[List[Path]] = [[] for _ in range(max(1, min(tasks, len(files))))]
+    rows = [0] * len(bins)
+    for path in sorted(files, key=lambda path: file_stats(path).rows, reverse=True):
+        lightest = rows.index(min(rows))
+        bins[lightest].append(path)
+        rows[lightest] += file_stats(path).rows
+    return [paths for paths in bins if paths]
+
+
+@contextmanager
+def _environ(**values: str):
+    """Set environment variables while the worker processes are spawned (they copy the environment)."""
+    previous = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+class ScatterGather:
+    """A pool of worker processes running aggregations over the files of a store."""
+
+    def __init__(self, store: LogStore, workers: Optional[int] = None):
+        self.store = store
+        self.workers = workers or os.cpu_count() or 1
+        # Each worker gets its share of the cores for the polars thread pool
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        context = multiprocessing.get_context("spawn")
+        with _environ(POLARS_MAX_THREADS=str(threads)):
+            # Pool starts every worker now, with this environment
+            self._pool = context.Pool(self.workers)
+
+    def run(
+        self,
+        aggregations: Dict[str, Aggregation],
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        where: Optional[pl.Expr] = None,
+    ) -> Dict[str, Any]:
+        """
+        Results of the aggregations over the logs between `since` and `until`
+        (inclusive) matching `where`, computed in the worker processes.
+        """
+        store = self.store.pin()
+        condition = where
+        for bound in (pl.col("Date") >= since if since else None, pl.col("Date") <= until if until else None):
+            if bound is not None:
+                condition = bound if condition is None else condition & bound
+        tasks = split_files(store.window_files(since, until), self.workers * TASKS_PER_WORKER)
+        if tasks:
+            arguments = [([str(path) for path in task], condition, aggregations) for task in tasks]
+            partials = self._pool.starmap(_run_task, arguments, chunksize=1)
+        else:
+            partials = [_run_task([], condition, aggregations)]
+        return {name: aggregation.merge([partial[name] for partial in partials]) for name, aggregation in aggregations.items()}
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
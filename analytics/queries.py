@@ -0,0 +1,296 @@
+"""
+Pure analytics functions over a logs DataFrame (LOG_SCHEMA columns).
+
+No Streamlit and no I/O here: every function takes a polars DataFrame and
+returns a DataFrame or a plain dict, so they can be called from the pages,
+the HTTP service (analytics.server), the benchmarks or a notebook alike.
+
+The aggregations (ip_stats, top_ports, flow_summary, network_flows,
+external_sources) and the filters also accept a LazyFrame, e.g. the scan of
+the whole store: they are then computed exactly with the streaming engine,
+in bounded memory, whatever the size of the store.
+"""
+import ipaddress
+from datetime import date, datetime
+from typing import List, Optional, Tuple, Union
+
+import polars as pl
+
+from ingest.parser import ipv4_expr, ipv4_to_uint32
+from monitoring.profiling import profiled
+
+# Internal networks of the university
+INTERNAL_NETWORKS = [
+    ipaddress.ip_network("10.70.0.0/16"),
+    ipaddress.ip_network("159.84.0.0/16"),
+    ipaddress.ip_network("192.168.0.0/16"),
+]
+
+# port_type values of filter_flows
+PORT_TYPES = ("src", "dst", "both")
+
+# A logs DataFrame, or a lazy scan of the store
+Frame = Union[pl.DataFrame, pl.LazyFrame]
+
+
+def collect(frames: List[pl.LazyFrame]) -> List[pl.DataFrame]:
+    """Collect with the streaming engine; several queries over the same scan share it."""
+    return pl.collect_all(frames, engine="streaming")
+
+
+def is_internal_ip(ip: str) -> bool:
+    """Whether an IP belongs to one of the internal networks."""
+    try:
+        ip_obj = ipaddress.ip_address(ip)
+        return any(ip_obj in network for network in INTERNAL_NETWORKS)
+    except ValueError:
+        return False
+
+
+def is_internal(values: pl.Series) -> pl.Series:
+    """Vectorized is_internal_ip over an IP string column (invalid addresses are external)."""
+    addresses = ipv4_to_uint32(values)
+    internal = pl.lit(False)
+    for network in INTERNAL_NETWORKS:
+        start, end = int(network.network_address), int(network.broadcast_address)
+        internal = internal | pl.col("address").is_between(start, end)
+    return pl.DataFrame({"address": addresses}).select(internal.fill_null(False).alias(values.name)).to_series()
+
+
+def internal_ips(df: Frame, columns=("IPsrc", "IPdst")) -> pl.Series:
+    """
+    The distinct internal addresses of some IP columns. Addresses repeat a lot,
+    so lazy queries classify them once and test rows with is_in.
+    """
+    lazy = df.lazy()
+    ips = pl.concat([lazy.select(pl.col(column).alias("ip")).unique() for column in columns]).unique()
+    address = ipv4_expr("ip")
+    internal = pl.lit(False)
+    for network in INTERNAL_NETWORKS:
+        internal = internal | address.is_between(int(network.network_address), int(network.broadcast_address))
+    return collect([ips.filter(internal.fill_null(False))])[0].to_series()
+
+
+@profiled("queries.sample_rows")
+def sample_rows(df: pl.DataFrame, n: Optional[int] = 10000, seed: int = 42) -> pl.DataFrame:
+    """Deterministic sample of at most n rows (the whole frame if n is None)."""
+    if n is not None and df.height > n:
+        return df.sample(n=n, seed=seed)
+    return df
+
+
+@profiled("queries.ip_stats")
+def ip_stats(df: Frame, limit: Optional[int] = None) -> pl.DataFrame:
+    """Destinations, permitted, denied and total connections per source IP (the `limit` busiest ones)."""
+    stats = (
+        df.lazy()
+        .group_by("IPsrc")
+        .agg(
+            [
+                pl.n_unique("IPdst").alias("nb_destinations"),
+                (pl.col("action") == "PERMIT").sum().cast(pl.UInt32).alias("permit_count"),
+                (pl.col("action") == "DENY").sum().cast(pl.UInt32).alias("deny_count"),
+                pl.len().cast(pl.UInt32).alias("total_count"),
+            ]
+        )
+        .sort(["total_count", "IPsrc"], descending=[True, False])
+    )
+    if limit is not None:
+        stats = stats.head(limit)
+    return collect([stats])[0]
+
+
+@profiled("queries.port_stats")
+def port_stats(df: pl.DataFrame, port_range: Tuple[int, int]) -> pl.DataFrame:
+    """Rows whose destination port lies in port_range (inclusive)."""
+    return df.filter(pl.col("Port_dst").cast(pl.Int32).is_between(port_range[0], port_range[1]))
+
+
+@profiled("queries.network_info")
+def network_info(df: pl.DataFrame) -> pl.DataFrame:
+    """Add the is_src_internal / is_dst_internal columns."""
+    return df.with_columns(
+        is_internal(df["IPsrc"]).alias("is_src_internal"),
+        is_internal(df["IPdst"]).alias("is_dst_internal"),
+    )
+
+
+@profiled("queries.top_ports")
+def top_ports(df: Frame, max_port: int = 1024, limit: int = 10) -> pl.DataFrame:
+    """Most used permitted destination ports below max_port (Port_dst as string)."""
+    ports = (
+        df.lazy()
+        .filter((pl.col("Port_dst").cast(pl.Int32) < max_port) & (pl.col("action") == "PERMIT"))
+        .group_by("Port_dst")
+        .agg([pl.len().cast(pl.UInt32).alias("count"), pl.first("Protocole").alias("protocole")])
+        .sort(["count", "Port_dst"], descending=[True, False])
+        .limit(limit)
+        .with_columns(pl.col("Port_dst").cast(pl.Utf8))
+    )
+    return collect([ports])[0]
+
+
+@profiled("queries.ip_details")
+def ip_details(df: Frame, ip: str, limit: Optional[int] = None) -> pl.DataFrame:
+    """The rows of one source IP, the `limit` most recent ones if given."""
+    rows = df.lazy().filter(pl.col("IPsrc") == ip)
+    if limit is not None:
+        rows = rows.sort("Date", descending=True).head(limit)
+    return collect([rows])[0]
+
+
+def _counts(rows: pl.LazyFrame, columns: List[str], limit: Optional[int] = None) -> pl.LazyFrame:
+    counts = rows.group_by(columns).agg(pl.len().cast(pl.UInt32).alias("count"))
+    counts = counts.sort(["count", *columns], descending=[True] + [False] * len(columns))
+    return counts.head(limit) if limit is not None else counts
+
+
+@profiled("queries.ip_summary")
+def ip_summary(df: Frame, ip: str, limit: int = 1000) -> dict:
+    """
+    Aggregates of the connections of one source IP, in one streaming pass:
+    totals, first and last connection, counts per action and protocol, top
+    10 destination ports, and the `limit` busiest destinations and
+    (destination, port, action) triples. Count tables are lists of records.
+    """
+    rows = df.lazy().filter(pl.col("IPsrc") == ip)
+    totals, *tables = collect(
+        [
+            rows.select(
+                pl.len().alias("connections"),
+                pl.n_unique("IPdst").alias("destinations"),
+                pl.min("Date").alias("first"),
+                pl.max("Date").alias("last"),
+            ),
+            _counts(rows, ["action"]),
+            _counts(rows, ["Protocole"]),
+            _counts(rows, ["Port_dst"], 10),
+            _counts(rows, ["IPdst"], limit),
+            _counts(rows, ["IPdst", "Port_dst", "action"], limit),
+        ]
+    )
+    connections, destinations, first, last = totals.row(0)
+    summary = {
+        "connections": connections,
+        "destinations": destinations if connections else 0,
+        "first": first.isoformat() if first is not None else None,
+        "last": last.isoformat() if last is not None else None,
+    }
+    for name, table in zip(("actions", "protocols", "ports", "top_destinations", "top_connections"), tables):
+        summary[name] = table.to_dicts()
+    return summary
+
+
+@profiled("queries.network_flows")
+def network_flows(df: Frame) -> pl.DataFrame:
+    """Number of flows per internal/external source, internal/external destination and action."""
+    internal = internal_ips(df)
+    flows = (
+        df.lazy()
+        .group_by(
+            pl.col("IPsrc").is_in(internal.implode()).alias("is_src_internal"),
+            pl.col("IPdst").is_in(internal.implode()).alias("is_dst_internal"),
+            "action",
+        )
+        .agg(pl.len().cast(pl.UInt32).alias("count"))
+        .sort(["count", "action"], descending=[True, False])
+    )
+    return collect([flows])[0]
+
+
+@profiled("queries.external_sources")
+def external_sources(df: Frame, limit: Optional[int] = 1000) -> pl.DataFrame:
+    """Connection attempts per external source IP and action, busiest first."""
+    internal = internal_ips(df, columns=("IPsrc",))
+    sources = (
+        df.lazy()
+        .filter(~pl.col("IPsrc").is_in(internal.implode()))
+        .group_by(["IPsrc", "action"])
+        .agg(pl.len().cast(pl.UInt32).alias("nombre_tentatives"))
+        .sort(["nombre_tentatives", "IPsrc", "action"], descending=[True, False, False])
+    )
+    if limit is not None:
+        sources = sources.head(limit)
+    return collect([sources])[0]
+
+
+def _day_bounds(value, end: bool) -> datetime:
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value
+    return datetime.combine(value, datetime.max.time() if end else datetime.min.time())
+
+
+@profiled("queries.filter_flows")
+def filter_flows(
+    df: Frame,
+    protocol: Optional[str] = None,
+    action: Optional[str] = None,
+    port_range: Optional[Tuple[int, int]] = None,
+    port_type: str = "both",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> pl.DataFrame:
+    """
+    Filter flows by protocol, action, port range (on the source, destination
+    or both ports) and day range. None means no filter; start and end are
+    inclusive whole days. A LazyFrame gives a LazyFrame.
+    """
+    if port_type not in PORT_TYPES:
+        raise ValueError(f"port_type must be one of {PORT_TYPES}")
+    conditions = []
+    if protocol is not None:
+        conditions.append(pl.col("Protocole") == protocol)
+    if action is not None:
+        conditions.append(pl.col("action") == action)
+    if port_range is not None:
+        min_port, max_port = port_range
+        if port_type in ("src", "both"):
+            conditions.append(pl.col("Port_src").is_between(min_port, max_port))
+        if port_type in ("dst", "both"):
+            conditions.append(pl.col("Port_dst").is_between(min_port, max_port))
+    if start is not None:
+        conditions.append(pl.col("Date") >= _day_bounds(start, end=False))
+    if end is not None:
+        conditions.append(pl.col("Date") <= _day_bounds(end, end=True))
+    return df.filter(*conditions) if conditions else df
+
+
+def _shares(counts: pl.DataFrame, total: int) -> dict:
+    """Percentage of rows per value, from (value, len) counts."""
+    counts = counts.sort(["len", counts.columns[0]], descending=[True, False])
+    return {str(value): 100 * count / total for value, count in counts.iter_rows()}
+
+
+@profiled("queries.flow_summary")
+def flow_summary(df: Frame) -> dict:
+    """Headline figures of a set of flows: counts, action/protocol shares, top source and destination."""
+    lazy = df.lazy()
+    totals, *counts = collect(
+        [
+            lazy.select(
+                pl.len().alias("flows"),
+                pl.n_unique("IPsrc").alias("sources"),
+                pl.n_unique("IPdst").alias("destinations"),
+            )
+        ]
+        + [lazy.group_by(column).len() for column in ("action", "Protocole")]
+        # Only the busiest source and destination are needed
+        + [lazy.group_by(column).len().sort(["len", column], descending=[True, False]).head(1) for column in ("IPsrc", "IPdst")]
+    )
+    flows = totals["flows"].item()
+    summary = {
+        "flows": flows,
+        "sources": totals["sources"].item() if flows else 0,
+        "destinations": totals["destinations"].item() if flows else 0,
+        "actions": _shares(counts[0], flows) if flows else {},
+        "protocols": _shares(counts[1], flows) if flows else {},
+        "top_source": None,
+        "top_destination": None,
+    }
+    for key, top in zip(("top_source", "top_destination"), counts[2:]):
+        if flows:
+            ip, count = top.row(0)
+            summary[key] = {"ip": str(ip), "share": 100 * count / flows}
+    return summary
@@ -0,0 +1,150 @@
+"""
+Local HTTP API of the analytics service.
+
+    GET /v1/<endpoint>?param=value...   e.g. /v1/ip_stats?n=5000
+    GET /v1/                            list of the endpoints
+    GET /metrics                        Prometheus metrics of the process
+
+Table results are returned as Arrow IPC streams when the request accepts
+`application/vnd.apache.arrow.stream` (what analytics.client does), as JSON
+records otherwise; other results are JSON objects. Errors are JSON objects
+with an "error" key. Requests are handled concurrently, one thread per
+connection, and connections are kept alive (HTTP/1.1) so clients can pool
+them.
+
+Usage:
+    python -m analytics.server --port 8765
+"""
+import argparse
+import json
+import logging
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import polars as pl
+import pyarrow as pa
+
+from analytics.service import AnalyticsService, ServiceError
+from analytics.sql import SqlEngine
+from monitoring.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from monitoring.metrics import REGISTRY
+from storage.core import LogStore
+
+logger = logging.getLogger(__name__)
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+JSON = "application/json"
+
+API_REQUESTS = REGISTRY.counter("opsie_api_requests_total", "Analytics API requests", ["endpoint", "status"])
+API_DURATION = REGISTRY.histogram("opsie_api_request_duration_seconds", "Analytics API latency", ["endpoint"])
+
+
+def encode_arrow(df: pl.DataFrame) -> bytes:
+    table = df.to_arrow()
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_arrow(data: bytes) -> pl.DataFrame:
+    return pl.from_arrow(pa.ipc.open_stream(data).read_all())
+
+
+class AnalyticsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "AnalyticsServer"
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload):
+        self._send(status, json.dumps(payload, default=str).encode("utf-8"), JSON)
+
+    def _encode(self, result) -> Tuple[bytes, str]:
+        if isinstance(result, pl.DataFrame):
+            if ARROW_STREAM in self.headers.get("Accept", ""):
+                return encode_arrow(result), ARROW_STREAM
+            return result.write_json().encode("utf-8"), JSON
+        return json.dumps(result, default=str).encode("utf-8"), JSON
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            self._send(200, REGISTRY.render().encode("utf-8"), METRICS_CONTENT_TYPE)
+            return
+        if url.path.rstrip("/") == "/v1":
+            self._send_json(200, {"endpoints": sorted(self.server.service.endpoints)})
+            return
+        if not url.path.startswith("/v1/"):
+            self._send_json(404, {"error": f"Not found: {url.path}"})
+            return
+
+        endpoint = url.path[len("/v1/"):].strip("/")
+        start = time.perf_counter()
+        status = 200
+        try:
+            result = self.server.service.call(endpoint, dict(parse_qsl(url.query)))
+            body, content_type = self._encode(result)
+            self._send(200, body, content_type)
+        except ServiceError as e:
+            status = e.status
+            self._send_json(status, {"error": str(e)})
+        except Exception as e:
+            status = 500
+            logger.exception("Error while serving %s", self.path)
+            self._send_json(status, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            # Unknown endpoints are grouped to keep the label cardinality bounded
+            label = endpoint if endpoint in self.server.service.endpoints else "unknown"
+            API_REQUESTS.inc(endpoint=label, status=str(status))
+            API_DURATION.observe(time.perf_counter() - start, endpoint=label)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class AnalyticsServer(ThreadingHTTPServer):
+    """Threaded HTTP server bound to an AnalyticsService."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: Optional[AnalyticsService] = None):
+        super().__init__(address, AnalyticsHandler)
+        self.service = service or AnalyticsService()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--sample-limit", type=int, default=10000, help="Rows of the store the queries work on")
+    parser.add_argument("--sql-timeout", type=float, default=30.0, help="Seconds before an SQL query is cancelled")
+    parser.add_argument("--sql-max-rows", type=int, default=100_000, help="Rows an SQL query can return")
+    args = parser.parse_args()
+
+    store = LogStore(data_dir=args.data_dir)
+    sql_engine = SqlEngine(store, timeout=args.sql_timeout, max_rows=args.sql_max_rows)
+    service = AnalyticsService(store, sample_limit=args.sample_limit, sql_engine=sql_engine)
+    server = AnalyticsServer((args.host, args.port), service)
+    print(f"Analytics API listening on {server.url}/v1/", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,616 @@
+"""
+Analytics service: the queries of analytics.queries bound to a logs store.
+
+`AnalyticsService.call(endpoint, params)` is the single entry point used by
+the HTTP server and by the in-process client. Parameters may be strings (from
+a query string) or native values. Results are cached per store version, so
+every consumer (pages, SOC tooling) shares the same computation and appended
+logs invalidate the cache.
+"""
+import inspect
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+import polars as pl
+
+from analytics import queries
+from analytics.sql import TABLE, SqlEngine, SqlError, SqlTimeout, table_columns
+from storage.alerts import AlertStore
+from storage.core import LogStore
+
+Result = Union[pl.DataFrame, dict]
+
+
+class ServiceError(ValueError):
+    """Invalid request: unknown endpoint or bad parameter (HTTP 400/404)."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _to_date(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def _to_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ("1", "true", "yes"):
+        return True
+    if str(value).lower() in ("0", "false", "no"):
+        return False
+    raise ValueError("expected true or false")
+
+
+# Parameter converters, accepting query string values and native values
+_CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "n": int,
+    "ip": str,
+    "min_port": int,
+    "max_port": int,
+    "max_port_exclusive": int,
+    "limit": int,
+    "protocol": str,
+    "action": str,
+    "port_type": str,
+    "start": _to_date,
+    "end": _to_date,
+    "contamination": float,
+    "n_components": int,
+    "query": str,
+    "offset": int,
+    "approx": _to_bool,
+    "since": _to_datetime,
+    "until": _to_datetime,
+    "points": int,
+    "resolution": str,
+    "rule": str,
+    "rule_id": int,
+    "direction": str,
+    "weighted": _to_bool,
+    "hops": int,
+    "max_nodes": int,
+    "firewall": int,
+}
+
+
+# Budget of the result cache, shared by a service and its firewall-scoped services
+CACHE_BYTES = 256 * 1024 * 1024
+
+
+def _result_size(result: Result) -> int:
+    if isinstance(result, pl.DataFrame):
+        return result.estimated_size()
+    # Dicts of scalars and short lists: their text is a fair estimate
+    return len(repr(result))
+
+
+class ResultCache:
+    """Thread-safe LRU cache of endpoint results, bounded by their estimated size in bytes."""
+
+    def __init__(self, max_bytes: int = CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[tuple, Tuple[Result, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], Result]) -> Result:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+        # Computed outside the lock so concurrent requests don't serialize
+        result = compute()
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return result
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+class AnalyticsService:
+    """
+    Query endpoints over a LogStore.
+
+    Aggregations (ip_stats, ip_summary, top_ports, network_flows,
+    external_sources, flow_summary) are exact: computed over the whole store
+    with the streaming engine. Passing `n` turns them into a fast preview on
+    a random sample of n rows of the store sample. Passing `approx` answers
+    ip_stats, top_ports, external_sources and flow_summary from the sketches
+    of the store (analytics.approx), with error bounds. activity reads the
+    time series rollups of the store (storage.rollups), and rules,
+    rule_activity and rule_ports its rule hit counters (analytics.firewall_rules).
+    The graph_* endpoints query the connection graph index of the store
+    (analytics.graph).
+    alerts reads the table written by the detection engine (analytics.detection).
+    Passing `firewall` to any endpoint answers it from the partition of that
+    device only (a service over LogStore.partition, created on first use);
+    firewalls lists the devices of the store, tiers its storage tiers: exact
+    aggregations with a start/end day range only scan the files of that
+    window, so recent windows read the hot tier only.
+    Endpoints returning rows (sample, flows, port_stats, network_info,
+    anomalies) always work on the store sample of `sample_limit` rows,
+    optionally sub-sampled with `n`; ip_details returns the `limit` most
+    recent rows of a source. Results are cached within a byte budget
+    (ResultCache).
+    """
+
+    def __init__(
+        self,
+        db: Optional[LogStore] = None,
+        sample_limit: int = 10000,
+        cache_bytes: int = CACHE_BYTES,
+        sql_engine: Optional[SqlEngine] = None,
+        alert_store: Optional[AlertStore] = None,
+        cache: Optional[ResultCache] = None,
+    ):
+        self.db = db or LogStore()
+        self.alert_store = alert_store or AlertStore(self.db.data_dir)
+        self.sql_engine = sql_engine or SqlEngine(self.db)
+        self.sample_limit = sample_limit
+        self.cache = cache or ResultCache(cache_bytes)
+        self._lock = threading.Lock()
+        self._scoped: Dict[int, "AnalyticsService"] = {}
+        self.endpoints: Dict[str, Callable[..., Result]] = {
+            "info": self.info,
+            "sample": self.sample,
+            "ip_stats": self.ip_stats,
+            "ip_details": self.ip_details,
+            "ip_summary": self.ip_summary,
+            "port_stats": self.port_stats,
+            "top_ports": self.top_ports,
+            "network_info": self.network_info,
+            "network_flows": self.network_flows,
+            "external_sources": self.external_sources,
+            "flows": self.flows,
+            "flow_summary": self.flow_summary,
+            "activity": self.activity,
+            "anomalies": self.anomalies,
+            "sql": self.sql,
+            "sql_info": self.sql_info,
+            "rules": self.rules,
+            "rule_activity": self.rule_activity,
+            "rule_ports": self.rule_ports,
+            "graph_info": self.graph_info,
+            "graph_top": self.graph_top,
+            "graph_neighbors": self.graph_neighbors,
+            "graph_subgraph": self.graph_subgraph,
+            "alerts": self.alerts,
+            "detection_rules": self.detection_rules,
+            "firewalls": self.firewalls,
+            "tiers": self.tiers,
+        }
+
+    # Plumbing
+
+    def _cached(self, key: tuple, compute: Callable[[], Result]) -> Result:
+        """LRU cache keyed by the store version, shared by every caller of the service."""
+        return self.cache.get_or_compute((self.db.get_store_version(),) + key, compute)
+
+    def clear_cache(self):
+        self.cache.clear()
+
+    def scoped(self, firewall: int) -> "AnalyticsService":
+        """
+        The service of one firewall partition, sharing the alert table and the
+        result cache of this one (the store version of a partition names its
+        firewall, so their keys do not collide).
+        """
+        with self._lock:
+            if firewall not in self._scoped:
+                self._scoped[firewall] = AnalyticsService(
+                    self.db.partition(firewall), self.sample_limit, alert_store=self.alert_store, cache=self.cache
+                )
+            return self._scoped[firewall]
+
+    def call(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Result:
+        """Run an endpoint with raw parameters; raises ServiceError on bad requests."""
+        if endpoint not in self.endpoints:
+            raise ServiceError(f"Unknown endpoint: {endpoint}", status=404)
+        kwargs = {}
+        for name, value in (params or {}).items():
+            if value is None or value == "":
+                continue
+            converter = _CONVERTERS.get(name)
+            if converter is None:
+                raise ServiceError(f"Unknown parameter for {endpoint}: {name}")
+            try:
+                kwargs[name] = converter(value)
+            except (TypeError, ValueError) as e:
+                raise ServiceError(f"Invalid value for {name}: {value!r} ({e})")
+        service = self
+        if "firewall" in kwargs:
+            firewall = kwargs.pop("firewall")
+            if self.db.firewall is None:
+                service = self.scoped(firewall)
+            elif firewall != self.db.firewall:
+                raise ServiceError(f"This service only serves firewall {self.db.firewall}")
+        method = service.endpoints[endpoint]
+        # Only a parameter mismatch is a bad request: errors raised by the endpoint itself are not
+        try:
+            inspect.signature(method).bind(**kwargs)
+        except TypeError as e:
+            raise ServiceError(f"Invalid parameters for {endpoint}: {e}")
+        return method(**kwargs)
+
+    def _base(self) -> pl.DataFrame:
+        return self._cached(("base",), lambda: self.db.sample(self.sample_limit))
+
+    def _frame(self, n: Optional[int]) -> pl.DataFrame:
+        return self._cached(("sample", n), lambda: queries.sample_rows(self._base(), n))
+
+    def _sketch(self, n: Optional[int], *filters):
+        """The merged sketch of the store, for the approx variant of an endpoint."""
+        if n is not None:
+            raise ServiceError("approx and n are exclusive: sketches cover the whole store")
+        if any(value is not None for value in filters):
+            raise ServiceError("approx does not support filters: sketches cover the whole store")
+        return self.db.sketch()
+
+    def _source(self, n: Optional[int], start: Optional[date] = None, end: Optional[date] = None) -> queries.Frame:
+        """
+        Whole store (lazy scan, exact results) when n is None, else the fast
+        preview sample of n rows. The scan only opens the files (hot or warm
+        tier) holding logs between the start and end days.
+        """
+        if n is not None:
+            return self._frame(n)
+        since = datetime.combine(start, time.min) if start is not None else None
+        until = datetime.combine(end, time.max) if end is not None else None
+        return self.db.scan_window(since, until)
+
+    def _indexed_source(self, n, start, end, protocol, action, port_range, port_type) -> queries.Frame:
+        """
+        Like _source, but on the whole store the protocol, action and
+        destination port filters are first answered by the bitmap indexes of
+        the files (storage.bitmaps), so that only the row groups holding
+        matching logs are decoded.
+        """
+        predicates = {}
+        if protocol is not None:
+            predicates["Protocole"] = [protocol]
+        if action is not None:
+            predicates["action"] = [action]
+        if port_range is not None and port_type in ("dst", "both"):
+            predicates["Port_dst"] = range(port_range[0], port_range[1] + 1)
+        if n is not None or not predicates:
+            return self._source(n, start, end)
+        since = datetime.combine(start, time.min) if start is not None else None
+        until = datetime.combine(end, time.max) if end is not None else None
+        return self.db.filter_logs(predicates, since, until)
+
+    # Endpoints
+
+    def info(self) -> dict:
+        base = self._base()
+        bounds = self._cached(
+            ("bounds",), lambda: queries.collect([self.db.scan().select(pl.min("Date").alias("min"), pl.max("Date").alias("max"))])[0]
+        )
+        date_min, date_max = bounds.row(0)
+        return {
+            "version": self.db.get_store_version(),
+            "rows": self.db.count(),
+            "sample_rows": base.height,
+            "sample_limit": self.sample_limit,
+            "date_min": date_min.isoformat() if date_min is not None else None,
+            "date_max": date_max.isoformat() if date_max is not None else None,
+        }
+
+    def sample(self, n: Optional[int] = None) -> pl.DataFrame:
+        return self._frame(n)
+
+    def ip_stats(self, n: Optional[int] = None, limit: Optional[int] = None, approx: bool = False) -> pl.DataFrame:
+        if approx:
+            from analytics import approx as approximate
+
+            sketch = self._sketch(n)
+            return self._cached(("ip_stats.approx", limit), lambda: approximate.ip_stats(sketch, limit))
+        return self._cached(("ip_stats", n, limit), lambda: queries.ip_stats(self._source(n), limit))
+
+    def ip_details(self, ip: str, n: Optional[int] = None, limit: int = 10000) -> pl.DataFrame:
+        """The `limit` most recent rows of one source (use ip_summary for its aggregates)."""
+        return self._cached(("ip_details", ip, n, limit), lambda: queries.ip_details(self._source(n), ip, limit))
+
+    def ip_summary(self, ip: str, n: Optional[int] = None, limit: int = 1000) -> dict:
+        return self._cached(("ip_summary", ip, n, limit), lambda: queries.ip_summary(self._source(n), ip, limit))
+
+    def port_stats(self, min_port: int = 0, max_port: int = 65535, n: Optional[int] = None) -> pl.DataFrame:
+        return self._cached(
+            ("port_stats", min_port, max_port, n), lambda: queries.port_stats(self._frame(n), (min_port, max_port))
+        )
+
+    def top_ports(
+        self, max_port_exclusive: int = 1024, limit: int = 10, n: Optional[int] = None, approx: bool = False
+    ) -> pl.DataFrame:
+        if approx:
+            from analytics import approx as approximate
+
+            if max_port_exclusive > 1024:
+                raise ServiceError("approx top_ports needs max_port_exclusive <= 1024")
+            sketch = self._sketch(n)
+            return self._cached(
+                ("top_ports.approx", max_port_exclusive, limit),
+                lambda: approximate.top_ports(sketch, max_port_exclusive, limit),
+            )
+        return self._cached(
+            ("top_ports", max_port_exclusive, limit, n),
+            lambda: queries.top_ports(self._source(n), max_port_exclusive, limit),
+        )
+
+    def network_info(self, n: Optional[int] = None) -> pl.DataFrame:
+        return self._cached(("network_info", n), lambda: queries.network_info(self._frame(n)))
+
+    def network_flows(self, n: Optional[int] = None) -> pl.DataFrame:
+        return self._cached(("network_flows", n), lambda: queries.network_flows(self._source(n)))
+
+    def external_sources(self, limit: int = 1000, n: Optional[int] = None, approx: bool = False) -> pl.DataFrame:
+        if approx:
+            from analytics import approx as approximate
+
+            sketch = self._sketch(n)
+            return self._cached(("external_sources.approx", limit), lambda: approximate.external_sources(sketch, limit))
+        return self._cached(("external_sources", limit, n), lambda: queries.external_sources(self._source(n), limit))
+
+    @staticmethod
+    def _port_range(min_port: Optional[int], max_port: Optional[int], port_type: str):
+        if (min_port is None) != (max_port is None):
+            raise ServiceError("min_port and max_port go together")
+        if port_type not in queries.PORT_TYPES:
+            raise ServiceError(f"port_type must be one of {queries.PORT_TYPES}")
+        return (min_port, max_port) if min_port is not None else None
+
+    def flows(
+        self,
+        protocol: Optional[str] = None,
+        action: Optional[str] = None,
+        min_port: Optional[int] = None,
+        max_port: Optional[int] = None,
+        port_type: str = "both",
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        n: Optional[int] = None,
+    ) -> pl.DataFrame:
+        port_range = self._port_range(min_port, max_port, port_type)
+        key = ("flows", protocol, action, port_range, port_type, start, end, n)
+        return self._cached(
+            key,
+            lambda: queries.filter_flows(self._frame(n), protocol, action, port_range, port_type, start, end),
+        )
+
+    def flow_summary(
+        self,
+        protocol: Optional[str] = None,
+        action: Optional[str] = None,
+        min_port: Optional[int] = None,
+        max_port: Optional[int] = None,
+        port_type: str = "both",
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        n: Optional[int] = None,
+        approx: bool = False,
+    ) -> dict:
+        if approx:
+            from analytics import approx as approximate
+
+            sketch = self._sketch(n, protocol, action, min_port, max_port, start, end)
+            return self._cached(("flow_summary.approx",), lambda: approximate.flow_summary(sketch))
+        port_range = self._port_range(min_port, max_port, port_type)
+        key = ("flow_summary", protocol, action, port_range, port_type, start, end, n)
+        return self._cached(
+            key,
+            lambda: queries.flow_summary(
+                queries.filter_flows(
+                    self._indexed_source(n, start, end, protocol, action, port_range, port_type),
+                    protocol,
+                    action,
+                    port_range,
+                    port_type,
+                    start,
+                    end,
+                )
+            ),
+        )
+
+    def activity(
+        self,
+        ip: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        points: int = 1000,
+        resolution: Optional[str] = None,
+    ) -> pl.DataFrame:
+        """
+        Connections of one source per time bucket (bucket, PERMIT, DENY, total,
+        resolution), read from the rollups of the whole store. Without an explicit
+        resolution, the finest one with at most `points` buckets in the window.
+        """
+        from storage import rollups
+
+        if resolution is not None and resolution not in rollups.RESOLUTIONS:
+            raise ServiceError(f"resolution must be one of {tuple(rollups.RESOLUTIONS)}")
+        if points < 1:
+            raise ServiceError("points must be positive")
+
+        def compute() -> pl.DataFrame:
+            chosen = resolution
+            if chosen is None:
+                window_since, window_until = since, until
+                if window_since is None or window_until is None:
+                    # Window of the source activity, from its day buckets
+                    days = rollups.activity(self.db.rollups(), ip, since, until, "day")["bucket"]
+                    if days.len():
+                        window_since = window_since or days.min()
+                        window_until = window_until or days.max() + timedelta(days=1)
+                chosen = rollups.choose_resolution(window_since, window_until, points)
+            series = rollups.activity(self.db.rollups(), ip, since, until, chosen)
+            return series.with_columns(pl.lit(chosen).alias("resolution"))
+
+        return self._cached(("activity", ip, since, until, points, resolution), compute)
+
+    @staticmethod
+    def _day_range(start: Optional[date], end: Optional[date]):
+        if start is not None and end is not None and start > end:
+            raise ServiceError("start must not be after end")
+
+    def rules(self, start: Optional[date] = None, end: Optional[date] = None) -> pl.DataFrame:
+        """Hits of every firewall rule between start and end, from the rule counters of the store."""
+        from analytics import firewall_rules
+
+        self._day_range(start, end)
+        return self._cached(
+            ("rules", start, end), lambda: firewall_rules.rule_summary(self.db.rule_counters(), start, end)
+        )
+
+    def rule_activity(self, rule_id: int, start: Optional[date] = None, end: Optional[date] = None) -> pl.DataFrame:
+        from analytics import firewall_rules
+
+        self._day_range(start, end)
+        return self._cached(
+            ("rule_activity", rule_id, start, end),
+            lambda: firewall_rules.rule_activity(self.db.rule_counters(), rule_id, start, end),
+        )
+
+    def rule_ports(
+        self, rule_id: int, start: Optional[date] = None, end: Optional[date] = None, limit: int = 20
+    ) -> pl.DataFrame:
+        from analytics import firewall_rules
+
+        self._day_range(start, end)
+        return self._cached(
+            ("rule_ports", rule_id, start, end, limit),
+            lambda: firewall_rules.rule_ports(self.db.rule_counters(), rule_id, start, end, limit),
+        )
+
+    def _graph(self):
+        """Connection graph index of the whole store, rebuilt when the store changes."""
+        from analytics.graph import ConnectionGraph
+
+        return self._cached(("graph",), lambda: ConnectionGraph(self.db.edges()))
+
+    @staticmethod
+    def _direction(direction: str):
+        from analytics.graph import DIRECTIONS
+
+        if direction not in DIRECTIONS:
+            raise ServiceError(f"direction must be one of {DIRECTIONS}")
+
+    def graph_info(self) -> dict:
+        graph = self._graph()
+        return {"nodes": graph.node_count, "edges": graph.edge_count}
+
+    def graph_top(self, direction: str = "out", limit: int = 20, weighted: bool = False) -> pl.DataFrame:
+        """Addresses with the most distinct peers (or connections when weighted)."""
+        self._direction(direction)
+        return self._cached(
+            ("graph_top", direction, limit, weighted), lambda: self._graph().top_degree(direction, limit, weighted)
+        )
+
+    def graph_neighbors(self, ip: str, direction: str = "out", limit: int = 100) -> pl.DataFrame:
+        """Fan-out (direction=out) or fan-in (direction=in) edges of an address, busiest first."""
+        if direction not in ("out", "in"):
+            raise ServiceError("direction must be out or in")
+        graph = self._graph()
+        return graph.fan_out(ip, limit) if direction == "out" else graph.fan_in(ip, limit)
+
+    def graph_subgraph(self, ip: str, hops: int = 1, direction: str = "both", max_nodes: int = 100) -> pl.DataFrame:
+        """Edges within `hops` hops of an address, at most `max_nodes` nodes."""
+        self._direction(direction)
+        if not 0 <= hops <= 5:
+            raise ServiceError("hops must be between 0 and 5")
+        if max_nodes < 1:
+            raise ServiceError("max_nodes must be positive")
+        return self._cached(
+            ("graph_subgraph", ip, hops, direction, max_nodes),
+            lambda: self._graph().neighborhood(ip, hops, direction, max_nodes),
+        )
+
+    def anomalies(self, contamination: float = 0.01, n_components: int = 5, n: Optional[int] = None) -> pl.DataFrame:
+        if not 0 < contamination <= 0.5:
+            raise ServiceError("contamination must be in (0, 0.5]")
+        # scikit-learn and pandas are only loaded when anomalies are requested
+        from analytics.anomalies import detect_anomalies
+
+        return self._cached(
+            ("anomalies", contamination, n_components, n),
+            lambda: detect_anomalies(self._frame(n), n_components, contamination),
+        )
+
+    def sql(self, query: str, offset: int = 0, limit: int = 1000) -> pl.DataFrame:
+        """Page of a read-only SQL query over the whole store (not the sample)."""
+        try:
+            return self._cached(("sql", query, offset, limit), lambda: self.sql_engine.query(query, offset, limit))
+        except SqlTimeout as e:
+            raise ServiceError(str(e), status=408)
+        except SqlError as e:
+            raise ServiceError(str(e))
+
+    def sql_info(self) -> dict:
+        engine = self.sql_engine
+        return {
+            "backend": engine.backend,
+            "table": TABLE,
+            "columns": table_columns(),
+            "timeout": engine.timeout,
+            "max_rows": engine.max_rows,
+        }
+
+    def alerts(self, rule: Optional[str] = None, since: Optional[datetime] = None, limit: int = 1000) -> pl.DataFrame:
+        """Alerts of the detection rules, most recent first (cached by the alert store version)."""
+        from analytics.detection import DEFAULT_RULES
+
+        if rule is not None and rule not in {r.name for r in DEFAULT_RULES}:
+            raise ServiceError(f"unknown rule: {rule}")
+        if limit < 1:
+            raise ServiceError("limit must be positive")
+        return self.alert_store.alerts(rule, since, limit)
+
+    def firewalls(self) -> pl.DataFrame:
+        """Rows of every firewall partition; a null firewall counts the logs without a device id."""
+
+        def compute():
+            ids = self.db.firewalls()
+            rows = [self.db.partition(firewall).count() for firewall in ids]
+            unassigned = self.db.count() - sum(rows)
+            if unassigned:
+                ids, rows = ids + [None], rows + [unassigned]
+            return pl.DataFrame({"firewall": ids, "rows": rows}, schema={"firewall": pl.Int32, "rows": pl.Int64})
+
+        return self._cached(("firewalls",), compute)
+
+    def tiers(self) -> pl.DataFrame:
+        """Files, rows, bytes and time range of the hot, warm and cold tiers of the store (storage.tiers)."""
+        from storage.tiers import tier_summary
+
+        return self._cached(("tiers",), lambda: tier_summary(self.db))
+
+    def detection_rules(self) -> pl.DataFrame:
+        from analytics.detection import DEFAULT_RULES
+
+        return pl.DataFrame(
+            {
+                "rule": [rule.name for rule in DEFAULT_RULES],
+                "description": [rule.description for rule in DEFAULT_RULES],
+                "threshold": [rule.threshold for rule in DEFAULT_RULES],
+                "window_seconds": [int(rule.window.total_seconds()) for rule in DEFAULT_RULES],
+                "severity": [rule.severity for rule in DEFAULT_RULES],
+            }
+        )
@@ -0,0 +1,213 @@
+"""
+Ad-hoc read-only SQL over the parquet files of the logs store.
+
+The store is exposed as a single table named `logs` (the LOG_SCHEMA columns).
+Queries run directly on the parquet files, in parallel and out-of-core, and
+only the requested page of the result is materialized:
+
+- with DuckDB when it is installed (optional dependency: `pip install duckdb`),
+  which spills to disk for larger-than-memory sorts and joins;
+- otherwise with the Polars SQL engine on the lazy scan of the store,
+  collected with the streaming engine.
+
+Sandboxing: only a single SELECT (or WITH ... SELECT) statement is accepted;
+statements that write, change settings, load extensions or read other files
+(read_csv(), FROM 'file.parquet', ...) are rejected before execution, and the
+DuckDB connection is additionally locked to the store files. Queries are
+cancelled after `timeout` seconds and results are capped at `max_rows`.
+
+    engine = SqlEngine(LogStore())
+    page = engine.query("SELECT IPsrc, count(*) AS n FROM logs GROUP BY IPsrc ORDER BY n DESC", limit=100)
+"""
+import logging
+import os
+import re
+import threading
+import time
+from typing import List, Optional
+
+import polars as pl
+
+from storage.core import LOG_SCHEMA, LogStore
+
+logger = logging.getLogger(__name__)
+
+TABLE = "logs"
+BACKENDS = ("auto", "duckdb", "polars")
+
+# Keywords of statements that are not plain reads
+_FORBIDDEN_KEYWORDS = {
+    "ALTER", "ATTACH", "CALL", "CHECKPOINT", "COPY", "CREATE", "DELETE", "DETACH", "DROP",
+    "EXPORT", "IMPORT", "INSERT", "INSTALL", "LOAD", "MERGE", "PRAGMA", "RESET", "SET",
+    "TRUNCATE", "UPDATE", "USE", "VACUUM",
+}
+# Table functions and scalar functions that read or list files
+_FORBIDDEN_FUNCTIONS = {
+    "glob", "parquet_metadata", "parquet_scan", "parquet_schema", "read_blob", "read_csv",
+    "read_csv_auto", "read_ipc", "read_json", "read_json_auto", "read_ndjson", "read_parquet",
+    "read_text", "sniff_csv",
+}
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_QUOTED_IDENTIFIERS = re.compile(r'"(?:[^"]|"")*"')
+_WORDS = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# DuckDB reads files named after FROM/JOIN: FROM 'file.csv'
+_FILE_TABLE = re.compile(r"\b(FROM|JOIN)\s*\(?\s*'", re.I)
+_DUCKDB_TYPES = {pl.Datetime("us"): "TIMESTAMP", pl.Utf8: "VARCHAR", pl.Int32: "INTEGER"}
+
+
+def table_columns() -> dict:
+    """Columns of the logs table with their SQL types."""
+    return {name: _DUCKDB_TYPES[dtype] for name, dtype in LOG_SCHEMA.items()}
+
+
+class SqlError(ValueError):
+    """Rejected or failed query."""
+
+
+class SqlTimeout(SqlError):
+    """Query cancelled after the time limit."""
+
+
+def validate(sql: str) -> str:
+    """
+    Check that `sql` is a single read-only SELECT statement.
+    Returns the statement without trailing semicolons, raises SqlError otherwise.
+    """
+    statement = _COMMENTS.sub(" ", sql).strip().rstrip(";").strip()
+    if not statement:
+        raise SqlError("Empty query")
+    if _FILE_TABLE.search(statement):
+        raise SqlError("Reading files is not allowed, query the logs table")
+    code = _QUOTED_IDENTIFIERS.sub('""', _STRINGS.sub("''", statement))
+    if ";" in code:
+        raise SqlError("Only one statement can be run at a time")
+    words = _WORDS.findall(code)
+    if not words or words[0].upper() not in ("SELECT", "WITH"):
+        raise SqlError("Only SELECT queries are allowed")
+    for word in words:
+        if word.upper() in _FORBIDDEN_KEYWORDS:
+            raise SqlError(f"{word.upper()} is not allowed, the store is read-only")
+        if word.lower() in _FORBIDDEN_FUNCTIONS:
+            raise SqlError(f"{word}() is not allowed, query the logs table")
+    return statement
+
+
+def _sql_list(values: List[str]) -> str:
+    return "[" + ", ".join("'" + value.replace("'", "''") + "'" for value in values) + "]"
+
+
+def duckdb_available() -> bool:
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class SqlEngine:
+    """Read-only SQL over a LogStore, with a time limit and a cap on the result size."""
+
+    def __init__(
+        self,
+        store: Optional[LogStore] = None,
+        backend: str = "auto",
+        timeout: float = 30.0,
+        max_rows: int = 100_000,
+        memory_limit: Optional[str] = None,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}")
+        if backend == "auto":
+            backend = "duckdb" if duckdb_available() else "polars"
+        self.store = store or LogStore()
+        self.backend = backend
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.memory_limit = memory_limit
+
+    def query(self, sql: str, offset: int = 0, limit: int = 1000) -> pl.DataFrame:
+        """
+        Rows [offset, offset + limit) of the result of `sql`, never beyond
+        max_rows. Ask for one row more than the page size to know whether a
+        next page exists.
+        """
+        statement = validate(sql)
+        if offset < 0 or limit < 0:
+            raise SqlError("offset and limit must be positive")
+        limit = max(0, min(limit, self.max_rows - offset))
+        # One snapshot for the whole query, whatever is committed meanwhile
+        store = self.store.pin()
+        if self.backend == "duckdb":
+            return self._query_duckdb(statement, store.files(), offset, limit)
+        return self._query_polars(statement, store, offset, limit)
+
+    # Polars
+
+    def _query_polars(self, statement: str, store: LogStore, offset: int, limit: int) -> pl.DataFrame:
+        context = pl.SQLContext({TABLE: store.scan()})
+        try:
+            lazy = context.execute(statement).slice(offset, limit)
+            running = lazy.collect(engine="streaming", background=True)
+        except pl.exceptions.PolarsError as e:
+            raise SqlError(str(e).split("\n")[0])
+
+        deadline = time.monotonic() + self.timeout
+        delay = 0.001
+        while True:
+            try:
+                result = running.fetch()
+            except pl.exceptions.PolarsError as e:
+                raise SqlError(str(e).split("\n")[0])
+            if result is not None:
+                return result
+            if time.monotonic() > deadline:
+                running.cancel()
+                raise SqlTimeout(f"Query cancelled after {self.timeout:g} s")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    # DuckDB
+
+    def _connect(self, files: List):
+        import duckdb
+
+        connection = duckdb.connect(":memory:")
+        connection.execute(f"SET threads = {os.cpu_count() or 1}")
+        if self.memory_limit:
+            connection.execute(f"SET memory_limit = '{self.memory_limit}'")
+        paths = [str(path) for path in files]
+        # Parquet columns are cast like LOG_SCHEMA so both backends return the same types
+        casts = ", ".join(f'CAST("{name}" AS {_DUCKDB_TYPES[dtype]}) AS "{name}"' for name, dtype in LOG_SCHEMA.items())
+        connection.execute(
+            f"CREATE VIEW {TABLE} AS SELECT {casts} FROM read_parquet({_sql_list(paths)}, union_by_name = true)"
+        )
+        try:
+            # Only the store files remain readable, and the settings cannot be changed back
+            connection.execute(f"SET allowed_paths = {_sql_list(paths)}")
+            connection.execute("SET enable_external_access = false")
+            connection.execute("SET lock_configuration = true")
+        except duckdb.Error as e:
+            # Older DuckDB releases: the statement validation is the only sandbox
+            logger.warning("Could not lock the DuckDB connection: %s", e)
+        return connection
+
+    def _query_duckdb(self, statement: str, files: List, offset: int, limit: int) -> pl.DataFrame:
+        import duckdb
+
+        connection = self._connect(files)
+        timer = threading.Timer(self.timeout, connection.interrupt)
+        timer.start()
+        try:
+            relation = connection.execute(
+                f"SELECT * FROM ({statement}) AS q LIMIT {int(limit)} OFFSET {int(offset)}"
+            )
+            return relation.pl()
+        except duckdb.InterruptException:
+            raise SqlTimeout(f"Query cancelled after {self.timeout:g} s")
+        except duckdb.Error as e:
+            raise SqlError(str(e).split("\n")[0])
+        finally:
+            timer.cancel()
+            connection.close()
+
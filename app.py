@@ -1,5 +1,8 @@
 import streamlit as st
 from views.user import user_page
+import os
+from monitoring.metrics import SESSIONS, register_store_gauges, start_file_dumper, start_http_server
+from monitoring.profiling import PROFILER, current_session_id
 
 
 # Initialize session state
@@ -12,12 +15,39 @@ def init_session_state():
         st.session_state.password_change_required = False
 
 
+def _store_files():
+    # Imported on scrape only, so polars is not loaded at startup
+    from storage.core import LogStore
+
+    return LogStore().files()
+
+
+@st.cache_resource
+def start_metrics_exporter():
+    """Start the Prometheus exporter once per server process, if configured"""
+    register_store_gauges(_store_files)
+    port = os.environ.get("OPSIE_METRICS_PORT")
+    if port:
+        start_http_server(int(port), host=os.environ.get("OPSIE_METRICS_HOST", "127.0.0.1"))
+    path = os.environ.get("OPSIE_METRICS_FILE")
+    if path:
+        start_file_dumper(path)
+    return True
+
+
 # Main app
 def main():
     # Initialize database
 
     # Initialize session state
     init_session_state()
+
+    # Group the profiling records of this rerun
+    PROFILER.begin_run()
+
+    # Metrics: exporter and active sessions
+    start_metrics_exporter()
+    SESSIONS.touch(current_session_id())
     
     # Initialize page
     user_page()
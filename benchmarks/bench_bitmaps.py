@@ -0,0 +1,85 @@
+"""
+Bitmap indexes (storage.bitmaps) against plain parquet scans on a synthetic
+store, compacted like the maintenance does (Date-sorted files of 131072-row
+row groups).
+
+Every filter is timed as a read (LogStore.filter_logs against a polars scan
+with the same predicates, which polars pushes down to the row group
+statistics) and as a count (LogStore.count_logs, from the bitmaps alone).
+The decoded column shows the share of row groups a bitmap read decodes.
+
+Filters:
+- rare: a port only hit by scans (few row groups)
+- spread: DENY UDP/53, spread over the whole history
+- broad: PERMIT to a well-known port (most of the store)
+
+Usage:
+    python -m benchmarks.bench_bitmaps --store /tmp/bench-bitmaps [--rows 5000000]
+"""
+import argparse
+import time
+
+import polars as pl
+
+from benchmarks.synthetic import build_store
+from storage.bitmaps import file_index, predicate_expressions, row_group_runs
+from storage.core import file_stats
+from storage.maintenance import compact
+
+
+def best(run, repeat):
+    """Best time over `repeat` runs, and the result of the last one."""
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        seconds = min(seconds, time.perf_counter() - start)
+    return seconds, result
+
+
+def rare_port(store) -> int:
+    """The most frequent destination port among the ports of less than 100 rows (ports hit by scans)."""
+    counts = store.scan_window().group_by("Port_dst").len().filter(pl.col("len") < 100)
+    return counts.sort(["len", "Port_dst"], descending=[True, False]).collect()["Port_dst"][0]
+
+
+def decoded_share(store, predicates) -> float:
+    rows = 0
+    for path in store.parts():
+        bitmap = file_index(path).match(predicates)
+        rows += sum(stop - start for start, stop in row_group_runs(path, bitmap))
+    return rows / sum(file_stats(path).rows for path in store.parts())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", required=True, help="Data directory of the synthetic store (reused if present)")
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    store = build_store(args.rows, args.store)
+    compact(store)
+    port = rare_port(store)
+    filters = {
+        f"rare (port {port})": {"Port_dst": [port]},
+        "spread (DENY UDP/53)": {"action": ["DENY"], "Protocole": ["UDP"], "Port_dst": [53]},
+        "broad (PERMIT < 1024)": {"action": ["PERMIT"], "Port_dst": range(0, 1024)},
+    }
+    print(f"{store.count():,} rows in {len(store.parts())} files")
+    print(f"{'filter':>26} {'rows':>10} {'decoded':>8} {'scan':>8} {'bitmap':>8} {'count scan':>11} {'count bitmap':>13}")
+    for name, predicates in filters.items():
+        conditions = predicate_expressions(predicates)
+        scan, rows = best(lambda: store.scan_window().filter(*conditions).collect(engine="streaming").height, args.repeat)
+        bitmap, matched = best(lambda: store.filter_logs(predicates).collect(engine="streaming").height, args.repeat)
+        count_scan, _ = best(lambda: store.scan_window().filter(*conditions).select(pl.len()).collect().item(), args.repeat)
+        count_bitmap, counted = best(lambda: store.count_logs(predicates), args.repeat)
+        assert rows == matched == counted
+        print(
+            f"{name:>26} {rows:>10,} {decoded_share(store, predicates):>8.0%} {scan:>8.3f} {bitmap:>8.3f}"
+            f" {count_scan:>11.3f} {count_bitmap:>13.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
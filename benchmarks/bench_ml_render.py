@@ -0,0 +1,61 @@
+"""
+Benchmark of the ML page scatter rendering (PCA + anomalies).
+
+Measures the time needed to build the figure and encode it as PNG, the way
+`st.pyplot` does, from 10k to 10M points.
+
+Usage:
+    python -m benchmarks.bench_ml_render [--sizes 10000 100000 ...]
+"""
+import argparse
+import io
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from views.machine_learning import build_anomaly_figure
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def make_pca_frame(n_points, contamination=0.01, seed=42):
+    """Synthetic PCA output: a dense gaussian cloud plus scattered anomalies."""
+    rng = np.random.default_rng(seed)
+    pc1 = rng.normal(0, 1, n_points)
+    pc2 = rng.normal(0, 1, n_points)
+    is_anomaly = rng.random(n_points) < contamination
+    pc1[is_anomaly] *= 6
+    pc2[is_anomaly] *= 6
+    return pd.DataFrame({"PC1": pc1, "PC2": pc2, "is_anomaly": is_anomaly})
+
+
+def time_render(pca_df):
+    """Returns the figure build + PNG encoding time in seconds."""
+    start = time.perf_counter()
+    fig = build_anomaly_figure(pca_df)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    args = parser.parse_args()
+
+    print(f"{'points':>12} {'render (s)':>12}")
+    for n_points in args.sizes:
+        pca_df = make_pca_frame(n_points)
+        elapsed = time_render(pca_df)
+        print(f"{n_points:>12} {elapsed:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
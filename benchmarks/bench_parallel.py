@@ -0,0 +1,79 @@
+"""
+Scaling of the scatter-gather executor (analytics.parallel) with the number
+of worker processes, on a synthetic store of many parts.
+
+Every run computes the same aggregations over the whole store: row count,
+rows and bytes per action, top 10 sources and distinct destinations. The
+baseline is the same aggregations in one polars query in this process.
+Speedups are bounded by the cores of the machine (printed first).
+
+Usage:
+    python -m benchmarks.bench_parallel --store /tmp/bench-parallel [--rows 5000000] [--workers 1,2,4,8]
+"""
+import argparse
+import os
+import time
+
+import polars as pl
+
+from analytics.parallel import Count, Distinct, GroupBy, ScatterGather, TopK
+from benchmarks.synthetic import build_store
+
+AGGREGATIONS = {
+    "rows": Count(),
+    "actions": GroupBy(["action"], sums=["Port_dst"]),
+    "sources": TopK("IPsrc", 10),
+    "destinations": Distinct("IPdst"),
+}
+
+
+def baseline(store, repeat):
+    """Best time of the aggregations as one query in this process."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scan = store.scan_window()
+        pl.collect_all(
+            [
+                scan.select(pl.len()),
+                scan.group_by("action").agg(pl.len(), pl.col("Port_dst").sum()),
+                scan.group_by("IPsrc").len().top_k(10, by="len"),
+                scan.select(pl.col("IPdst").n_unique()),
+            ]
+        )
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scatter_gather(store, workers, repeat):
+    """Best time of the aggregations over `workers` processes (pool start-up excluded)."""
+    best = float("inf")
+    with ScatterGather(store, workers=workers) as pool:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = pool.run(AGGREGATIONS)
+            best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", required=True, help="Data directory of the synthetic store (reused if present)")
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--chunk-rows", type=int, default=250_000)
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    store = build_store(args.rows, args.store, chunk_rows=args.chunk_rows)
+    print(f"{os.cpu_count()} cores, {store.count():,} rows in {len(store.parts())} files")
+    reference = baseline(store, args.repeat)
+    print(f"{'workers':>8} {'seconds':>9} {'rows/s':>13} {'speedup':>8}")
+    print(f"{'query':>8} {reference:>9.3f} {store.count() / reference:>13,.0f} {1:>8.2f}")
+    for workers in map(int, args.workers.split(",")):
+        seconds, result = scatter_gather(store, workers, args.repeat)
+        print(f"{workers:>8} {seconds:>9.3f} {result['rows'] / seconds:>13,.0f} {reference / seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Throughput of the firewall log parser against the generic CSV path.
+
+Baselines:
+- `pl.read_csv` + the post-processing of the Upload page before the
+  dedicated parser (null filtering, pandas date conversion)
+- `pl.read_csv` + the same typed conversions as the parser (uint32 IPs,
+  uint16 ports, categoricals)
+
+Usage:
+    python -m benchmarks.bench_parser [--rows 1000000]
+"""
+import argparse
+import io
+import time
+from pathlib import Path
+
+import pandas as pd
+import polars as pl
+
+from ingest.parser import LINE_FIELDS, iter_batches, read_log_stream
+
+SAMPLE_FILE = Path(__file__).resolve().parent.parent / "data" / "sample.txt"
+
+
+def make_payload(n_rows):
+    """Repeat the sample file lines up to n_rows lines."""
+    lines = [line for line in SAMPLE_FILE.read_text().splitlines() if line]
+    repeats = n_rows // len(lines) + 1
+    return ("\n".join((lines * repeats)[:n_rows]) + "\n").encode()
+
+
+def generic_csv(payload):
+    """Upload page path: generic reader, then the conversions of upload_csv_to_logs."""
+    df = pl.read_csv(io.BytesIO(payload), separator=";", has_header=False, new_columns=LINE_FIELDS)
+    df = df.drop_nulls([col for col in df.columns if col not in ("interface_sortie", "firewall")])
+    df = df.to_pandas()
+    df["Date"] = pd.to_datetime(df["Date"], format="%Y-%m-%d %H:%M:%S")
+    return pl.from_pandas(df)
+
+
+def generic_csv_typed(payload):
+    """Generic reader followed by the same typed conversions as the parser."""
+    df = pl.read_csv(io.BytesIO(payload), separator=";", has_header=False, new_columns=LINE_FIELDS)
+    octets = lambda column: [
+        pl.col(column).str.split_exact(".", 3).struct.field(f"field_{i}").cast(pl.UInt32) for i in range(4)
+    ]
+    to_int = lambda column: (
+        octets(column)[0] * 16777216 + octets(column)[1] * 65536 + octets(column)[2] * 256 + octets(column)[3]
+    ).alias(column)
+    return df.with_columns(
+        pl.col("Date").str.strptime(pl.Datetime("ms"), "%Y-%m-%d %H:%M:%S"),
+        to_int("IPsrc"),
+        to_int("IPdst"),
+        pl.col("Port_src").cast(pl.UInt16),
+        pl.col("Port_dst").cast(pl.UInt16),
+        *[pl.col(col).cast(pl.Categorical) for col in ("Protocole", "action", "interface_entrée", "interface_sortie")],
+    ).to_arrow()
+
+
+def typed_batches(payload):
+    return sum(batch.num_rows for batch in iter_batches(io.BytesIO(payload)))
+
+
+def store_frame(payload):
+    return read_log_stream(io.BytesIO(payload))
+
+
+def measure(function, payload, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(payload)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'scenario':>28} {'seconds':>9} {'rows/s':>12} {'MB/s':>8}")
+    for n_rows in args.rows:
+        payload = make_payload(n_rows)
+        megabytes = len(payload) / 1e6
+        for name, function in [
+            ("pl.read_csv + upload path", generic_csv),
+            ("pl.read_csv + typed convert", generic_csv_typed),
+            ("parser: typed Arrow batches", typed_batches),
+            ("parser: store DataFrame", store_frame),
+        ]:
+            seconds = measure(function, payload)
+            print(f"{n_rows:>10} {name:>28} {seconds:>9.3f} {n_rows / seconds:>12.0f} {megabytes / seconds:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
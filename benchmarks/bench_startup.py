@@ -0,0 +1,84 @@
+"""
+Cold start of the dashboard.
+
+Measured in fresh interpreters, several times each (median reported):
+
+- startup.import_app: `import app` (Streamlit, the navigation and the home page code);
+- startup.home: first run of app.py rendering the Home page, through
+  Streamlit's AppTest (the test harness is imported before timing);
+- startup.page.<module>: first navigation to a page, i.e. importing its
+  module once the application is loaded.
+
+Pages are imported lazily by views.user, so the home page must not pay for
+their dependencies. Results are appended to benchmarks/results.jsonl and
+compared with the previous run.
+
+Usage:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 10 --no-save
+"""
+import argparse
+import statistics
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.bench_import import timed
+from benchmarks.run import RESULTS_FILE, compare, git_commit, load_results, save_results
+
+_HOME_SETUP = "from streamlit.testing.v1 import AppTest\napp = AppTest.from_file('app.py', default_timeout=120)"
+
+
+def scenarios() -> Dict[str, tuple]:
+    """Scenario name -> (timed statement, untimed setup)."""
+    from views.user import PAGES
+
+    measures = {
+        "startup.import_app": ("import app", ""),
+        "startup.home": ("app.run()", _HOME_SETUP),
+    }
+    for module, _, _ in PAGES.values():
+        measures[f"startup.page.{module}"] = (f"import {module}", "import app")
+    return measures
+
+
+def run(repeat: int = 5, only: str = None) -> List[dict]:
+    commit = git_commit()
+    results = []
+    for name, (statement, setup) in scenarios().items():
+        if only and not name.startswith(only):
+            continue
+        durations = [timed(statement, setup) for _ in range(repeat)]
+        result = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": commit,
+            "scenario": name,
+            "rows": 0,
+            "status": "ok",
+            "seconds": statistics.median(durations),
+            "runs": durations,
+        }
+        print(f"  {name:<40} {result['seconds'] * 1000:8.1f} ms")
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="Only run the scenarios whose name starts with this prefix")
+    parser.add_argument("--results", type=Path, default=RESULTS_FILE)
+    parser.add_argument("--no-save", action="store_true", help="Do not append the results to the history")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.only)
+    comparison = compare(results, load_results(args.results))
+    if comparison:
+        print("\nComparison with the previous run:")
+        print("\n".join(comparison))
+    if not args.no_save:
+        save_results(results, args.results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Benchmark suite of the hot paths of the application on synthetic data.
+
+Every scenario is timed on stores of increasing size generated by
+benchmarks.synthetic (reused between runs from --store-dir). The Streamlit
+and storage caches are cleared before each repetition so the cached functions
+are really measured. Results are appended to benchmarks/results.jsonl together with the
+git commit and the library versions, and compared with the previous run of
+the same scenario to flag regressions.
+
+Usage:
+    python -m benchmarks.run --sizes 10000 1000000 10000000
+    python -m benchmarks.run --only analysis. --repeat 5
+    python -m benchmarks.run --report
+"""
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import polars as pl
+import streamlit as st
+
+from benchmarks.synthetic import build_store, generate_logs
+from db import LogDatabase
+from analytics import approx, firewall_rules, queries
+from analytics.graph import ConnectionGraph
+from analytics.anomalies import detect_anomalies
+from storage import edges, rollups, rule_counters
+from storage.sketches import LogSketch
+
+RESULTS_FILE = Path(__file__).resolve().parent / "results.jsonl"
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+# A run slower than the previous one by more than this ratio is a regression
+REGRESSION_THRESHOLD = 1.2
+
+
+class Scenario(NamedTuple):
+    name: str
+    # setup(db) -> argument handed to run; not timed
+    setup: Callable
+    run: Callable
+    # Largest store size the scenario is run on (None: no limit)
+    max_rows: Optional[int] = None
+
+
+def _sample(db):
+    return db.get_logs_sample(version=db.get_store_version())
+
+
+def _upload_setup(db):
+    # The Upload page hands raw strings to upload_csv_to_logs
+    df = pl.concat(list(generate_logs(db.get_logs_count(), seed=7)))
+    return df.with_columns(pl.col("Date").dt.strftime("%Y-%m-%d %H:%M:%S")), tempfile.mkdtemp(prefix="opsie-upload-")
+
+
+def _upload_run(args):
+    df, data_dir = args
+    try:
+        ok, message = LogDatabase(data_dir=data_dir).upload_csv_to_logs(df)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    if not ok:
+        raise RuntimeError(message)
+
+
+def _busiest_source(db):
+    return db.sketch().summaries["sources"].top(1)[0][0]
+
+
+def _details_per_minute(args):
+    # What the activity chart did before the rollups: the rows of the source, grouped on the fly
+    scan, ip = args
+    return queries.ip_details(scan, ip).group_by(pl.col("Date").dt.truncate("1m"), "action").len()
+
+
+def _rules_from_logs(scan):
+    # What the rules page would cost without the counters: grouping every log
+    external = ~pl.col("IPsrc").is_in(queries.internal_ips(scan, columns=("IPsrc",)).implode())
+    return queries.collect([
+        scan.group_by("idRegle").agg(
+            pl.len().alias("hits"),
+            (pl.col("action") == "DENY").sum().alias("DENY"),
+            ((pl.col("action") == "DENY") & external).sum().alias("external_DENY"),
+            pl.col("Port_dst").n_unique().alias("ports"),
+        )
+    ])[0]
+
+
+SCENARIOS = [
+    Scenario("ingest.upload_csv_to_logs", _upload_setup, _upload_run, max_rows=1_000_000),
+    Scenario("db.get_logs_count", lambda db: db, lambda db: db.get_logs_count(version=db.get_store_version())),
+    Scenario("db.get_logs_sample", lambda db: db, _sample),
+    Scenario("db.get_logs", lambda db: db, lambda db: db.get_logs(version=db.get_store_version())),
+    Scenario("store.count", lambda db: db, lambda db: db.count()),
+    Scenario("store.logs", lambda db: db, lambda db: db.logs()),
+    Scenario("queries.ip_stats", _sample, queries.ip_stats),
+    Scenario("queries.port_stats", _sample, lambda df: queries.port_stats(df, (0, 1023))),
+    Scenario("queries.network_info", _sample, queries.network_info),
+    Scenario("queries.top_ports", _sample, queries.top_ports),
+    Scenario("queries.ip_details", _sample, lambda df: queries.ip_details(df, df["IPsrc"][0])),
+    Scenario("queries.sample_rows", lambda db: db.get_logs(version=db.get_store_version()), queries.sample_rows),
+    Scenario(
+        "queries.filter_flows",
+        lambda db: db.get_logs(version=db.get_store_version()),
+        lambda df: queries.filter_flows(df, "TCP", "DENY", (1024, 49151), "dst"),
+    ),
+    Scenario("queries.flow_summary", lambda db: db.get_logs(version=db.get_store_version()), queries.flow_summary),
+    Scenario("ml.detect_anomalies", _sample, detect_anomalies),
+    # Exact aggregates over the whole store (streaming engine on the lazy scan)
+    Scenario("exact.ip_stats", lambda db: db.scan(), queries.ip_stats),
+    Scenario("exact.top_ports", lambda db: db.scan(), queries.top_ports),
+    Scenario("exact.network_flows", lambda db: db.scan(), queries.network_flows),
+    Scenario("exact.flow_summary", lambda db: db.scan(), queries.flow_summary),
+    # Sketches: ingestion overhead, merge of the sidecars, approximate aggregates
+    Scenario("sketch.from_frame", lambda db: db.logs(), LogSketch.from_frame, max_rows=1_000_000),
+    Scenario("sketch.merge", lambda db: db, lambda db: db.sketch()),
+    Scenario("approx.ip_stats", lambda db: db.sketch(), approx.ip_stats),
+    Scenario("approx.top_ports", lambda db: db.sketch(), approx.top_ports),
+    Scenario("approx.flow_summary", lambda db: db.sketch(), approx.flow_summary),
+    # Time series of the busiest source: rollups built at ingestion vs grouping its rows
+    Scenario("rollups.build", lambda db: db.logs(), rollups.build_rollups, max_rows=1_000_000),
+    Scenario(
+        "rollups.activity",
+        lambda db: (db.rollups(), _busiest_source(db)),
+        lambda args: rollups.activity(*args, resolution="minute"),
+    ),
+    Scenario("exact.activity", lambda db: (db.scan(), _busiest_source(db)), _details_per_minute),
+    # Rules page: hit counters built at ingestion vs grouping the logs
+    Scenario("rule_counters.build", lambda db: db.logs(), rule_counters.build_counters, max_rows=1_000_000),
+    Scenario("rules.summary", lambda db: db.rule_counters(), firewall_rules.rule_summary),
+    Scenario("exact.rules", lambda db: db.scan(), _rules_from_logs),
+    # Connection graph: edges built at ingestion, CSR index, then subgraph queries
+    Scenario("edges.build", lambda db: db.logs(), edges.build_edges, max_rows=1_000_000),
+    Scenario("graph.index", lambda db: db.edges(), ConnectionGraph),
+    Scenario("graph.top_degree", lambda db: ConnectionGraph(db.edges()), lambda graph: graph.top_degree("both")),
+    Scenario(
+        "graph.neighborhood",
+        lambda db: (ConnectionGraph(db.edges()), _busiest_source(db)),
+        lambda args: args[0].neighborhood(args[1], hops=2, max_nodes=200),
+    ),
+]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, str]:
+    import pandas
+    import pyarrow
+    import sklearn
+
+    return {
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "pandas": pandas.__version__,
+        "pyarrow": pyarrow.__version__,
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "streamlit": st.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def time_scenario(scenario: Scenario, db, repeat: int):
+    """
+    Run a scenario `repeat` times. Returns the durations in seconds and the
+    number of rows actually processed (the page sample for the view scenarios).
+    """
+    durations, input_rows = [], None
+    for _ in range(repeat):
+        st.cache_data.clear()
+        db.cache.clear()
+        argument = scenario.setup(db)
+        input_rows = getattr(argument, "height", None)
+        start = time.perf_counter()
+        scenario.run(argument)
+        durations.append(time.perf_counter() - start)
+    return durations, input_rows
+
+
+def run_suite(sizes: List[int], store_dir: Path, repeat: int = 3, only: Optional[str] = None) -> List[dict]:
+    commit, env = git_commit(), environment()
+    results = []
+    for rows in sizes:
+        print(f"== {rows} rows")
+        # The Streamlit adapter exposes both the db.* readers and the storage core ones
+        db = LogDatabase(data_dir=build_store(rows, store_dir / f"rows-{rows}").data_dir)
+        for scenario in SCENARIOS:
+            if only and not scenario.name.startswith(only):
+                continue
+            result = {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "commit": commit,
+                "scenario": scenario.name,
+                "rows": rows,
+                "env": env,
+            }
+            if scenario.max_rows is not None and rows > scenario.max_rows:
+                result["status"] = "skipped"
+            else:
+                try:
+                    durations, input_rows = time_scenario(scenario, db, repeat)
+                    result.update(status="ok", seconds=statistics.median(durations), runs=durations)
+                    if input_rows is not None:
+                        result["input_rows"] = input_rows
+                except Exception as e:
+                    result.update(status="error", error=f"{type(e).__name__}: {e}")
+            print(_format(result))
+            results.append(result)
+    return results
+
+
+def _format(result: dict) -> str:
+    label = f"  {result['scenario']:<34}"
+    if result["status"] != "ok":
+        return f"{label} {result['status']} {result.get('error', '')}"
+    rows = result.get("input_rows", result["rows"])
+    if not rows:
+        return f"{label} {result['seconds'] * 1000:10.1f} ms"
+    return f"{label} {result['seconds'] * 1000:10.1f} ms  {rows / result['seconds']:14,.0f} rows/s ({rows} rows)"
+
+
+def load_results(path: Path = RESULTS_FILE) -> List[dict]:
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_results(results: List[dict], path: Path = RESULTS_FILE):
+    with open(path, "a") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+
+
+def compare(results: List[dict], history: List[dict], threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """Compare each result with the last successful run of the same scenario and size."""
+    previous = {}
+    for entry in history:
+        if entry.get("status") == "ok":
+            previous[(entry["scenario"], entry["rows"])] = entry
+    lines = []
+    for result in results:
+        before = previous.get((result["scenario"], result["rows"]))
+        if result.get("status") != "ok" or before is None:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        flag = "REGRESSION" if ratio > threshold else ("faster" if ratio < 1 / threshold else "")
+        lines.append(
+            f"{result['scenario']:<34} {result['rows']:>11} rows  "
+            f"{before['seconds'] * 1000:9.1f} -> {result['seconds'] * 1000:9.1f} ms  x{ratio:.2f} {flag}"
+            f"  (vs {before.get('commit')})"
+        )
+    return lines
+
+
+def report(history: List[dict]):
+    """Print the latest result of every scenario and size."""
+    latest = {}
+    for entry in history:
+        latest[(entry["scenario"], entry["rows"])] = entry
+    for (_, _), entry in sorted(latest.items(), key=lambda item: (item[0][1], item[0][0])):
+        print(f"{entry['rows']:>11} {_format(entry)}  [{entry.get('commit')}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", help="Only run the scenarios whose name starts with this prefix")
+    parser.add_argument(
+        "--store-dir",
+        type=Path,
+        default=Path(tempfile.gettempdir()) / "opsie-bench",
+        help="Where the synthetic stores are generated (reused between runs)",
+    )
+    parser.add_argument("--results", type=Path, default=RESULTS_FILE)
+    parser.add_argument("--no-save", action="store_true", help="Do not append the results to the history")
+    parser.add_argument("--report", action="store_true", help="Only print the latest recorded results")
+    args = parser.parse_args()
+
+    history = load_results(args.results)
+    if args.report:
+        report(history)
+        return
+
+    args.store_dir.mkdir(parents=True, exist_ok=True)
+    results = run_suite(args.sizes, args.store_dir, args.repeat, args.only)
+    comparison = compare(results, history)
+    if comparison:
+        print("\nComparison with the previous run:")
+        print("\n".join(comparison))
+    if not args.no_save:
+        save_results(results, args.results)
+
+
+if __name__ == "__main__":
+    main()
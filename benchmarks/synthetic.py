@@ -0,0 +1,206 @@
+"""
+Deterministic synthetic firewall log generator.
+
+Produces logs in the store representation (LOG_SCHEMA) with
+realistic distributions:
+
+- regular traffic between internal networks (the `is_internal_ip` ranges)
+  and external addresses, skewed towards a few popular ports;
+- port scans: one external source sweeping consecutive ports of an internal
+  host within a few seconds, mostly denied;
+- bursts: a handful of hot sources emitting many connections in a short window;
+- background noise on random ports.
+
+The same (rows, seed) always yields the same data, chunk by chunk, so
+datasets from 1k to 100M rows can be streamed to disk without holding them
+in memory.
+
+Usage:
+    python -m benchmarks.synthetic --rows 10000000 --out /tmp/opsie-bench
+"""
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import polars as pl
+
+from ingest.parser import LINE_FIELDS, SEPARATOR, uint32_to_ipv4
+from storage.core import LOG_SCHEMA, LogStore
+
+# Internal networks of analytics.queries.is_internal_ip (base address, prefix length)
+INTERNAL_NETWORKS = [(0x0A460000, 16), (0x9F540000, 16), (0xC0A80000, 16)]
+COMMON_PORTS = np.array([443, 80, 53, 22, 25, 123, 3389, 8080, 3306, 21, 993, 445])
+COMMON_PORT_WEIGHTS = np.array([40, 20, 12, 6, 4, 4, 3, 3, 2, 2, 2, 2], dtype=float)
+FIREWALLS = np.array([1, 2, 6])
+
+# Share of each traffic kind
+REGULAR, SCAN, BURST, NOISE = 0.80, 0.05, 0.10, 0.05
+CHUNK_ROWS = 1_000_000
+START = datetime(2025, 1, 1)
+# Simulated duration covered by one million rows
+SECONDS_PER_MILLION = 86400
+
+
+def _internal_ips(rng, n, hosts=2000):
+    """Internal addresses drawn from a fixed pool of hosts per network."""
+    network = rng.integers(0, len(INTERNAL_NETWORKS), n)
+    bases = np.array([base for base, _ in INTERNAL_NETWORKS], dtype=np.int64)
+    return bases[network] + rng.zipf(1.3, n).clip(1, hosts)
+
+
+def _external_ips(rng, n, pool=50000):
+    """External addresses with a heavy-tailed popularity, outside the internal ranges."""
+    rank = rng.zipf(1.2, n).clip(1, pool).astype(np.int64)
+    # Spread the ranks over 1.0.0.0 - 9.255.255.255, never internal
+    return 0x01000000 + (rank * 2654435761) % 0x09000000
+
+
+def _regular(rng, n, start_ts, span):
+    outbound = rng.random(n) < 0.6
+    internal, external = _internal_ips(rng, n), _external_ips(rng, n)
+    port_dst = rng.choice(COMMON_PORTS, n, p=COMMON_PORT_WEIGHTS / COMMON_PORT_WEIGHTS.sum())
+    # Inbound traffic is denied more often than outbound traffic
+    deny = rng.random(n) < np.where(outbound, 0.05, 0.35)
+    return {
+        "ts": start_ts + rng.integers(0, span, n),
+        "src": np.where(outbound, internal, external),
+        "dst": np.where(outbound, external, internal),
+        "port_dst": port_dst,
+        "deny": deny,
+    }
+
+
+def _scans(rng, n, start_ts, span, ports_per_scan=200):
+    n_scans = max(1, n // ports_per_scan)
+    scan = np.arange(n) % n_scans
+    src = _external_ips(rng, n_scans, pool=5000)[scan]
+    dst = _internal_ips(rng, n_scans)[scan]
+    first_port = rng.integers(1, 60000, n_scans)[scan]
+    step = np.arange(n) // n_scans
+    start = rng.integers(0, span, n_scans)[scan]
+    return {
+        # One probe every ~50ms per scan
+        "ts": start_ts + start + step // 20,
+        "src": src,
+        "dst": dst,
+        "port_dst": (first_port + step) % 65535 + 1,
+        "deny": rng.random(n) < 0.9,
+    }
+
+
+def _bursts(rng, n, start_ts, span, hot_sources=10):
+    hot = _external_ips(rng, hot_sources, pool=hot_sources * 10)
+    source = rng.integers(0, hot_sources, n)
+    burst_start = rng.integers(0, span, hot_sources)
+    return {
+        # Each hot source emits within a 5 minute window
+        "ts": start_ts + burst_start[source] + rng.integers(0, 300, n),
+        "src": hot[source],
+        "dst": _internal_ips(rng, n, hosts=50),
+        "port_dst": rng.choice(np.array([80, 443, 22]), n),
+        "deny": rng.random(n) < 0.5,
+    }
+
+
+def _noise(rng, n, start_ts, span):
+    return {
+        "ts": start_ts + rng.integers(0, span, n),
+        "src": rng.integers(0x01000000, 0xDF000000, n),
+        "dst": np.where(rng.random(n) < 0.5, _internal_ips(rng, n), _external_ips(rng, n)),
+        "port_dst": rng.integers(1, 65536, n),
+        "deny": rng.random(n) < 0.6,
+    }
+
+
+def generate_chunk(rows: int, chunk_index: int = 0, seed: int = 42) -> pl.DataFrame:
+    """One time-ordered chunk; chunk i covers the time slice following chunk i-1."""
+    rng = np.random.default_rng([seed, chunk_index])
+    span = max(1, int(SECONDS_PER_MILLION * rows / 1_000_000))
+    start_ts = int(START.timestamp()) + chunk_index * int(SECONDS_PER_MILLION * CHUNK_ROWS / 1_000_000)
+
+    counts = rng.multinomial(rows, [REGULAR, SCAN, BURST, NOISE])
+    parts = [
+        generator(rng, count, start_ts, span)
+        for generator, count in zip((_regular, _scans, _bursts, _noise), counts)
+        if count
+    ]
+    columns = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    n = len(columns["ts"])
+    protocol = np.where(np.isin(columns["port_dst"], [53, 123]), "UDP", np.where(rng.random(n) < 0.05, "UDP", "TCP"))
+    rule = np.where(columns["deny"], rng.choice(np.array([2, 4, 555, 999]), n), rng.choice(np.array([1, 5, 6, 7]), n))
+
+    df = pl.DataFrame(
+        {
+            "Date": (columns["ts"] * 1_000_000).astype("datetime64[us]"),
+            "IPsrc": pl.Series("IPsrc", columns["src"].astype(np.uint32)),
+            "IPdst": pl.Series("IPdst", columns["dst"].astype(np.uint32)),
+            "Protocole": protocol,
+            "Port_src": rng.integers(1024, 65536, n),
+            "Port_dst": columns["port_dst"],
+            "idRegle": rule,
+            "action": np.where(columns["deny"], "DENY", "PERMIT"),
+            "interface_entrée": np.where(rng.random(n) < 0.7, "eth0", "eth1"),
+            "interface_sortie": pl.Series("interface_sortie", [None] * n, dtype=pl.Utf8),
+            "firewall": rng.choice(FIREWALLS, n),
+        }
+    ).sort("Date")
+    return df.with_columns(uint32_to_ipv4(df["IPsrc"]), uint32_to_ipv4(df["IPdst"])).select(
+        [pl.col(name).cast(dtype) for name, dtype in LOG_SCHEMA.items()]
+    )
+
+
+def generate_logs(rows: int, seed: int = 42, chunk_rows: int = CHUNK_ROWS) -> Iterator[pl.DataFrame]:
+    """Yield `rows` synthetic logs as successive chunks of at most chunk_rows rows."""
+    chunk_index = 0
+    remaining = rows
+    while remaining > 0:
+        size = min(chunk_rows, remaining)
+        yield generate_chunk(size, chunk_index, seed)
+        remaining -= size
+        chunk_index += 1
+
+
+def to_lines(df: pl.DataFrame) -> bytes:
+    """Raw log lines (same format as data/logs.csv) for ingestion benchmarks."""
+    text = df.select(
+        pl.concat_str(
+            [pl.col("Date").dt.strftime("%Y-%m-%d %H:%M:%S")]
+            + [pl.col(name).cast(pl.Utf8).fill_null("") for name in LINE_FIELDS[1:]],
+            separator=SEPARATOR,
+        )
+    ).to_series()
+    return ("\n".join(text.to_list()) + "\n").encode()
+
+
+def build_store(rows: int, data_dir, seed: int = 42, chunk_rows: int = CHUNK_ROWS) -> LogStore:
+    """Create (or reuse) a store of `rows` synthetic logs in data_dir, one part per chunk."""
+    data_dir = Path(data_dir)
+    marker = data_dir / f".synthetic-{rows}-{seed}"
+    db = LogStore(data_dir=data_dir)
+    if marker.exists():
+        return db
+    for df in generate_logs(rows, seed, chunk_rows):
+        db.append_logs(df)
+    marker.touch()
+    return db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", required=True, help="Data directory of the generated store")
+    parser.add_argument("--lines", help="Also write the raw log lines to this file")
+    args = parser.parse_args()
+
+    build_store(args.rows, args.out, args.seed)
+    if args.lines:
+        with open(args.lines, "wb") as f:
+            for df in generate_logs(args.rows, args.seed):
+                f.write(to_lines(df))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,25 @@
+"""
+Streamlit adapters of the logs store.
+
+The store itself lives in storage.core, which does not depend on Streamlit
+and is what ingestion workers, CLIs and the analytics service use. This
+module adds what the pages need on top of it: readers cached with
+st.cache_data, the pydantic validation of uploaded files and the profiling
+of the calls.
+"""
 import hashlib
 import logging
 import polars as pl
 import pandas as pd
 import streamlit as st
-from typing import Optional, List
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
-import os
 from pathlib import Path
 
+from monitoring.profiling import profiled
+from storage.core import LOG_SCHEMA, LogStore, PartWriter  # noqa: F401 (re-exported)
+
 logger = logging.getLogger(__name__)
 
 # Pydantic models for data validation (unchanged)
@@ -23,13 +34,13 @@ class Logs(BaseModel):
     action: str
     interface_entrée: str
     interface_sortie: Optional[str] = None
-    # firewall: int
+    firewall: Optional[int] = None
 
 # Base Database class with common functionality
 class Database:
-    def __init__(self):
+    def __init__(self, data_dir="data"):
         # Keep the parameters for compatibility, but we won't use them
-        self.data_dir = Path("data")
+        self.data_dir = Path(data_dir)
         # Create data directory if it doesn't exist
         self.data_dir.mkdir(exist_ok=True)
 
@@ -38,66 +49,45 @@ class Database:
         return hashlib.sha256(password.encode()).hexdigest()
 
 
-class LogDatabase(Database):
-    def __init__(self):
-        super().__init__()
-        self.logs_file = self.data_dir / "logs.parquet"
-        # Initialize the parquet file if it doesn't exist
-        if not self.logs_file.exists():
-            self._init_logs_file()
+class LogDatabase(Database, LogStore):
+    def __init__(self, data_dir="data"):
+        LogStore.__init__(self, data_dir)
 
-    def _init_logs_file(self):
-        """Initialize an empty logs parquet file with the correct schema"""
-        # Create an empty DataFrame with the correct schema
-        empty_df = pl.DataFrame(
-            schema={
-                "Date": pl.Datetime,
-                "IPsrc": pl.Utf8,
-                "IPdst": pl.Utf8,
-                "Protocole": pl.Utf8,
-                "Port_src": pl.Int32,
-                "Port_dst": pl.Int32,
-                "idRegle": pl.Int32,
-                "action": pl.Utf8,
-                "interface_entrée": pl.Utf8,
-                "interface_sortie": pl.Utf8,
-                # "firewall": pl.Int32
-            }
-        )
-        # Save the empty DataFrame to parquet
-        empty_df.write_parquet(self.logs_file)
-    
-    @st.cache_data
-    def get_logs_sample(_self, limit=10000) -> pl.DataFrame:
+    @profiled("db.append_logs")
+    def append_logs(self, df: pl.DataFrame) -> List[Path]:
+        return LogStore.append_logs(self, df)
+
+    @profiled("db.get_logs_sample", cache=st.cache_data)
+    def get_logs_sample(_self, limit=10000, version=None) -> pl.DataFrame:
         """
         Retrieve a sample of logs from the parquet file with a limit.
+        `version` is only used as a cache key (see get_store_version).
         """
-        if not _self.logs_file.exists():
+        if not _self.files():
             return pl.DataFrame()
         
         try:
-            df = pl.read_parquet(_self.logs_file)
             # Return the first 'limit' rows
-            return df.head(limit)
+            return _self._read_sample(limit)
         except pl.exceptions.PolarsError as e:
             logger.error("Error reading parquet file: %s", e)
             return pl.DataFrame()
     
-    @st.cache_data
-    def get_logs_count(self) -> int:
+    @profiled("db.get_logs_count", cache=st.cache_data)
+    def get_logs_count(_self, version=None) -> int:
         """
         Get the total number of log entries.
         """
-        if not self.logs_file.exists():
+        if not _self.files():
             return 0
         
         try:
-            df = pl.read_parquet(self.logs_file)
-            return len(df)
+            return _self._read_count()
         except Exception as e:
             logger.error(f"Error reading parquet file: {e}")
             return 0
     
+    @profiled("db.upload_csv_to_logs")
     def upload_csv_to_logs(self, df: pl.DataFrame):
         """
         Upload data from a DataFrame to the logs parquet file.
@@ -107,8 +97,8 @@ class LogDatabase(Database):
             if df is None or len(df) == 0:
                 return False, "Empty DataFrame provided"
             
-            # Drop rows with null values except for interface_sortie
-            columns_to_check = [col for col in df.columns if col != "interface_sortie"]
+            # Drop rows with null values except for the optional interface_sortie and firewall
+            columns_to_check = [col for col in df.columns if col not in ("interface_sortie", "firewall")]
             df = df.drop_nulls(columns_to_check)
             
             df = df.to_pandas()
@@ -117,7 +107,7 @@ class LogDatabase(Database):
             df = pl.from_pandas(df)
             
             # Convert DataFrame to a list of dictionaries for validation
-            records = df.select([
+            records = df.select([column for column in [
                 "Date",
                 "IPsrc",
                 "IPdst",
@@ -128,8 +118,8 @@ class LogDatabase(Database):
                 "action",
                 "interface_entrée",
                 "interface_sortie",
-                # "firewall",
-            ]).to_dicts()
+                "firewall",
+            ] if column in df.columns]).to_dicts()
             
             # Validate each record using the Pydantic Logs model
             logs_data = []
@@ -140,8 +130,8 @@ class LogDatabase(Database):
                 except Exception as e:
                     return False, f"Data validation error: {e}"
             
-            # Save the DataFrame to parquet
-            df.write_parquet(self.logs_file)
+            # Save the DataFrame to parquet, replacing the appended parts too
+            self.replace_logs(df)
             
             # Clear the cache to refresh the data
             st.cache_data.clear()
@@ -150,14 +140,13 @@ class LogDatabase(Database):
         except Exception as e:
             return False, f"Error uploading file: {e}"
     
-    @st.cache_data
-    def get_logs(_self) -> pl.DataFrame:
+    @profiled("db.get_logs", cache=st.cache_data)
+    def get_logs(_self, version=None) -> pl.DataFrame:
         """
         Retrieve all logs from the parquet file and convert to Logs objects.
         """
         try:
-            df = pl.read_parquet(_self.logs_file)
-            return df
+            return _self._read_logs()
             
         except Exception as e:
             logger.error(f"Error reading parquet file: {e}")
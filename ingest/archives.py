@@ -0,0 +1,146 @@
+"""
+Ingestion of compressed and rotated log archives.
+
+Supported inputs: plain log files, single-file `.gz`, `.bz2` and `.zst`
+files, and tarballs (`.tar`, `.tar.gz`/`.tgz`, `.tar.bz2`, `.tar.zst`) whose
+members may themselves be compressed. Archives are stream-decompressed block
+by block straight into the parser and a PartWriter, never to disk. Several
+inputs are processed in parallel, one thread per input (the decompressors
+and the parser release the GIL); memory stays bounded by
+`workers * BATCH_BYTES`.
+
+Usage:
+    python -m ingest.archives archives/fw-2025-01-*.log.gz archives/january.tar.zst --workers 4
+"""
+import argparse
+import bz2
+import gzip
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+
+from ingest.parser import BATCH_BYTES, SEPARATOR, iter_batches, to_log_frame
+from storage.core import LogStore
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, only needed for .zst inputs
+    zstandard = None
+
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.zst", ".tzst")
+# Extensions accepted by the Upload page for archives
+ARCHIVE_TYPES = ["gz", "bz2", "zst", "tar", "tgz"]
+
+Source = Union[str, Path, BinaryIO]
+
+
+@dataclass
+class ArchiveStats:
+    """Result of the ingestion of one input."""
+
+    name: str
+    members: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    # One part per firewall found in the input
+    parts: List[Path] = field(default_factory=list)
+
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def open_compressed(stream: BinaryIO, name: str) -> BinaryIO:
+    """Wrap a binary stream with the streaming decompressor matching its name."""
+    lower = name.lower()
+    if lower.endswith((".gz", ".tgz")):
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if lower.endswith((".bz2", ".tbz2")):
+        return bz2.BZ2File(stream, mode="rb")
+    if lower.endswith((".zst", ".tzst")):
+        if zstandard is None:
+            raise RuntimeError("Reading .zst files requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    return stream
+
+
+def _open_source(source: Source) -> Tuple[BinaryIO, str, bool]:
+    """Return (binary stream, name, whether the stream must be closed by us)."""
+    if isinstance(source, (str, Path)):
+        return open(source, "rb"), str(source), True
+    return source, getattr(source, "name", "upload"), False
+
+
+def iter_log_streams(source: Source) -> Iterator[Tuple[str, BinaryIO]]:
+    """Yield (name, decompressed stream) for every log file contained in `source`."""
+    raw, name, owned = _open_source(source)
+    try:
+        stream = open_compressed(raw, name)
+        if name.lower().endswith(TAR_SUFFIXES):
+            # Streaming mode: members are read in order, without seeking
+            with tarfile.open(fileobj=stream, mode="r|") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    member_stream = tar.extractfile(member)
+                    yield member.name, open_compressed(member_stream, member.name)
+        else:
+            yield name, stream
+    finally:
+        if owned:
+            raw.close()
+
+
+def ingest_archive(
+    source: Source,
+    db: Optional[LogStore] = None,
+    separator: str = SEPARATOR,
+    batch_bytes: int = BATCH_BYTES,
+) -> ArchiveStats:
+    """Stream one input into new parts of the store (one per firewall)."""
+    db = db or LogStore()
+    stats = ArchiveStats(name=str(getattr(source, "name", source)))
+    start = time.perf_counter()
+    with db.open_part_writer() as writer:
+        for _, stream in iter_log_streams(source):
+            stats.members += 1
+            for batch in iter_batches(stream, separator, batch_bytes):
+                writer.write(to_log_frame(batch))
+        stats.rows = writer.rows
+    stats.parts = writer.paths
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def ingest_archives(
+    sources: Iterable[Source],
+    db: Optional[LogStore] = None,
+    workers: Optional[int] = None,
+    separator: str = SEPARATOR,
+    batch_bytes: int = BATCH_BYTES,
+) -> List[ArchiveStats]:
+    """Ingest several inputs in parallel, one part per input and firewall."""
+    db = db or LogStore()
+    sources = list(sources)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda source: ingest_archive(source, db, separator, batch_bytes), sources))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Log files or archives to ingest")
+    parser.add_argument("--workers", type=int, default=None, help="Inputs processed in parallel")
+    parser.add_argument("--separator", default=SEPARATOR)
+    args = parser.parse_args()
+
+    for stats in ingest_archives(args.paths, workers=args.workers, separator=args.separator):
+        print(
+            f"{stats.name}: {stats.members} file(s), {stats.rows} rows "
+            f"in {stats.seconds:.2f}s ({stats.rows_per_second():.0f} rows/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
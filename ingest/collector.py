@@ -0,0 +1,322 @@
+"""
+Concurrent multi-source log collector.
+
+Every source (log file, TCP socket, directory of rotated .gz files) is read
+by its own asyncio task. Chunks of raw lines are parsed in a worker pool and
+handed to a single writer task through a bounded queue, so a slow store
+slows the readers down instead of filling memory. Each source keeps its line
+order; the writer appends batches to the store in arrival order.
+
+Usage:
+    python -m ingest.collector --file fw1.log --gz-dir archives/fw2 --listen 127.0.0.1:6514
+"""
+import argparse
+import asyncio
+import io
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+import polars as pl
+
+from analytics.detection import DetectionEngine
+from ingest.archives import open_compressed
+from ingest.parser import parse_lines
+from monitoring.metrics import register_store_gauges, start_http_server
+from storage.alerts import AlertStore
+from storage.core import LogStore
+
+CHUNK_LINES = 5000
+
+
+@dataclass
+class SourceStats:
+    """Throughput counters of one source."""
+
+    name: str
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+    lines: int = 0
+    rows: int = 0
+    chunks: int = 0
+
+    def rows_per_second(self) -> float:
+        elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "lines": self.lines,
+            "rows": self.rows,
+            "chunks": self.chunks,
+            "rows_per_second": self.rows_per_second(),
+            "done": self.finished_at is not None,
+        }
+
+
+def _read_chunks(handle, chunk_lines: int):
+    """Blocking generator of line chunks from a text file handle."""
+    chunk = []
+    for line in handle:
+        chunk.append(line)
+        if len(chunk) >= chunk_lines:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _iterate_blocking(open_file, chunk_lines: int) -> AsyncIterator[List[str]]:
+    """Run a blocking file read in the default executor, one chunk at a time."""
+    loop = asyncio.get_running_loop()
+    handle = await loop.run_in_executor(None, open_file)
+    try:
+        chunks = _read_chunks(handle, chunk_lines)
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        handle.close()
+
+
+class FileSource:
+    """A local plain-text log file, read once from start to end."""
+
+    def __init__(self, path, chunk_lines: int = CHUNK_LINES):
+        self.path = Path(path)
+        self.name = f"file:{self.path}"
+        self.chunk_lines = chunk_lines
+
+    def chunks(self) -> AsyncIterator[List[str]]:
+        return _iterate_blocking(
+            lambda: open(self.path, "r", encoding="utf-8", errors="replace"),
+            self.chunk_lines,
+        )
+
+
+class GzDirectorySource:
+    """
+    A directory of rotated compressed files (.gz by default, or any format
+    supported by ingest.archives.open_compressed), read oldest first.
+    """
+
+    def __init__(self, directory, pattern: str = "*.gz", chunk_lines: int = CHUNK_LINES):
+        self.directory = Path(directory)
+        self.pattern = pattern
+        self.name = f"gzdir:{self.directory}"
+        self.chunk_lines = chunk_lines
+
+    async def chunks(self) -> AsyncIterator[List[str]]:
+        files = sorted(self.directory.glob(self.pattern), key=lambda p: (p.stat().st_mtime, p.name))
+        for path in files:
+            opener = lambda path=path: io.TextIOWrapper(
+                open_compressed(open(path, "rb"), path.name), encoding="utf-8", errors="replace"
+            )
+            async for chunk in _iterate_blocking(opener, self.chunk_lines):
+                yield chunk
+
+
+class SocketSource:
+    """
+    A local TCP listener receiving newline separated log lines from any number
+    of connections. Stops after `idle_timeout` seconds without data, or when
+    `stop()` is called.
+    """
+
+    def __init__(self, host: str, port: int, chunk_lines: int = CHUNK_LINES, idle_timeout: Optional[float] = None):
+        self.host = host
+        self.port = port
+        self.name = f"tcp:{host}:{port}"
+        self.chunk_lines = chunk_lines
+        self.idle_timeout = idle_timeout
+        self.ready = asyncio.Event()
+        self._lines: Optional[asyncio.Queue] = None
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            await self._lines.put(line.decode("utf-8", errors="replace"))
+        writer.close()
+
+    def stop(self):
+        if self._lines is not None:
+            self._lines.put_nowait(None)
+
+    async def chunks(self) -> AsyncIterator[List[str]]:
+        self._lines = asyncio.Queue(maxsize=self.chunk_lines * 4)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+        self.ready.set()
+        chunk: List[str] = []
+        try:
+            while True:
+                try:
+                    # Flush partial chunks quickly so a quiet socket still gets written
+                    line = await asyncio.wait_for(self._lines.get(), timeout=0.5 if chunk else self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if chunk:
+                        yield chunk
+                        chunk = []
+                        continue
+                    break
+                if line is None:
+                    break
+                chunk.append(line)
+                if len(chunk) >= self.chunk_lines:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        finally:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+class Collector:
+    """
+    Reads several sources concurrently and writes them to a LogStore.
+
+    - `pool`: executor used to parse the chunks (a process pool by default)
+    - `max_pending`: size of the queue between readers and the writer (backpressure)
+    - `parse_ahead`: chunks of one source parsed in parallel while keeping its order
+    - `batch_rows`: the writer merges queued frames up to this many rows per append
+    - `detector`: detection rules run on every written batch
+    """
+
+    def __init__(
+        self,
+        sources,
+        db: Optional[LogStore] = None,
+        pool: Optional[Executor] = None,
+        max_pending: int = 8,
+        parse_ahead: int = 2,
+        batch_rows: int = 50000,
+        detector: Optional[DetectionEngine] = None,
+    ):
+        self.sources = list(sources)
+        self.db = db or LogStore()
+        self.pool = pool
+        self.max_pending = max_pending
+        self.parse_ahead = parse_ahead
+        self.batch_rows = batch_rows
+        self.detector = detector
+        self.stats: Dict[str, SourceStats] = {source.name: SourceStats(source.name) for source in self.sources}
+        self.rows_written = 0
+        self.batches_written = 0
+
+    async def _read_source(self, source, queue: asyncio.Queue, pool: Executor):
+        loop = asyncio.get_running_loop()
+        stats = self.stats[source.name]
+        in_flight = deque()
+
+        async def forward_oldest():
+            df = await in_flight.popleft()
+            stats.rows += df.height
+            if df.height:
+                await queue.put(df)
+
+        try:
+            async for chunk in source.chunks():
+                stats.lines += len(chunk)
+                stats.chunks += 1
+                in_flight.append(loop.run_in_executor(pool, parse_lines, chunk))
+                if len(in_flight) >= self.parse_ahead:
+                    await forward_oldest()
+            while in_flight:
+                await forward_oldest()
+        finally:
+            stats.finished_at = time.perf_counter()
+
+    async def _write(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            df = await queue.get()
+            if df is None:
+                return
+            frames, rows, done = [df], df.height, False
+            # Merge what is already queued to write fewer, larger parts
+            while rows < self.batch_rows and not queue.empty():
+                extra = queue.get_nowait()
+                if extra is None:
+                    done = True
+                    break
+                frames.append(extra)
+                rows += extra.height
+            batch = pl.concat(frames, how="vertical")
+            await loop.run_in_executor(None, self.db.append_logs, batch)
+            if self.detector is not None:
+                await loop.run_in_executor(None, self.detector.process, batch)
+            self.rows_written += batch.height
+            self.batches_written += 1
+            if done:
+                return
+
+    async def run(self) -> Dict[str, dict]:
+        """Collect every source until exhausted and return the per-source stats."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending)
+        pool = self.pool or ProcessPoolExecutor()
+        try:
+            writer = asyncio.create_task(self._write(queue))
+            readers = [asyncio.create_task(self._read_source(source, queue, pool)) for source in self.sources]
+
+            async def end_of_input():
+                await asyncio.gather(*readers)
+                await queue.put(None)
+
+            tasks = [writer, *readers, asyncio.create_task(end_of_input())]
+            try:
+                # Everything done, or the first failure: a failed writer would
+                # leave the readers blocked on the full queue forever
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    task.result()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            if self.pool is None:
+                pool.shutdown()
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", action="append", default=[], help="Log file to read (repeatable)")
+    parser.add_argument("--gz-dir", action="append", default=[], help="Directory of rotated .gz files (repeatable)")
+    parser.add_argument("--listen", action="append", default=[], help="host:port TCP listener (repeatable)")
+    parser.add_argument("--idle-timeout", type=float, default=30.0, help="Stop listeners after this many idle seconds")
+    parser.add_argument("--threads", action="store_true", help="Parse in a thread pool instead of processes")
+    parser.add_argument("--metrics-port", type=int, help="Expose Prometheus metrics on this local port")
+    parser.add_argument("--detect", action="store_true", help="Run the detection rules on the collected logs")
+    args = parser.parse_args()
+    if args.metrics_port is not None:
+        start_http_server(args.metrics_port)
+        register_store_gauges(LogStore().files)
+
+    sources = [FileSource(path) for path in args.file]
+    sources += [GzDirectorySource(path) for path in args.gz_dir]
+    for address in args.listen:
+        host, port = address.rsplit(":", 1)
+        sources.append(SocketSource(host, int(port), idle_timeout=args.idle_timeout))
+    if not sources:
+        parser.error("at least one source is required")
+
+    pool = ThreadPoolExecutor() if args.threads else None
+    detector = DetectionEngine(AlertStore()) if args.detect else None
+    stats = asyncio.run(Collector(sources, pool=pool, detector=detector).run())
+    for name, source_stats in stats.items():
+        print(f"{name}: {source_stats['rows']} rows, {source_stats['rows_per_second']:.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
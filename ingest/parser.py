@@ -0,0 +1,209 @@
+"""
+Parsing of the firewall log line format:
+Date;IPsrc;IPdst;Protocole;Port_src;Port_dst;idRegle;action;interface_entrée;interface_sortie;firewall
+
+The format is fixed, so the lines are tokenized with an explicit raw schema
+(no type inference, no renaming afterwards) and every field is converted
+straight to its typed Arrow representation:
+
+- Date: timestamp[ms]
+- IPsrc, IPdst: uint32
+- Port_src, Port_dst: uint16
+- idRegle, firewall: uint32 (firewall is the optional 11th field)
+- Protocole, action, interfaces: dictionary encoded strings
+"""
+from typing import BinaryIO, Iterable, Iterator, Union
+
+import polars as pl
+import pyarrow as pa
+
+from storage.core import LOG_SCHEMA
+
+# Fields of a raw log line, in order
+LINE_FIELDS = [
+    "Date",
+    "IPsrc",
+    "IPdst",
+    "Protocole",
+    "Port_src",
+    "Port_dst",
+    "idRegle",
+    "action",
+    "interface_entrée",
+    "interface_sortie",
+    "firewall",
+]
+SEPARATOR = ";"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Size of the raw byte blocks parsed at once by iter_batches
+BATCH_BYTES = 8 * 1024 * 1024
+
+_CATEGORY = pa.dictionary(pa.int32(), pa.string())
+ARROW_SCHEMA = pa.schema(
+    [
+        ("Date", pa.timestamp("ms")),
+        ("IPsrc", pa.uint32()),
+        ("IPdst", pa.uint32()),
+        ("Protocole", _CATEGORY),
+        ("Port_src", pa.uint16()),
+        ("Port_dst", pa.uint16()),
+        ("idRegle", pa.uint32()),
+        ("action", _CATEGORY),
+        ("interface_entrée", _CATEGORY),
+        ("interface_sortie", _CATEGORY),
+        ("firewall", pa.uint32()),
+    ]
+)
+# Fields that must be present for a line to be kept
+REQUIRED_FIELDS = [name for name in LINE_FIELDS if name not in ("interface_sortie", "firewall")]
+
+
+# Raw column types handed to the CSV tokenizer: no type inference, numbers are
+# parsed natively, invalid values become null and rejected below
+_RAW_SCHEMA = {
+    "Date": pl.Utf8,
+    "IPsrc": pl.Utf8,
+    "IPdst": pl.Utf8,
+    "Protocole": pl.Utf8,
+    "Port_src": pl.UInt16,
+    "Port_dst": pl.UInt16,
+    "idRegle": pl.UInt32,
+    "action": pl.Utf8,
+    "interface_entrée": pl.Utf8,
+    "interface_sortie": pl.Utf8,
+    "firewall": pl.UInt32,
+}
+
+
+def ipv4_expr(column: str) -> pl.Expr:
+    """Dotted IPv4 string to uint32, invalid addresses become null."""
+    octets = pl.col(column).str.split_exact(".", 3)
+    address = pl.lit(0, pl.UInt64)
+    for i in range(4):
+        octet = octets.struct.field(f"field_{i}").cast(pl.UInt16, strict=False)
+        octet = pl.when(octet <= 255).then(octet)
+        address = address * 256 + octet.cast(pl.UInt64)
+    # split_exact pads missing parts with null and ignores extra dots
+    well_formed = pl.col(column).str.count_matches(".", literal=True) == 3
+    return pl.when(well_formed).then(address).cast(pl.UInt32).alias(column)
+
+
+def ipv4_to_uint32(values: pl.Series) -> pl.Series:
+    """
+    Convert an IP column to uint32. Addresses repeat a lot in firewall logs,
+    so only the distinct values are parsed, then mapped back to the rows.
+    """
+    uniques = values.drop_nulls().unique()
+    converted = pl.DataFrame({values.name: uniques}).select(ipv4_expr(values.name)).to_series()
+    return values.replace_strict(uniques, converted, default=None, return_dtype=pl.UInt32)
+
+
+def _convert() -> list:
+    """Expressions turning the raw columns (except the IPs) into the ARROW_SCHEMA types."""
+    return [
+        pl.col("Date").str.strptime(pl.Datetime("ms"), DATE_FORMAT, strict=False),
+        pl.col("Protocole").cast(pl.Categorical),
+        pl.col("action").cast(pl.Categorical),
+        pl.col("interface_entrée").cast(pl.Categorical),
+        # An empty output interface means no value
+        pl.when(pl.col("interface_sortie") != "").then(pl.col("interface_sortie")).cast(pl.Categorical),
+    ]
+
+
+def parse_batch(data: Union[bytes, str], separator: str = SEPARATOR) -> pa.RecordBatch:
+    """
+    Parse a block of complete log lines into a RecordBatch following ARROW_SCHEMA.
+    Lines without the trailing firewall field get a null firewall; blank lines
+    and lines with an invalid required field (date, IP, port, rule id) are
+    dropped. Fields past the 11th are ignored.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if not data.strip():
+        return pa.RecordBatch.from_pylist([], schema=ARROW_SCHEMA)
+    df = pl.read_csv(
+        data,
+        separator=separator,
+        has_header=False,
+        new_columns=LINE_FIELDS,
+        schema_overrides=_RAW_SCHEMA,
+        ignore_errors=True,
+        truncate_ragged_lines=True,
+        quote_char=None,
+    )
+    df = df.with_columns(
+        *_convert(),
+        ipv4_to_uint32(df["IPsrc"]),
+        ipv4_to_uint32(df["IPdst"]),
+    ).drop_nulls(REQUIRED_FIELDS)
+    if df.is_empty():
+        return pa.RecordBatch.from_pylist([], schema=ARROW_SCHEMA)
+    return df.to_arrow().cast(ARROW_SCHEMA).combine_chunks().to_batches()[0]
+
+
+def iter_batches(
+    stream: BinaryIO, separator: str = SEPARATOR, batch_bytes: int = BATCH_BYTES
+) -> Iterator[pa.RecordBatch]:
+    """
+    Read a binary stream block by block and yield one RecordBatch per block.
+    Blocks are cut at the last newline so no line is split across batches;
+    memory use is bounded by batch_bytes.
+    """
+    remainder = b""
+    while True:
+        block = stream.read(batch_bytes)
+        if not block:
+            break
+        block = remainder + block
+        cut = block.rfind(b"\n")
+        if cut == -1:
+            remainder = block
+            continue
+        remainder = block[cut + 1:]
+        batch = parse_batch(block[: cut + 1], separator)
+        if batch.num_rows:
+            yield batch
+    if remainder.strip():
+        batch = parse_batch(remainder, separator)
+        if batch.num_rows:
+            yield batch
+
+
+def uint32_to_ipv4(values: pl.Series) -> pl.Series:
+    """Format a uint32 IP column as dotted strings, formatting each distinct value once."""
+    uniques = values.drop_nulls().unique()
+    address = pl.col(values.name)
+    formatted = pl.DataFrame({values.name: uniques}).select(
+        pl.concat_str(
+            [((address // (1 << shift)) % 256).cast(pl.Utf8) for shift in (24, 16, 8, 0)],
+            separator=".",
+        )
+    ).to_series()
+    return values.replace_strict(uniques, formatted, default=None, return_dtype=pl.Utf8)
+
+
+def to_log_frame(batch: Union[pa.RecordBatch, pa.Table]) -> pl.DataFrame:
+    """
+    Convert a parsed batch to the store representation (LOG_SCHEMA columns,
+    dotted IP strings).
+    """
+    df = pl.from_arrow(batch)
+    return df.select(
+        [
+            uint32_to_ipv4(df[name]) if name in ("IPsrc", "IPdst") else pl.col(name).cast(dtype)
+            for name, dtype in LOG_SCHEMA.items()
+        ]
+    )
+
+
+def parse_lines(lines: Iterable[str], separator: str = SEPARATOR) -> pl.DataFrame:
+    """Parse raw log lines into a DataFrame following LOG_SCHEMA."""
+    return to_log_frame(parse_batch("\n".join(line.rstrip("\r\n") for line in lines), separator))
+
+
+def read_log_stream(stream: BinaryIO, separator: str = SEPARATOR) -> pl.DataFrame:
+    """Parse a whole binary stream (e.g. an uploaded file) into the store representation."""
+    batches = [to_log_frame(batch) for batch in iter_batches(stream, separator)]
+    if not batches:
+        return to_log_frame(parse_batch(b"", separator))
+    return pl.concat(batches, how="vertical")
@@ -0,0 +1,459 @@
+"""
+Real-time ingestion of firewall logs.
+
+A background worker reads lines from a growing log file (tail -F) or from a
+local syslog socket (UDP or Unix datagram), groups them in micro-batches and
+appends each batch to the parquet store every `max_seconds` or `max_rows`.
+
+Usage:
+    python -m ingest.tail --file /var/log/firewall.log
+    python -m ingest.tail --udp 127.0.0.1:5514 --batch-rows 5000 --batch-seconds 2
+"""
+import argparse
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Deque, Iterator, List, Optional, Tuple
+
+import polars as pl
+
+from analytics.detection import DetectionEngine
+from ingest.parser import parse_lines
+from monitoring.metrics import register_store_gauges, start_http_server
+from storage.alerts import AlertStore
+from storage.core import LogStore
+
+logger = logging.getLogger(__name__)
+
+# Start of a log record inside a syslog message: "<134>Feb 12 10:05:02 fw1 2025-02-12 10:05:02;..."
+RECORD_START = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2};")
+# Characters of a worker name ("tail:/var/log/fw.log") not kept in its dead-letter file name
+UNSAFE_NAME = re.compile(r"[^\w.-]+")
+
+
+@dataclass
+class IngestStats:
+    """Ingestion counters exposed to the dashboard."""
+
+    started_at: float = field(default_factory=time.time)
+    rows_total: int = 0
+    lines_total: int = 0
+    batches_total: int = 0
+    last_flush_at: Optional[float] = None
+    last_batch_rows: int = 0
+    last_batch_seconds: float = 0.0
+    last_event_time: Optional[datetime] = None
+    write_errors: int = 0
+    last_error: Optional[str] = None
+    lines_dead_lettered: int = 0
+
+    def throughput(self, now: Optional[float] = None) -> float:
+        """Average rows written per second since the worker started."""
+        elapsed = (now or time.time()) - self.started_at
+        return self.rows_total / elapsed if elapsed > 0 else 0.0
+
+    def lag_seconds(self, now: Optional[datetime] = None) -> Optional[float]:
+        """Delay between now and the most recent event written to the store."""
+        if self.last_event_time is None:
+            return None
+        return ((now or datetime.now()) - self.last_event_time).total_seconds()
+
+    def snapshot(self) -> dict:
+        """Plain dict of the current counters."""
+        return {
+            "rows_total": self.rows_total,
+            "lines_total": self.lines_total,
+            "batches_total": self.batches_total,
+            "rows_per_second": self.throughput(),
+            "lag_seconds": self.lag_seconds(),
+            "last_batch_rows": self.last_batch_rows,
+            "last_batch_seconds": self.last_batch_seconds,
+            "last_flush_at": self.last_flush_at,
+            "write_errors": self.write_errors,
+            "last_error": self.last_error,
+            "lines_dead_lettered": self.lines_dead_lettered,
+        }
+
+
+class MicroBatcher:
+    """
+    Buffers raw lines and writes them to `sink` as a parsed DataFrame once
+    `max_rows` lines are buffered or the oldest buffered line is older than
+    `max_seconds`.
+
+    A batch the sink fails to write is kept (parsed) and retried by the next
+    flushes, after a back-off of `retry_seconds` doubled at every failure.
+    Batches failing `max_attempts` times, and the oldest ones when more than
+    `max_pending` are waiting, are moved to the `dead_letter` file (their raw
+    lines, ready to be replayed), so memory stays bounded while the store is
+    unavailable.
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[pl.DataFrame], object],
+        max_rows: int = 10000,
+        max_seconds: float = 5.0,
+        stats: Optional[IngestStats] = None,
+        dead_letter: Optional[Path] = None,
+        max_attempts: int = 5,
+        max_pending: int = 8,
+        retry_seconds: float = 1.0,
+    ):
+        self.sink = sink
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.stats = stats or IngestStats()
+        self.dead_letter = Path(dead_letter) if dead_letter is not None else None
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+        self.retry_seconds = retry_seconds
+        self._lines: List[str] = []
+        self._first_line_at: Optional[float] = None
+        self._lock = threading.Lock()
+        # Parsed batches waiting to be written (the oldest first), failures of the oldest
+        self._pending: Deque[Tuple[List[str], pl.DataFrame]] = deque()
+        self._attempts = 0
+        self._retry_at = 0.0
+        self._write_lock = threading.Lock()
+
+    def add(self, line: str):
+        """Buffer one line, flushing if the batch is full."""
+        with self._lock:
+            if not self._lines:
+                self._first_line_at = time.monotonic()
+            self._lines.append(line)
+            full = len(self._lines) >= self.max_rows
+        if full:
+            self.flush()
+
+    def poll(self):
+        """Flush the buffer if it has been waiting longer than max_seconds, or a retry is due."""
+        now = time.monotonic()
+        with self._lock:
+            due = self._lines and now - self._first_line_at >= self.max_seconds
+        if due or (self._pending and now >= self._retry_at):
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Parse the buffered lines and write the waiting batches whose retry is
+        due, returning the number of rows written. If the sink fails the
+        batch stays queued for a retry and the error is raised.
+        """
+        with self._lock:
+            lines, self._lines = self._lines, []
+            self._first_line_at = None
+        with self._write_lock:
+            if lines:
+                df = parse_lines(lines)
+                self.stats.lines_total += len(lines)
+                self._pending.append((lines, df))
+            while len(self._pending) > self.max_pending:
+                self._drop_oldest()
+            written = 0
+            while self._pending and time.monotonic() >= self._retry_at:
+                written += self._write_oldest()
+            return written
+
+    def _write_oldest(self) -> int:
+        lines, df = self._pending[0]
+        start = time.perf_counter()
+        try:
+            if df.height:
+                self.sink(df)
+        except Exception as e:
+            self.stats.write_errors += 1
+            self.stats.last_error = f"{type(e).__name__}: {e}"
+            self._attempts += 1
+            if self._attempts >= self.max_attempts:
+                self._drop_oldest()
+            else:
+                self._retry_at = time.monotonic() + self.retry_seconds * 2 ** (self._attempts - 1)
+            raise
+        self._pending.popleft()
+        self._attempts = 0
+        self.stats.rows_total += df.height
+        self.stats.batches_total += 1
+        self.stats.last_batch_rows = df.height
+        self.stats.last_batch_seconds = time.perf_counter() - start
+        self.stats.last_flush_at = time.time()
+        if df.height:
+            self.stats.last_event_time = df["Date"].max()
+        return df.height
+
+    def _drop_oldest(self):
+        lines, _ = self._pending.popleft()
+        self._attempts = 0
+        self._retry_at = 0.0
+        self.stats.lines_dead_lettered += len(lines)
+        if self.dead_letter is None:
+            logger.error("Dropped a batch of %d lines the sink could not write", len(lines))
+            return
+        self.dead_letter.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.dead_letter, "a", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in lines)
+        logger.error("Moved a batch of %d lines the sink could not write to %s", len(lines), self.dead_letter)
+
+    def close(self):
+        """
+        Last flush, without waiting for the back-off; the lines that still
+        cannot be written are moved to the dead-letter file.
+        """
+        self._retry_at = 0.0
+        try:
+            self.flush()
+        finally:
+            with self._write_lock:
+                while self._pending:
+                    self._drop_oldest()
+
+
+def _decode(line: bytes) -> str:
+    return line.decode("utf-8", errors="replace")
+
+
+def follow_file(
+    path, stop: threading.Event, from_start: bool = False, poll_interval: float = 0.5
+) -> Iterator[Optional[str]]:
+    """
+    Yield the lines appended to `path`, like `tail -F`.
+    Handles truncation and rotation (the path pointing to a new file): the
+    rotated file is read to its end before following the new one.
+    Yields None when no data is available so the caller can run its timers.
+    The file is read in binary so that tell() is a byte offset comparable to
+    the file size; only complete lines are decoded.
+    """
+    path = Path(path)
+    handle = None
+    inode = None
+    remainder = b""
+
+    while not stop.is_set():
+        if handle is None:
+            try:
+                handle = open(path, "rb")
+            except FileNotFoundError:
+                yield None
+                stop.wait(poll_interval)
+                continue
+            inode = os.fstat(handle.fileno()).st_ino
+            if not from_start:
+                handle.seek(0, os.SEEK_END)
+            # Files appearing after a rotation are always read from the start
+            from_start = True
+            remainder = b""
+
+        chunk = handle.read(65536)
+        if chunk:
+            lines = (remainder + chunk).split(b"\n")
+            remainder = lines.pop()
+            for line in lines:
+                yield _decode(line)
+            continue
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != inode:
+            # Rotated: drain the old file first (lines written just before the
+            # rotation), its unterminated last line included, then open the new one
+            lines = (remainder + handle.read()).split(b"\n")
+            handle.close()
+            handle = None
+            remainder = lines.pop()
+            for line in lines:
+                yield _decode(line)
+            if remainder:
+                yield _decode(remainder)
+        elif stat.st_size < handle.tell():
+            # Truncated in place
+            handle.seek(0)
+            remainder = b""
+        else:
+            yield None
+            stop.wait(poll_interval)
+
+    if handle is not None:
+        handle.close()
+
+
+def extract_record(message: str) -> Optional[str]:
+    """Strip the syslog header (priority, timestamp, host) and return the log record."""
+    match = RECORD_START.search(message)
+    if match is None:
+        return None
+    return message[match.start():].strip()
+
+
+def listen_syslog(
+    stop: threading.Event,
+    udp_address: Optional[tuple] = None,
+    unix_path: Optional[str] = None,
+    timeout: float = 0.5,
+) -> Iterator[Optional[str]]:
+    """
+    Yield the log records received on a local UDP or Unix datagram syslog socket.
+    Yields None on timeouts so the caller can run its timers.
+    """
+    if unix_path is not None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        sock.bind(unix_path)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(udp_address)
+    sock.settimeout(timeout)
+
+    try:
+        while not stop.is_set():
+            try:
+                data = sock.recv(65535)
+            except socket.timeout:
+                yield None
+                continue
+            # A datagram may carry several newline separated messages
+            for message in data.decode("utf-8", errors="replace").splitlines():
+                record = extract_record(message)
+                if record is not None:
+                    yield record
+    finally:
+        sock.close()
+        if unix_path is not None and os.path.exists(unix_path):
+            os.unlink(unix_path)
+
+
+class IngestWorker(threading.Thread):
+    """
+    Background thread feeding a line source into a MicroBatcher.
+    `source` is a callable taking the stop event and returning the line iterator.
+    Write failures don't stop the worker: the batcher retries them, then moves
+    them to `dead_letter` (by default `<data_dir>/dead_letter/<name>.log`).
+    """
+
+    def __init__(
+        self,
+        source: Callable[[threading.Event], Iterator[Optional[str]]],
+        db: Optional[LogStore] = None,
+        max_rows: int = 10000,
+        max_seconds: float = 5.0,
+        name: str = "ingest-worker",
+        detector: Optional[DetectionEngine] = None,
+        dead_letter: Optional[Path] = None,
+    ):
+        super().__init__(name=name, daemon=True)
+        self.db = db or LogStore()
+        self.stop_event = threading.Event()
+        self.source = source
+        self.detector = detector
+        if dead_letter is None:
+            dead_letter = self.db.data_dir / "dead_letter" / (UNSAFE_NAME.sub("_", name) + ".log")
+        self.batcher = MicroBatcher(self._write, max_rows, max_seconds, dead_letter=dead_letter)
+        self.error: Optional[BaseException] = None
+
+    @property
+    def stats(self) -> IngestStats:
+        return self.batcher.stats
+
+    def _write(self, df: pl.DataFrame):
+        self.db.append_logs(df)
+        # Rules run on the stream once the batch is stored
+        if self.detector is not None:
+            self.detector.process(df)
+
+    def run(self):
+        try:
+            for line in self.source(self.stop_event):
+                try:
+                    if line is not None:
+                        self.batcher.add(line)
+                    self.batcher.poll()
+                except Exception:
+                    # The store failed: the batcher retries the batch later, or dead-letters it
+                    logger.exception("%s: writing a batch failed", self.name)
+        except BaseException as e:
+            self.error = e
+            try:
+                self.batcher.close()
+            except Exception:
+                # Keep the error of the source; the unwritten lines are in the dead-letter file
+                logger.exception("%s: last flush failed", self.name)
+            raise
+        try:
+            self.batcher.close()
+        except BaseException as e:
+            self.error = e
+            raise
+
+    def stop(self, timeout: Optional[float] = None):
+        """Ask the worker to stop, flush its last batch and wait for it."""
+        self.stop_event.set()
+        self.join(timeout)
+
+
+def tail_file_worker(path, from_start=False, **kwargs) -> IngestWorker:
+    """Worker tailing a growing log file."""
+    return IngestWorker(
+        lambda stop: follow_file(path, stop, from_start=from_start),
+        name=f"tail:{path}",
+        **kwargs,
+    )
+
+
+def syslog_worker(udp_address=None, unix_path=None, **kwargs) -> IngestWorker:
+    """Worker listening on a local UDP or Unix datagram syslog socket."""
+    label = unix_path or f"{udp_address[0]}:{udp_address[1]}"
+    return IngestWorker(
+        lambda stop: listen_syslog(stop, udp_address=udp_address, unix_path=unix_path),
+        name=f"syslog:{label}",
+        **kwargs,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="Log file to follow")
+    source.add_argument("--udp", help="host:port of the UDP syslog socket")
+    source.add_argument("--unix", help="Path of the Unix datagram syslog socket")
+    parser.add_argument("--from-start", action="store_true", help="Read the file from its beginning")
+    parser.add_argument("--batch-rows", type=int, default=10000)
+    parser.add_argument("--batch-seconds", type=float, default=5.0)
+    parser.add_argument("--metrics-port", type=int, help="Expose Prometheus metrics on this local port")
+    parser.add_argument("--detect", action="store_true", help="Run the detection rules on the stream")
+    args = parser.parse_args()
+    if args.metrics_port is not None:
+        start_http_server(args.metrics_port)
+        register_store_gauges(LogStore().files)
+
+    options = {"max_rows": args.batch_rows, "max_seconds": args.batch_seconds}
+    if args.detect:
+        options["detector"] = DetectionEngine(AlertStore())
+    if args.file:
+        worker = tail_file_worker(args.file, from_start=args.from_start, **options)
+    elif args.udp:
+        host, port = args.udp.rsplit(":", 1)
+        worker = syslog_worker(udp_address=(host, int(port)), **options)
+    else:
+        worker = syslog_worker(unix_path=args.unix, **options)
+
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(10)
+            print(worker.stats.snapshot(), flush=True)
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
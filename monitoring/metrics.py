@@ -0,0 +1,342 @@
+"""
+Prometheus-style metrics of the dashboard and of the ingestion workers.
+
+Counters, gauges and histograms (optionally labelled) live in a Registry and
+are rendered in the Prometheus text exposition format (version 0.0.4). They
+are exposed either on a local HTTP port (`start_http_server`, scrape
+`/metrics`) or periodically dumped to a file (`start_file_dumper`, e.g. for
+the node_exporter textfile collector).
+
+The exporter is started by the dashboard when OPSIE_METRICS_PORT or
+OPSIE_METRICS_FILE is set, and by the ingestion CLIs with --metrics-port.
+
+Metrics reported by the application:
+- opsie_query_duration_seconds{function}: latency of the profiled data functions
+- opsie_query_errors_total{function}
+- opsie_cache_requests_total{function,result}: Streamlit cache hits and misses
+- opsie_ingested_rows_total{path} / opsie_ingested_parts_total{path}
+- opsie_store_files, opsie_store_bytes: size of the logs store
+- opsie_active_sessions: dashboard sessions seen in the last 5 minutes
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from 1ms to 1 minute
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(sample name, formatted labels, value) triples."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines += [f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing value (rates are computed by Prometheus)."""
+
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down. Either set explicitly, or computed at scrape
+    time by a callback returning a number (or a {label values: number} dict).
+    """
+
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback: Optional[Callable] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception:
+                # A failing callback must not break the whole scrape
+                return
+            if not isinstance(values, dict):
+                values = {(): values}
+            items = list(values.items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, with their sum and count."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: [count per bucket (+Inf last), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(self.labelnames, key, ("le", _format_value(bound))),
+                    cumulative,
+                )
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), cumulative
+
+
+class Registry:
+    """Set of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Re-registering (e.g. module reloaded by Streamlit) returns the live metric
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered with another type or labels")
+                if isinstance(metric, Gauge) and metric.callback is not None:
+                    existing.callback = metric.callback
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+QUERY_DURATION = REGISTRY.histogram(
+    "opsie_query_duration_seconds", "Latency of the dashboard data functions", ["function"]
+)
+QUERY_ERRORS = REGISTRY.counter("opsie_query_errors_total", "Data function calls that raised", ["function"])
+CACHE_REQUESTS = REGISTRY.counter(
+    "opsie_cache_requests_total", "Calls of Streamlit cached functions by result (hit or miss)", ["function", "result"]
+)
+INGESTED_ROWS = REGISTRY.counter("opsie_ingested_rows_total", "Rows appended to the logs store", ["path"])
+INGESTED_PARTS = REGISTRY.counter("opsie_ingested_parts_total", "Parquet parts appended to the logs store", ["path"])
+ALERTS_RAISED = REGISTRY.counter("opsie_alerts_raised_total", "Alerts raised by the detection rules", ["rule"])
+MAINTENANCE_FILES = REGISTRY.counter(
+    "opsie_maintenance_files_total", "Store files compacted or expired by the maintenance job", ["operation"]
+)
+
+
+class SessionTracker:
+    """Dashboard sessions seen recently, for the active sessions gauge."""
+
+    def __init__(self, window_seconds: float = 300.0):
+        self.window_seconds = window_seconds
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, session_id: Optional[str]):
+        if session_id is None:
+            return
+        with self._lock:
+            self._last_seen[session_id] = time.monotonic()
+
+    def active(self) -> int:
+        limit = time.monotonic() - self.window_seconds
+        with self._lock:
+            self._last_seen = {session: seen for session, seen in self._last_seen.items() if seen >= limit}
+            return len(self._last_seen)
+
+
+SESSIONS = SessionTracker()
+REGISTRY.gauge("opsie_active_sessions", "Dashboard sessions seen in the last 5 minutes", callback=SESSIONS.active)
+
+
+def register_store_gauges(files: Callable[[], List[Path]], registry: Registry = REGISTRY):
+    """Expose the number and total size of the files of a store, computed at scrape time."""
+
+    def sizes():
+        return [path.stat().st_size for path in files() if path.exists()]
+
+    registry.gauge("opsie_store_files", "Parquet files in the logs store", callback=lambda: len(sizes()))
+    registry.gauge("opsie_store_bytes", "Size of the logs store on disk", callback=lambda: sum(sizes()))
+
+
+def _handler(registry: Registry):
+    # http.server (with ssl and email) is only imported when serving: the
+    # storage core imports this module for its counters
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would flood the console
+            pass
+
+    return MetricsHandler
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY):
+    """
+    Serve the metrics on http://host:port/metrics from a daemon thread.
+    Port 0 picks a free port (see `server.server_address`). Stop with `server.shutdown()`.
+    """
+    from http.server import ThreadingHTTPServer
+
+    server = ThreadingHTTPServer((host, port), _handler(registry))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_metrics_file(path, registry: Registry = REGISTRY):
+    """Write the metrics atomically (tmp file + rename) so readers never see a partial file."""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(registry.render(), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def start_file_dumper(path, interval: float = 15.0, registry: Registry = REGISTRY) -> threading.Event:
+    """Dump the metrics to `path` every `interval` seconds; set the returned event to stop."""
+    stop = threading.Event()
+
+    def loop():
+        while True:
+            write_metrics_file(path, registry)
+            if stop.wait(interval):
+                break
+
+    threading.Thread(target=loop, name="metrics-file", daemon=True).start()
+    return stop
@@ -0,0 +1,360 @@
+"""
+Lightweight per-call profiling of the data functions of the dashboard.
+
+`profiled` (decorator) and `profile_block` (context manager) record, for every
+call: wall time, rows in / rows out, peak memory and, for functions cached
+with Streamlit, whether the call was a cache hit or a miss. Records are
+grouped by Streamlit session and rerun so the debug panel can show what the
+last rerun of the page spent its time on.
+
+Recording is off by default and costs a single attribute check per call
+(the latency metrics of monitoring.metrics are always reported).
+It is enabled with `PROFILER.enable()` (the debug panel does it) or with the
+OPSIE_PROFILE=1 environment variable. The records can be exported as JSON or
+as a Chrome trace file (chrome://tracing, https://ui.perfetto.dev).
+
+Peak memory is measured with tracemalloc, which sees Python, numpy and pandas
+allocations but not the native allocations of polars/Arrow; the RSS delta of
+the call is recorded next to it for those.
+"""
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from monitoring.metrics import CACHE_REQUESTS, QUERY_DURATION, QUERY_ERRORS
+
+MAX_RECORDS = 5000
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None
+
+
+def _rss_bytes() -> Optional[int]:
+    """Current resident set size (Linux only, None elsewhere)."""
+    if _PAGE_SIZE is None:
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def current_session_id() -> Optional[str]:
+    """Id of the Streamlit session running the current thread, if any."""
+    # Outside of the app (workers, CLIs), never pay for importing Streamlit
+    if "streamlit" not in sys.modules:
+        return None
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        return None
+    return ctx.session_id if ctx is not None else None
+
+
+def count_rows(value: Any) -> Optional[int]:
+    """Number of rows of a DataFrame-like value (polars, pandas, Arrow, numpy), else None."""
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    for attribute in ("height", "num_rows"):
+        rows = getattr(value, attribute, None)
+        if isinstance(rows, int):
+            return rows
+    shape = getattr(value, "shape", None)
+    if isinstance(shape, tuple) and shape:
+        return int(shape[0])
+    return None
+
+
+@dataclass
+class CallRecord:
+    """Measurements of one profiled call."""
+
+    name: str
+    start: float
+    session: Optional[str] = None
+    run: int = 0
+    thread: int = 0
+    depth: int = 0
+    seconds: float = 0.0
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    peak_memory: Optional[int] = None
+    rss_delta: Optional[int] = None
+    # None: not a cached function, True: served from the Streamlit cache
+    cache_hit: Optional[bool] = None
+    error: Optional[str] = None
+    _peak_abs: int = field(default=0, repr=False)
+    _start_traced: int = field(default=0, repr=False)
+    _start_rss: Optional[int] = field(default=None, repr=False)
+
+    def to_dict(self) -> dict:
+        return {key: value for key, value in asdict(self).items() if not key.startswith("_")}
+
+
+_stack: contextvars.ContextVar = contextvars.ContextVar("profiling_stack", default=())
+# Set by the profiled wrapper of a cached function, flipped by the function body on a miss
+_cache_miss: contextvars.ContextVar = contextvars.ContextVar("profiling_cache_miss", default=None)
+
+
+class Profiler:
+    """Collects CallRecords in a bounded buffer shared by every session."""
+
+    def __init__(self, max_records: int = MAX_RECORDS, enabled: bool = False, trace_memory: bool = True):
+        self.records: deque = deque(maxlen=max_records)
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self._runs: Dict[Optional[str], int] = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def enable(self, trace_memory: Optional[bool] = None):
+        if trace_memory is not None:
+            self.trace_memory = trace_memory
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+    def begin_run(self) -> int:
+        """Mark the start of a new rerun of the current session; returns its number."""
+        session = current_session_id()
+        with self._lock:
+            self._runs[session] = self._runs.get(session, 0) + 1
+            return self._runs[session]
+
+    def current_run(self, session: Optional[str] = None) -> int:
+        return self._runs.get(session, 0)
+
+    def start(self, name: str, rows_in: Optional[int] = None) -> CallRecord:
+        session = current_session_id()
+        stack = _stack.get()
+        record = CallRecord(
+            name=name,
+            start=time.perf_counter(),
+            session=session,
+            run=self._runs.get(session, 0),
+            thread=threading.get_ident(),
+            depth=len(stack),
+            rows_in=rows_in,
+        )
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # The parent keeps the peak reached so far, then the peak restarts for this call
+            if stack:
+                stack[-1]._peak_abs = max(stack[-1]._peak_abs, peak)
+            tracemalloc.reset_peak()
+            record._start_traced = record._peak_abs = current
+        record._start_rss = _rss_bytes()
+        _stack.set(stack + (record,))
+        return record
+
+    def stop(self, record: CallRecord, result: Any = None):
+        record.seconds = time.perf_counter() - record.start
+        record.rows_out = count_rows(result)
+        if tracemalloc.is_tracing():
+            record._peak_abs = max(record._peak_abs, tracemalloc.get_traced_memory()[1])
+            record.peak_memory = record._peak_abs - record._start_traced
+        rss = _rss_bytes()
+        if rss is not None and record._start_rss is not None:
+            record.rss_delta = rss - record._start_rss
+        stack = _stack.get()
+        if stack and stack[-1] is record:
+            stack = stack[:-1]
+            if stack:
+                stack[-1]._peak_abs = max(stack[-1]._peak_abs, record._peak_abs)
+            _stack.set(stack)
+        with self._lock:
+            self.records.append(record)
+
+    def select(self, session: Optional[str] = None, run: Optional[int] = None) -> List[CallRecord]:
+        """Records of one session (all sessions if None), optionally of one rerun."""
+        with self._lock:
+            records = list(self.records)
+        return [
+            record
+            for record in records
+            if (session is None or record.session == session) and (run is None or record.run == run)
+        ]
+
+    def summary(self, records: Optional[List[CallRecord]] = None) -> List[dict]:
+        """Aggregate the records by function name, slowest total time first."""
+        records = self.select() if records is None else records
+        stats: Dict[str, dict] = {}
+        for record in records:
+            entry = stats.setdefault(
+                record.name,
+                {"name": record.name, "calls": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                 "cache_hits": 0, "cache_misses": 0, "max_peak_memory": None, "errors": 0},
+            )
+            entry["calls"] += 1
+            entry["total_seconds"] += record.seconds
+            entry["max_seconds"] = max(entry["max_seconds"], record.seconds)
+            if record.cache_hit is True:
+                entry["cache_hits"] += 1
+            elif record.cache_hit is False:
+                entry["cache_misses"] += 1
+            if record.peak_memory is not None:
+                entry["max_peak_memory"] = max(entry["max_peak_memory"] or 0, record.peak_memory)
+            if record.error:
+                entry["errors"] += 1
+        return sorted(stats.values(), key=lambda entry: entry["total_seconds"], reverse=True)
+
+    def to_json(self, records: Optional[List[CallRecord]] = None) -> str:
+        records = self.select() if records is None else records
+        return json.dumps([record.to_dict() for record in records], indent=2)
+
+    def to_chrome_trace(self, records: Optional[List[CallRecord]] = None) -> str:
+        """Export as Chrome trace events ("X" complete events, microseconds)."""
+        records = self.select() if records is None else records
+        events = []
+        for record in records:
+            args = {
+                key: value
+                for key, value in record.to_dict().items()
+                if key in ("rows_in", "rows_out", "peak_memory", "rss_delta", "cache_hit", "error", "run")
+                and value is not None
+            }
+            events.append(
+                {
+                    "name": record.name,
+                    "cat": record.name.split(".", 1)[0],
+                    "ph": "X",
+                    "ts": (record.start - self._origin) * 1e6,
+                    "dur": record.seconds * 1e6,
+                    "pid": os.getpid(),
+                    "tid": record.thread,
+                    "args": args,
+                }
+            )
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+
+
+PROFILER = Profiler()
+if os.environ.get("OPSIE_PROFILE") == "1":
+    PROFILER.enable()
+
+
+def _default_name(func: Callable) -> str:
+    module = getattr(func, "__module__", "") or ""
+    return f"{module.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+
+def _rows_in(args, kwargs) -> Optional[int]:
+    for value in list(args) + list(kwargs.values()):
+        rows = count_rows(value)
+        if rows is not None:
+            return rows
+    return None
+
+
+def profiled(name: Optional[str] = None, cache: Optional[Callable] = None, profiler: Profiler = PROFILER):
+    """
+    Decorator measuring every call of the function.
+
+    The latency (and cache result) always goes to the Prometheus metrics of
+    monitoring.metrics, which only costs two clock reads; the detailed record
+    goes to `profiler` when it is enabled.
+
+    `cache` is an optional Streamlit cache decorator (e.g. `st.cache_data(ttl=3600)`)
+    applied to the function; the measures then tell cache hits from misses:
+
+        @profiled("analysis.calculate_ip_stats", cache=st.cache_data(ttl=3600))
+        def calculate_ip_stats(_df): ...
+    """
+
+    def decorator(func):
+        record_name = name or _default_name(func)
+        target = func
+
+        if cache is not None:
+            @functools.wraps(func)
+            def on_miss(*args, **kwargs):
+                # Only runs when the cache has no value for these arguments
+                flag = _cache_miss.get()
+                if flag is not None:
+                    flag[0] = True
+                return func(*args, **kwargs)
+
+            target = cache(on_miss)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record = profiler.start(record_name, _rows_in(args, kwargs)) if profiler.enabled else None
+            token = _cache_miss.set([False]) if cache is not None else None
+            start = time.perf_counter()
+            result = None
+            try:
+                result = target(*args, **kwargs)
+                return result
+            except BaseException as e:
+                QUERY_ERRORS.inc(function=record_name)
+                if record is not None:
+                    record.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                QUERY_DURATION.observe(time.perf_counter() - start, function=record_name)
+                if token is not None:
+                    missed = _cache_miss.get()[0]
+                    _cache_miss.reset(token)
+                    CACHE_REQUESTS.inc(function=record_name, result="miss" if missed else "hit")
+                    if record is not None:
+                        record.cache_hit = not missed
+                if record is not None:
+                    profiler.stop(record, result)
+
+        if cache is not None:
+            # Keep the cache API (e.g. calculate_ip_stats.clear())
+            wrapper.clear = target.clear
+        return wrapper
+
+    return decorator
+
+
+class profile_block:
+    """
+    Context manager recording a block of code, e.g. a conversion or a chart:
+
+        with profile_block("analysis.to_pandas", rows_in=df.height) as block:
+            pdf = df.to_pandas()
+            block.result = pdf
+    """
+
+    def __init__(self, name: str, rows_in: Optional[int] = None, profiler: Profiler = PROFILER):
+        self.name = name
+        self.rows_in = rows_in
+        self.profiler = profiler
+        self.result = None
+        self._record = None
+
+    def __enter__(self):
+        if self.profiler.enabled:
+            self._record = self.profiler.start(self.name, self.rows_in)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._record is not None:
+            if exc_type is not None:
+                self._record.error = f"{exc_type.__name__}: {exc}"
+            self.profiler.stop(self._record, self.result)
+        return False
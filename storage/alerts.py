@@ -0,0 +1,82 @@
+"""
+Alerts table of the detection engine (analytics.detection).
+
+Alerts are appended as small parquet parts to `<data_dir>/alerts/`, written
+to a temporary file then renamed like the logs parts, so the dashboard and
+the detection workers can share the directory without locking.
+"""
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+import polars as pl
+
+from storage.core import VersionedCache
+
+ALERT_SCHEMA = {
+    "rule": pl.Utf8,
+    "severity": pl.Utf8,
+    "IPsrc": pl.Utf8,
+    # Sliding window in which the threshold was crossed (first episode window)
+    "start": pl.Datetime("us"),
+    # Last trigger of the episode within the batch that raised the alert
+    "end": pl.Datetime("us"),
+    # Largest value reached by the rule metric, and the threshold of the rule
+    "value": pl.UInt32,
+    "threshold": pl.UInt32,
+    "detected_at": pl.Datetime("us"),
+}
+
+
+class AlertStore:
+    """The alerts of a data directory."""
+
+    def __init__(self, data_dir="data", cache_entries: int = 8):
+        self.alerts_dir = Path(data_dir) / "alerts"
+        self.cache = VersionedCache(cache_entries)
+
+    def _files(self) -> List[Path]:
+        if not self.alerts_dir.exists():
+            return []
+        return sorted(self.alerts_dir.glob("part-*.parquet"))
+
+    def get_version(self) -> str:
+        stats = [path.stat() for path in self._files()]
+        return f"{len(stats)}-{max((stat.st_mtime_ns for stat in stats), default=0)}"
+
+    def append_alerts(self, alerts: pl.DataFrame) -> Optional[Path]:
+        """Append alerts (ALERT_SCHEMA columns) as a new part; None if there are none."""
+        if alerts.height == 0:
+            return None
+        self.alerts_dir.mkdir(parents=True, exist_ok=True)
+        path = self.alerts_dir / f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        alerts.select([pl.col(name).cast(dtype) for name, dtype in ALERT_SCHEMA.items()]).write_parquet(tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def _read(self, rule: Optional[str], since, limit: Optional[int]) -> pl.DataFrame:
+        files = self._files()
+        if not files:
+            return pl.DataFrame(schema=ALERT_SCHEMA)
+        alerts = pl.scan_parquet(files)
+        if rule is not None:
+            alerts = alerts.filter(pl.col("rule") == rule)
+        if since is not None:
+            alerts = alerts.filter(pl.col("end") >= since)
+        alerts = alerts.sort(["start", "rule", "IPsrc"], descending=[True, False, False])
+        if limit is not None:
+            alerts = alerts.head(limit)
+        return alerts.collect()
+
+    def alerts(self, rule: Optional[str] = None, since=None, limit: Optional[int] = None) -> pl.DataFrame:
+        """Alerts, most recent first, optionally of one rule and ending after `since`."""
+        key = ("alerts", rule, since, limit, self.get_version())
+        return self.cache.get_or_compute("alerts", key, lambda: self._read(rule, since, limit))
+
+    def clear(self):
+        """Remove every alert (before replaying the history)."""
+        for path in self._files():
+            path.unlink(missing_ok=True)
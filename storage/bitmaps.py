@@ -0,0 +1,400 @@
+"""
+Bitmap indexes of the low-cardinality filter columns of the logs store.
+
+Every parquet file of the store gets a bitmap index (`bitmaps/<file stem>.npz`
+next to it) with, for each value of the INDEXED_COLUMNS, the set of row
+numbers holding it. The sets are compressed the roaring way: rows are cut in
+chunks of 65536, and each chunk holding the value is a container of either
+the sorted 16-bit offsets of its rows (up to ARRAY_MAX rows) or a 65536-bit
+bitset. A filter combining several columns is answered by OR-ing the bitmaps
+of the accepted values of each column and AND-ing the columns, before any
+column data is decoded: counts come from the bitmaps alone, and reads only
+decode the row groups holding matching rows (row group bounds come from the
+parquet footer, so the index does not depend on how the file was written).
+Reads gain when matching rows are clustered (values seen in bursts, files
+sorted by Date); when they are spread over every row group, polars'
+predicate pushdown alone does as well.
+
+Indexes are built at ingestion (storage.core.write_sidecars, _PartFile) and
+rebuilt from the file when missing (files written before indexes existed).
+"""
+from functools import lru_cache
+from pathlib import Path
+from typing import Collection, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import polars as pl
+
+INDEXED_COLUMNS = ("action", "Protocole", "Port_dst", "interface_entrée", "interface_sortie")
+CHUNK_BITS = 16
+# Containers with more rows than this are bitsets (65536 bits, as large as 4096 offsets)
+ARRAY_MAX = 4096
+
+
+def bitmap_path(path: Path) -> Path:
+    """Bitmap index of a parquet file of the store."""
+    return path.parent / "bitmaps" / f"{path.stem}.npz"
+
+
+# Containers: np.uint16 array of sorted offsets, or np.uint64 bitset of 1024 words
+
+
+def _to_bitset(container: np.ndarray) -> np.ndarray:
+    if container.dtype == np.uint64:
+        return container
+    bits = np.zeros(1 << CHUNK_BITS, dtype=bool)
+    bits[container] = True
+    return np.packbits(bits, bitorder="little").view(np.uint64)
+
+
+def _offsets(container: np.ndarray) -> np.ndarray:
+    if container.dtype == np.uint16:
+        return container
+    return np.flatnonzero(np.unpackbits(container.view(np.uint8), bitorder="little")).astype(np.uint16)
+
+
+def _cardinality(container: np.ndarray) -> int:
+    if container.dtype == np.uint16:
+        return len(container)
+    return int(np.bitwise_count(container).sum())
+
+
+def _container(offsets: np.ndarray) -> np.ndarray:
+    """The smallest container of sorted offsets."""
+    return offsets if len(offsets) <= ARRAY_MAX else _to_bitset(offsets)
+
+
+def _and(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        return np.intersect1d(a, b, assume_unique=True)
+    if a.dtype == np.uint64 and b.dtype == np.uint64:
+        both = a & b
+        return _offsets(both) if _cardinality(both) <= ARRAY_MAX else both
+    offsets, bitset = (a, b) if a.dtype == np.uint16 else (b, a)
+    return offsets[((bitset[offsets >> 6] >> (offsets & 63).astype(np.uint64)) & 1).astype(bool)]
+
+
+def _or(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        return _container(np.union1d(a, b))
+    return _to_bitset(a) | _to_bitset(b)
+
+
+class Bitmap:
+    """A compressed set of row numbers: one container per chunk of 65536 rows holding some."""
+
+    __slots__ = ("containers",)
+
+    def __init__(self, containers: Optional[Dict[int, np.ndarray]] = None):
+        self.containers = containers or {}
+
+    @classmethod
+    def from_rows(cls, rows: np.ndarray) -> "Bitmap":
+        """Bitmap of sorted, distinct row numbers."""
+        rows = np.asarray(rows, dtype=np.int64)
+        chunks = rows >> CHUNK_BITS
+        containers = {}
+        for part in np.split(rows, np.flatnonzero(np.diff(chunks)) + 1):
+            if len(part):
+                containers[int(part[0] >> CHUNK_BITS)] = _container((part & 0xFFFF).astype(np.uint16))
+        return cls(containers)
+
+    def rows(self) -> np.ndarray:
+        """Sorted row numbers of the set."""
+        parts = [
+            (chunk << CHUNK_BITS) + _offsets(container).astype(np.int64)
+            for chunk, container in sorted(self.containers.items())
+        ]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def intersects(self, start: int, stop: int) -> bool:
+        """Whether the set holds a row number in [start, stop)."""
+        for chunk in range(start >> CHUNK_BITS, ((stop - 1) >> CHUNK_BITS) + 1):
+            container = self.containers.get(chunk)
+            if container is None:
+                continue
+            low = max(start - (chunk << CHUNK_BITS), 0)
+            high = min(stop - (chunk << CHUNK_BITS), 1 << CHUNK_BITS)
+            if container.dtype == np.uint16:
+                if np.searchsorted(container, low) < np.searchsorted(container, high):
+                    return True
+            elif np.unpackbits(container.view(np.uint8), bitorder="little")[low:high].any():
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return sum(_cardinality(container) for container in self.containers.values())
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        containers = {}
+        for chunk in self.containers.keys() & other.containers.keys():
+            container = _and(self.containers[chunk], other.containers[chunk])
+            if _cardinality(container):
+                containers[chunk] = container
+        return Bitmap(containers)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        containers = dict(self.containers)
+        for chunk, container in other.containers.items():
+            containers[chunk] = _or(containers[chunk], container) if chunk in containers else container
+        return Bitmap(containers)
+
+
+def _union(containers: List[np.ndarray]) -> np.ndarray:
+    """Union of containers of one chunk (of distinct values: their offsets are disjoint)."""
+    if len(containers) == 1:
+        return containers[0]
+    arrays = [container for container in containers if container.dtype == np.uint16]
+    bitsets = [container for container in containers if container.dtype == np.uint64]
+    if not bitsets:
+        return _container(np.sort(np.concatenate(arrays)))
+    # The array containers are set in one bitset rather than one each
+    if arrays:
+        bitsets.append(_to_bitset(np.concatenate(arrays)))
+    return np.bitwise_or.reduce(bitsets)
+
+
+class ColumnBitmaps(NamedTuple):
+    """
+    The bitmaps of every value of one column, packed: the containers of
+    values[i] are containers bounds[i]:bounds[i + 1], container k being the
+    chunk chunks[k] stored in data[ends[k - 1]:ends[k]] (a bitset if dense[k]).
+    """
+
+    values: np.ndarray
+    bounds: np.ndarray
+    chunks: np.ndarray
+    dense: np.ndarray
+    ends: np.ndarray
+    data: np.ndarray
+
+    @classmethod
+    def build(cls, values: np.ndarray, codes: np.ndarray, rows: np.ndarray) -> "ColumnBitmaps":
+        """Bitmaps of distinct (value, row) pairs, values[codes[j]] being the value of row rows[j]."""
+        if np.all(np.diff(rows) > 0):
+            # Rows in order (from a frame): a stable sort by value is enough, a radix sort for 16-bit codes
+            keys = codes.astype(np.uint16) if len(values) <= 1 << 16 else codes
+            order = np.argsort(keys, kind="stable")
+        else:
+            order = np.lexsort((rows, codes))
+        codes, rows = codes[order], rows[order]
+        chunks = rows >> CHUNK_BITS
+        # One container per (value, chunk): the array containers are slices of the sorted offsets
+        starts = np.flatnonzero((np.diff(codes, prepend=-1) != 0) | (np.diff(chunks, prepend=-1) != 0))
+        stops = np.append(starts[1:], len(rows))
+        offsets = (rows & 0xFFFF).astype(np.uint16)
+        dense = stops - starts > ARRAY_MAX
+        pieces, previous = [], 0
+        for k in np.flatnonzero(dense):
+            pieces += [offsets[previous : starts[k]], _to_bitset(offsets[starts[k] : stops[k]]).view(np.uint16)]
+            previous = stops[k]
+        pieces.append(offsets[previous:])
+        sizes = np.where(dense, 1 << (CHUNK_BITS - 4), stops - starts)
+        return cls(
+            values,
+            np.searchsorted(codes[starts], np.arange(len(values) + 1)).astype(np.int64),
+            chunks[starts].astype(np.uint32),
+            dense,
+            np.cumsum(sizes, dtype=np.int64),
+            np.concatenate(pieces),
+        )
+
+    def _containers(self, value: int):
+        """(chunk, container) pairs of values[value]."""
+        for k in range(self.bounds[value], self.bounds[value + 1]):
+            container = self.data[(self.ends[k - 1] if k else 0) : self.ends[k]]
+            yield int(self.chunks[k]), container.copy().view(np.uint64) if self.dense[k] else container
+
+    def accepted(self, values: Collection) -> np.ndarray:
+        """Positions of the indexed values that are in `values` (a range is compared by bounds)."""
+        numeric = self.values.dtype.kind in "iu"
+        if numeric and isinstance(values, range) and values.step == 1:
+            return np.flatnonzero((self.values >= values.start) & (self.values < values.stop))
+        accepted = np.array(list(values))
+        if not len(self.values) or (accepted.dtype.kind in "iu") != numeric:
+            # Nothing indexed, or values of another type than the column
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(np.isin(self.values, accepted))
+
+    def union(self, positions: np.ndarray) -> Bitmap:
+        """Rows holding one of the values at `positions`."""
+        chunks: Dict[int, List[np.ndarray]] = {}
+        for position in positions:
+            for chunk, container in self._containers(position):
+                chunks.setdefault(chunk, []).append(container)
+        return Bitmap({chunk: _union(containers) for chunk, containers in chunks.items()})
+
+    def rows(self):
+        """Codes (positions in values) and rows of every (value, row) pair."""
+        sizes = np.diff(self.ends, prepend=0)
+        starts = self.ends - sizes
+        # Bitsets expanded to their offsets, array containers kept as they are
+        pieces, counts, previous = [], sizes.copy(), 0
+        for k in np.flatnonzero(self.dense):
+            offsets = _offsets(self.data[starts[k] : self.ends[k]].copy().view(np.uint64))
+            pieces += [self.data[previous : starts[k]], offsets]
+            counts[k] = len(offsets)
+            previous = self.ends[k]
+        pieces.append(self.data[previous:])
+        codes = np.repeat(np.arange(len(self.values)), np.diff(self.bounds))
+        rows = np.repeat(self.chunks.astype(np.int64) << CHUNK_BITS, counts) + np.concatenate(pieces)
+        return np.repeat(codes, counts), rows
+
+
+class BitmapIndex:
+    """The bitmaps of every value of the indexed columns of one file of `rows` rows."""
+
+    def __init__(self, rows: int, columns: Dict[str, ColumnBitmaps]):
+        self.rows = rows
+        self.columns = columns
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame) -> "BitmapIndex":
+        columns = {}
+        for column in INDEXED_COLUMNS:
+            if column not in df.columns:
+                continue
+            present = df.select(pl.col(column), pl.int_range(pl.len(), dtype=pl.Int64).alias("row")).drop_nulls(column)
+            distinct = present[column].unique().sort()
+            if distinct.dtype.is_integer():
+                values = distinct.to_numpy()
+                codes = np.searchsorted(values, present[column].to_numpy())
+            else:
+                values = np.array(distinct.to_list(), dtype=str)
+                codes = present[column].cast(pl.Enum(distinct.to_list())).to_physical().to_numpy()
+            columns[column] = ColumnBitmaps.build(values, codes.astype(np.int64), present["row"].to_numpy())
+        return cls(df.height, columns)
+
+    def lookup(self, column: str, values: Collection) -> Optional[Bitmap]:
+        """Rows whose column is one of `values` (any collection: list, set, range), None if not indexed."""
+        bitmaps = self.columns.get(column)
+        if bitmaps is None:
+            return None
+        return bitmaps.union(bitmaps.accepted(values))
+
+    def match(self, predicates: Dict[str, Collection]) -> Optional[Bitmap]:
+        """
+        Rows matching every predicate ({column: accepted values}) on an
+        indexed column. None if no predicate is on an indexed column; the
+        predicates on other columns are left to the caller.
+        """
+        matched = None
+        for column, values in predicates.items():
+            bitmap = self.lookup(column, values)
+            if bitmap is not None:
+                matched = bitmap if matched is None else matched & bitmap
+        return matched
+
+    def save(self, path: Path):
+        arrays = {"rows": np.array([self.rows]), "columns": np.array(list(self.columns))}
+        for i, bitmaps in enumerate(self.columns.values()):
+            arrays.update({f"{field}{i}": array for field, array in bitmaps._asdict().items()})
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BitmapIndex"]:
+        """The saved index, None if the file is missing or unreadable."""
+        try:
+            with np.load(path) as arrays:
+                columns = {
+                    column: ColumnBitmaps(*(arrays[f"{field}{i}"] for field in ColumnBitmaps._fields))
+                    for i, column in enumerate(arrays["columns"].tolist())
+                }
+                return cls(int(arrays["rows"][0]), columns)
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def merge_bitmaps(indexes: List[BitmapIndex]) -> BitmapIndex:
+    """Index of the concatenation of the files (or batches) of `indexes`, in order."""
+    # First row of each index in the concatenation
+    offsets = np.cumsum([0] + [index.rows for index in indexes])
+    columns = {}
+    for column in dict.fromkeys(column for index in indexes for column in index.columns):
+        parts = [(index.columns[column], offsets[i]) for i, index in enumerate(indexes) if column in index.columns]
+        values = np.unique(np.concatenate([bitmaps.values for bitmaps, _ in parts]))
+        codes, rows = [], []
+        for bitmaps, offset in parts:
+            local_codes, local_rows = bitmaps.rows()
+            codes.append(np.searchsorted(values, bitmaps.values)[local_codes])
+            rows.append(local_rows + offset)
+        columns[column] = ColumnBitmaps.build(values, np.concatenate(codes), np.concatenate(rows))
+    return BitmapIndex(int(offsets[-1]), columns)
+
+
+@lru_cache(maxsize=256)
+def _file_index(path: Path, mtime_ns: int) -> BitmapIndex:
+    from storage.core import file_stats
+
+    index = BitmapIndex.load(bitmap_path(path))
+    if index is None or index.rows != file_stats(path).rows:
+        # Written before bitmap indexes existed
+        columns = [column for column in INDEXED_COLUMNS if column in pl.read_parquet_schema(path)]
+        index = BitmapIndex.from_frame(pl.read_parquet(path, columns=columns))
+        try:
+            index.save(bitmap_path(path))
+        except OSError:
+            pass
+    return index
+
+
+def file_index(path: Path) -> BitmapIndex:
+    """
+    The bitmap index of a parquet file of the store (cached: published files
+    are never modified), built and saved if missing or stale.
+    """
+    return _file_index(path, path.stat().st_mtime_ns)
+
+
+def predicate_expressions(predicates: Dict[str, Collection]) -> List[pl.Expr]:
+    """The predicates ({column: accepted values}) as polars expressions."""
+    expressions = []
+    for column, values in predicates.items():
+        if isinstance(values, range) and values.step == 1:
+            expressions.append(pl.col(column).is_between(values.start, values.stop - 1))
+        else:
+            expressions.append(pl.col(column).is_in(list(values)))
+    return expressions
+
+
+def row_group_runs(path: Path, bitmap: Bitmap) -> List[Tuple[int, int]]:
+    """(first row, end row) of the runs of consecutive row groups of a parquet file holding rows of `bitmap`."""
+    import pyarrow.parquet as pq
+
+    metadata = pq.ParquetFile(path).metadata
+    runs = []
+    start = 0
+    for i in range(metadata.num_row_groups):
+        stop = start + metadata.row_group(i).num_rows
+        if bitmap.intersects(start, stop):
+            if runs and runs[-1][1] == start:
+                runs[-1] = (runs[-1][0], stop)
+            else:
+                runs.append((start, stop))
+        start = stop
+    return runs
+
+
+def scan_rows(path: Path, bitmap: Bitmap, conditions: List[pl.Expr]) -> Optional[pl.LazyFrame]:
+    """
+    Lazy scan of the rows of a parquet file matching `conditions`, decoding
+    only the row groups holding rows of `bitmap` (the rows matching the
+    indexed predicates); None if there are none. Within those row groups
+    polars filters on the predicate columns before decoding the others,
+    which is faster than gathering the rows of the bitmap. When every row
+    group holds matches the bitmap prunes nothing: the file is scanned as a
+    whole, slicing would only cost polars its own row group statistics.
+    """
+    from storage.core import file_stats, scan_logs
+
+    runs = row_group_runs(path, bitmap)
+    if not runs:
+        return None
+    scan = scan_logs(path)
+    if runs == [(0, file_stats(path).rows)]:
+        return scan.filter(*conditions) if conditions else scan
+    return pl.concat([scan.slice(start, stop - start).filter(*conditions) for start, stop in runs])
@@ -0,0 +1,876 @@
+"""
+Framework-free core of the logs store.
+
+The store is a directory holding a base parquet file (`logs.parquet`, the
+initial content) and parts appended by the ingestion. Parts are partitioned by firewall: the logs
+of device 6 go to `logs/firewall=6/part-*.parquet`, and logs without a
+firewall id to `logs/part-*.parquet` (like the base file and the parts
+written before the firewall column existed). A store opened for one
+firewall (`LogStore(firewall=6)` or `store.partition(6)`) only lists, reads
+and aggregates the files of that partition. This module only depends on
+polars (pyarrow is imported when a PartWriter is opened), so batch jobs,
+CLIs and worker processes can use it without importing Streamlit.
+db.LogDatabase is the Streamlit adapter built on top of it.
+
+The files of the store are the ones named by its latest snapshot manifest
+(`_snapshots/`, see storage.snapshots): appends and replacements write new
+files then commit a new snapshot, so concurrent readers and writers, in
+threads or processes, never see a partial write. Files replaced by a commit
+are deleted later by LogStore.vacuum(), run in the background. New files
+carry the pid of the process writing them, so vacuum never deletes a file
+that a live writer has not committed yet, however long it stays open.
+
+Readers are memoized per store version (the snapshot version): appending a
+part changes the version, so cached results never outlive the data they
+were computed from.
+
+Every parquet file gets sidecars written before the file is published: a
+sketch (`<file>.sketch.npz`, see storage.sketches) that LogStore.sketch()
+merges into approximate statistics of the whole store, time series rollups
+(`rollups/<file>`, see storage.rollups) read by LogStore.rollups(),
+firewall rule hit counters (`rule_counters/<file>`, see storage.rule_counters)
+read by LogStore.rule_counters(), connection edges (`edges/<file>`, see
+storage.edges) merged by LogStore.edges(), and bitmap indexes of the filter
+columns (`bitmaps/<file>.npz`, see storage.bitmaps) used by
+LogStore.filter_logs(). Sidecars live next to their file, so they are
+partitioned by firewall too.
+"""
+import functools
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import replace
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Collection, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import polars as pl
+
+from monitoring.metrics import CACHE_REQUESTS, INGESTED_PARTS, INGESTED_ROWS
+from storage.snapshots import RETENTION, Snapshot, SnapshotLog
+
+# Schema of the logs store, shared by every parquet file of the store
+LOG_SCHEMA = {
+    "Date": pl.Datetime("us"),
+    "IPsrc": pl.Utf8,
+    "IPdst": pl.Utf8,
+    "Protocole": pl.Utf8,
+    "Port_src": pl.Int32,
+    "Port_dst": pl.Int32,
+    "idRegle": pl.Int32,
+    "action": pl.Utf8,
+    "interface_entrée": pl.Utf8,
+    "interface_sortie": pl.Utf8,
+    # Device id (11th field of the log lines), null when the line has none
+    "firewall": pl.Int32,
+}
+# Parquet footer key holding the storage tier of a file (storage.tiers); files without it are hot
+TIER_KEY = b"opsie.tier"
+
+
+def scan_logs(path: Path) -> pl.LazyFrame:
+    """Lazily scan one parquet file of the store, cast to LOG_SCHEMA (older files have no firewall)."""
+    columns = pl.read_parquet_schema(path)
+    return pl.scan_parquet(path).select(
+        [
+            pl.col(name).cast(dtype) if name in columns else pl.lit(None, dtype).alias(name)
+            for name, dtype in LOG_SCHEMA.items()
+        ]
+    )
+
+
+def read_logs(path: Path) -> pl.DataFrame:
+    """Read one parquet file of the store, cast to LOG_SCHEMA."""
+    return scan_logs(path).collect()
+
+
+def to_logs(df: pl.DataFrame) -> pl.DataFrame:
+    """Cast a DataFrame to LOG_SCHEMA; a missing firewall column becomes null."""
+    return df.select(
+        [
+            pl.col(name).cast(dtype) if name in df.columns else pl.lit(None, dtype).alias(name)
+            for name, dtype in LOG_SCHEMA.items()
+        ]
+    )
+
+
+def path_firewall(path: Path) -> Optional[int]:
+    """Firewall of a file of the store, from its partition directory (None: logs without a firewall id)."""
+    # Parts are in the partition directory, history rollups one level below
+    for directory in (path.parent, path.parent.parent):
+        if directory.name.startswith("firewall="):
+            return int(directory.name.split("=", 1)[1])
+    return None
+
+
+class FileStats(NamedTuple):
+    """Rows, time range (None if unknown) and storage tier of a parquet file of the store."""
+
+    rows: int
+    first: Optional[datetime]
+    last: Optional[datetime]
+    tier: str
+
+
+@functools.lru_cache(maxsize=65_536)
+def _footer_stats(path: str, mtime_ns: int) -> FileStats:
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    metadata = parquet.metadata
+    tier = (metadata.metadata or {}).get(TIER_KEY, b"hot").decode()
+    column = parquet.schema_arrow.get_field_index("Date")
+    if column < 0:
+        return FileStats(metadata.num_rows, None, None, tier)
+    first = last = None
+    for i in range(metadata.num_row_groups):
+        stats = metadata.row_group(i).column(column).statistics
+        if stats is None or not stats.has_min_max:
+            if stats is not None and stats.null_count == metadata.row_group(i).num_rows:
+                # Only null dates
+                continue
+            # No statistics: the time range is unknown
+            return FileStats(metadata.num_rows, None, None, tier)
+        first = stats.min if first is None else min(first, stats.min)
+        last = stats.max if last is None else max(last, stats.max)
+    return FileStats(metadata.num_rows, first, last, tier)
+
+
+def file_stats(path: Path) -> FileStats:
+    """Footer statistics of a file of the store, cached (published files are never modified)."""
+    return _footer_stats(str(path), path.stat().st_mtime_ns)
+
+
+def split_by_firewall(df: pl.DataFrame) -> List[Tuple[Optional[int], pl.DataFrame]]:
+    """The rows of each firewall of a LOG_SCHEMA DataFrame (None: rows without a firewall id)."""
+    if df.height == 0:
+        return []
+    partitions = df.partition_by("firewall", as_dict=True, maintain_order=True)
+    return [(firewall, rows) for (firewall,), rows in partitions.items()]
+
+
+def write_sidecars(df: pl.DataFrame, path: Path):
+    """Write every sidecar of a parquet file of the store, before the file is published."""
+    from storage.bitmaps import BitmapIndex, bitmap_path
+    from storage.edges import build_edges, edge_path, write_edges
+    from storage.rollups import build_rollups, rollup_path, write_rollups
+    from storage.rule_counters import build_counters, counter_path, write_counters
+    from storage.sketches import LogSketch, sketch_path
+
+    LogSketch.from_frame(df).save(sketch_path(path))
+    write_rollups(build_rollups(df), rollup_path(path))
+    write_counters(build_counters(df), counter_path(path))
+    write_edges(build_edges(df), edge_path(path))
+    BitmapIndex.from_frame(df).save(bitmap_path(path))
+
+
+def remove_file(path: Path):
+    """Remove a parquet file of the store and its sidecars."""
+    from storage.bitmaps import bitmap_path
+    from storage.edges import edge_path
+    from storage.rollups import rollup_path
+    from storage.rule_counters import counter_path
+    from storage.sketches import sketch_path
+
+    path.unlink(missing_ok=True)
+    for sidecar in (sketch_path(path), rollup_path(path), counter_path(path), edge_path(path), bitmap_path(path)):
+        sidecar.unlink(missing_ok=True)
+
+
+# Rows after which a PartWriter closes the part of a firewall and starts a new one,
+# bounding the sidecars held in memory (~50 MB); compaction merges parts later
+MAX_PART_ROWS = 1_048_576
+
+# A background vacuum also runs every VACUUM_EVERY commits, to expire the manifests of appends
+VACUUM_EVERY = 64
+
+# Names of the new files of this process not committed (or dropped) yet
+_UNCOMMITTED: Set[str] = set()
+_UNCOMMITTED_LOCK = threading.Lock()
+# Owner pid in the name of a new file: part-<time>-<pid>-<id>.parquet (and its .tmp)
+_OWNED_NAME = re.compile(r"\.?((?:part|rollups)-\d+-(\d+)-[0-9a-f]{8}\.parquet)")
+
+
+def _new_file_name(prefix: str) -> str:
+    name = f"{prefix}-{time.time_ns()}-{os.getpid()}-{uuid.uuid4().hex[:8]}.parquet"
+    with _UNCOMMITTED_LOCK:
+        _UNCOMMITTED.add(name)
+    return name
+
+
+def _release(paths: Iterable[Path]):
+    with _UNCOMMITTED_LOCK:
+        _UNCOMMITTED.difference_update(path.name for path in paths)
+
+
+def _being_written(path: Path) -> bool:
+    """
+    Whether a data file (or its tmp file) may still be committed by its
+    writer: one of the uncommitted files of this process, or a file of
+    another process still running. Names without a pid (older files) can't
+    tell.
+    """
+    match = _OWNED_NAME.match(path.name)
+    if match is None:
+        return False
+    pid = int(match.group(2))
+    if pid == os.getpid():
+        with _UNCOMMITTED_LOCK:
+            return match.group(1) in _UNCOMMITTED
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class _PartFile:
+    """
+    Streams DataFrames into a single parquet part, one row group per batch.
+    The sidecars of the batches are kept until close, where they are merged:
+    their size grows with the rows of the part (about 50 bytes per row), so
+    PartWriter rolls over to a new part every MAX_PART_ROWS rows.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp_path = path.with_name(f".{path.name}.tmp")
+        self.rows = 0
+        self.sketch = None
+        self.rollups = []
+        self.counters = []
+        self.edges = []
+        self.bitmaps = []
+        self._writer = None
+
+    def write(self, df: pl.DataFrame):
+        import pyarrow.parquet as pq
+
+        from storage.bitmaps import BitmapIndex
+        from storage.edges import build_edges
+        from storage.rollups import build_rollups
+        from storage.rule_counters import build_counters
+        from storage.sketches import LogSketch
+
+        table = df.to_arrow()
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.tmp_path, table.schema, compression="zstd")
+            self.sketch = LogSketch()
+        self._writer.write_table(table)
+        self.sketch.merge(LogSketch.from_frame(df))
+        self.rollups.append(build_rollups(df))
+        self.counters.append(build_counters(df))
+        self.edges.append(build_edges(df))
+        self.bitmaps.append(BitmapIndex.from_frame(df))
+        self.rows += len(table)
+
+    def close(self) -> Optional[Path]:
+        if self._writer is None:
+            return None
+        from storage.bitmaps import bitmap_path, merge_bitmaps
+        from storage.edges import edge_path, merge_edges, write_edges
+        from storage.rollups import merge_rollups, rollup_path, write_rollups
+        from storage.rule_counters import counter_path, merge_counters, write_counters
+        from storage.sketches import sketch_path
+
+        self._writer.close()
+        self._writer = None
+        self.sketch.save(sketch_path(self.path))
+        write_rollups(merge_rollups(self.rollups), rollup_path(self.path))
+        write_counters(merge_counters(self.counters), counter_path(self.path))
+        write_edges(merge_edges(self.edges), edge_path(self.path))
+        merge_bitmaps(self.bitmaps).save(bitmap_path(self.path))
+        self.sketch, self.rollups, self.counters, self.edges, self.bitmaps = None, [], [], [], []
+        os.replace(self.tmp_path, self.path)
+        return self.path
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self.tmp_path.unlink(missing_ok=True)
+
+
+class PartWriter:
+    """
+    Streams DataFrames into new parquet parts of the store, one part per
+    firewall found in the batches, one row group per batch. A part is closed
+    once it holds `max_rows` rows and the next batches of its firewall go to
+    a new one, so arbitrarily large inputs are written with bounded memory.
+    Usable as a context manager: the parts are published on a clean exit and
+    discarded if an exception is raised. The parts of every firewall are
+    committed together, so readers see all of them or none.
+    """
+
+    def __init__(
+        self,
+        new_path: Callable[[Optional[int]], Path],
+        commit: Optional[Callable[[List[Path]], None]] = None,
+        max_rows: int = MAX_PART_ROWS,
+    ):
+        self._new_path = new_path
+        self._commit = commit
+        self.max_rows = max_rows
+        # Open part of each firewall, and every part of the writer (closed ones included)
+        self.files: Dict[Optional[int], _PartFile] = {}
+        self.parts: List[_PartFile] = []
+
+    @property
+    def rows(self) -> int:
+        return sum(part.rows for part in self.parts)
+
+    @property
+    def paths(self) -> List[Path]:
+        """Paths of the parts written so far (published on close)."""
+        return [part.path for part in self.parts if part.rows]
+
+    def write(self, df: pl.DataFrame):
+        for firewall, rows in split_by_firewall(to_logs(df)):
+            if firewall not in self.files:
+                self.files[firewall] = _PartFile(self._new_path(firewall))
+                self.parts.append(self.files[firewall])
+            part = self.files[firewall]
+            part.write(rows)
+            if part.rows >= self.max_rows:
+                # Written out now, published with the others on close
+                part.close()
+                del self.files[firewall]
+
+    def close(self) -> List[Path]:
+        """Publish the parts in a single commit, returns their paths (empty if nothing was written)."""
+        for part in self.files.values():
+            part.close()
+        published = self.paths
+        if published and self._commit is not None:
+            self._commit(published)
+        if published:
+            INGESTED_ROWS.inc(self.rows, path="part_writer")
+            INGESTED_PARTS.inc(len(published), path="part_writer")
+        return published
+
+    def abort(self):
+        _release(part.path for part in self.parts)
+        for part in self.parts:
+            part.abort()
+            remove_file(part.path)
+            if part.path.parent.name.startswith("firewall="):
+                # Partition directory created for this writer only
+                try:
+                    part.path.parent.rmdir()
+                except OSError:
+                    pass
+        self.files = {}
+        self.parts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class VersionedCache:
+    """Small thread-safe LRU cache whose keys include the store version."""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, name: str, key: tuple, compute: Callable[[], object]):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                CACHE_REQUESTS.inc(function=name, result="hit")
+                return self._entries[key]
+        CACHE_REQUESTS.inc(function=name, result="miss")
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class LogStore:
+    """
+    The logs store of a data directory: listing, reading and appending parquet
+    files. With a `firewall`, readers only see the partition of that device.
+    Readers see the latest snapshot of the store (storage.snapshots), or the
+    snapshot they are pinned to (see pin()).
+    """
+
+    def __init__(
+        self,
+        data_dir="data",
+        cache_entries: int = 32,
+        firewall: Optional[int] = None,
+        snapshot: Optional[Snapshot] = None,
+    ):
+        self.data_dir = Path(data_dir)
+        self.firewall = firewall
+        # Create data directory if it doesn't exist
+        self.data_dir.mkdir(exist_ok=True)
+        self.logs_file = self.data_dir / "logs.parquet"
+        self.cache = VersionedCache(cache_entries)
+        self.snapshots = SnapshotLog(self.data_dir)
+        self._pinned = snapshot
+        self._vacuum_thread: Optional[threading.Thread] = None
+        # Edges merged so far, per (edges file, mtime), extended as parts are appended
+        self._edges_state: Tuple[FrozenSet[Tuple[Path, int]], Optional[pl.DataFrame]] = (frozenset(), None)
+        if self.snapshots.latest() is None:
+            self._bootstrap()
+
+    def _init_logs_file(self):
+        """Initialize an empty logs parquet file with the correct schema"""
+        tmp_path = self.logs_file.with_name(f".{self.logs_file.name}.{uuid.uuid4().hex[:8]}.tmp")
+        pl.DataFrame(schema=LOG_SCHEMA).write_parquet(tmp_path)
+        os.replace(tmp_path, self.logs_file)
+
+    def _bootstrap(self):
+        """First snapshot of a data directory: the files of a store written before the snapshots existed."""
+        if not self.logs_file.exists():
+            self._init_logs_file()
+
+        def legacy_files(base: Snapshot) -> Optional[Snapshot]:
+            if base.version:
+                # Another process bootstrapped the store first
+                return None
+            parts = sorted(self.parts_dir.glob("part-*.parquet")) if self.parts_dir.exists() else []
+            parts += sorted(self.parts_dir.glob("firewall=*/part-*.parquet"))
+            return Snapshot(1, tuple(self._relative(path) for path in [self.logs_file] + parts))
+
+        self.snapshots.commit(legacy_files)
+
+    def _relative(self, path: Path) -> str:
+        return path.relative_to(self.data_dir).as_posix()
+
+    @property
+    def parts_dir(self) -> Path:
+        """Directory holding the parquet parts appended by the ingestion workers."""
+        return self.data_dir / "logs"
+
+    def partition_dir(self, firewall: Optional[int]) -> Path:
+        """Directory of the parts of one firewall (None: logs without a firewall id)."""
+        return self.parts_dir if firewall is None else self.parts_dir / f"firewall={firewall}"
+
+    def partition(self, firewall: Optional[int]) -> "LogStore":
+        """The store restricted to one firewall (None: every device), pinned like this one."""
+        return LogStore(self.data_dir, self.cache.max_entries, firewall=firewall, snapshot=self._pinned)
+
+    def snapshot(self) -> Snapshot:
+        """The snapshot read by this store: the pinned one, or the latest."""
+        return self._pinned or self.snapshots.latest()
+
+    def pin(self, snapshot: Optional[Snapshot] = None) -> "LogStore":
+        """
+        A view of the store frozen at `snapshot` (default: the latest), for
+        readers that must see one consistent state across several reads. Its
+        files stay on disk for RETENTION seconds after being replaced.
+        """
+        snapshot = snapshot or self.snapshot()
+        return LogStore(self.data_dir, self.cache.max_entries, firewall=self.firewall, snapshot=snapshot)
+
+    def _snapshot_files(self) -> List[Path]:
+        return [self.data_dir / name for name in self.snapshot().files]
+
+    def firewalls(self) -> List[int]:
+        """Ids of the firewalls having parts in the snapshot."""
+        return sorted({firewall for firewall in map(path_firewall, self._snapshot_files()) if firewall is not None})
+
+    def parts(self) -> List[Path]:
+        """The appended parts of every partition, or only the parts of `firewall` if set, in commit order."""
+        parts = [path for path in self._snapshot_files() if path != self.logs_file]
+        if self.firewall is not None:
+            directory = self.partition_dir(self.firewall)
+            return [path for path in parts if path.parent == directory]
+        return parts
+
+    def files(self) -> List[Path]:
+        """List the parquet files of the store: the base file (unless scoped to a firewall) and the parts."""
+        if self.firewall is not None:
+            return self.parts()
+        return self._snapshot_files()
+
+    def history_files(self) -> List[Path]:
+        """Rollups kept for the logs dropped by the retention (storage.maintenance), of the scoped partition."""
+        files = [self.data_dir / name for name in self.snapshot().history]
+        if self.firewall is not None:
+            return [path for path in files if path.parent.parent == self.partition_dir(self.firewall)]
+        return files
+
+    def new_history_path(self, firewall: Optional[int]) -> Path:
+        directory = self.partition_dir(firewall) / "history"
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / _new_file_name("rollups")
+
+    def scan(self, files: Optional[List[Path]] = None) -> pl.LazyFrame:
+        """Lazily scan the store (or some of its files), casting every file to LOG_SCHEMA."""
+        frames = [scan_logs(path) for path in (self.files() if files is None else files)]
+        if not frames:
+            return pl.LazyFrame(schema=LOG_SCHEMA)
+        return pl.concat(frames, how="vertical")
+
+    def window_files(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Path]:
+        """
+        The files holding logs between `since` and `until` (inclusive), from
+        their footer statistics: a window of recent days only opens the hot
+        files (storage.tiers).
+        """
+        files = []
+        for path in self.files():
+            stats = file_stats(path)
+            if stats.rows == 0:
+                continue
+            if stats.first is not None and (
+                (until is not None and stats.first > until) or (since is not None and stats.last < since)
+            ):
+                continue
+            files.append(path)
+        return files
+
+    def scan_window(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> pl.LazyFrame:
+        """Lazy scan of the logs between `since` and `until` (inclusive), reading only the files of the window."""
+        scan = self.scan(self.window_files(since, until))
+        if since is not None:
+            scan = scan.filter(pl.col("Date") >= since)
+        if until is not None:
+            scan = scan.filter(pl.col("Date") <= until)
+        return scan
+
+    def _matching(self, path: Path, predicates: Dict[str, Collection]):
+        """
+        Bitmap of the rows of a file matching the predicates on its indexed
+        columns (None if there are none), and the predicates left to check.
+        """
+        from storage.bitmaps import file_index
+
+        index = file_index(path)
+        others = {column: values for column, values in predicates.items() if column not in index.columns}
+        return index.match(predicates), others
+
+    def _scan_matching(
+        self, path: Path, predicates: Dict[str, Collection], conditions: List[pl.Expr]
+    ) -> Optional[pl.LazyFrame]:
+        from storage.bitmaps import predicate_expressions, scan_rows
+
+        bitmap, _ = self._matching(path, predicates)
+        conditions = conditions + predicate_expressions(predicates)
+        if bitmap is None:
+            return scan_logs(path).filter(*conditions) if conditions else scan_logs(path)
+        return scan_rows(path, bitmap, conditions)
+
+    def filter_logs(
+        self, predicates: Dict[str, Collection], since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> pl.LazyFrame:
+        """
+        Lazy scan of the logs between `since` and `until` (inclusive) whose
+        columns all take one of their accepted values ({column: values},
+        values being any collection: list, set, range). Predicates on indexed
+        columns are first answered by the bitmap indexes of the files
+        (storage.bitmaps): files without matches are skipped and only the
+        row groups holding matching rows are decoded. Being lazy, the result
+        can be aggregated with the streaming engine like scan_window.
+        """
+        conditions = []
+        if since is not None:
+            conditions.append(pl.col("Date") >= since)
+        if until is not None:
+            conditions.append(pl.col("Date") <= until)
+        scans = [self._scan_matching(path, predicates, conditions) for path in self.window_files(since, until)]
+        scans = [scan for scan in scans if scan is not None]
+        return pl.concat(scans) if scans else pl.LazyFrame(schema=LOG_SCHEMA)
+
+    def count_logs(self, predicates: Dict[str, Collection]) -> int:
+        """Number of logs matching the predicates (see filter_logs), from the bitmaps alone when they cover them."""
+        count = 0
+        scans = []
+        for path in self.files():
+            bitmap, others = self._matching(path, predicates)
+            if bitmap is not None and not others:
+                count += len(bitmap)
+            else:
+                scans.append(self._scan_matching(path, predicates, []))
+        scans = [scan for scan in scans if scan is not None]
+        return count + (pl.concat(scans).select(pl.len()).collect().item() if scans else 0)
+
+    def get_store_version(self) -> str:
+        """
+        Return a token that changes whenever the store content changes (the
+        snapshot version). Pass it to cached readers so that appended data
+        invalidates their cache.
+        """
+        version = str(self.snapshot().version)
+        return version if self.firewall is None else f"{version}@firewall={self.firewall}"
+
+    def _memoized(self, name: str, args: tuple, compute: Callable[[], object]):
+        return self.cache.get_or_compute(name, (name, args, self.get_store_version()), compute)
+
+    # Uncached reads, shared by the memoized readers below and by the
+    # Streamlit adapter (db.LogDatabase) which caches them with st.cache_data
+
+    def _read_sample(self, limit: int) -> pl.DataFrame:
+        return self.scan().head(limit).collect()
+
+    def _read_count(self) -> int:
+        return self.scan().select(pl.len()).collect().item()
+
+    def _read_logs(self) -> pl.DataFrame:
+        return self.scan().collect()
+
+    # Readers
+
+    def sample(self, limit: int = 10000) -> pl.DataFrame:
+        """The first `limit` rows of the store."""
+        return self._memoized("store.sample", (limit,), lambda: self._read_sample(limit))
+
+    def count(self) -> int:
+        """Total number of rows of the store."""
+        return self._memoized("store.count", (), self._read_count)
+
+    def logs(self) -> pl.DataFrame:
+        """The whole store in memory."""
+        return self._memoized("store.logs", (), self._read_logs)
+
+    def _read_sketch(self):
+        from storage.sketches import LogSketch, sketch_path
+
+        merged = LogSketch()
+        for path in self.files():
+            sketch = LogSketch.load(sketch_path(path))
+            if sketch is None or sketch.rows != pl.scan_parquet(path).select(pl.len()).collect().item():
+                # Written before sketches existed, by another polars version, or stale
+                sketch = LogSketch.from_frame(read_logs(path))
+                try:
+                    sketch.save(sketch_path(path))
+                except OSError:
+                    pass
+            merged.merge(sketch)
+        return merged
+
+    def sketch(self):
+        """
+        Approximate statistics of the whole store (storage.sketches.LogSketch),
+        merged from the sidecar of every file. Shared: do not modify it.
+        """
+        return self._memoized("store.sketch", (), self._read_sketch)
+
+    def _sidecar_files(self, path_of, rows_of, build, write) -> List[Path]:
+        """Sidecar files of every file of the store, rebuilt when missing or stale."""
+        files = []
+        for path in self.files():
+            sidecar = path_of(path)
+            rows = pl.scan_parquet(path).select(pl.len()).collect().item()
+            if not sidecar.exists() or rows_of(sidecar) != rows:
+                # Written before this sidecar existed, or stale
+                write(build(read_logs(path)), sidecar)
+            files.append(sidecar)
+        return files
+
+    def _rollup_files(self) -> List[Path]:
+        from storage.rollups import build_rollups, rollup_path, rollup_rows, write_rollups
+
+        return self._sidecar_files(rollup_path, rollup_rows, build_rollups, write_rollups)
+
+    def rollups(self) -> pl.LazyFrame:
+        """
+        Lazy scan of the time series rollups of the whole store
+        (storage.rollups.ROLLUP_SCHEMA), including the history of the logs
+        dropped by the retention.
+        """
+        from storage.rollups import ROLLUP_SCHEMA
+
+        files = self._memoized("store.rollup_files", (), self._rollup_files) + self.history_files()
+        if not files:
+            return pl.LazyFrame(schema=ROLLUP_SCHEMA)
+        return pl.scan_parquet(files)
+
+    def _counter_files(self) -> List[Path]:
+        from storage.rule_counters import build_counters, counter_path, counter_rows, write_counters
+
+        return self._sidecar_files(counter_path, counter_rows, build_counters, write_counters)
+
+    def rule_counters(self) -> pl.LazyFrame:
+        """Lazy scan of the rule hit counters of the whole store (storage.rule_counters.COUNTER_SCHEMA)."""
+        from storage.rule_counters import COUNTER_SCHEMA
+
+        files = self._memoized("store.counter_files", (), self._counter_files)
+        if not files:
+            return pl.LazyFrame(schema=COUNTER_SCHEMA)
+        return pl.scan_parquet(files)
+
+    def _read_edges(self) -> pl.DataFrame:
+        from storage.edges import build_edges, edge_path, edge_rows, merge_edges, write_edges
+
+        files = frozenset(
+            (path, path.stat().st_mtime_ns)
+            for path in self._sidecar_files(edge_path, edge_rows, build_edges, write_edges)
+        )
+        merged_files, merged = self._edges_state
+        if merged is None or not merged_files <= files:
+            # First read, or files were replaced: merge everything again
+            merged_files, merged = frozenset(), merge_edges([])
+        new_files = sorted(files - merged_files)
+        if new_files:
+            merged = merge_edges([merged] + [pl.read_parquet(path) for path, _ in new_files])
+        self._edges_state = (files, merged)
+        return merged
+
+    def edges(self) -> pl.DataFrame:
+        """
+        Connection edges of the whole store (storage.edges.EDGE_SCHEMA). Only
+        the edges of the files appended since the previous call are merged.
+        """
+        return self._memoized("store.edges", (), self._read_edges)
+
+    # Writers
+
+    def _new_part_path(self, firewall: Optional[int] = None) -> Path:
+        directory = self.partition_dir(firewall)
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / _new_file_name("part")
+
+    def release(self, paths: Iterable[Path]):
+        """
+        Mark new files (see _new_part_path, new_history_path) as committed or
+        dropped: vacuum judges them by their age from now on, instead of
+        keeping them for their writer.
+        """
+        _release(paths)
+
+    def _commit_parts(self, paths: List[Path]) -> Snapshot:
+        """Commit new parts on top of the latest snapshot."""
+        added = [self._relative(path) for path in paths]
+        try:
+            _, committed = self.snapshots.commit(lambda base: replace(base, files=base.files + tuple(added)))
+        finally:
+            self.release(paths)
+        self._after_commit(committed, dropped=False)
+        return committed
+
+    def open_part_writer(self, max_rows: int = MAX_PART_ROWS) -> PartWriter:
+        """
+        Open a writer adding parquet parts to the store (one per firewall, and
+        per `max_rows` rows), batch by batch. The parts become visible to
+        readers only when the writer is closed.
+        """
+        return PartWriter(self._new_part_path, self._commit_parts, max_rows)
+
+    def _write_part(self, df: pl.DataFrame, firewall: Optional[int]) -> Path:
+        path = self._new_part_path(firewall)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        try:
+            df.write_parquet(tmp_path)
+            write_sidecars(df, path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            # Never committed: left to vacuum
+            self.release([path])
+            raise
+        return path
+
+    def _write_parts(self, logs: pl.DataFrame) -> List[Path]:
+        """One new part per firewall of `logs`, not committed yet."""
+        paths = []
+        try:
+            for firewall, rows in split_by_firewall(logs):
+                paths.append(self._write_part(rows, firewall))
+        except BaseException:
+            self.release(paths)
+            raise
+        return paths
+
+    def append_logs(self, df: pl.DataFrame) -> List[Path]:
+        """
+        Append a batch of logs to the store, as one new parquet part per firewall.
+        The parts are committed in one snapshot, so readers see the whole batch
+        or nothing of it.
+        """
+        paths = self._write_parts(to_logs(df))
+        if paths:
+            self._commit_parts(paths)
+        INGESTED_ROWS.inc(df.height, path="append")
+        INGESTED_PARTS.inc(len(paths), path="append")
+        return paths
+
+    def replace_logs(self, df: pl.DataFrame):
+        """
+        Replace the whole store content by `df`, written as new parts of the
+        partitions of its firewalls, in one commit. The previous files are
+        deleted by vacuum() once no reader can still be using them.
+        """
+        logs = to_logs(df)
+        paths = self._write_parts(logs)
+        added = [self._relative(path) for path in paths]
+        try:
+            _, committed = self.snapshots.commit(lambda base: Snapshot(base.version, tuple(added)))
+        finally:
+            self.release(paths)
+        self._after_commit(committed, dropped=True)
+        INGESTED_ROWS.inc(df.height, path="upload")
+        INGESTED_PARTS.inc(len(paths), path="upload")
+
+    # Cleanup
+
+    def _after_commit(self, committed: Snapshot, dropped: bool):
+        """Vacuum in the background after a commit dropping files, and every VACUUM_EVERY commits."""
+        if not dropped and committed.version % VACUUM_EVERY:
+            return
+        if self._vacuum_thread is not None and self._vacuum_thread.is_alive():
+            return
+        self._vacuum_thread = threading.Thread(target=self.vacuum, name="store-vacuum", daemon=True)
+        self._vacuum_thread.start()
+
+    def _data_files(self) -> List[Path]:
+        """
+        Parquet files and temporary files of the store directory, committed or
+        not. The legacy logs_file is left out: it is the store's original data
+        (it may be tracked outside of the store), so vacuum never deletes it.
+        """
+        files = []
+        if self.parts_dir.exists():
+            for directory in ("", "firewall=*/"):
+                for pattern in ("part-*.parquet", ".*.tmp", "history/rollups-*.parquet", "history/.*.tmp"):
+                    files += self.parts_dir.glob(directory + pattern)
+        return files
+
+    def vacuum(self, retention: float = RETENTION) -> List[Path]:
+        """
+        Delete the files (and their sidecars) that no snapshot of the last
+        `retention` seconds names: files replaced by a later commit, and files
+        of writers that died (or gave up) before committing. Files of writers
+        still running are kept whatever their age. Returns the deleted files.
+        """
+        kept, expired = self.snapshots.expire(retention)
+        if not kept:
+            return []
+        for manifest in expired:
+            manifest.unlink(missing_ok=True)
+        referenced = {self.data_dir / name for snapshot in kept for name in snapshot.files + snapshot.history}
+        deadline = time.time() - retention
+        removed = []
+        for path in self._data_files():
+            try:
+                if path in referenced or _being_written(path) or path.stat().st_mtime >= deadline:
+                    # Still readable, or being written and not committed yet
+                    continue
+            except FileNotFoundError:
+                continue
+            if path.suffix == ".tmp":
+                path.unlink(missing_ok=True)
+            else:
+                remove_file(path)
+            removed.append(path)
+        return removed
@@ -0,0 +1,107 @@
+"""
+Connection edges of the logs store, maintained at ingestion time.
+
+Every parquet file of the store gets an edges file (`edges/<file name>` next
+to it) with one row per IPsrc → IPdst pair: number of connections, denied
+connections, first and last seen, and the smallest destination ports of the
+pair. Edges are additive like the rollups, so the edges of the whole store
+are merged from the files (incrementally, see LogStore.edges()) and indexed
+by analytics.graph.
+
+Only the EDGE_PORTS smallest distinct ports are kept per edge (`many_ports`
+tells that there were more): the k smallest values of a union are the k
+smallest of the k smallest of each part, so merged edges stay exact.
+"""
+import os
+from pathlib import Path
+from typing import List
+
+import polars as pl
+
+EDGE_PORTS = 16
+EDGE_SCHEMA = {
+    "IPsrc": pl.Utf8,
+    "IPdst": pl.Utf8,
+    "count": pl.UInt32,
+    "deny": pl.UInt32,
+    "first_seen": pl.Datetime("us"),
+    "last_seen": pl.Datetime("us"),
+    "ports": pl.List(pl.Int32),
+    "many_ports": pl.Boolean,
+}
+_KEYS = ["IPsrc", "IPdst"]
+ROW_GROUP_SIZE = 65_536
+
+
+def edge_path(path: Path) -> Path:
+    """Edges file of a parquet file of the store."""
+    return path.parent / "edges" / path.name
+
+
+def _ports(keyed_ports: pl.LazyFrame) -> pl.LazyFrame:
+    """The smallest EDGE_PORTS distinct ports per edge, from (IPsrc, IPdst, port) rows."""
+    # Sorting the distinct triples once is cheaper than sorting the ports of every group
+    return (
+        keyed_ports.drop_nulls("port")
+        .unique()
+        .sort("port")
+        .group_by(_KEYS)
+        .agg(pl.col("port").head(EDGE_PORTS).alias("ports"), (pl.len() > EDGE_PORTS).alias("many_ports"))
+    )
+
+
+def _with_ports(totals: pl.LazyFrame, ports: pl.LazyFrame) -> pl.DataFrame:
+    many = pl.col("many_ports").fill_null(False)
+    if "_many" in totals.collect_schema():
+        # Merged edges: some part already had more ports than it kept
+        many = many | pl.col("_many")
+    return (
+        totals.join(ports, on=_KEYS, how="left", nulls_equal=True)
+        .with_columns(pl.col("ports").fill_null(pl.lit([], dtype=pl.List(pl.Int32))), many.alias("many_ports"))
+        .select(list(EDGE_SCHEMA))
+        .collect()
+        .cast(EDGE_SCHEMA)
+    )
+
+
+def build_edges(df: pl.DataFrame) -> pl.DataFrame:
+    """Edges of a logs DataFrame (a missing address is kept as a null end, dropped by the index)."""
+    logs = df.lazy()
+    totals = logs.group_by(_KEYS).agg(
+        pl.len().cast(pl.UInt32).alias("count"),
+        (pl.col("action") == "DENY").sum().cast(pl.UInt32).alias("deny"),
+        pl.col("Date").min().alias("first_seen"),
+        pl.col("Date").max().alias("last_seen"),
+    )
+    return _with_ports(totals, _ports(logs.select(*_KEYS, pl.col("Port_dst").alias("port"))))
+
+
+def merge_edges(edges: List[pl.DataFrame]) -> pl.DataFrame:
+    """Merge the edges of several batches or files."""
+    if not edges:
+        return pl.DataFrame(schema=EDGE_SCHEMA)
+    if len(edges) == 1:
+        return edges[0]
+    merged = pl.concat(edges).lazy()
+    totals = merged.group_by(_KEYS).agg(
+        pl.col("count").sum().cast(pl.UInt32),
+        pl.col("deny").sum().cast(pl.UInt32),
+        pl.col("first_seen").min(),
+        pl.col("last_seen").max(),
+        pl.col("many_ports").any().alias("_many"),
+    )
+    ports = _ports(merged.select(*_KEYS, pl.col("ports").alias("port")).explode("port"))
+    return _with_ports(totals, ports)
+
+
+def write_edges(edges: pl.DataFrame, path: Path):
+    """Write the edges of a parquet file atomically."""
+    path.parent.mkdir(exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    edges.sort(_KEYS).write_parquet(tmp_path, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, path)
+
+
+def edge_rows(path: Path) -> int:
+    """Number of logs counted by an edges file."""
+    return pl.scan_parquet(path).select(pl.col("count").sum()).collect().item() or 0
@@ -0,0 +1,379 @@
+"""
+Background maintenance of the logs store: compaction, tiers and retention.
+
+Ingestion appends one small part per batch and per firewall, so a busy store
+ends up with thousands of tiny files, each read with its own footer, row
+groups and sidecars. `compact()` rewrites the small files of each partition,
+by time order, into files of about TARGET_FILE_ROWS rows sorted by Date,
+with ROW_GROUP_ROWS row groups, dictionary encoding and zstd.
+
+`apply_tiers()` moves the files whose logs are all older than the hot
+window (7 days) to the warm tier, merged and recompressed with a heavier
+zstd level (see storage.tiers).
+
+`apply_retention()` drops the raw logs older than the retention horizon
+(90 days by default, cut at midnight so that no rollup bucket is split):
+whole files when they are entirely older, the old rows of the files that
+straddle the horizon. The rollups of the dropped logs are kept as history
+files of the snapshot (LogStore.history_files()), so activity charts still
+cover the whole period. With an `archive_dir`, the dropped logs are copied
+there first, under the same layout as the store.
+
+Every change is committed as a new snapshot (storage.snapshots): readers
+keep reading the previous files until the commit and are never blocked, and
+a change whose input files were replaced meanwhile is given up. Run it
+periodically with `python -m storage.maintenance --interval 3600`.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import time
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import polars as pl
+
+from monitoring.metrics import MAINTENANCE_FILES
+from storage.core import TIER_KEY, LogStore, file_stats, path_firewall, read_logs, remove_file, write_sidecars
+from storage.snapshots import Snapshot
+from storage.tiers import COMPRESSION_LEVELS, HOT_DAYS, warm_horizon
+
+RETENTION_DAYS = 90
+# Files below SMALL_FILE_ROWS rows are merged into files of about TARGET_FILE_ROWS rows
+SMALL_FILE_ROWS = 262_144
+TARGET_FILE_ROWS = 2_097_152
+ROW_GROUP_ROWS = 131_072
+
+
+@dataclass
+class FileInfo:
+    """Rows and time range of a parquet file of the store."""
+
+    path: Path
+    firewall: Optional[int]
+    rows: int
+    first: Optional[datetime]
+    last: Optional[datetime]
+    null_dates: int
+    tier: str
+
+
+@dataclass
+class MaintenanceReport:
+    files_before: int = 0
+    files_after: int = 0
+    compacted_files: int = 0
+    written_files: int = 0
+    warmed_files: int = 0
+    expired_files: int = 0
+    expired_rows: int = 0
+    archived: List[Path] = field(default_factory=list)
+    # Median duration of probe_query() before and after, in seconds
+    latency_before: float = 0.0
+    latency_after: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"files {self.files_before} -> {self.files_after} "
+            f"({self.compacted_files} compacted into {self.written_files}, {self.warmed_files} moved to warm, "
+            f"{self.expired_files} expired), "
+            f"{self.expired_rows} rows past retention, "
+            f"query {self.latency_before * 1000:.1f} ms -> {self.latency_after * 1000:.1f} ms"
+        )
+
+
+def file_info(path: Path) -> FileInfo:
+    stats = (
+        pl.scan_parquet(path)
+        .select(
+            pl.len().alias("rows"),
+            pl.col("Date").min().alias("first"),
+            pl.col("Date").max().alias("last"),
+            pl.col("Date").null_count().alias("null_dates"),
+        )
+        .collect()
+        .row(0, named=True)
+    )
+    return FileInfo(path, path_firewall(path), **stats, tier=file_stats(path).tier)
+
+
+def write_compacted(df: pl.DataFrame, path: Path, tier: str = "hot"):
+    """
+    Write logs sorted by Date in well-sized, dictionary-encoded zstd row
+    groups (at the level of their tier), with their sidecars.
+    """
+    import pyarrow.parquet as pq
+
+    df = df.sort("Date", nulls_last=True)
+    table = df.to_arrow()
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), TIER_KEY: tier.encode()})
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    pq.write_table(
+        table,
+        tmp_path,
+        row_group_size=ROW_GROUP_ROWS,
+        compression="zstd",
+        compression_level=COMPRESSION_LEVELS[tier],
+        use_dictionary=True,
+        write_statistics=True,
+    )
+    write_sidecars(df, path)
+    os.replace(tmp_path, path)
+
+
+def _commit_rewrite(store: LogStore, inputs: List[Path], outputs: List[Path], history: List[Path] = ()) -> bool:
+    """
+    Replace `inputs` by `outputs` (at the position of the first input) and add
+    `history`, in one commit. Given up, and the new files removed, if an input
+    is no longer in the latest snapshot.
+    """
+    removed = {store._relative(path) for path in inputs}
+    added = tuple(store._relative(path) for path in outputs)
+
+    def update(base: Snapshot) -> Optional[Snapshot]:
+        if not removed <= set(base.files):
+            return None
+        position = min(i for i, name in enumerate(base.files) if name in removed)
+        kept = [name for name in base.files if name not in removed]
+        files = tuple(kept[:position]) + added + tuple(kept[position:])
+        return replace(base, files=files, history=base.history + tuple(store._relative(path) for path in history))
+
+    _, committed = store.snapshots.commit(update)
+    store.release(list(outputs) + list(history))
+    if committed is None:
+        for path in list(outputs) + list(history):
+            remove_file(path)
+        return False
+    return True
+
+
+def _by_partition(infos: List[FileInfo]) -> Dict[Optional[int], List[FileInfo]]:
+    partitions: Dict[Optional[int], List[FileInfo]] = {}
+    for info in infos:
+        partitions.setdefault(info.firewall, []).append(info)
+    return partitions
+
+
+def _time_groups(infos: List[FileInfo], target_rows: int) -> List[List[FileInfo]]:
+    """Files in time order, cut into groups of about `target_rows` rows."""
+    infos = sorted(infos, key=lambda info: (info.first is None, info.first or datetime.min))
+    groups, group = [], []
+    for info in infos:
+        group.append(info)
+        if sum(member.rows for member in group) >= target_rows:
+            groups.append(group)
+            group = []
+    return groups + [group]
+
+
+def _rewrite_group(store: LogStore, firewall: Optional[int], group: List[FileInfo], tier: str) -> bool:
+    """Merge a group of files of a partition into one file of `tier`, committed in place of them."""
+    inputs = [info.path for info in group]
+    output = store._new_part_path(firewall)
+    write_compacted(pl.concat([read_logs(path) for path in inputs]), output, tier)
+    return _commit_rewrite(store, inputs, [output])
+
+
+def compact(
+    store: LogStore,
+    small_rows: int = SMALL_FILE_ROWS,
+    target_rows: int = TARGET_FILE_ROWS,
+    report: Optional[MaintenanceReport] = None,
+) -> MaintenanceReport:
+    """
+    Merge the small files of each partition and tier, by time order, into
+    sorted files of about `target_rows` rows.
+    """
+    report = report or MaintenanceReport()
+    infos = [file_info(path) for path in store.pin().files()]
+    for firewall, files in _by_partition(infos).items():
+        for tier in COMPRESSION_LEVELS:
+            small = [info for info in files if info.tier == tier and info.rows < small_rows]
+            for group in _time_groups(small, target_rows):
+                if len(group) >= 2 and _rewrite_group(store, firewall, group, tier):
+                    report.compacted_files += len(group)
+                    report.written_files += 1
+                    MAINTENANCE_FILES.inc(len(group), operation="compacted")
+        _compact_history(store, firewall)
+    return report
+
+
+def apply_tiers(
+    store: LogStore,
+    hot_days: int = HOT_DAYS,
+    now: Optional[datetime] = None,
+    target_rows: int = TARGET_FILE_ROWS,
+    report: Optional[MaintenanceReport] = None,
+) -> MaintenanceReport:
+    """Move the hot files whose logs are all older than `hot_days` days to the warm tier."""
+    report = report or MaintenanceReport()
+    horizon = warm_horizon(hot_days, now)
+    infos = [file_info(path) for path in store.pin().files()]
+    for firewall, files in _by_partition(infos).items():
+        old = [info for info in files if info.tier == "hot" and info.last is not None and info.last < horizon]
+        for group in _time_groups(old, target_rows):
+            if group and _rewrite_group(store, firewall, group, "warm"):
+                report.warmed_files += len(group)
+                report.written_files += 1
+                MAINTENANCE_FILES.inc(len(group), operation="warmed")
+    return report
+
+
+def _compact_history(store: LogStore, firewall: Optional[int]):
+    """Merge the history rollups of a partition into one file."""
+    from storage.rollups import merge_rollups, write_rollups
+
+    partition = store.pin().partition(firewall)
+    history = [path for path in partition.history_files() if path_firewall(path) == firewall]
+    if len(history) < 2:
+        return
+    merged = store.new_history_path(firewall)
+    write_rollups(merge_rollups([pl.read_parquet(path) for path in history]), merged)
+    names = {store._relative(path) for path in history}
+
+    def update(base: Snapshot) -> Optional[Snapshot]:
+        if not names <= set(base.history):
+            return None
+        kept = tuple(name for name in base.history if name not in names)
+        return replace(base, history=kept + (store._relative(merged),))
+
+    committed = store.snapshots.commit(update)[1]
+    store.release([merged])
+    if committed is None:
+        merged.unlink(missing_ok=True)
+
+
+def retention_horizon(days: int = RETENTION_DAYS, now: Optional[datetime] = None) -> datetime:
+    """Midnight `days` days before `now`: logs strictly before it are past retention."""
+    day = ((now or datetime.now()) - timedelta(days=days)).date()
+    return datetime(day.year, day.month, day.day)
+
+
+def _archive(store: LogStore, path: Path, rows: Optional[pl.DataFrame], archive_dir: Path) -> Path:
+    """Copy a file (or some of its rows) to the archive, under the same relative path as in the store."""
+    target = Path(archive_dir) / path.relative_to(store.data_dir)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if rows is None:
+        shutil.copy2(path, target)
+    else:
+        rows.write_parquet(target, compression="zstd")
+    return target
+
+
+def apply_retention(
+    store: LogStore,
+    days: int = RETENTION_DAYS,
+    now: Optional[datetime] = None,
+    archive_dir: Optional[Path] = None,
+    report: Optional[MaintenanceReport] = None,
+) -> MaintenanceReport:
+    """
+    Drop (or archive, then drop) the logs older than the horizon, keeping
+    their rollups as history.
+    """
+    from storage.rollups import build_rollups, rollup_path, write_rollups
+
+    report = report or MaintenanceReport()
+    horizon = retention_horizon(days, now)
+    infos = [file_info(path) for path in store.pin().files()]
+    for firewall, files in _by_partition(infos).items():
+        inputs, outputs, history = [], [], []
+        for info in files:
+            if info.first is None or info.first >= horizon:
+                continue
+            inputs.append(info.path)
+            if info.last < horizon and not info.null_dates:
+                # Entirely past retention: keep its rollups as they are
+                old, kept = None, None
+                report.expired_rows += info.rows
+                report.expired_files += 1
+            else:
+                logs = read_logs(info.path)
+                expired = pl.col("Date") < horizon
+                old, kept = logs.filter(expired), logs.filter(~expired.fill_null(False))
+                report.expired_rows += old.height
+            if archive_dir is not None:
+                report.archived.append(_archive(store, info.path, old, archive_dir))
+            path = store.new_history_path(firewall)
+            if old is None and rollup_path(info.path).exists():
+                shutil.copy2(rollup_path(info.path), path)
+            else:
+                write_rollups(build_rollups(old if old is not None else read_logs(info.path)), path)
+            history.append(path)
+            if kept is not None and kept.height:
+                output = store._new_part_path(firewall)
+                write_compacted(kept, output, info.tier)
+                outputs.append(output)
+        if inputs and _commit_rewrite(store, inputs, outputs, history):
+            MAINTENANCE_FILES.inc(len(inputs), operation="expired")
+    return report
+
+
+def probe_query(store: LogStore) -> pl.DataFrame:
+    """A typical dashboard aggregation over the whole store, timed before and after maintenance."""
+    return (
+        store.scan()
+        .filter(pl.col("action") == "DENY")
+        .group_by("Protocole", "Port_dst")
+        .agg(pl.len().alias("count"), pl.col("Date").max().alias("last"))
+        .collect()
+    )
+
+
+def query_latency(store: LogStore, query: Callable[[LogStore], object] = probe_query, runs: int = 3) -> float:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        query(store)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def run_maintenance(
+    store: LogStore,
+    retention_days: Optional[int] = RETENTION_DAYS,
+    archive_dir: Optional[Path] = None,
+    now: Optional[datetime] = None,
+    small_rows: int = SMALL_FILE_ROWS,
+    target_rows: int = TARGET_FILE_ROWS,
+    hot_days: Optional[int] = HOT_DAYS,
+) -> MaintenanceReport:
+    """
+    Retention (unless `retention_days` is None), warm tier (unless
+    `hot_days` is None), compaction, then vacuum of the files replaced earlier.
+    """
+    report = MaintenanceReport(files_before=len(store.files()), latency_before=query_latency(store))
+    if retention_days is not None:
+        apply_retention(store, retention_days, now, archive_dir, report)
+    if hot_days is not None:
+        apply_tiers(store, hot_days, now, target_rows, report)
+    compact(store, small_rows, target_rows, report)
+    store.vacuum()
+    report.files_after = len(store.files())
+    report.latency_after = query_latency(store)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact the logs store and apply the retention")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS, help="0 to keep every log")
+    parser.add_argument("--hot-days", type=int, default=HOT_DAYS, help="Days of logs kept in the hot tier")
+    parser.add_argument("--archive-dir", type=Path, help="Copy the logs past retention here before dropping them")
+    parser.add_argument("--interval", type=float, default=0, help="Seconds between runs (default: run once)")
+    args = parser.parse_args()
+
+    store = LogStore(args.data_dir)
+    while True:
+        report = run_maintenance(store, args.retention_days or None, args.archive_dir, hot_days=args.hot_days)
+        print(report.summary(), flush=True)
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Multi-resolution time series of the logs store, maintained at ingestion time.
+
+Every parquet file of the store gets a rollup file (`rollups/<file name>`
+next to it) holding the number of connections per bucket × IPsrc × action,
+at minute, hour and day resolution. Rollups are sorted by resolution and
+IPsrc so that the activity of one source only reads a few row groups.
+
+Activity queries pick the resolution from the time window and the width of
+the chart: the finest resolution whose buckets still fit in `max_points`,
+i.e. the coarsest data that fills the chart. A year of activity reads day
+buckets, a few hours of a busy source read minute buckets.
+"""
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+import polars as pl
+
+# Finest first
+RESOLUTIONS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+_INTERVALS = {"minute": "1m", "hour": "1h", "day": "1d"}
+ROLLUP_SCHEMA = {
+    "resolution": pl.Utf8,
+    "bucket": pl.Datetime("us"),
+    "IPsrc": pl.Utf8,
+    "action": pl.Utf8,
+    "count": pl.UInt32,
+}
+_KEYS = ["resolution", "IPsrc", "bucket", "action"]
+# Small row groups so the statistics on IPsrc skip most of a rollup file
+ROW_GROUP_SIZE = 16_384
+
+
+def rollup_path(path: Path) -> Path:
+    """Rollup file of a parquet file of the store."""
+    return path.parent / "rollups" / path.name
+
+
+def build_rollups(df: pl.DataFrame) -> pl.DataFrame:
+    """Connections per bucket, IPsrc and action of a logs DataFrame, at every resolution."""
+    frames = [
+        df.lazy()
+        .group_by(pl.col("Date").dt.truncate(interval).alias("bucket"), "IPsrc", "action")
+        .agg(pl.len().cast(pl.UInt32).alias("count"))
+        .with_columns(pl.lit(resolution).alias("resolution"))
+        for resolution, interval in _INTERVALS.items()
+    ]
+    return pl.concat(pl.collect_all(frames)).select(list(ROLLUP_SCHEMA))
+
+
+def merge_rollups(rollups: List[pl.DataFrame]) -> pl.DataFrame:
+    """Sum rollups of several batches (buckets may span batches)."""
+    if not rollups:
+        return pl.DataFrame(schema=ROLLUP_SCHEMA)
+    return (
+        pl.concat(rollups)
+        .group_by(_KEYS)
+        .agg(pl.col("count").sum().cast(pl.UInt32))
+        .select(list(ROLLUP_SCHEMA))
+    )
+
+
+def write_rollups(rollups: pl.DataFrame, path: Path):
+    """Write the rollups of a parquet file atomically, sorted for IPsrc pushdown."""
+    path.parent.mkdir(exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    rollups.sort(_KEYS, nulls_last=True).write_parquet(
+        tmp_path, row_group_size=ROW_GROUP_SIZE, statistics=True
+    )
+    os.replace(tmp_path, path)
+
+
+def rollup_rows(path: Path) -> int:
+    """Number of logs counted by a rollup file."""
+    return (
+        pl.scan_parquet(path)
+        .filter(pl.col("resolution") == "day")
+        .select(pl.col("count").sum())
+        .collect()
+        .item()
+        or 0
+    )
+
+
+def choose_resolution(since: Optional[datetime], until: Optional[datetime], max_points: int = 1000) -> str:
+    """Finest resolution with at most `max_points` buckets between since and until."""
+    if since is None or until is None:
+        return "day"
+    span = until - since
+    for resolution, step in RESOLUTIONS.items():
+        if span / step <= max_points:
+            return resolution
+    return "day"
+
+
+def activity(
+    rollups: pl.LazyFrame,
+    ip: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    resolution: str = "day",
+) -> pl.DataFrame:
+    """PERMIT, DENY and total connections of `ip` per bucket of `resolution`, in [since, until]."""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {tuple(RESOLUTIONS)}")
+    conditions = [pl.col("resolution") == resolution, pl.col("IPsrc") == ip]
+    if since is not None:
+        conditions.append(pl.col("bucket") >= pl.lit(since).dt.truncate(_INTERVALS[resolution]))
+    if until is not None:
+        conditions.append(pl.col("bucket") <= until)
+    series = (
+        rollups.filter(*conditions)
+        .group_by("bucket")
+        .agg(
+            *[
+                pl.col("count").filter(pl.col("action") == action).sum().cast(pl.UInt32).alias(action)
+                for action in ("PERMIT", "DENY")
+            ],
+            pl.col("count").sum().cast(pl.UInt32).alias("total"),
+        )
+        .sort("bucket")
+    )
+    return series.collect()
@@ -0,0 +1,77 @@
+"""
+Firewall rule hit counters of the logs store, maintained at ingestion time.
+
+Every parquet file of the store gets a counters file (`rule_counters/<file
+name>` next to it) holding the number of logs per day × idRegle × action ×
+Protocole × Port_dst × origin of the source (external or internal network).
+Counters are sorted by idRegle so that the detail of one rule only reads a
+few row groups, and they are additive: the counters of the whole store are
+the sum of the counters of its files, so the rules page never scans the logs.
+"""
+import os
+from pathlib import Path
+from typing import List
+
+import polars as pl
+
+COUNTER_SCHEMA = {
+    "day": pl.Date,
+    "idRegle": pl.Int32,
+    "action": pl.Utf8,
+    "Protocole": pl.Utf8,
+    "Port_dst": pl.Int32,
+    # The source address is outside the internal networks (analytics.queries)
+    "external": pl.Boolean,
+    "count": pl.UInt32,
+}
+_KEYS = ["idRegle", "day", "action", "Protocole", "Port_dst", "external"]
+# Small row groups so the statistics on idRegle skip most of a counters file
+ROW_GROUP_SIZE = 16_384
+
+
+def counter_path(path: Path) -> Path:
+    """Counters file of a parquet file of the store."""
+    return path.parent / "rule_counters" / path.name
+
+
+def build_counters(df: pl.DataFrame) -> pl.DataFrame:
+    """Logs per rule, day, action, protocol, destination port and origin of a logs DataFrame."""
+    from analytics.queries import is_internal
+
+    sources = df["IPsrc"].unique()
+    external = pl.DataFrame({"IPsrc": sources, "external": ~is_internal(sources)})
+    return (
+        df.lazy()
+        .join(external.lazy(), on="IPsrc", how="left", nulls_equal=True)
+        .group_by(pl.col("Date").dt.date().alias("day"), "idRegle", "action", "Protocole", "Port_dst", "external")
+        .agg(pl.len().cast(pl.UInt32).alias("count"))
+        .select(list(COUNTER_SCHEMA))
+        .collect()
+    )
+
+
+def merge_counters(counters: List[pl.DataFrame]) -> pl.DataFrame:
+    """Sum the counters of several batches."""
+    if not counters:
+        return pl.DataFrame(schema=COUNTER_SCHEMA)
+    return (
+        pl.concat(counters)
+        .group_by(_KEYS)
+        .agg(pl.col("count").sum().cast(pl.UInt32))
+        .select(list(COUNTER_SCHEMA))
+    )
+
+
+def write_counters(counters: pl.DataFrame, path: Path):
+    """Write the counters of a parquet file atomically, sorted for idRegle pushdown."""
+    path.parent.mkdir(exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    counters.sort(_KEYS, nulls_last=True).write_parquet(
+        tmp_path, row_group_size=ROW_GROUP_SIZE, statistics=True
+    )
+    os.replace(tmp_path, path)
+
+
+def counter_rows(path: Path) -> int:
+    """Number of logs counted by a counters file."""
+    return pl.scan_parquet(path).select(pl.col("count").sum()).collect().item() or 0
@@ -0,0 +1,303 @@
+"""
+Mergeable sketches of the logs store, maintained at ingestion time.
+
+Every parquet part gets a small sidecar file (`<part>.sketch.npz`) holding a
+LogSketch of its rows. Sketches of several parts merge into the sketch of
+the whole store without reading the logs again, which gives approximate
+heavy hitters and distinct counts in constant time whatever the size of the
+store:
+
+- HyperLogLog: distinct sources, destinations and destination ports of the
+  store, and distinct destinations / ports of each tracked source.
+  Relative standard error 1.04 / sqrt(2 ** p).
+- SpaceSaving: top-K sources (all, permitted, denied), destinations and
+  destination ports with per-item error bounds. Counts are upper bounds:
+  the true count of an item lies in [count - error, count], and an item
+  that is not tracked occurred at most `bound` times.
+
+Hashes come from polars' Series.hash, which is only stable within a polars
+version: sketches record the version they were built with, and sidecars
+built by another version are rebuilt from their part (see LogStore.sketch).
+"""
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import polars as pl
+
+FORMAT_VERSION = 1
+HASH_SEED = 0x5EC7
+# Precision of the store-wide HyperLogLogs (16 KiB each, ~0.8% error)
+GLOBAL_PRECISION = 14
+# Precision of the per-source HyperLogLogs (256 B each, ~6.5% error)
+SOURCE_PRECISION = 8
+# Items tracked by the top-K summaries
+CAPACITY = 1000
+# Exact counts of the small categorical columns
+CATEGORY_CAPACITY = 64
+
+# Summary name -> (column, row filter)
+SUMMARIES = {
+    "sources": ("IPsrc", None),
+    "sources.PERMIT": ("IPsrc", pl.col("action") == "PERMIT"),
+    "sources.DENY": ("IPsrc", pl.col("action") == "DENY"),
+    "destinations": ("IPdst", None),
+    "ports": ("Port_dst", None),
+    # At most 1024 distinct values: exact
+    "well_known_ports": ("Port_dst", (pl.col("action") == "PERMIT") & (pl.col("Port_dst") < 1024)),
+    "actions": ("action", None),
+    "protocols": ("Protocole", None),
+}
+# Items kept by each summary (CAPACITY by default)
+CAPACITIES = {"well_known_ports": 1024, "actions": CATEGORY_CAPACITY, "protocols": CATEGORY_CAPACITY}
+# Summaries of integer columns (the others hold strings)
+INTEGER_SUMMARIES = {"ports", "well_known_ports"}
+# Store-wide distinct counts
+DISTINCT = {"sources": "IPsrc", "destinations": "IPdst", "ports": "Port_dst"}
+# Distinct counts per tracked source
+PER_SOURCE = {"destinations": "IPdst", "ports": "Port_dst"}
+
+
+def relative_error(precision: int) -> float:
+    """Relative standard error of a HyperLogLog with 2 ** precision registers."""
+    return 1.04 / np.sqrt(1 << precision)
+
+
+def hash_values(values: pl.Series) -> np.ndarray:
+    """64-bit hashes of a column, nulls excluded."""
+    return values.drop_nulls().hash(seed=HASH_SEED).to_numpy()
+
+
+def _rank(hashes: np.ndarray, precision: int):
+    """Register index and rank (position of the first 1 bit) of each hash."""
+    index = (hashes >> np.uint64(64 - precision)).astype(np.intp)
+    rest = hashes << np.uint64(precision)
+    # frexp gives the bit length of the remaining bits (0 for 0)
+    _, bit_length = np.frexp(rest.astype(np.float64))
+    rank = np.where(rest == 0, 64 - precision + 1, 65 - bit_length)
+    return index, rank.astype(np.uint8)
+
+
+def _estimate(registers: np.ndarray) -> np.ndarray:
+    """HyperLogLog cardinality estimate of each row of registers (last axis)."""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[-1]
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=-1)
+    zeros = np.count_nonzero(registers == 0, axis=-1)
+    # Small range correction: linear counting
+    with np.errstate(divide="ignore"):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter over 64-bit hashes."""
+
+    def __init__(self, precision: int = GLOBAL_PRECISION, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+
+    @property
+    def relative_error(self) -> float:
+        return relative_error(self.precision)
+
+    def add_hashes(self, hashes: np.ndarray):
+        index, rank = _rank(hashes, self.precision)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> float:
+        return float(_estimate(self.registers)[0])
+
+
+@dataclass
+class SpaceSaving:
+    """
+    Mergeable top-K summary (the count-based summary of Space-Saving /
+    Misra-Gries, merged as in Agarwal et al., "Mergeable summaries").
+    Batches are counted exactly then folded in, so it is fed with whole
+    DataFrames rather than one item at a time.
+    """
+
+    capacity: int = CAPACITY
+    counts: Dict[object, int] = field(default_factory=dict)
+    errors: Dict[object, int] = field(default_factory=dict)
+    # Upper bound of the count of any item that is not tracked
+    bound: int = 0
+
+    @classmethod
+    def from_counts(cls, items: Iterable, counts: Iterable[int], capacity: int = CAPACITY) -> "SpaceSaving":
+        summary = cls(capacity)
+        summary.counts = dict(zip(items, (int(count) for count in counts)))
+        summary.errors = dict.fromkeys(summary.counts, 0)
+        summary._truncate()
+        return summary
+
+    def _truncate(self):
+        if len(self.counts) <= self.capacity:
+            return
+        ranked = sorted(self.counts, key=lambda item: (-self.counts[item], item))
+        kept, dropped = ranked[: self.capacity], ranked[self.capacity:]
+        self.bound = max(self.bound, self.counts[dropped[0]])
+        self.counts = {item: self.counts[item] for item in kept}
+        self.errors = {item: self.errors[item] for item in kept}
+
+    def merge(self, other: "SpaceSaving"):
+        # An item missing from one side occurred there at most `bound` times
+        for item in self.counts.keys() - other.counts.keys():
+            self.counts[item] += other.bound
+            self.errors[item] += other.bound
+        for item, count in other.counts.items():
+            if item in self.counts:
+                self.counts[item] += count
+                self.errors[item] += other.errors[item]
+            else:
+                self.counts[item] = count + self.bound
+                self.errors[item] = other.errors[item] + self.bound
+        self.bound += other.bound
+        self._truncate()
+
+    def top(self, k: Optional[int] = None) -> List[tuple]:
+        """(item, count, error) of the k most frequent items."""
+        ranked = sorted(self.counts, key=lambda item: (-self.counts[item], item))[:k]
+        return [(item, self.counts[item], self.errors[item]) for item in ranked]
+
+    def get(self, item) -> tuple:
+        """(count, error) of an item; (bound, bound) when it is not tracked."""
+        if item in self.counts:
+            return self.counts[item], self.errors[item]
+        return self.bound, self.bound
+
+
+class LogSketch:
+    """Sketch of a set of logs: row count, top-K summaries and distinct counters."""
+
+    def __init__(self):
+        self.rows = 0
+        self.polars_version = pl.__version__
+        self.summaries = {name: SpaceSaving(CAPACITIES.get(name, CAPACITY)) for name in SUMMARIES}
+        self.distinct = {name: HyperLogLog(GLOBAL_PRECISION) for name in DISTINCT}
+        # Registers of the sources tracked by summaries["sources"], in the order of `tracked`
+        self.tracked: List[str] = []
+        self.per_source = {name: np.zeros((0, 1 << SOURCE_PRECISION), dtype=np.uint8) for name in PER_SOURCE}
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame) -> "LogSketch":
+        sketch = cls()
+        sketch.rows = df.height
+        if not df.height:
+            return sketch
+        for name, (column, condition) in SUMMARIES.items():
+            rows = df if condition is None else df.filter(condition)
+            capacity = sketch.summaries[name].capacity
+            # Truncated in polars: only the tracked items reach Python
+            counts = rows[column].drop_nulls().value_counts().top_k(capacity + 1, by="count")
+            summary = SpaceSaving.from_counts(counts[column].to_list(), counts["count"].to_list(), capacity)
+            sketch.summaries[name] = summary
+        for name, column in DISTINCT.items():
+            sketch.distinct[name].add_hashes(hash_values(df[column]))
+
+        sketch.tracked = list(sketch.summaries["sources"].counts)
+        rows = df.select("IPsrc", *PER_SOURCE.values()).join(
+            pl.DataFrame({"IPsrc": sketch.tracked, "_source": range(len(sketch.tracked))},
+                         schema={"IPsrc": df.schema["IPsrc"], "_source": pl.Int64}),
+            on="IPsrc",
+        )
+        for name, column in PER_SOURCE.items():
+            values = rows.drop_nulls(column)
+            registers = np.zeros((len(sketch.tracked), 1 << SOURCE_PRECISION), dtype=np.uint8)
+            index, rank = _rank(values[column].hash(seed=HASH_SEED).to_numpy(), SOURCE_PRECISION)
+            np.maximum.at(registers, (values["_source"].to_numpy(), index), rank)
+            sketch.per_source[name] = registers
+        return sketch
+
+    def merge(self, other: "LogSketch") -> "LogSketch":
+        """Merge another sketch into this one (both must come from the same polars version)."""
+        previous = {name: dict(zip(self.tracked, registers)) for name, registers in self.per_source.items()}
+        self.rows += other.rows
+        for name, summary in self.summaries.items():
+            summary.merge(other.summaries[name])
+        for name, counter in self.distinct.items():
+            counter.merge(other.distinct[name])
+        # Per-source registers follow the merged top sources
+        self.tracked = list(self.summaries["sources"].counts)
+        position = {source: i for i, source in enumerate(self.tracked)}
+        for name in PER_SOURCE:
+            registers = np.zeros((len(self.tracked), 1 << SOURCE_PRECISION), dtype=np.uint8)
+            for source, row in previous[name].items():
+                if source in position:
+                    registers[position[source]] = row
+            for source, row in zip(other.tracked, other.per_source[name]):
+                if source in position:
+                    np.maximum(registers[position[source]], row, out=registers[position[source]])
+            self.per_source[name] = registers
+        return self
+
+    def distinct_per_source(self, name: str) -> Dict[str, float]:
+        """
+        Estimated distinct destinations ("destinations") or ports ("ports") of
+        each tracked source. A lower bound for sources that were not tracked
+        in every merged part.
+        """
+        if not self.tracked:
+            return {}
+        return dict(zip(self.tracked, _estimate(self.per_source[name]).tolist()))
+
+    # Persistence
+
+    def save(self, path: Path):
+        """Write the sketch atomically (npz, no pickle)."""
+        arrays = {
+            "format": np.array([FORMAT_VERSION]),
+            "rows": np.array([self.rows]),
+            "polars_version": np.array([self.polars_version]),
+            "tracked": np.array(self.tracked, dtype=str),
+        }
+        for name, summary in self.summaries.items():
+            items = list(summary.counts)
+            arrays[f"summary/{name}/items"] = np.array(items, dtype=np.int64 if name in INTEGER_SUMMARIES else str)
+            arrays[f"summary/{name}/counts"] = np.array([summary.counts[item] for item in items], dtype=np.int64)
+            arrays[f"summary/{name}/errors"] = np.array([summary.errors[item] for item in items], dtype=np.int64)
+            arrays[f"summary/{name}/bound"] = np.array([summary.bound])
+        for name, counter in self.distinct.items():
+            arrays[f"distinct/{name}"] = counter.registers
+        for name, registers in self.per_source.items():
+            arrays[f"per_source/{name}"] = registers
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["LogSketch"]:
+        """Read a sketch; None if it is missing, unreadable or built by another format/polars version."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["format"][0]) != FORMAT_VERSION or str(data["polars_version"][0]) != pl.__version__:
+                    return None
+                sketch = cls()
+                sketch.rows = int(data["rows"][0])
+                sketch.tracked = data["tracked"].tolist()
+                for name, summary in sketch.summaries.items():
+                    items = data[f"summary/{name}/items"].tolist()
+                    summary.counts = dict(zip(items, data[f"summary/{name}/counts"].tolist()))
+                    summary.errors = dict(zip(items, data[f"summary/{name}/errors"].tolist()))
+                    summary.bound = int(data[f"summary/{name}/bound"][0])
+                for name in DISTINCT:
+                    sketch.distinct[name].registers = data[f"distinct/{name}"].copy()
+                for name in PER_SOURCE:
+                    sketch.per_source[name] = data[f"per_source/{name}"].copy()
+                return sketch
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def sketch_path(part: Path) -> Path:
+    """Sidecar file of a parquet file of the store."""
+    return part.with_name(f"{part.stem}.sketch.npz")
@@ -0,0 +1,138 @@
+"""
+Snapshot commits of the logs store.
+
+The content of the store is the list of parquet files named by its latest
+manifest, `_snapshots/snapshot-<version>.json`. Writers never modify a
+published file: they write new files, then commit a manifest naming the new
+file list. A manifest is written to a temporary file and published with
+os.link, which fails if the version already exists, so concurrent writers
+(threads or processes) never overwrite each other's commits: the loser
+reloads the latest snapshot, applies its change to it and retries.
+
+Readers load the latest manifest and only ever open the files it names, so
+they see whole commits (every part of a multi-firewall append, or none of a
+replaced store) and never a partially written file. Files dropped by a
+commit stay on disk for RETENTION seconds, so a reader pinned to an older
+snapshot can finish; LogStore.vacuum() then deletes them with the expired
+manifests and the files of writers that crashed before committing.
+"""
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+SNAPSHOT_DIR = "_snapshots"
+# Seconds a replaced file (or an uncommitted one) stays on disk for the readers still using it
+RETENTION = 600.0
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    A committed state of the store: its version, its parquet files and the
+    rollups kept for the logs dropped by the retention (`history`), relative
+    to the data directory.
+    """
+
+    version: int
+    files: Tuple[str, ...]
+    history: Tuple[str, ...] = ()
+
+
+def _manifest_name(version: int) -> str:
+    return f"snapshot-{version:012d}.json"
+
+
+class SnapshotLog:
+    """The manifests of a data directory: loading the latest one and committing new ones."""
+
+    def __init__(self, data_dir: Path):
+        self.directory = Path(data_dir) / SNAPSHOT_DIR
+        self._latest: Optional[Snapshot] = None
+
+    def manifests(self) -> List[Path]:
+        """Manifest files, oldest first."""
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob("snapshot-*.json"))
+
+    def latest(self) -> Optional[Snapshot]:
+        """The latest committed snapshot (None before the first commit)."""
+        manifests = self.manifests()
+        if not manifests:
+            return None
+        version = int(manifests[-1].stem.split("-", 1)[1])
+        cached = self._latest
+        if cached is None or cached.version != version:
+            cached = self._latest = self.load(manifests[-1])
+        return cached
+
+    @staticmethod
+    def load(path: Path) -> Snapshot:
+        content = json.loads(path.read_text())
+        return Snapshot(content["version"], tuple(content["files"]), tuple(content.get("history", ())))
+
+    def _publish(self, snapshot: Snapshot) -> bool:
+        """Publish the manifest of `snapshot`; False if another writer committed this version first."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / _manifest_name(snapshot.version)
+        tmp_path = self.directory / f".{path.name}.{uuid.uuid4().hex[:8]}.tmp"
+        content = {
+            "version": snapshot.version,
+            "files": list(snapshot.files),
+            "history": list(snapshot.history),
+            "committed_at": time.time(),
+        }
+        with open(tmp_path, "w") as f:
+            json.dump(content, f)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            return False
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        self._latest = snapshot
+        return True
+
+    def commit(self, update: Callable[[Snapshot], Optional[Snapshot]]) -> Tuple[Snapshot, Optional[Snapshot]]:
+        """
+        Commit the snapshot returned by `update(latest snapshot)` (its version
+        is ignored), retrying on the new latest snapshot when another writer
+        commits first. `update` may return None to give up the commit.
+        Returns the (base, committed) snapshots.
+        """
+        while True:
+            base = self.latest() or Snapshot(0, ())
+            content = update(base)
+            if content is None:
+                return base, None
+            committed = replace(content, version=base.version + 1)
+            if self._publish(committed):
+                return base, committed
+
+    def expire(self, retention: float) -> Tuple[List[Snapshot], List[Path]]:
+        """
+        Snapshots still readable (the latest, and those replaced less than
+        `retention` seconds ago), and the manifests of the expired ones.
+        """
+        manifests = self.manifests()
+        if not manifests:
+            return [], []
+        deadline = time.time() - retention
+        kept, expired = [], []
+        for manifest, successor in zip(manifests, manifests[1:] + [None]):
+            try:
+                replaced_long_ago = successor is not None and successor.stat().st_mtime < deadline
+                if replaced_long_ago:
+                    expired.append(manifest)
+                else:
+                    kept.append(self.load(manifest))
+            except FileNotFoundError:
+                # Expired by a concurrent vacuum
+                continue
+        return kept, expired
@@ -0,0 +1,66 @@
+"""
+Storage tiers of the logs store.
+
+- hot: the logs of the last HOT_DAYS days, in the files written by the
+  ingestion and the compaction (light zstd), fast to write and to scan;
+- warm: older raw logs, rewritten by the maintenance (storage.maintenance.
+  apply_tiers) with a heavier zstd level: smaller on disk, slower to write,
+  about as fast to decode;
+- cold: logs past the retention, of which only the rollups are kept
+  (LogStore.history_files(), see storage.maintenance.apply_retention).
+
+The tier of a file is recorded in its parquet footer (TIER_KEY). Queries are
+routed by their date window: LogStore.scan_window() only opens the files
+whose time range overlaps the window, so a query on recent days reads the
+hot files only, and LogStore.rollups() (activity charts) covers every tier
+including cold.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+import polars as pl
+
+from storage.core import LogStore, file_stats
+
+TIERS = ("hot", "warm", "cold")
+HOT_DAYS = 7
+# zstd level of the files of each raw tier
+COMPRESSION_LEVELS = {"hot": 1, "warm": 15}
+
+
+def warm_horizon(hot_days: int = HOT_DAYS, now: Optional[datetime] = None) -> datetime:
+    """Midnight `hot_days` days before `now`: files whose logs are all older belong to the warm tier."""
+    day = ((now or datetime.now()) - timedelta(days=hot_days)).date()
+    return datetime(day.year, day.month, day.day)
+
+
+def tier_summary(store: LogStore) -> pl.DataFrame:
+    """Files, rows, bytes and time range of each tier of the store."""
+    rows = []
+    for path in store.files():
+        stats = file_stats(path)
+        rows.append((stats.tier, 1, stats.rows, path.stat().st_size, stats.first, stats.last))
+    history = store.history_files()
+    if history:
+        days = pl.scan_parquet(history).filter(pl.col("resolution") == "day")
+        counted = days.select(
+            pl.col("count").sum().cast(pl.Int64),
+            pl.col("bucket").min().alias("first"),
+            pl.col("bucket").max().alias("last"),
+        ).collect()
+        count, first, last = counted.row(0)
+        rows.append(("cold", len(history), count, sum(path.stat().st_size for path in history), first, last))
+    schema = {
+        "tier": pl.Utf8,
+        "files": pl.Int64,
+        "rows": pl.Int64,
+        "bytes": pl.Int64,
+        "first": pl.Datetime("us"),
+        "last": pl.Datetime("us"),
+    }
+    files = pl.DataFrame(rows, schema=schema, orient="row")
+    summary = files.group_by("tier").agg(
+        pl.col("files").sum(), pl.col("rows").sum(), pl.col("bytes").sum(), pl.col("first").min(), pl.col("last").max()
+    )
+    order = pl.DataFrame({"tier": list(TIERS)})
+    return order.join(summary, on="tier", how="inner", maintain_order="left")
@@ -0,0 +1,160 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import polars as pl
+import pytest
+
+from analytics import queries
+from analytics.client import AnalyticsClient, LocalClient
+from analytics.server import AnalyticsServer
+from analytics.service import AnalyticsService, ResultCache, ServiceError
+from benchmarks.synthetic import generate_chunk
+from db import LogDatabase
+
+
+@pytest.fixture
+def service(tmp_path):
+    db = LogDatabase(data_dir=tmp_path)
+    db.append_logs(generate_chunk(3000, seed=3))
+    return AnalyticsService(db, sample_limit=2000)
+
+
+@pytest.fixture
+def server(service):
+    server = AnalyticsServer(("127.0.0.1", 0), service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_is_internal_matches_scalar_version():
+    """La version vectorisée donne le même résultat que is_internal_ip"""
+    ips = ["10.70.0.1", "159.84.255.255", "192.168.1.1", "8.8.8.8", "10.69.0.1", "not_an_ip", "", None]
+    expected = [queries.is_internal_ip(ip) if ip is not None else False for ip in ips]
+    assert queries.is_internal(pl.Series("ip", ips, dtype=pl.Utf8)).to_list() == expected
+
+
+def test_filter_flows():
+    """Filtres de protocole, d'action, de ports et de période sur des journées entières"""
+    df = generate_chunk(2000, seed=5)
+    day = df["Date"].min().date()
+    flows = queries.filter_flows(df, protocol="TCP", action="DENY", port_range=(1, 1023), port_type="dst", start=day, end=day)
+    assert flows.height > 0
+    assert set(flows["Protocole"]) == {"TCP"} and set(flows["action"]) == {"DENY"}
+    assert flows["Port_dst"].max() <= 1023
+    assert flows["Date"].dt.date().max() == day
+    assert queries.filter_flows(df).height == df.height
+    with pytest.raises(ValueError):
+        queries.filter_flows(df, port_type="x")
+
+
+def test_service_cache_follows_store_version(service):
+    """Les résultats sont mis en cache par version du store et recalculés après un ajout"""
+    first = service.call("ip_stats", {"n": "500"})
+    assert service.call("ip_stats", {"n": 500}) is first
+    assert first["total_count"].sum() == 500
+    service.db.append_logs(generate_chunk(10, seed=4))
+    assert service.call("ip_stats", {"n": 500}) is not first
+
+
+def test_ip_summary_aggregates_the_rows_of_the_source(service):
+    """Le résumé d'une IP donne les agrégats de ses lignes, sans les renvoyer"""
+    logs = service.db.logs()
+    ip = logs["IPsrc"].value_counts(sort=True)["IPsrc"][0]
+    rows = logs.filter(pl.col("IPsrc") == ip)
+    summary = service.call("ip_summary", {"ip": ip, "limit": "3"})
+    assert summary["connections"] == rows.height and summary["destinations"] == rows["IPdst"].n_unique()
+    assert summary["last"] == rows["Date"].max().isoformat()
+    assert {row["action"]: row["count"] for row in summary["actions"]} == dict(rows["action"].value_counts().iter_rows())
+    assert len(summary["top_destinations"]) == min(3, summary["destinations"])
+    assert summary["top_destinations"][0]["count"] == rows["IPdst"].value_counts()["count"].max()
+    assert service.call("ip_details", {"ip": ip, "limit": "5"})["Date"].to_list() == rows["Date"].sort(descending=True).head(5).to_list()
+
+
+def test_result_cache_is_bounded_by_size(service):
+    """Le cache de résultats évince les plus anciens au-delà de son budget en octets, partagé par les pare-feux"""
+    cache = ResultCache(max_bytes=1000)
+    small = pl.DataFrame({"x": list(range(50))})
+    for key in range(5):
+        cache.get_or_compute((key,), lambda: small)
+    assert cache.bytes <= 1000 and len(cache._entries) == 2
+    assert cache.get_or_compute(("big",), lambda: pl.DataFrame({"x": list(range(1000))})).height == 1000
+    assert ("big",) not in cache._entries
+    assert service.scoped(6).cache is service.cache
+
+
+def test_service_rejects_bad_requests(service):
+    """Endpoint ou paramètres invalides : ServiceError avec le code HTTP correspondant"""
+    with pytest.raises(ServiceError) as error:
+        service.call("nope")
+    assert error.value.status == 404
+    for params in ({"n": "abc"}, {"unknown": "1"}, {"min_port": "1"}):
+        with pytest.raises(ServiceError) as error:
+            service.call("flows", params)
+        assert error.value.status == 400
+
+
+def test_service_endpoint_errors_are_not_bad_requests(service):
+    """Une TypeError levée par l'endpoint lui-même reste une erreur serveur, pas une 400"""
+
+    def broken(n=None):
+        return None + n
+
+    service.endpoints["flows"] = broken
+    with pytest.raises(TypeError) as error:
+        service.call("flows", {"n": "10"})
+    assert not isinstance(error.value, ServiceError)
+    with pytest.raises(ServiceError):
+        service.call("flows", {"ip": "10.0.0.1"})
+
+
+def test_http_api_matches_local_client(service, server):
+    """L'API HTTP renvoie les mêmes résultats que le client local, y compris en parallèle"""
+    client = AnalyticsClient(server.url, pool_size=3)
+    local = LocalClient(service)
+    try:
+        assert client.query("info") == local.query("info")
+        assert client.query("ip_stats", n=1000).equals(local.query("ip_stats", n=1000))
+        filters = {"protocol": "TCP", "min_port": 1, "max_port": 1023, "port_type": "dst", "start": date(2025, 1, 1)}
+        assert client.query("flows", **filters).equals(local.query("flows", **filters))
+        assert client.query("flow_summary", **filters) == local.query("flow_summary", **filters)
+        ip = local.query("ip_stats")["IPsrc"][0]
+        assert client.query("ip_summary", ip=ip) == local.query("ip_summary", ip=ip)
+
+        ips = local.query("ip_stats")["IPsrc"].head(12).to_list()
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            details = list(pool.map(lambda ip: client.query("ip_details", ip=ip), ips))
+        assert [set(frame["IPsrc"]) for frame in details] == [{ip} for ip in ips]
+
+        with pytest.raises(ServiceError):
+            client.query("flows", port_type="x")
+    finally:
+        client.close()
+
+
+def test_exact_aggregates_on_the_lazy_scan(tmp_path):
+    """Les agrégats calculés en streaming sur tout le store sont identiques au calcul en mémoire"""
+    db = LogDatabase(data_dir=tmp_path)
+    for seed in range(3):
+        db.append_logs(generate_chunk(2000, chunk_index=seed, seed=11))
+    lazy, df = db.scan(), db.scan().collect()
+    assert queries.ip_stats(lazy).equals(queries.ip_stats(df))
+    assert queries.ip_stats(lazy, limit=5).equals(queries.ip_stats(df).head(5))
+    assert queries.top_ports(lazy).equals(queries.top_ports(df))
+    assert queries.flow_summary(lazy) == queries.flow_summary(df)
+    flows = queries.network_flows(lazy)
+    assert flows["count"].sum() == df.height
+    internal = queries.network_info(df).filter(pl.col("is_src_internal")).height
+    assert flows.filter(pl.col("is_src_internal"))["count"].sum() == internal
+    external = queries.external_sources(lazy, limit=None)
+    assert external["nombre_tentatives"].sum() == df.height - internal
+
+
+def test_service_exact_by_default_preview_on_demand(service):
+    """Sans n les agrégats portent sur tout le store, avec n sur un échantillon (aperçu)"""
+    assert service.call("ip_stats")["total_count"].sum() == 3000
+    assert service.call("flow_summary")["flows"] == 3000
+    assert service.call("ip_stats", {"n": 500})["total_count"].sum() == 500
+    assert service.call("flow_summary", {"n": 500})["flows"] == 500
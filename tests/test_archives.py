@@ -0,0 +1,76 @@
+import bz2
+import gzip
+import io
+import tarfile
+
+import pytest
+import zstandard
+
+from db import LogDatabase
+from ingest.archives import ingest_archive, ingest_archives, iter_log_streams
+
+LINE = "2025-02-12 10:05:02;54.174.62.181;159.84.146.99;TCP;{port};443;1;PERMIT;eth0;;6\n"
+
+
+def payload(n, offset=0):
+    return "".join(LINE.format(port=offset + i) for i in range(n)).encode()
+
+
+def add_member(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+def test_single_file_formats(tmp_path, monkeypatch):
+    """Les fichiers .gz, .bz2 et .zst sont décompressés à la volée, en parallèle"""
+    monkeypatch.chdir(tmp_path)
+    db = LogDatabase()
+    (tmp_path / "a.log.gz").write_bytes(gzip.compress(payload(30)))
+    (tmp_path / "b.log.bz2").write_bytes(bz2.compress(payload(20)))
+    (tmp_path / "c.log.zst").write_bytes(zstandard.ZstdCompressor().compress(payload(10)))
+    (tmp_path / "d.log").write_bytes(payload(5))
+
+    results = ingest_archives(
+        [tmp_path / name for name in ("a.log.gz", "b.log.bz2", "c.log.zst", "d.log")], db=db, workers=4
+    )
+
+    assert [stats.rows for stats in results] == [30, 20, 10, 5]
+    assert all(part.exists() for stats in results for part in stats.parts)
+    assert db.scan().collect().height == 65
+
+
+def test_tarball_with_compressed_members(tmp_path, monkeypatch):
+    """Un tarball de rotations quotidiennes, membres compressés ou non, donne une seule partie"""
+    monkeypatch.chdir(tmp_path)
+    db = LogDatabase()
+    archive = tmp_path / "january.tar.gz"
+    with tarfile.open(archive, "w:gz") as tar:
+        add_member(tar, "fw-01.log.gz", gzip.compress(payload(40)))
+        add_member(tar, "fw-02.log", payload(25, offset=100))
+
+    assert [name for name, _ in iter_log_streams(archive)] == ["fw-01.log.gz", "fw-02.log"]
+    stats = ingest_archive(archive, db=db, batch_bytes=512)
+    assert stats.members == 2
+    assert stats.rows == 65
+    assert len(db.parts()) == 1
+
+
+def test_uploaded_file_object(tmp_path, monkeypatch):
+    """Un fichier téléversé (objet avec un nom) est accepté comme une archive sur disque"""
+    monkeypatch.chdir(tmp_path)
+    db = LogDatabase()
+    upload = io.BytesIO(gzip.compress(payload(12)))
+    upload.name = "upload.log.gz"
+    assert ingest_archive(upload, db=db).rows == 12
+
+
+def test_failed_archive_leaves_no_part(tmp_path, monkeypatch):
+    """Une archive corrompue n'ajoute aucune partie au store"""
+    monkeypatch.chdir(tmp_path)
+    db = LogDatabase()
+    broken = tmp_path / "broken.log.gz"
+    broken.write_bytes(gzip.compress(payload(5000))[:-200])
+    with pytest.raises(EOFError):
+        ingest_archive(broken, db=db, batch_bytes=1024)
+    assert list(db.parts_dir.rglob("*")) == []
@@ -0,0 +1,51 @@
+import io
+
+from analytics.queries import is_internal_ip
+from benchmarks.run import compare
+from benchmarks.synthetic import build_store, generate_chunk, generate_logs, to_lines
+from ingest.parser import read_log_stream
+from storage.core import LOG_SCHEMA
+
+
+def test_generator_is_deterministic():
+    """La même graine produit les mêmes logs, une autre graine des logs différents"""
+    assert generate_chunk(2000, seed=1).equals(generate_chunk(2000, seed=1))
+    assert not generate_chunk(2000, seed=1).equals(generate_chunk(2000, seed=2))
+
+
+def test_generator_chunks():
+    """Les blocs respectent le schéma du store et se suivent dans le temps"""
+    chunks = list(generate_logs(2500, chunk_rows=1000))
+    assert [chunk.height for chunk in chunks] == [1000, 1000, 500]
+    for chunk in chunks:
+        assert chunk.columns == list(LOG_SCHEMA)
+        assert chunk["Date"].is_sorted()
+    assert chunks[0]["Date"].max() <= chunks[1]["Date"].min()
+    # Mélange de trafic interne et externe, refus et autorisations
+    df = chunks[0]
+    assert set(df["action"].unique()) == {"PERMIT", "DENY"}
+    internal = sum(is_internal_ip(ip) for ip in df["IPsrc"])
+    assert 0 < internal < df.height
+
+
+def test_lines_round_trip():
+    """Les lignes brutes générées sont relues à l'identique par le parseur"""
+    df = generate_chunk(500)
+    parsed = read_log_stream(io.BytesIO(to_lines(df)))
+    assert parsed.equals(df)
+
+
+def test_build_store_is_reused(tmp_path):
+    """Le store généré est réutilisé tel quel lors d'un second appel"""
+    db = build_store(1500, tmp_path, chunk_rows=1000)
+    version = db.get_store_version()
+    assert db.count() == 1500
+    assert build_store(1500, tmp_path, chunk_rows=1000).get_store_version() == version
+
+
+def test_compare_flags_regressions():
+    """Un scénario plus lent que le seuil par rapport au run précédent est signalé"""
+    history = [{"scenario": "a", "rows": 10, "status": "ok", "seconds": 1.0, "commit": "abc"}]
+    lines = compare([{"scenario": "a", "rows": 10, "status": "ok", "seconds": 1.5}], history)
+    assert len(lines) == 1 and "REGRESSION" in lines[0]
+    assert compare([{"scenario": "b", "rows": 10, "status": "ok", "seconds": 1.5}], history) == []
@@ -0,0 +1,91 @@
+from datetime import date
+
+import numpy as np
+import polars as pl
+import pytest
+
+from analytics import queries
+from analytics.service import AnalyticsService
+from benchmarks.synthetic import generate_chunk
+from storage.bitmaps import Bitmap, BitmapIndex, bitmap_path, file_index, merge_bitmaps, row_group_runs, scan_rows
+from storage.core import LOG_SCHEMA, LogStore, to_logs
+
+ORDER = list(LOG_SCHEMA)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LogStore(data_dir=tmp_path)
+    for day in range(3):
+        store.append_logs(generate_chunk(3000, chunk_index=day, seed=day))
+    with store.open_part_writer() as writer:
+        for batch in range(3):
+            writer.write(generate_chunk(2000, chunk_index=3, seed=10 + batch))
+    return store
+
+
+def test_bitmap_operations_match_sets():
+    """Conteneurs tableaux et bitsets : ET, OU et cardinalités identiques à des ensembles"""
+    rng = np.random.default_rng(1)
+    # Un bloc dense (bitset) et des lignes éparses (tableau) dans d'autres blocs
+    a = np.unique(np.concatenate([rng.integers(0, 65_536, 20_000), rng.integers(65_536, 400_000, 3000)]))
+    b = np.unique(rng.integers(0, 400_000, 30_000))
+    first, second = Bitmap.from_rows(a), Bitmap.from_rows(b)
+    assert first.containers[0].dtype == np.uint64 and first.containers[2].dtype == np.uint16
+    assert np.array_equal(first.rows(), a) and len(first) == len(a)
+    assert np.array_equal((first & second).rows(), np.intersect1d(a, b))
+    assert np.array_equal((first | second).rows(), np.union1d(a, b))
+    assert first.intersects(int(a[-1]), int(a[-1]) + 1) and not Bitmap.from_rows(b[b < 1000]).intersects(1000, 400_000)
+
+
+def test_index_of_batches_is_the_index_of_the_file(tmp_path):
+    """L'index fusionné des lots, sauvegardé puis relu, est celui du fichier entier"""
+    batches = [to_logs(generate_chunk(40_000, chunk_index=i, seed=i)) for i in range(3)]
+    expected = BitmapIndex.from_frame(pl.concat(batches))
+    merged = merge_bitmaps([BitmapIndex.from_frame(batch) for batch in batches])
+    merged.save(tmp_path / "index.npz")
+    loaded = BitmapIndex.load(tmp_path / "index.npz")
+    assert loaded.rows == expected.rows == 120_000
+    for predicates in ({"action": ["DENY"]}, {"Protocole": ["UDP"], "Port_dst": range(0, 1024)}):
+        assert np.array_equal(loaded.match(predicates).rows(), expected.match(predicates).rows())
+    assert len(loaded.lookup("Port_dst", ["80"])) == 0
+
+
+def test_filters_are_answered_by_the_bitmaps(store):
+    """Les filtres multi-colonnes et les comptages donnent les résultats d'un filtre polars"""
+    logs = store.logs()
+    for predicates in (
+        {"action": ["DENY"], "Protocole": ["UDP"], "Port_dst": [53]},
+        {"action": ["PERMIT"], "Port_dst": range(0, 1024), "IPsrc": set(logs["IPsrc"].head(50))},
+        {"interface_entrée": ["eth1"]},
+    ):
+        expected = logs.filter(*[pl.col(column).is_in(list(values)) for column, values in predicates.items()])
+        assert store.filter_logs(predicates).collect().sort(ORDER).equals(expected.sort(ORDER))
+        assert store.count_logs(predicates) == expected.height
+    assert all(bitmap_path(path).exists() for path in store.parts())
+
+
+def test_only_row_groups_with_matches_are_read(tmp_path):
+    """Seuls les groupes de lignes contenant des correspondances sont décodés"""
+    # Port 8443 dans le troisième groupe de lignes seulement
+    port = pl.when(pl.int_range(pl.len()) // 1000 == 2).then(8443).otherwise(80).cast(pl.Int32)
+    logs = to_logs(generate_chunk(4000, seed=5)).with_columns(port.alias("Port_dst"))
+    path = tmp_path / "part-0.parquet"
+    logs.write_parquet(path, row_group_size=1000)
+    # Fichier sans index (écrit avant les index bitmap) : l'index est reconstruit
+    bitmap = file_index(path).lookup("Port_dst", [8443])
+    assert bitmap_path(path).exists() and len(bitmap) == 1000
+    assert row_group_runs(path, bitmap) == [(2000, 3000)]
+    assert scan_rows(path, file_index(path).lookup("Port_dst", [22]), []) is None
+    # Un index qui n'écarte aucun groupe de lignes : lecture simple du fichier
+    everywhere = scan_rows(path, file_index(path).lookup("Port_dst", [80]) | bitmap, [])
+    assert "SLICE" not in everywhere.explain() and everywhere.collect().equals(logs)
+
+
+def test_flow_summary_with_indexed_filters(store):
+    """Le résumé des flux filtré via les index est celui du filtre direct"""
+    service = AnalyticsService(store)
+    params = {"protocol": "TCP", "action": "DENY", "min_port": 0, "max_port": 1023, "port_type": "dst"}
+    summary = service.call("flow_summary", {**params, "start": date(2025, 1, 2)})
+    logs = queries.filter_flows(store.logs(), "TCP", "DENY", (0, 1023), "dst", date(2025, 1, 2), None)
+    assert summary == queries.flow_summary(logs)
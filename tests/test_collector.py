@@ -0,0 +1,83 @@
+import asyncio
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from db import LogDatabase
+from ingest.collector import Collector, FileSource, GzDirectorySource, SocketSource
+
+LINE = "2025-02-12 10:05:{second:02d};54.174.62.181;159.84.146.99;TCP;{port};443;1;PERMIT;eth0;;6\n"
+
+
+def make_lines(n, offset=0):
+    return [LINE.format(second=i % 60, port=offset + i) for i in range(n)]
+
+
+def test_collector_reads_all_sources(tmp_path, monkeypatch):
+    """Fichier, répertoire .gz et socket sont collectés en parallèle, dans l'ordre par source"""
+    monkeypatch.chdir(tmp_path)
+    db = LogDatabase()
+
+    log_file = tmp_path / "fw1.log"
+    log_file.write_text("".join(make_lines(120, offset=1000)))
+    gz_dir = tmp_path / "fw2"
+    gz_dir.mkdir()
+    for day in range(3):
+        with gzip.open(gz_dir / f"fw2-{day}.log.gz", "wt") as f:
+            f.writelines(make_lines(50, offset=2000 + day * 50))
+
+    socket_source = SocketSource("127.0.0.1", 0, chunk_lines=10, idle_timeout=2)
+
+    async def send_lines():
+        await socket_source.ready.wait()
+        _, writer = await asyncio.open_connection("127.0.0.1", socket_source.port)
+        writer.writelines(line.encode() for line in make_lines(30, offset=3000))
+        await writer.drain()
+        writer.close()
+        await asyncio.sleep(0.1)
+        socket_source.stop()
+
+    sources = [
+        FileSource(log_file, chunk_lines=25),
+        GzDirectorySource(gz_dir, chunk_lines=20),
+        socket_source,
+    ]
+    collector = Collector(sources, db=db, pool=ThreadPoolExecutor(2), max_pending=2, batch_rows=40)
+
+    async def scenario():
+        _, stats = await asyncio.gather(send_lines(), collector.run())
+        return stats
+
+    stats = asyncio.run(scenario())
+
+    assert stats["file:" + str(log_file)]["rows"] == 120
+    assert stats["gzdir:" + str(gz_dir)]["rows"] == 150
+    assert stats[socket_source.name]["rows"] == 30
+    assert all(source["rows_per_second"] > 0 for source in stats.values())
+
+    stored = db.scan().collect()
+    assert stored.height == collector.rows_written == 300
+    # L'ordre des lignes de chaque source est conservé
+    for low, high in [(1000, 1120), (2000, 2150), (3000, 3030)]:
+        ports = stored.filter((stored["Port_src"] >= low) & (stored["Port_src"] < high))["Port_src"].to_list()
+        assert ports == list(range(low, high))
+
+
+class FailingStore:
+    def append_logs(self, df):
+        raise OSError("disque plein")
+
+
+def test_collector_fails_when_the_sink_fails(tmp_path):
+    """Une écriture en échec arrête la collecte : les lecteurs bloqués sur la file sont annulés"""
+    log_file = tmp_path / "fw1.log"
+    log_file.write_text("".join(make_lines(200)))
+    # Sans données, la socket attendrait une minute avant de s'arrêter
+    socket_source = SocketSource("127.0.0.1", 0, idle_timeout=60)
+    sources = [FileSource(log_file, chunk_lines=10), socket_source]
+    collector = Collector(sources, db=FailingStore(), pool=ThreadPoolExecutor(2), max_pending=1, batch_rows=10)
+
+    with pytest.raises(OSError, match="disque plein"):
+        asyncio.run(asyncio.wait_for(collector.run(), timeout=20))
+    assert collector.rows_written == 0
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import polars as pl
+import pytest
+
+from analytics.detection import DetectionEngine, Rule
+from analytics.service import AnalyticsService, ServiceError
+from benchmarks.synthetic import generate_chunk
+from storage.alerts import AlertStore
+from storage.core import LOG_SCHEMA, LogStore
+
+T0 = datetime(2025, 1, 1)
+RULES = [
+    Rule("port_scan", "ports", threshold=5, window=timedelta(seconds=10), key="Port_dst"),
+    Rule(
+        "brute_force",
+        "refus SSH",
+        threshold=4,
+        window=timedelta(seconds=10),
+        condition=(pl.col("action") == "DENY") & (pl.col("Port_dst") == 22),
+    ),
+]
+
+
+def logs(events):
+    """(secondes après T0, IPsrc, Port_dst, action) -> logs du store"""
+    rows = [
+        {
+            "Date": T0 + timedelta(seconds=seconds),
+            "IPsrc": ip,
+            "IPdst": "10.0.0.1",
+            "Protocole": "TCP",
+            "Port_src": 40000,
+            "Port_dst": port,
+            "idRegle": 1,
+            "action": action,
+            "interface_entrée": "eth0",
+            "interface_sortie": None,
+            "firewall": None,
+        }
+        for seconds, ip, port, action in events
+    ]
+    return pl.DataFrame(rows).select([pl.col(name).cast(dtype) for name, dtype in LOG_SCHEMA.items()])
+
+
+def naive_windows(df, rule):
+    """Valeur de la règle dans la fenêtre (t - window, t] à chaque événement, par balayage direct"""
+    if rule.condition is not None:
+        df = df.filter(rule.condition)
+    values = []
+    for ip, date in df.select("IPsrc", "Date").iter_rows():
+        window = df.filter((pl.col("IPsrc") == ip) & (pl.col("Date") > date - rule.window) & (pl.col("Date") <= date))
+        values.append(window[rule.key].n_unique() if rule.key else window.height)
+    return df.with_columns(pl.Series("value", values))
+
+
+def expected_sources(df, rule):
+    return set(naive_windows(df, rule).filter(pl.col("value") >= rule.threshold)["IPsrc"])
+
+
+@pytest.fixture
+def events():
+    scan = [(i * 1.5, "1.1.1.1", 1000 + i, "DENY") for i in range(8)]
+    slow_scan = [(i * 4, "2.2.2.2", 2000 + i, "DENY") for i in range(8)]
+    repeated_port = [(i, "3.3.3.3", 80, "PERMIT") for i in range(20)]
+    brute = [(30 + i * 2, "4.4.4.4", 22, "DENY") for i in range(6)]
+    return logs(sorted(scan + slow_scan + repeated_port + brute))
+
+
+def test_alerts_match_a_naive_sliding_window(events):
+    """Les sources en alerte sont celles qui dépassent le seuil dans une fenêtre glissante"""
+    alerts = DetectionEngine(rules=RULES).process(events)
+    for rule in RULES:
+        raised = set(alerts.filter(pl.col("rule") == rule.name)["IPsrc"])
+        assert raised == expected_sources(events, rule)
+    assert set(alerts["IPsrc"]) == {"1.1.1.1", "4.4.4.4"}
+    # Une alerte par épisode, pas une par événement au-dessus du seuil
+    assert alerts.height == 2
+
+
+def test_batches_give_the_same_alerts_as_one_batch(events):
+    """Découper le flux en lots ne change ni les sources ni les fenêtres des alertes"""
+    whole = DetectionEngine(rules=RULES).process(events)
+    engine = DetectionEngine(rules=RULES)
+    batched = pl.concat([engine.process(batch) for batch in events.iter_slices(3)])
+    columns = ["rule", "IPsrc", "start"]
+    assert batched.select(columns).sort(columns).equals(whole.select(columns).sort(columns))
+
+
+def test_state_is_bounded_by_the_window_and_the_threshold():
+    """Entre deux lots, l'état ne garde que la fenêtre récente, au plus `threshold` clés par source"""
+    engine = DetectionEngine(rules=RULES)
+    engine.process(logs([(i * 0.01, "1.1.1.1", i, "DENY") for i in range(1000)]))
+    assert engine.state["port_scan"].height == 5
+    engine.process(logs([(3600, "5.5.5.5", 80, "PERMIT")]))
+    assert engine.state_rows() == 1
+    assert all(episodes.height == 0 for episodes in engine.episodes.values())
+
+
+def test_alerts_are_stored_and_served(tmp_path):
+    """Les alertes de l'historique sont écrites dans la table lue par le service"""
+    store = LogStore(data_dir=tmp_path)
+    store.append_logs(generate_chunk(20_000, seed=1))
+    engine = DetectionEngine(AlertStore(tmp_path))
+    raised = engine.scan_store(store)
+    assert raised > 0 and engine.events == 20_000
+
+    service = AnalyticsService(store)
+    alerts = service.call("alerts", {"limit": "1000"})
+    assert alerts.height == raised
+    assert alerts["start"].is_sorted(descending=True)
+    scans = service.call("alerts", {"rule": "port_scan"})
+    assert set(scans["rule"]) <= {"port_scan"}
+    assert service.call("detection_rules").height == 3
+    with pytest.raises(ServiceError):
+        service.call("alerts", {"rule": "unknown"})
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+import polars as pl
+import pytest
+
+from analytics.filters import FilterEngine, Filters, narrows
+from benchmarks.synthetic import START, generate_chunk
+
+
+@pytest.fixture
+def logs():
+    return pl.concat([generate_chunk(2000, chunk_index=day, seed=day) for day in range(3)])
+
+
+def test_filters_match_the_filtered_frame(logs):
+    """Les filtres composés en une expression donnent le même résultat que des filtres successifs"""
+    engine = FilterEngine(logs, "v1")
+    assert engine.options("action") == ["DENY", "PERMIT"]
+    start, end = START + timedelta(days=1), START + timedelta(days=2)
+    result = engine.apply(Filters(action="DENY", protocol="TCP", start=start, end=end))
+    expected = logs.filter(pl.col("action") == "DENY").filter(pl.col("Protocole") == "TCP")
+    assert result.equals(expected.filter((pl.col("Date") >= start) & (pl.col("Date") <= end)))
+    assert engine.apply(Filters()).equals(logs)
+
+
+def test_narrowed_filters_reuse_the_previous_result(logs):
+    """Un filtre resserré repart du résultat précédent, un filtre élargi de tout le jeu de données"""
+    engine = FilterEngine(logs)
+    denied = engine.apply(Filters(action="DENY"))
+    port = denied["Port_dst"][0]
+    narrowed = engine.apply(Filters(action="DENY", port_dst=port, start=START + timedelta(days=1)))
+    assert engine.scanned_rows == denied.height
+    expected = logs.filter((pl.col("action") == "DENY") & (pl.col("Port_dst") == port) & (pl.col("Date") >= START + timedelta(days=1)))
+    assert narrowed.equals(expected)
+    engine.apply(Filters(action="PERMIT"))
+    assert engine.scanned_rows == logs.height
+    engine.apply(Filters(action="PERMIT"))
+    assert engine.scanned_rows == 0
+
+
+def test_narrows():
+    """Seuls l'ajout d'un filtre et le resserrement de la plage de dates resserrent"""
+    day = START + timedelta(days=1)
+    assert narrows(Filters(action="DENY"), Filters())
+    assert narrows(Filters(start=day, end=day), Filters(start=START))
+    assert not narrows(Filters(), Filters(action="DENY"))
+    assert not narrows(Filters(action="PERMIT"), Filters(action="DENY"))
+    assert not narrows(Filters(start=START), Filters(start=day))
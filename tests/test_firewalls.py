@@ -0,0 +1,68 @@
+import polars as pl
+import pytest
+
+from analytics.service import AnalyticsService, ServiceError
+from benchmarks.synthetic import generate_chunk
+from storage.core import LOG_SCHEMA, LogStore
+from storage.rollups import rollup_path
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LogStore(data_dir=tmp_path)
+    store.append_logs(generate_chunk(20_000, seed=1))
+    store.append_logs(generate_chunk(500, seed=2).with_columns(pl.lit(None, dtype=pl.Int32).alias("firewall")))
+    return store
+
+
+def test_parts_are_partitioned_by_firewall(store):
+    """Chaque pare-feu a son répertoire firewall=<id>, les logs sans pare-feu restent à la racine"""
+    logs = store.logs()
+    firewalls = sorted(logs["firewall"].drop_nulls().unique().to_list())
+    assert store.firewalls() == firewalls
+    for firewall in firewalls:
+        parts = store.partition(firewall).parts()
+        assert parts and all(part.parent.name == f"firewall={firewall}" for part in parts)
+        assert all(rollup_path(part).exists() for part in parts)
+    assert len(list(store.parts_dir.glob("part-*.parquet"))) == 1
+    assert store.count() == 20_500
+
+
+def test_scoped_store_matches_a_filter(store):
+    """Un store restreint à un pare-feu lit, compte et agrège seulement sa partition"""
+    logs = store.logs()
+    firewall = store.firewalls()[0]
+    scoped = store.partition(firewall)
+    expected = logs.filter(pl.col("firewall") == firewall)
+    assert scoped.count() == expected.height
+    assert scoped.logs().sort(list(LOG_SCHEMA)).equals(expected.sort(list(LOG_SCHEMA)))
+    days = scoped.rollups().filter(pl.col("resolution") == "day")
+    assert days.select(pl.col("count").sum()).collect().item() == expected.height
+    assert scoped.sketch().rows == expected.height
+    assert scoped.get_store_version() != store.get_store_version()
+
+
+def test_legacy_files_without_firewall_column(tmp_path):
+    """Les fichiers écrits avant la colonne firewall se lisent comme des logs sans pare-feu"""
+    store = LogStore(data_dir=tmp_path)
+    generate_chunk(300, seed=3).drop("firewall").write_parquet(store.logs_file)
+    store.append_logs(generate_chunk(200, seed=4))
+    logs = store.logs()
+    assert logs.columns == list(LOG_SCHEMA) and logs.height == 500
+    assert logs["firewall"].null_count() == 300
+
+
+def test_service_answers_per_firewall(store):
+    """Le paramètre firewall restreint n'importe quel endpoint à la partition du pare-feu"""
+    service = AnalyticsService(store)
+    devices = service.call("firewalls")
+    assert devices["rows"].sum() == store.count()
+    assert devices["firewall"].null_count() == 1
+    firewall = store.firewalls()[0]
+    rows = devices.filter(pl.col("firewall") == firewall)["rows"].item()
+    assert service.call("info", {"firewall": str(firewall)})["rows"] == rows
+    ports = service.call("top_ports", {"firewall": firewall})
+    assert ports.equals(AnalyticsService(store.partition(firewall)).call("top_ports"))
+    assert service.call("info")["rows"] == store.count()
+    with pytest.raises(ServiceError):
+        service.scoped(firewall).call("info", {"firewall": firewall + 1})
@@ -0,0 +1,88 @@
+import polars as pl
+import pytest
+
+from analytics.graph import ConnectionGraph
+from analytics.service import AnalyticsService, ServiceError
+from benchmarks.synthetic import generate_chunk
+from storage.core import LogStore
+from storage.edges import EDGE_PORTS, build_edges, edge_path, merge_edges
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LogStore(data_dir=tmp_path)
+    store.append_logs(generate_chunk(20_000, seed=1))
+    with store.open_part_writer() as writer:
+        writer.write(generate_chunk(5000, chunk_index=1, seed=2))
+        writer.write(generate_chunk(5000, chunk_index=2, seed=3))
+    return store
+
+
+def test_merged_edges_equal_the_edges_of_all_logs(store):
+    """Les arêtes fusionnées des fichiers sont celles calculées sur tous les logs, ports compris"""
+    logs = store.logs()
+    expected = build_edges(logs).sort(["IPsrc", "IPdst"])
+    assert store.edges().sort(["IPsrc", "IPdst"]).equals(expected)
+    ports = logs.group_by("IPsrc", "IPdst").agg(pl.col("Port_dst").unique().sort().head(EDGE_PORTS)).sort(["IPsrc", "IPdst"])
+    assert expected["ports"].equals(ports["Port_dst"].alias("ports"))
+    halves = [build_edges(half) for half in logs.iter_slices(logs.height // 2 + 1)]
+    assert merge_edges(halves).sort(["IPsrc", "IPdst"]).equals(expected)
+
+
+def test_edges_are_merged_incrementally(store):
+    """Une partie ajoutée est fusionnée aux arêtes déjà calculées ; un fichier manquant est reconstruit"""
+    store.edges()
+    store.append_logs(generate_chunk(3000, chunk_index=3, seed=4))
+    assert store.edges()["count"].sum() == store.count()
+    part = store.parts()[0]
+    edge_path(part).unlink()
+    store.cache.clear()
+    assert store.edges()["count"].sum() == store.count() and edge_path(part).exists()
+    store.replace_logs(generate_chunk(700, seed=5))
+    assert store.edges()["count"].sum() == 700
+
+
+def test_csr_queries_match_the_logs(store):
+    """Fan-out, fan-in et degrés de l'index CSR égaux aux groupby sur les logs"""
+    logs = store.logs()
+    graph = ConnectionGraph(store.edges())
+    top = graph.top_degree("out", limit=3)
+    out_degree = logs.group_by("IPsrc").agg(pl.col("IPdst").n_unique().alias("degree")).sort("degree", descending=True)
+    assert top["out_degree"].to_list() == out_degree["degree"].head(3).to_list()
+    ip = top["ip"][0]
+    fan_out = graph.fan_out(ip)
+    expected = logs.filter(pl.col("IPsrc") == ip).group_by("IPdst").len()
+    assert dict(fan_out.select("IPdst", "count").iter_rows()) == dict(expected.iter_rows())
+    assert fan_out["count"].is_sorted(descending=True)
+    destination = fan_out["IPdst"][0]
+    fan_in = graph.fan_in(destination)
+    assert set(fan_in["IPsrc"]) == set(logs.filter(pl.col("IPdst") == destination)["IPsrc"])
+    assert graph.fan_out("203.0.113.250").is_empty()
+
+
+def test_neighborhood_is_bounded_and_follows_hops(store):
+    """Le sous-graphe respecte le nombre de sauts et le nombre maximal d'adresses"""
+    graph = ConnectionGraph(store.edges())
+    ip = graph.top_degree("both", limit=1)["ip"][0]
+    one_hop = graph.neighborhood(ip, hops=1, direction="out", max_nodes=10_000)
+    assert set(one_hop.filter(pl.col("src_hop") == 0)["IPdst"]) == set(graph.fan_out(ip)["IPdst"])
+    two_hops = graph.neighborhood(ip, hops=2, direction="both", max_nodes=50)
+    nodes = pl.concat([two_hops["IPsrc"], two_hops["IPdst"]]).unique()
+    assert nodes.len() <= 50 and ip in nodes.to_list()
+    assert two_hops.select(pl.max_horizontal("src_hop", "dst_hop")).to_series().max() <= 2
+    # Chaque arête relie deux nœuds à au plus un saut d'écart
+    assert (two_hops["src_hop"] - two_hops["dst_hop"]).abs().max() <= 1
+
+
+def test_graph_endpoints(store):
+    service = AnalyticsService(store)
+    info = service.call("graph_info")
+    assert info["edges"] == store.edges().height
+    top = service.call("graph_top", {"direction": "in", "limit": "5", "weighted": "true"})
+    assert top.height == 5 and top["in_count"].is_sorted(descending=True)
+    ip = top["ip"][0]
+    assert service.call("graph_neighbors", {"ip": ip, "direction": "in", "limit": "3"}).height == 3
+    subgraph = service.call("graph_subgraph", {"ip": ip, "hops": "2", "max_nodes": "20"})
+    assert {"src_hop", "dst_hop"} <= set(subgraph.columns)
+    with pytest.raises(ServiceError):
+        service.call("graph_subgraph", {"ip": ip, "direction": "sideways"})
@@ -0,0 +1,226 @@
+import io
+import socket
+import threading
+import time
+
+import pytest
+
+from db import LogDatabase
+from ingest.parser import ARROW_SCHEMA, iter_batches, parse_batch, parse_lines, read_log_stream
+from ingest.tail import IngestWorker, MicroBatcher, extract_record, follow_file, syslog_worker, tail_file_worker
+
+LINE = "2025-02-12 10:05:02;54.174.62.181;159.84.146.99;TCP;41584;443;1;PERMIT;eth0;;6"
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_parse_lines_drops_malformed():
+    """Les lignes mal formées sont ignorées, le 11e champ est optionnel"""
+    df = parse_lines([LINE, "", "pas;une;ligne", LINE.rsplit(";", 1)[0]])
+    assert df.height == 2
+    assert df["Port_dst"].to_list() == [443, 443]
+    assert df["interface_sortie"].null_count() == 2
+
+
+def test_parse_batch_typed_columns():
+    """Le parseur produit des colonnes Arrow typées et conserve le 11e champ"""
+    batch = parse_batch(LINE + "\n" + LINE.replace("159.84.146.99", "10.70.0.300"))
+    assert batch.schema == ARROW_SCHEMA
+    assert batch.num_rows == 1
+    row = batch.to_pylist()[0]
+    assert row["IPsrc"] == (54 << 24) + (174 << 16) + (62 << 8) + 181
+    assert row["Port_src"] == 41584
+    assert row["action"] == "PERMIT"
+    assert row["interface_sortie"] is None
+    assert row["firewall"] == 6
+
+
+def test_read_log_stream_in_small_blocks():
+    """Le découpage en blocs ne coupe aucune ligne"""
+    payload = ("\n".join([LINE] * 50) + "\n").encode()
+    batches = list(iter_batches(io.BytesIO(payload), batch_bytes=100))
+    assert sum(batch.num_rows for batch in batches) == 50
+    df = read_log_stream(io.BytesIO(payload))
+    assert df["IPsrc"].unique().to_list() == ["54.174.62.181"]
+    assert df["firewall"].to_list() == [6] * 50
+
+
+def test_micro_batcher_flushes_on_rows():
+    """Un lot est écrit dès que max_rows lignes sont en attente"""
+    batches = []
+    batcher = MicroBatcher(batches.append, max_rows=3, max_seconds=60)
+    for _ in range(7):
+        batcher.add(LINE)
+    assert [b.height for b in batches] == [3, 3]
+    batcher.flush()
+    assert batcher.stats.rows_total == 7
+    assert batcher.stats.batches_total == 3
+
+
+def test_micro_batcher_flushes_on_time():
+    """Un lot est écrit quand la plus ancienne ligne dépasse max_seconds"""
+    batches = []
+    batcher = MicroBatcher(batches.append, max_rows=1000, max_seconds=0.05)
+    batcher.add(LINE)
+    batcher.poll()
+    assert batches == []
+    time.sleep(0.06)
+    batcher.poll()
+    assert len(batches) == 1
+
+
+def test_micro_batcher_retries_a_failed_batch_after_a_back_off():
+    """Un lot dont l'écriture échoue reste en attente et est réécrit après un délai"""
+    batches = []
+
+    def sink(df):
+        if not batches:
+            batches.append(None)
+            raise OSError("disque plein")
+        batches.append(df)
+
+    batcher = MicroBatcher(sink, max_rows=1000, max_seconds=60, retry_seconds=0.05)
+    batcher.add(LINE)
+    with pytest.raises(OSError):
+        batcher.flush()
+    batcher.add(LINE)
+    # Pendant le délai, le nouveau lot attend derrière le lot en échec
+    assert batcher.flush() == 0
+    time.sleep(0.06)
+    batcher.poll()
+    assert [b.height for b in batches[1:]] == [1, 1]
+    assert batcher.stats.rows_total == 2 and batcher.stats.write_errors == 1
+
+
+def test_micro_batcher_dead_letters_batches_it_cannot_write(tmp_path, monkeypatch):
+    """Store indisponible : la mémoire reste bornée, chaque ligne n'est analysée qu'une fois, les lots finissent en lettre morte"""
+    parsed = []
+
+    def parse(lines):
+        parsed.extend(lines)
+        return parse_lines(lines)
+
+    def sink(df):
+        raise OSError("disque plein")
+
+    monkeypatch.setattr("ingest.tail.parse_lines", parse)
+    dead_letter = tmp_path / "dead" / "fw.log"
+    batcher = MicroBatcher(sink, max_rows=2, max_pending=3, max_attempts=2, retry_seconds=60, dead_letter=dead_letter)
+    lines = [LINE.replace(";6", f";{i}") for i in range(20)]
+    for line in lines:
+        try:
+            batcher.add(line)
+        except OSError:
+            pass
+        assert len(batcher._pending) <= 3
+    assert parsed == lines
+    with pytest.raises(OSError):
+        batcher.close()
+    assert dead_letter.read_text().splitlines() == lines
+    assert batcher.stats.lines_dead_lettered == 20 and batcher.stats.rows_total == 0
+
+
+def test_follow_file_handles_rotation(tmp_path):
+    """Le suivi reprend au début du nouveau fichier après une rotation"""
+    path = tmp_path / "fw.log"
+    path.write_text("ancienne\n")
+    stop = threading.Event()
+    lines = follow_file(path, stop, poll_interval=0.01)
+    assert next(lines) is None
+    with open(path, "a") as f:
+        f.write("a\nb")
+    assert [next(lines), next(lines)] == ["a", None]
+    # Écrit juste avant la rotation, dernière ligne sans fin de ligne
+    with open(path, "a") as f:
+        f.write("\nc")
+    path.rename(tmp_path / "fw.log.1")
+    path.write_text("d\n")
+    received = [line for line in (next(lines) for _ in range(6)) if line is not None]
+    assert received == ["b", "c", "d"]
+    stop.set()
+
+
+def test_follow_file_reads_multibyte_characters_written_in_two_parts(tmp_path):
+    """Un caractère UTF-8 écrit en deux fois ne fait pas croire à une troncature"""
+    path = tmp_path / "fw.log"
+    path.write_text("début\n", encoding="utf-8")
+    stop = threading.Event()
+    lines = follow_file(path, stop, from_start=True, poll_interval=0.01)
+    assert [next(lines), next(lines)] == ["début", None]
+    encoded = "après\n".encode("utf-8")
+    cut = encoded.index("è".encode("utf-8")) + 1
+    with open(path, "ab") as f:
+        f.write(encoded[:cut])
+    assert [next(lines), next(lines)] == [None, None]
+    with open(path, "ab") as f:
+        f.write(encoded[cut:])
+    received = [line for line in (next(lines) for _ in range(3)) if line is not None]
+    assert received == ["après"]
+    stop.set()
+
+
+def test_extract_record():
+    """L'en-tête syslog est retiré du message"""
+    assert extract_record(f"<134>Feb 12 10:05:02 fw1 {LINE}") == LINE
+    assert extract_record("<134>Feb 12 10:05:02 fw1 bruit") is None
+
+
+def test_tail_worker_appends_to_store(tmp_path, monkeypatch):
+    """Le worker écrit les lignes ajoutées au fichier dans le store parquet"""
+    monkeypatch.chdir(tmp_path)
+    db = LogDatabase()
+    log_file = tmp_path / "fw.log"
+    log_file.write_text(LINE + "\n")
+    worker = tail_file_worker(log_file, from_start=True, db=db, max_rows=2, max_seconds=0.1)
+    worker.start()
+    with open(log_file, "a") as f:
+        f.write(LINE + "\n" + LINE + "\n")
+    assert wait_for(lambda: worker.stats.rows_total == 3)
+    worker.stop(timeout=5)
+    assert db.scan().collect().height == 3
+    assert worker.stats.lag_seconds() > 0
+
+
+def test_worker_keeps_the_source_error_when_the_last_flush_fails(tmp_path):
+    """Si la source échoue et que l'écriture finale échoue aussi, le worker garde l'erreur de la source"""
+
+    class FailingStore:
+        data_dir = tmp_path
+
+        def append_logs(self, df):
+            raise OSError("disque plein")
+
+    def source(stop):
+        yield LINE
+        raise ValueError("fichier illisible")
+
+    worker = IngestWorker(source, db=FailingStore(), max_rows=1000, max_seconds=60, name="tail:/var/log/fw.log")
+    with pytest.raises(ValueError):
+        worker.run()
+    assert isinstance(worker.error, ValueError)
+    assert (tmp_path / "dead_letter" / "tail_var_log_fw.log.log").read_text() == LINE + "\n"
+
+
+def test_syslog_worker_udp(tmp_path, monkeypatch):
+    """Le worker syslog UDP ingère les messages reçus"""
+    monkeypatch.chdir(tmp_path)
+    db = LogDatabase()
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    worker = syslog_worker(udp_address=("127.0.0.1", port), db=db, max_rows=1000, max_seconds=0.1)
+    worker.start()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    assert wait_for(lambda: sender.sendto(f"<134>fw1 {LINE}".encode(), ("127.0.0.1", port)) and worker.stats.rows_total > 0)
+    worker.stop(timeout=5)
+    sender.close()
+    assert db.scan().collect().height == worker.stats.rows_total
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import polars as pl
+import pyarrow.parquet as pq
+import pytest
+
+from benchmarks.synthetic import generate_chunk
+from storage.core import LOG_SCHEMA, LogStore
+from storage.maintenance import _commit_rewrite, apply_retention, compact, run_maintenance, write_compacted
+
+ORDER = list(LOG_SCHEMA)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LogStore(data_dir=tmp_path / "data")
+    for day in range(3):
+        for batch in range(4):
+            store.append_logs(generate_chunk(600, chunk_index=day, seed=10 * day + batch))
+    return store
+
+
+def daily_activity(store):
+    return (
+        store.rollups()
+        .filter(pl.col("resolution") == "day")
+        .group_by("bucket")
+        .agg(pl.col("count").sum())
+        .sort("bucket")
+        .collect()
+    )
+
+
+def test_compaction_merges_small_files_without_changing_the_logs(store):
+    """Les petites parties de chaque pare-feu sont fusionnées en fichiers triés, sans perte"""
+    logs = store.logs().sort(ORDER)
+    activity = daily_activity(store)
+    before = len(store.parts())
+    report = compact(store, small_rows=10_000, target_rows=4000)
+    parts = store.parts()
+    assert report.compacted_files == before and len(parts) == report.written_files < before
+    assert {part.parent.name for part in parts} == {f"firewall={firewall}" for firewall in store.firewalls()}
+    assert store.logs().sort(ORDER).equals(logs)
+    assert daily_activity(store).equals(activity)
+    for part in parts:
+        assert pl.read_parquet(part)["Date"].is_sorted()
+        assert pq.ParquetFile(part).metadata.row_group(0).column(0).compression == "ZSTD"
+
+
+def test_retention_drops_old_logs_and_keeps_their_rollups(store, tmp_path):
+    """Les logs au-delà de l'horizon sont archivés puis supprimés, leurs agrégats restent"""
+    # Une partie à cheval sur l'horizon : jour 0 et jour 2
+    straddling = [generate_chunk(300, chunk_index=0, seed=7), generate_chunk(300, chunk_index=2, seed=8)]
+    store.append_logs(pl.concat(straddling))
+    logs = store.logs()
+    activity = daily_activity(store)
+    horizon = datetime(2025, 1, 2)
+    now = horizon + timedelta(days=90, hours=12)
+    report = apply_retention(store, days=90, now=now, archive_dir=tmp_path / "archive")
+    remaining = store.logs()
+    assert remaining["Date"].min() >= horizon
+    assert remaining.sort(ORDER).equals(logs.filter(pl.col("Date") >= horizon).sort(ORDER))
+    assert report.expired_rows == logs.filter(pl.col("Date") < horizon).height
+    archived = pl.concat([pl.read_parquet(path) for path in report.archived])
+    assert archived.height == report.expired_rows
+    assert daily_activity(store).equals(activity)
+    assert store.history_files() and store.partition(store.firewalls()[0]).history_files()
+
+
+def test_a_rewrite_of_replaced_files_is_given_up(store, tmp_path):
+    """Une compaction dont les fichiers ont été remplacés entre-temps n'est pas commitée"""
+    inputs = store.parts()[:2]
+    output = tmp_path / "data" / "logs" / "part-0-compacted.parquet"
+    write_compacted(pl.concat([pl.read_parquet(path) for path in inputs]), output)
+    store.replace_logs(generate_chunk(100, seed=99))
+    assert not _commit_rewrite(store, inputs, [output])
+    assert not output.exists() and store.count() == 100
+
+
+def test_maintenance_report(store):
+    """Le rapport donne le nombre de fichiers et la latence avant et après"""
+    report = run_maintenance(store, retention_days=None, small_rows=10_000, target_rows=100_000)
+    assert report.files_after < report.files_before
+    assert report.latency_before > 0 and report.latency_after > 0
+    assert "files" in report.summary()
@@ -0,0 +1,98 @@
+import urllib.request
+
+import polars as pl
+import pytest
+import streamlit as st
+
+from db import LogDatabase
+from ingest.parser import parse_lines
+from monitoring.metrics import (
+    CACHE_REQUESTS,
+    INGESTED_ROWS,
+    QUERY_DURATION,
+    Registry,
+    register_store_gauges,
+    start_http_server,
+    write_metrics_file,
+)
+from monitoring.profiling import profiled
+
+
+def parse_exposition(text):
+    """Échantillons du format texte Prometheus : {'nom{labels}': valeur}"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_exposition_format():
+    """Compteurs, jauges et histogrammes sont rendus au format texte Prometheus"""
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ["page"])
+    registry.gauge("temperature", "Temperature", callback=lambda: 21.5)
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    requests.inc(page="analysis")
+    requests.inc(2, page='say "hi"')
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text and "# TYPE latency_seconds histogram" in text
+    samples = parse_exposition(text)
+    assert samples['requests_total{page="analysis"}'] == 1
+    assert samples['requests_total{page="say \\"hi\\""}'] == 2
+    assert samples["temperature"] == 21.5
+    assert samples['latency_seconds_bucket{le="0.1"}'] == 1
+    assert samples['latency_seconds_bucket{le="1"}'] == 2
+    assert samples['latency_seconds_bucket{le="+Inf"}'] == 3
+    assert samples["latency_seconds_count"] == 3
+    assert samples["latency_seconds_sum"] == pytest.approx(5.55)
+    with pytest.raises(ValueError):
+        requests.inc(-1, page="analysis")
+
+
+def test_local_scrape(tmp_path, monkeypatch):
+    """Les métriques de l'application sont lisibles par un scrape HTTP local"""
+    monkeypatch.chdir(tmp_path)
+    db = LogDatabase()
+    register_store_gauges(db.files)
+
+    @profiled("test.scraped", cache=st.cache_data)
+    def query(n):
+        return pl.DataFrame({"a": range(n)})
+
+    query.clear()
+    rows_before = INGESTED_ROWS.value(path="append")
+    hits_before = CACHE_REQUESTS.value(function="test.scraped", result="hit")
+    query(3)
+    query(3)
+    db.append_logs(parse_lines(["2025-02-12 10:05:02;54.174.62.181;159.84.146.99;TCP;5000;443;1;PERMIT;eth0;;6"] * 4))
+
+    server = start_http_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            samples = parse_exposition(response.read().decode())
+    finally:
+        server.shutdown()
+
+    assert samples['opsie_query_duration_seconds_count{function="test.scraped"}'] == 2
+    assert samples['opsie_cache_requests_total{function="test.scraped",result="hit"}'] == hits_before + 1
+    assert samples['opsie_cache_requests_total{function="test.scraped",result="miss"}'] >= 1
+    assert samples['opsie_ingested_rows_total{path="append"}'] == rows_before + 4
+    assert samples["opsie_store_files"] == 2
+    assert samples["opsie_store_bytes"] > 0
+    assert "opsie_active_sessions" in samples
+
+
+def test_file_dump(tmp_path):
+    """Les métriques peuvent être écrites dans un fichier"""
+    QUERY_DURATION.observe(0.01, function="test.dumped")
+    path = tmp_path / "opsie.prom"
+    write_metrics_file(path)
+    samples = parse_exposition(path.read_text())
+    assert samples['opsie_query_duration_seconds_count{function="test.dumped"}'] >= 1
@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+import polars as pl
+import pytest
+
+from analytics.parallel import Count, Distinct, GroupBy, ScatterGather, TopK, split_files
+from benchmarks.synthetic import START, generate_chunk
+from storage.core import LogStore, file_stats
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    store = LogStore(data_dir=tmp_path_factory.mktemp("data"))
+    for day in range(6):
+        store.append_logs(generate_chunk(1500, chunk_index=day, seed=day))
+    return store
+
+
+@pytest.fixture(scope="module")
+def pool(store):
+    with ScatterGather(store, workers=2) as pool:
+        yield pool
+
+
+def test_partial_results_merge_into_the_query_results(store, pool):
+    """Les agrégats partiels des workers fusionnés donnent les résultats d'une requête unique"""
+    logs = store.logs()
+    result = pool.run(
+        {
+            "rows": Count(),
+            "actions": GroupBy(["action"], sums=["Port_dst"]),
+            "sources": TopK("IPsrc", 5),
+            "destinations": Distinct("IPdst"),
+        }
+    )
+    assert result["rows"] == logs.height
+    actions = logs.group_by("action").agg(pl.len().alias("count"), pl.col("Port_dst").sum().cast(pl.Int64))
+    assert result["actions"].sort("action").equals(actions.sort("action").cast({"count": pl.Int64}))
+    counts = logs.group_by("IPsrc").len()["len"].sort(descending=True).head(5).to_list()
+    assert result["sources"]["count"].to_list() == counts
+    distinct = logs["IPdst"].n_unique()
+    assert abs(result["destinations"] - distinct) / distinct < 0.05
+
+
+def test_windows_and_filters_are_applied_in_the_workers(store, pool):
+    """La fenêtre de dates et le filtre sont appliqués avant les agrégats"""
+    since, until = START + timedelta(days=2), START + timedelta(days=3, hours=12)
+    where = pl.col("action") == "DENY"
+    result = pool.run({"rows": Count()}, since=since, until=until, where=where)
+    expected = store.logs().filter(pl.col("Date").is_between(since, until) & where).height
+    assert result["rows"] == expected > 0
+    assert pool.run({"rows": Count()}, since=START + timedelta(days=30))["rows"] == 0
+
+
+def test_files_are_split_into_balanced_tasks(store):
+    """Les fichiers sont répartis en tâches de tailles proches"""
+    files = store.parts()
+    tasks = split_files(files, 3)
+    assert sorted(path for task in tasks for path in task) == sorted(files)
+    rows = [sum(file_stats(path).rows for path in task) for task in tasks]
+    assert len(tasks) == 3 and max(rows) - min(rows) <= max(file_stats(path).rows for path in files)
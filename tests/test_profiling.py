@@ -0,0 +1,80 @@
+import json
+
+import polars as pl
+import pytest
+import streamlit as st
+
+from monitoring.profiling import Profiler, profile_block, profiled
+
+
+@pytest.fixture
+def profiler():
+    profiler = Profiler()
+    profiler.enable()
+    yield profiler
+    profiler.disable()
+
+
+def test_records_rows_and_cache_hits(profiler):
+    """Chaque appel est mesuré : lignes en entrée/sortie et hit/miss du cache Streamlit"""
+
+    @profiled("test.head", cache=st.cache_data, profiler=profiler)
+    def head(_df, n):
+        return _df.head(n)
+
+    df = pl.DataFrame({"a": range(100)})
+    head.clear()
+    head(df, 3)
+    head(df, 3)
+    head(df, 5)
+    records = profiler.select()
+    assert [record.cache_hit for record in records] == [False, True, False]
+    assert [(record.rows_in, record.rows_out) for record in records] == [(100, 3), (100, 3), (100, 5)]
+    assert all(record.seconds > 0 and record.peak_memory is not None for record in records)
+    summary = profiler.summary()
+    assert summary[0]["calls"] == 3 and summary[0]["cache_hits"] == 1 and summary[0]["cache_misses"] == 2
+
+
+def test_nested_calls_and_errors(profiler):
+    """Les appels imbriqués gardent leur profondeur, les exceptions sont enregistrées"""
+
+    @profiled("test.inner", profiler=profiler)
+    def inner():
+        return [0] * 200000
+
+    @profiled("test.outer", profiler=profiler)
+    def outer():
+        inner()
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        outer()
+    inner_record, outer_record = profiler.select()
+    assert (inner_record.depth, outer_record.depth) == (1, 0)
+    assert outer_record.error == "ValueError: boom"
+    # Le pic de mémoire de l'appel imbriqué remonte à l'appelant
+    assert outer_record.peak_memory >= inner_record.peak_memory >= 200000 * 8
+
+
+def test_disabled_profiler_records_nothing():
+    """Sans activation, la fonction est appelée directement sans mesure"""
+    profiler = Profiler()
+
+    @profiled(profiler=profiler)
+    def double(x):
+        return 2 * x
+
+    assert double(2) == 4
+    assert profiler.select() == []
+
+
+def test_exports(profiler):
+    """Export JSON et trace Chrome des mesures"""
+    with profile_block("test.block", rows_in=10, profiler=profiler) as block:
+        block.result = pl.DataFrame({"a": [1, 2]})
+    records = json.loads(profiler.to_json())
+    assert records[0]["name"] == "test.block" and records[0]["rows_out"] == 2
+    trace = json.loads(profiler.to_chrome_trace())
+    event = trace["traceEvents"][0]
+    assert event["ph"] == "X" and event["name"] == "test.block" and event["dur"] > 0
+    assert event["args"]["rows_in"] == 10
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import polars as pl
+import pytest
+
+from analytics.service import AnalyticsService, ServiceError
+from benchmarks.synthetic import generate_chunk
+from storage.core import LogStore
+from storage.rollups import choose_resolution, rollup_path
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LogStore(data_dir=tmp_path)
+    store.append_logs(generate_chunk(20_000, seed=1))
+    with store.open_part_writer() as writer:
+        writer.write(generate_chunk(5000, chunk_index=1, seed=2))
+        writer.write(generate_chunk(5000, chunk_index=2, seed=3))
+    return store
+
+
+def test_choose_resolution():
+    """La résolution la plus fine qui tient dans la largeur du graphique"""
+    day = datetime(2025, 1, 1)
+    assert choose_resolution(day.replace(hour=10), day.replace(hour=13), 1000) == "minute"
+    assert choose_resolution(day, datetime(2025, 1, 20), 1000) == "hour"
+    assert choose_resolution(day, datetime(2026, 1, 1), 1000) == "day"
+    assert choose_resolution(None, None) == "day"
+
+
+def test_rollups_written_at_ingestion_match_the_logs(store):
+    """Chaque partie a ses agrégats ; la série d'une IP égale le groupby sur les logs"""
+    parts = store.parts()
+    assert len(parts) == 2 * len(store.firewalls()) and all(rollup_path(part).exists() for part in parts)
+    logs = store.logs()
+    ip = logs["IPsrc"].value_counts().sort("count", descending=True)["IPsrc"][0]
+    service = AnalyticsService(store)
+    series = service.call("activity", {"ip": ip, "resolution": "minute"})
+    expected = (
+        logs.filter(pl.col("IPsrc") == ip)
+        .group_by(pl.col("Date").dt.truncate("1m").alias("bucket"))
+        .agg((pl.col("action") == "DENY").sum().cast(pl.UInt32).alias("DENY"), pl.len().cast(pl.UInt32).alias("total"))
+        .sort("bucket")
+    )
+    assert series.select("bucket", "DENY", "total").equals(expected)
+
+
+def test_activity_picks_the_resolution_from_the_window(store):
+    """Une fenêtre de quelques heures passe à la minute, toute l'activité reste au jour si elle est longue"""
+    ip = store.logs()["IPsrc"][0]
+    service = AnalyticsService(store)
+    zoom = service.call("activity", {"ip": ip, "since": "2025-01-01T00:00:00", "until": "2025-01-01T03:00:00"})
+    assert set(zoom["resolution"]) == {"minute"}
+    assert zoom["bucket"].max() <= datetime(2025, 1, 1, 3)
+    overview = service.call("activity", {"ip": ip, "points": 2})
+    assert set(overview["resolution"]) == {"day"}
+    with pytest.raises(ServiceError):
+        service.call("activity", {"ip": ip, "resolution": "week"})
+
+
+def test_missing_rollups_are_rebuilt(store):
+    """Un store antérieur aux agrégats est complété à la première lecture"""
+    part = store.parts()[0]
+    rollup_path(part).unlink()
+    total = store.rollups().filter(pl.col("resolution") == "hour").select(pl.col("count").sum()).collect().item()
+    assert total == store.count() and rollup_path(part).exists()
+    store.replace_logs(generate_chunk(700, seed=4))
+    store.vacuum(retention=0)
+    assert not rollup_path(part).exists()
+    assert store.rollups().filter(pl.col("resolution") == "day").select(pl.col("count").sum()).collect().item() == 700
@@ -0,0 +1,71 @@
+from datetime import date
+
+import polars as pl
+import pytest
+
+from analytics.queries import is_internal
+from analytics.service import AnalyticsService, ServiceError
+from benchmarks.synthetic import generate_chunk
+from storage.core import LogStore
+from storage.rule_counters import counter_path
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LogStore(data_dir=tmp_path)
+    store.append_logs(generate_chunk(20_000, seed=1))
+    with store.open_part_writer() as writer:
+        writer.write(generate_chunk(5000, chunk_index=1, seed=2))
+        writer.write(generate_chunk(5000, chunk_index=2, seed=3))
+    return store
+
+
+def test_rule_summary_matches_the_logs(store):
+    """Les compteurs de chaque partie donnent les mêmes totaux par règle qu'un groupby sur les logs"""
+    parts = store.parts()
+    assert all(counter_path(part).exists() for part in parts)
+    logs = store.logs()
+    external = ~is_internal(logs["IPsrc"])
+    expected = (
+        logs.with_columns(external.alias("external"))
+        .group_by("idRegle")
+        .agg(
+            pl.len().cast(pl.UInt64).alias("hits"),
+            (pl.col("action") == "DENY").sum().cast(pl.UInt64).alias("DENY"),
+            ((pl.col("action") == "DENY") & pl.col("external")).sum().cast(pl.UInt64).alias("external_DENY"),
+            pl.col("Port_dst").n_unique().cast(pl.UInt32).alias("ports"),
+        )
+        .sort("idRegle")
+    )
+    summary = AnalyticsService(store).call("rules")
+    assert summary.select(expected.columns).sort("idRegle").equals(expected)
+    assert summary["hits"].is_sorted(descending=True)
+    assert not summary["silent"].any()
+
+
+def test_rules_silent_in_a_window(store):
+    """Une règle connue sans déclenchement sur la période est signalée silencieuse"""
+    store.append_logs(generate_chunk(100, seed=4).with_columns(pl.lit(4242).alias("idRegle")))
+    service = AnalyticsService(store)
+    day = store.logs()["Date"].min().date()
+    summary = service.call("rules", {"start": "2000-01-01", "end": "2000-01-02"})
+    assert summary["silent"].all() and summary["hits"].sum() == 0
+    assert 4242 in summary["idRegle"].to_list()
+    daily = service.call("rule_activity", {"rule_id": "4242"})
+    assert daily["PERMIT"].sum() + daily["DENY"].sum() == 100
+    ports = service.call("rule_ports", {"rule_id": 4242, "start": day, "limit": 3})
+    assert ports.height <= 3
+    with pytest.raises(ServiceError):
+        service.call("rules", {"start": date(2025, 2, 1), "end": date(2025, 1, 1)})
+
+
+def test_missing_counters_are_rebuilt(store):
+    """Un store antérieur aux compteurs est complété à la première lecture"""
+    part = store.parts()[0]
+    counter_path(part).unlink()
+    assert store.rule_counters().select(pl.col("count").sum()).collect().item() == store.count()
+    assert counter_path(part).exists()
+    store.replace_logs(generate_chunk(700, seed=5))
+    store.vacuum(retention=0)
+    assert not counter_path(part).exists()
+    assert store.rule_counters().select(pl.col("count").sum()).collect().item() == 700
@@ -0,0 +1,96 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from analytics.service import AnalyticsService, ServiceError
+from benchmarks.synthetic import generate_chunk
+from storage.core import LogStore
+from storage.sketches import HyperLogLog, SpaceSaving, hash_values, sketch_path
+
+
+def test_hyperloglog_within_error_and_mergeable():
+    """L'estimation reste dans 3 écarts types et la fusion équivaut à l'union"""
+    values = pl.Series([f"10.0.{i // 256}.{i % 256}" for i in range(50_000)])
+    left, right, whole = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    left.add_hashes(hash_values(values[:30_000]))
+    right.add_hashes(hash_values(values[20_000:]))
+    whole.add_hashes(hash_values(values))
+    left.merge(right)
+    assert np.array_equal(left.registers, whole.registers)
+    assert abs(whole.estimate() - 50_000) <= 3 * whole.relative_error * 50_000
+    small = HyperLogLog()
+    small.add_hashes(hash_values(values[:100]))
+    assert abs(small.estimate() - 100) <= 3
+
+
+def test_space_saving_bounds_after_merges():
+    """Après fusion, chaque vrai compteur reste dans [count - error, count] et les absents sous bound"""
+    rng = np.random.default_rng(3)
+    parts = [rng.zipf(1.5, 5000) % 500 for _ in range(6)]
+    merged = SpaceSaving(capacity=20)
+    for part in parts:
+        items, counts = np.unique(part, return_counts=True)
+        merged.merge(SpaceSaving.from_counts(items.tolist(), counts.tolist(), capacity=20))
+    items, counts = np.unique(np.concatenate(parts), return_counts=True)
+    truth = dict(zip(items.tolist(), counts.tolist()))
+    for item, true_count in truth.items():
+        count, error = merged.get(item)
+        assert count - error <= true_count <= count
+    # Les plus fréquents sont bien classés en tête
+    assert [item for item, _, _ in merged.top(3)] == sorted(truth, key=truth.get, reverse=True)[:3]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LogStore(data_dir=tmp_path)
+    store.append_logs(generate_chunk(3000, seed=1))
+    with store.open_part_writer() as writer:
+        writer.write(generate_chunk(1000, seed=2))
+        writer.write(generate_chunk(1000, seed=3))
+    return store
+
+
+def test_sidecars_written_at_ingestion(store):
+    """Chaque partie a son sketch ; la fusion donne les totaux du store"""
+    parts = store.parts()
+    assert len(parts) == 2 * len(store.firewalls()) and all(sketch_path(part).exists() for part in parts)
+    logs = store.logs()
+    sketch = store.sketch()
+    assert sketch.rows == logs.height
+    top = logs["IPsrc"].value_counts().sort(["count", "IPsrc"], descending=[True, False]).row(0)
+    assert sketch.summaries["sources"].top(1)[0][:2] == top
+    permitted = logs.filter((pl.col("action") == "PERMIT") & (pl.col("Port_dst") < 1024))["Port_dst"]
+    assert dict((port, count) for port, count, _ in sketch.summaries["well_known_ports"].top()) == dict(
+        permitted.value_counts().iter_rows()
+    )
+
+
+def test_missing_or_stale_sidecar_is_rebuilt(store):
+    """Un sketch absent (store antérieur) est reconstruit depuis sa partie"""
+    part = store.parts()[0]
+    sketch_path(part).unlink()
+    assert store.sketch().rows == 5000
+    assert sketch_path(part).exists()
+    store.replace_logs(generate_chunk(700, seed=4))
+    store.vacuum(retention=0)
+    assert not sketch_path(part).exists()
+    assert store.sketch().rows == 700
+
+
+def test_service_approx_mode(store):
+    """Le mode approximatif répond depuis les sketches, avec ses bornes d'erreur"""
+    service = AnalyticsService(store)
+    exact = service.call("flow_summary")
+    approx = service.call("flow_summary", {"approx": "true"})
+    assert approx["flows"] == exact["flows"]
+    assert approx["top_source"] == exact["top_source"]
+    assert abs(approx["sources"] - exact["sources"]) <= 3 * approx["errors"]["distinct_error"] * exact["sources"]
+    stats = service.call("ip_stats", {"approx": True, "limit": 5})
+    assert stats["IPsrc"].to_list() == service.call("ip_stats", {"limit": 5})["IPsrc"].to_list()
+    assert service.call("top_ports", {"approx": True}).equals(
+        service.call("top_ports").select("Port_dst", "count").with_columns(error=pl.lit(0, pl.UInt32))
+    )
+    with pytest.raises(ServiceError):
+        service.call("ip_stats", {"approx": True, "n": 1000})
+    with pytest.raises(ServiceError):
+        service.call("flow_summary", {"approx": True, "action": "DENY"})
@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import polars as pl
+
+from benchmarks.synthetic import generate_chunk
+from storage.core import LogStore
+
+BATCH = 40
+
+
+def batch(batch_id):
+    """Lot de BATCH lignes réparties sur plusieurs pare-feux, identifié par idRegle"""
+    return generate_chunk(BATCH, seed=batch_id).with_columns(pl.lit(batch_id, dtype=pl.Int32).alias("idRegle"))
+
+
+def incomplete_batches(logs):
+    """Lots dont le lecteur ne voit qu'une partie des lignes"""
+    sizes = logs.group_by("idRegle").len()
+    return sizes.filter(pl.col("len") != BATCH)["idRegle"].to_list()
+
+
+def append_batches(data_dir, writer, batches):
+    store = LogStore(data_dir)
+    for i in range(batches):
+        store.append_logs(batch(writer * 1000 + i))
+
+
+def replace_batches(data_dir, writer, batches):
+    store = LogStore(data_dir)
+    for i in range(batches):
+        store.replace_logs(batch(writer * 1000 + i))
+
+
+def read_until(data_dir, done, results):
+    """Lit le store en boucle jusqu'à la fin des écritures ; chaque lecture doit voir des lots entiers"""
+    store = LogStore(data_dir)
+    reads, errors = 0, []
+    while not done.is_set():
+        try:
+            bad = incomplete_batches(store.logs())
+        except Exception as e:
+            errors.append(repr(e))
+        else:
+            if bad:
+                errors.append(f"incomplete batches {bad}")
+        reads += 1
+    results.put((reads, errors))
+
+
+def run_concurrently(data_dir, writers, readers=2, timeout=120):
+    context = multiprocessing.get_context("spawn")
+    results, done = context.Queue(), context.Event()
+    reading = [context.Process(target=read_until, args=(data_dir, done, results)) for _ in range(readers)]
+    writing = [context.Process(target=target, args=(data_dir, *args)) for target, args in writers]
+    for process in reading + writing:
+        process.start()
+    for process in writing:
+        process.join(timeout)
+        assert process.exitcode == 0
+    done.set()
+    reports = [results.get(timeout=timeout) for _ in range(readers)]
+    for process in reading:
+        process.join(timeout)
+    return reports
+
+
+def test_concurrent_appends_are_atomic_and_never_lost(tmp_path):
+    """Des processus qui ajoutent en parallèle ne perdent aucun lot ; les lecteurs ne voient que des lots entiers"""
+    LogStore(tmp_path)
+    reports = run_concurrently(tmp_path, [(append_batches, (writer, 12)) for writer in range(3)])
+    assert all(reads > 0 and not errors for reads, errors in reports)
+    logs = LogStore(tmp_path).logs()
+    assert logs.height == 3 * 12 * BATCH and not incomplete_batches(logs)
+    assert LogStore(tmp_path).snapshot().version == 1 + 3 * 12
+
+
+def test_concurrent_replaces_and_appends(tmp_path):
+    """Remplacements et ajouts concurrents : chaque lecture voit un état commité, sans fichier tronqué"""
+    LogStore(tmp_path)
+    writers = [(replace_batches, (writer, 8)) for writer in range(2)] + [(append_batches, (2, 8))]
+    reports = run_concurrently(tmp_path, writers)
+    assert all(reads > 0 and not errors for reads, errors in reports)
+    store = LogStore(tmp_path)
+    assert not incomplete_batches(store.logs())
+    # Le dernier remplacement efface les lots précédents : au plus un lot remplacé, suivi d'ajouts
+    replaced = store.logs().filter(pl.col("idRegle") < 2000)["idRegle"].n_unique()
+    assert replaced == 1
+
+
+def test_pinned_reader_survives_a_replace_until_vacuum(tmp_path):
+    """Un lecteur épinglé garde son instantané ; vacuum supprime ensuite les fichiers remplacés"""
+    store = LogStore(tmp_path)
+    store.append_logs(batch(1))
+    pinned = store.pin()
+    store.replace_logs(batch(2))
+    assert set(pinned.logs()["idRegle"]) == {1}
+    assert set(store.logs()["idRegle"]) == {2}
+    assert store.vacuum() == []
+    old_parts = pinned.parts()
+    removed = store.vacuum(retention=0)
+    assert set(old_parts) <= set(removed) and not any(part.exists() for part in old_parts)
+    assert set(store.logs()["idRegle"]) == {2}
+    assert len(store.snapshots.manifests()) == 1
+
+
+def test_vacuum_keeps_the_legacy_logs_file(tmp_path):
+    """vacuum ne supprime jamais le fichier historique logs.parquet, même une fois remplacé"""
+    batch(1).write_parquet(tmp_path / "logs.parquet")
+    store = LogStore(tmp_path)
+    assert set(store.logs()["idRegle"]) == {1}
+    store.replace_logs(batch(2))
+    store.vacuum(retention=0)
+    assert store.logs_file.exists() and set(store.logs()["idRegle"]) == {2}
+
+
+def test_vacuum_keeps_the_files_of_live_writers(tmp_path):
+    """Les fichiers non publiés d'un écrivain encore ouvert survivent à vacuum, même anciens"""
+    store = LogStore(tmp_path)
+    store.append_logs(batch(1))
+    writer = store.open_part_writer()
+    writer.write(batch(2))
+    # Pare-feu inactif depuis longtemps : son fichier temporaire n'est plus modifié
+    for part in writer.files.values():
+        os.utime(part.tmp_path, (0, 0))
+    # Fichier d'un processus terminé sans publier
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    orphan = store.parts_dir / f"part-1-{int(dead.stdout)}-0123abcd.parquet"
+    batch(3).write_parquet(orphan)
+    os.utime(orphan, (0, 0))
+    assert store.vacuum(retention=0) == [orphan]
+    writer.close()
+    assert set(store.logs()["idRegle"]) == {1, 2}
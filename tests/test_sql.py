@@ -0,0 +1,87 @@
+import pytest
+
+from analytics.service import AnalyticsService, ServiceError
+from analytics.sql import SqlEngine, SqlError, SqlTimeout, duckdb_available, validate
+from benchmarks.synthetic import generate_chunk
+from storage.core import LogStore
+
+BACKENDS = ["polars"] + (["duckdb"] if duckdb_available() else [])
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LogStore(data_dir=tmp_path)
+    store.append_logs(generate_chunk(3000, seed=8))
+    store.append_logs(generate_chunk(2000, seed=9))
+    return store
+
+
+@pytest.mark.parametrize("query", [
+    "DROP TABLE logs",
+    "SELECT 1; DROP TABLE logs",
+    "INSERT INTO logs SELECT * FROM logs",
+    "SELECT * FROM read_parquet('/etc/passwd')",
+    "SELECT * FROM '/etc/passwd'",
+    "COPY logs TO 'out.csv'",
+    "WITH x AS (SELECT 1) SELECT * FROM x; SET threads = 1",
+    "-- commentaire seul",
+])
+def test_rejects_non_read_queries(query):
+    """Seule une requête SELECT sur la table logs est acceptée"""
+    with pytest.raises(SqlError):
+        validate(query)
+
+
+def test_accepts_keywords_in_strings_and_comments():
+    """Les mots-clés dans les chaînes et commentaires ne sont pas des instructions"""
+    assert validate("SELECT 'drop; set' AS x FROM logs -- delete\n;") == "SELECT 'drop; set' AS x FROM logs"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_pages_cover_the_whole_store(store, backend):
+    """Les pages successives couvrent tout le store, dans la limite de max_rows"""
+    engine = SqlEngine(store, backend=backend, max_rows=4500)
+    query = "SELECT Date, IPsrc, Port_dst FROM logs ORDER BY Date, IPsrc, Port_dst"
+    pages = [engine.query(query, offset=offset, limit=1000) for offset in range(0, 5000, 1000)]
+    assert [page.height for page in pages] == [1000, 1000, 1000, 1000, 500]
+    counts = engine.query("SELECT action, count(*) AS n FROM logs GROUP BY action ORDER BY action")
+    expected = store.logs().group_by("action").len().sort("action")
+    assert counts["action"].to_list() == expected["action"].to_list()
+    assert counts["n"].to_list() == expected["len"].to_list()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_query_reads_a_single_snapshot(store, backend, monkeypatch):
+    """Une requête lit le store d'un seul snapshot, même si une écriture est publiée pendant son exécution"""
+    snapshots = []
+    latest = store.snapshot
+
+    def snapshot():
+        snapshots.append(latest())
+        return snapshots[-1]
+
+    monkeypatch.setattr(store, "snapshot", snapshot)
+    engine = SqlEngine(store, backend=backend)
+    assert engine.query("SELECT count(*) AS n FROM logs")["n"].item() == 5000
+    assert len(snapshots) == 1
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_timeout_cancels_the_query(store, backend):
+    """Une requête trop longue est annulée"""
+    engine = SqlEngine(store, backend=backend, timeout=0.01)
+    with pytest.raises(SqlTimeout):
+        engine.query("SELECT a.IPsrc, count(*) FROM logs a JOIN logs b ON a.Port_dst = b.Port_dst GROUP BY 1")
+
+
+def test_service_endpoint(store):
+    """L'endpoint sql renvoie 400 pour une requête refusée et 408 après le délai"""
+    service = AnalyticsService(store, sql_engine=SqlEngine(store, backend="polars", timeout=0.01))
+    assert service.call("sql", {"query": "SELECT count(*) AS n FROM logs"})["n"].item() == 5000
+    with pytest.raises(ServiceError) as error:
+        service.call("sql", {"query": "DELETE FROM logs"})
+    assert error.value.status == 400
+    with pytest.raises(ServiceError) as error:
+        service.call("sql", {"query": "SELECT a.IPsrc FROM logs a JOIN logs b ON a.Port_dst = b.Port_dst"})
+    assert error.value.status == 408
+    assert service.call("sql_info")["backend"] == "polars"
@@ -0,0 +1,32 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGE_DEPENDENCIES = {"sklearn", "matplotlib", "pandas", "pydantic", "polars"}
+
+
+def test_app_import_does_not_load_the_pages():
+    """Le démarrage ne charge ni les pages ni leurs dépendances lourdes"""
+    code = "import sys, app; print(' '.join(sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    loaded = set(output.stdout.split())
+    assert not PAGE_DEPENDENCIES & {name.split(".")[0] for name in loaded}
+    assert not {"views.analysis", "views.upload", "views.machine_learning"} & loaded
+
+
+def test_home_page_renders(tmp_path, monkeypatch):
+    """La page d'accueil s'affiche, les pages restent importables à la demande"""
+    # Le stockage s'ouvre dans data/ du répertoire courant : pas dans celui du dépôt
+    (tmp_path / "img").symlink_to(ROOT / "img")
+    monkeypatch.chdir(tmp_path)
+    app = AppTest.from_file(str(ROOT / "app.py"), default_timeout=120)
+    app.run()
+    assert not app.exception
+    assert any("Welcome" in element.value for element in app.markdown)
+
+    from views.user import PAGES, load_page
+
+    assert all(callable(load_page(tab)) for tab in PAGES)
@@ -0,0 +1,59 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.bench_import import HEAVY_MODULES, loaded_modules
+from benchmarks.synthetic import generate_chunk
+from storage.bitmaps import bitmap_path
+from storage.core import LogStore, file_stats
+from storage.rollups import rollup_path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_core_does_not_import_the_ui_stack():
+    """Le cœur du stockage s'importe sans Streamlit, pandas, pydantic ni scikit-learn"""
+    assert not HEAVY_MODULES & set(loaded_modules("storage.core"))
+    # Le service analytique non plus tant que les anomalies ne sont pas demandées
+    assert not HEAVY_MODULES & set(loaded_modules("analytics.service"))
+
+
+def test_readers_are_cached_per_store_version(tmp_path):
+    """Les lectures sont mises en cache et invalidées par l'ajout d'une partie"""
+    store = LogStore(data_dir=tmp_path)
+    store.append_logs(generate_chunk(1000, seed=1))
+    sample = store.sample(100)
+    assert sample.height == 100 and store.sample(100) is sample
+    assert store.count() == 1000
+    store.append_logs(generate_chunk(500, seed=2))
+    assert store.count() == 1500
+    assert store.sample(100) is not sample and store.logs().height == 1500
+
+
+def test_core_usable_from_a_worker_process(tmp_path):
+    """Un processus sans Streamlit peut écrire dans le store lu par l'application"""
+    code = (
+        "import sys; from benchmarks.synthetic import generate_chunk; from storage.core import LogStore; "
+        f"LogStore(data_dir={str(tmp_path)!r}).append_logs(generate_chunk(200)); "
+        "print('streamlit' in sys.modules)"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "False"
+
+    from db import LogDatabase
+
+    db = LogDatabase(data_dir=tmp_path)
+    assert db.get_logs_count(version=db.get_store_version()) == 200
+
+
+def test_part_writer_rolls_over_to_bounded_parts(tmp_path):
+    """Le PartWriter ferme une partie tous les max_rows lignes et publie toutes les parties ensemble"""
+    store = LogStore(tmp_path)
+    batches = [generate_chunk(2000, chunk_index=i, seed=i).drop("firewall") for i in range(5)]
+    with store.open_part_writer(max_rows=4000) as writer:
+        for batch in batches:
+            writer.write(batch)
+        assert len(writer.paths) == 3 and store.count() == 0
+    assert sorted(file_stats(path).rows for path in store.parts()) == [2000, 4000, 4000]
+    assert all(rollup_path(path).exists() and bitmap_path(path).exists() for path in store.parts())
+    assert store.count() == writer.rows == 10_000
@@ -0,0 +1,65 @@
+from datetime import date, datetime, timedelta
+
+import polars as pl
+import pytest
+
+from analytics.service import AnalyticsService
+from benchmarks.synthetic import START, generate_chunk
+from storage.core import LOG_SCHEMA, LogStore, file_stats
+from storage.maintenance import apply_retention, apply_tiers
+from storage.tiers import tier_summary
+
+ORDER = list(LOG_SCHEMA)
+# Jour 9 du jeu synthétique, à midi
+NOW = START + timedelta(days=9, hours=12)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LogStore(data_dir=tmp_path)
+    for day in range(10):
+        store.append_logs(generate_chunk(800, chunk_index=day, seed=day))
+    return store
+
+
+def test_old_files_move_to_the_warm_tier(store):
+    """Les fichiers plus anciens que la fenêtre chaude sont recompressés en tier warm, sans perte"""
+    logs = store.logs().sort(ORDER)
+    report = apply_tiers(store, hot_days=3, now=NOW)
+    tiers = {path: file_stats(path) for path in store.parts()}
+    warm = [stats for stats in tiers.values() if stats.tier == "warm"]
+    hot = [stats for stats in tiers.values() if stats.tier == "hot"]
+    assert report.warmed_files == 6 * len(store.firewalls())
+    assert max(stats.last for stats in warm) < START + timedelta(days=6) <= min(stats.first for stats in hot)
+    assert store.logs().sort(ORDER).equals(logs)
+    summary = tier_summary(store)
+    assert summary["tier"].to_list() == ["hot", "warm"] and summary["rows"].sum() == logs.height
+
+
+def test_recent_windows_only_read_the_hot_tier(store):
+    """Une fenêtre de dates récente n'ouvre que les fichiers de la période"""
+    apply_tiers(store, hot_days=3, now=NOW)
+    since = START + timedelta(days=8)
+    files = store.window_files(since=since)
+    assert files and all(file_stats(path).tier == "hot" for path in files)
+    assert len(files) == 2 * len(store.firewalls())
+    window = store.scan_window(since).collect()
+    assert window.sort(ORDER).equals(store.logs().filter(pl.col("Date") >= since).sort(ORDER))
+
+    service = AnalyticsService(store)
+    day = date(2025, 1, 9)
+    summary = service.call("flow_summary", {"start": day, "end": day})
+    logs = store.logs().filter(pl.col("Date").dt.date() == day)
+    assert summary["flows"] == logs.height
+
+
+def test_cold_tier_keeps_only_rollups(store):
+    """Au-delà de la rétention, seuls les agrégats restent, comptés dans le tier cold"""
+    rows = store.count()
+    apply_tiers(store, hot_days=3, now=NOW)
+    report = apply_retention(store, days=5, now=NOW)
+    summary = AnalyticsService(store).call("tiers")
+    assert summary["tier"].to_list() == ["hot", "warm", "cold"]
+    cold = summary.filter(pl.col("tier") == "cold").row(0, named=True)
+    assert cold["rows"] == report.expired_rows and cold["last"] < datetime(2025, 1, 5)
+    assert summary["rows"].sum() == rows
@@ -0,0 +1,37 @@
+import streamlit as st
+
+from views.client import get_client
+
+# Règle -> libellé affiché
+RULE_LABELS = {
+    "port_scan": "Scan de ports",
+    "brute_force": "Force brute SSH/RDP",
+    "fan_out": "Balayage d'adresses",
+}
+
+
+def alerts_page():
+    """Alertes levées par les règles de détection sur le flux d'ingestion et l'historique"""
+    st.title("Alertes de détection")
+    client = get_client()
+    rules = client.query("detection_rules")
+    with st.expander("Règles actives"):
+        st.dataframe(rules.to_pandas(), use_container_width=True, hide_index=True)
+
+    choices = ["Toutes"] + rules["rule"].to_list()
+    rule = st.selectbox("Règle", choices, format_func=lambda name: RULE_LABELS.get(name, name))
+    limit = st.selectbox("Nombre d'alertes", [100, 1000, 10000], index=1)
+    alerts = client.query("alerts", rule=None if rule == "Toutes" else rule, limit=limit)
+
+    if alerts.height == 0:
+        st.info(
+            "Aucune alerte. Lancez l'ingestion avec `--detect` ou rejouez l'historique "
+            "avec `python -m analytics.detection`."
+        )
+        return
+
+    counts = alerts.group_by("rule").len().sort("len", descending=True)
+    columns = st.columns(max(counts.height, 1))
+    for column, (name, count) in zip(columns, counts.iter_rows()):
+        column.metric(RULE_LABELS.get(name, name), f"{count:,}")
+    st.dataframe(alerts.to_pandas(), use_container_width=True, hide_index=True)
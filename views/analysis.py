@@ -1,10 +1,12 @@
+from datetime import datetime, time, timedelta
+
 import streamlit as st
 import polars as pl
 import plotly.express as px
 import plotly.graph_objects as go
-import pandas as pd
-import ipaddress
-from db import LogDatabase
+from analytics.queries import is_internal_ip  # noqa: F401 (API historique de la page)
+from monitoring.profiling import profiled
+from views.client import get_client
 
 CUSTOM_COLORS = [
     "#E41A1C",  # Rouge
@@ -19,158 +21,60 @@ CUSTOM_COLORS = [
     "#66C2A5",  # Turquoise
 ]
 
+# IP sources proposées dans la sélection et lignes du détail des IP externes
+IP_OPTIONS_LIMIT = 1000
+EXTERNAL_SOURCES_LIMIT = 1000
 
-@st.cache_data(ttl=3600)  # Cache pendant 1 heure
-def load_parquet_data():
-    """Charge et met en cache les données du fichier Parquet"""
-    try:
-        db = LogDatabase()
-
-        df = db.get_logs_sample()
-
-        return df
-    except Exception as e:
-        st.error(f"Erreur lors de la lecture du fichier: {e}")
-        return None
-    except Exception as e:
-        st.error(f"Erreur lors de la lecture du fichier: {str(e)}")
-        return None
-
-
-@st.cache_data(ttl=3600)
-def calculate_ip_stats(_df):
-    """Calcule et met en cache les statistiques par IP"""
-    return (
-        _df.group_by("IPsrc")
-        .agg(
-            [
-                pl.n_unique("IPdst").alias("nb_destinations"),
-                pl.col("action")
-                .filter(pl.col("action") == "PERMIT")
-                .count()
-                .alias("permit_count"),
-                pl.col("action")
-                .filter(pl.col("action") == "DENY")
-                .count()
-                .alias("deny_count"),
-                pl.count().alias("total_count"),
-            ]
-        )
-        .sort("total_count", descending=True)
-    )
-
-
-@st.cache_data(ttl=3600)
-def calculate_port_stats(_df, port_range):
-    """Calcule et met en cache les statistiques par port"""
-    # Conversion en entier pour la comparaison numérique
-    filtered_data = _df.filter(
-        (pl.col("Port_dst").cast(pl.Int32) >= port_range[0])
-        & (pl.col("Port_dst").cast(pl.Int32) <= port_range[1])
-    )
-    return filtered_data
+# Points de la série temporelle : l'API choisit la résolution la plus fine qui tient dans le graphique
+ACTIVITY_POINTS = 1000
+RESOLUTION_LABELS = {"minute": "minute", "hour": "heure", "day": "jour"}
+RESOLUTION_FORMATS = {"minute": "%Y-%m-%d %H:%M", "hour": "%Y-%m-%d %Hh", "day": "%Y-%m-%d"}
 
+EXACT_MODE = "Exact (tout le store)"
+APPROX_MODE = "Approximatif (sketches)"
+PREVIEW_MODE = "Aperçu rapide (échantillon)"
 
-@st.cache_data(ttl=3600)
-def calculate_network_info(_df):
-    """Calcule et met en cache les informations réseau"""
-    return _df.with_columns(
-        [
-            pl.col("IPsrc").map_elements(is_internal_ip).alias("is_src_internal"),
-            pl.col("IPdst").map_elements(is_internal_ip).alias("is_dst_internal"),
-        ]
-    )
 
-
-@st.cache_data(ttl=3600)
-def calculate_top_ports(_df, max_port=1024, limit=10):
-    """Calcule et met en cache les statistiques des ports les plus utilisés"""
-    return (
-        _df.filter(
-            (pl.col("Port_dst").cast(pl.Int32).lt(pl.lit(max_port)))
-            & (pl.col("action") == "PERMIT")
-        )
-        .group_by("Port_dst")
-        .agg([pl.count().alias("count"), pl.first("Protocole").alias("protocole")])
-        .sort("count", descending=True)
-        .limit(limit)
-        .with_columns([pl.col("Port_dst").cast(pl.Utf8).alias("Port_dst")])
-    )
-
-
-@st.cache_data(ttl=3600)
-def get_ip_details(_df, selected_ip):
-    """Récupère et met en cache les détails pour une IP spécifique"""
-    return _df.filter(pl.col("IPsrc") == selected_ip)
-
-
-@st.cache_data(ttl=3600)
-def sample_data(_df, n=10000):
-    """Échantillonne les données pour les visualisations"""
-    if _df.height > n:
-        return _df.sample(n=n, seed=42)
-    return _df
-
-
-# Définition des plages avec RFC 1918, à vérifier ?
-def is_internal_ip(ip: str) -> bool:
-    """Vérifie si une IP appartient au réseau interne de l'université"""
-    try:
-        ip_obj = ipaddress.ip_address(ip)
-        internal_networks = [
-            ipaddress.ip_network("10.70.0.0/16"),
-            ipaddress.ip_network("159.84.0.0/16"),
-            ipaddress.ip_network("192.168.0.0/16"),
-        ]
-        return any(ip_obj in network for network in internal_networks)
-    except ValueError:
-        return False
-
-
-def render_ip_analysis(df_sample, ip_stats, selected_ip, date_range):
-    """Rendu de l'analyse pour une IP spécifique"""
+@profiled("analysis.render_ip_analysis")
+def render_ip_analysis(summary, selected_ip, activity=None, sampled=False):
+    """
+    Rendu de l'analyse pour une IP spécifique (summary : agrégats de ses
+    connexions de l'endpoint ip_summary, activity : série temporelle de
+    l'endpoint activity sur la période choisie, sampled : summary vient de
+    l'échantillon de l'aperçu rapide)
+    """
     st.header(f"Analyse de l'IP source: {selected_ip}")
 
-    # Récupération des détails pour l'IP sélectionnée
-    ip_details = get_ip_details(df_sample, selected_ip)
-
-    if ip_details.height == 0:
-        st.warning(f"Aucune donnée trouvée pour l'IP {selected_ip} dans l'échantillon")
+    if not summary["connections"]:
+        where = "dans l'échantillon" if sampled else "dans le store"
+        st.warning(f"Aucune donnée trouvée pour l'IP {selected_ip} {where}")
         return
 
+    actions = {row["action"]: row["count"] for row in summary["actions"]}
+
     col1, col2 = st.columns(2)
 
     with col1:
-        # Calcul du nombre de destinations uniques
-        n_destinations = ip_details["IPdst"].n_unique()
-
         # Création d'une métrique avec du contexte
         st.metric(
             "Nombre de destinations uniques contactées",
-            value=n_destinations,
+            value=summary["destinations"],
             help="Nombre total d'adresses IP uniques contactées par cette source",
         )
 
         # Ajout d'un détail dans un expander si nécessaire
         with st.expander("Voir les destinations"):
-            dest_counts = (
-                ip_details.group_by("IPdst")
-                .agg(pl.count().alias("count"))
-                .sort("count", descending=True)
-            )
+            dest_counts = pl.DataFrame(summary["top_destinations"])
+            if dest_counts.height < summary["destinations"]:
+                st.caption(f"Les {dest_counts.height:,} destinations les plus contactées")
             st.dataframe(
                 dest_counts.to_pandas().style.background_gradient(
                     subset=["count"], cmap="YlOrRd"
                 )
             )
     with col2:
-        action_counts = (
-            ip_details.group_by("action")
-            .agg(pl.count().alias("count"))
-            .sort("count", descending=True)
-        )
         fig_actions = px.pie(
-            action_counts.to_pandas(),
+            pl.DataFrame(summary["actions"]).to_pandas(),
             values="count",
             names="action",
             title=f"Distribution des actions pour {selected_ip}",
@@ -181,13 +85,8 @@ def render_ip_analysis(df_sample, ip_stats, selected_ip, date_range):
 
     ################################# Détails des connexions
     with st.expander("Détails des connexions"):
-        connections_detail = (
-            ip_details.select(["IPdst", "Port_dst", "action"])
-            .group_by(["IPdst", "Port_dst", "action"])
-            .agg(pl.count().alias("occurrences"))
-            .sort("occurrences", descending=True)
-        )
-        st.write("Détail des connexions :")
+        connections_detail = pl.DataFrame(summary["top_connections"]).rename({"count": "occurrences"})
+        st.write("Détail des connexions (les plus fréquentes) :")
         st.dataframe(
             connections_detail.to_pandas().style.background_gradient(
                 subset=["occurrences"], cmap="YlOrRd"
@@ -195,30 +94,19 @@ def render_ip_analysis(df_sample, ip_stats, selected_ip, date_range):
         )
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Nombre total de destinations", ip_details["IPdst"].n_unique())
+        st.metric("Nombre total de destinations", summary["destinations"])
     with col2:
-        st.metric(
-            "Connexions autorisées",
-            ip_details.filter(pl.col("action") == "PERMIT").height,
-        )
+        st.metric("Connexions autorisées", actions.get("PERMIT", 0))
     with col3:
-        st.metric(
-            "Connexions refusées",
-            ip_details.filter(pl.col("action") == "DENY").height,
-        )
+        st.metric("Connexions refusées", actions.get("DENY", 0))
 
     ################################# Distribution des ports et protocoles pour adresse spécifique
     st.subheader("Distribution des ports et protocoles")
     pie1, pie2 = st.columns(2)
 
     with pie1:
-        # Top 10 Port destinations pie chart
-        port_dist = (
-            ip_details.group_by("Port_dst")
-            .agg(pl.count().alias("count"))
-            .sort("count", descending=True)
-            .limit(10)  # Limit to top 10 for readability
-        )
+        # Top 10 des ports de destination, calculé par le service
+        port_dist = pl.DataFrame(summary["ports"])
 
         if port_dist.height > 0:
             fig_ports = px.pie(
@@ -234,12 +122,7 @@ def render_ip_analysis(df_sample, ip_stats, selected_ip, date_range):
             st.info("Aucune donnée de port disponible pour cette IP")
 
     with pie2:
-        # Protocol distribution pie chart
-        proto_dist = (
-            ip_details.group_by("Protocole")
-            .agg(pl.count().alias("count"))
-            .sort("count", descending=True)
-        )
+        proto_dist = pl.DataFrame(summary["protocols"])
 
         if proto_dist.height > 0:
             fig_proto = px.pie(
@@ -257,55 +140,26 @@ def render_ip_analysis(df_sample, ip_stats, selected_ip, date_range):
     ################################# Time Series Analysis
     st.subheader("Analyse temporelle des connexions")
 
-    # Convert to pandas for time series analysis
-    ip_details_pd = ip_details.to_pandas()
-    ip_details_pd["Date"] = pd.to_datetime(ip_details_pd["Date"])
-
-    # Filtrage par période si date_range est défini
-    if date_range and len(date_range) == 2:
-        start_date, end_date = date_range
-        mask = (ip_details_pd["Date"].dt.date >= start_date) & (
-            ip_details_pd["Date"].dt.date <= end_date
-        )
-        filtered_data = ip_details_pd[mask]
-    else:
-        filtered_data = ip_details_pd
-
-    # Vérification si filtered_data contient des données
-    if not filtered_data.empty:
-        # Daily activity plot
-        daily_stats = (
-            filtered_data.groupby([filtered_data["Date"].dt.date, "action"])
-            .size()
-            .unstack(fill_value=0)
-        )
+    # Séries pré-agrégées à l'ingestion (minute/heure/jour), résolution choisie par l'API
+    if activity is not None and activity.height > 0:
+        resolution = activity["resolution"][0]
+        unit = RESOLUTION_LABELS[resolution]
 
         fig_time = go.Figure()
-
-        if "PERMIT" in daily_stats.columns:
-            fig_time.add_trace(
-                go.Scatter(
-                    x=daily_stats.index,
-                    y=daily_stats["PERMIT"],
-                    name="PERMIT",
-                    line=dict(color="green", width=2),
-                    fill="tonexty",
+        for action, color in (("PERMIT", "green"), ("DENY", "red")):
+            if activity[action].sum() > 0:
+                fig_time.add_trace(
+                    go.Scatter(
+                        x=activity["bucket"].to_list(),
+                        y=activity[action].to_list(),
+                        name=action,
+                        line=dict(color=color, width=2),
+                        fill="tonexty",
+                    )
                 )
-            )
-
-        if "DENY" in daily_stats.columns:
-            fig_time.add_trace(
-                go.Scatter(
-                    x=daily_stats.index,
-                    y=daily_stats["DENY"],
-                    name="DENY",
-                    line=dict(color="red", width=2),
-                    fill="tonexty",
-                )
-            )
 
         fig_time.update_layout(
-            title=f"Activité pour {selected_ip}",
+            title=f"Activité pour {selected_ip} (par {unit})",
             xaxis_title="Date",
             yaxis_title="Nombre de connexions",
             hovermode="x unified",
@@ -319,35 +173,41 @@ def render_ip_analysis(df_sample, ip_stats, selected_ip, date_range):
         # Activity statistics
         with st.expander("Statistiques d'activité"):
             stats_col1, stats_col2, stats_col3 = st.columns(3)
+            busiest = activity.row(activity["total"].arg_max(), named=True)
 
             with stats_col1:
-                daily_total = daily_stats.sum(axis=1)
                 st.metric(
-                    "Moyenne journalière",
-                    f"{daily_total.mean():.1f}",
-                    help="Nombre moyen de connexions par jour",
+                    f"Moyenne par {unit}",
+                    f"{activity['total'].mean():.1f}",
+                    help=f"Nombre moyen de connexions par {unit} actif",
                 )
 
             with stats_col2:
                 st.metric(
-                    "Jour le plus actif",
-                    daily_total.idxmax().strftime("%Y-%m-%d"),
-                    f"{daily_total.max():.0f} connexions",
+                    f"{unit.capitalize()} le plus actif",
+                    busiest["bucket"].strftime(RESOLUTION_FORMATS[resolution]),
+                    f"{busiest['total']:.0f} connexions",
                 )
 
             with stats_col3:
-                active_days = (daily_total > 0).sum()
                 st.metric(
-                    "Jours d'activité",
-                    f"{active_days}",
-                    help="Nombre de jours avec au moins une connexion",
+                    f"Périodes d'activité ({unit})",
+                    f"{activity.height}",
+                    help=f"Nombre de périodes d'une {unit} avec au moins une connexion"
+                    if resolution != "day" else "Nombre de jours avec au moins une connexion",
                 )
     else:
         st.warning("Aucune donnée disponible pour la période sélectionnée")
 
 
-def render_global_analysis(df_sample):
-    """Rendu de l'analyse globale pour toutes les IP"""
+@profiled("analysis.render_global_analysis")
+def render_global_analysis(client, sample_size, ip_stats, approx=False):
+    """
+    Rendu de l'analyse globale pour toutes les IP, à partir de l'API analytique.
+    sample_size None : statistiques exactes sur tout le store, sinon aperçu rapide sur un échantillon.
+    approx : compteurs et classements estimés à partir des sketches de tout le store.
+    """
+    summary = client.query("flow_summary", n=sample_size, approx=approx)
 
     # Dashboard global
     st.header("Tableau de bord général")
@@ -355,26 +215,25 @@ def render_global_analysis(df_sample):
     # Métriques générales
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Nombre total de connexions", df_sample.height)
+        st.metric("Nombre total de connexions", summary["flows"])
     with col2:
-        st.metric("Nombre d'IP sources uniques", df_sample["IPsrc"].n_unique())
+        st.metric("Nombre d'IP sources uniques", summary["sources"])
     with col3:
-        st.metric("Nombre d'IP destinations uniques", df_sample["IPdst"].n_unique())
+        st.metric("Nombre d'IP destinations uniques", summary["destinations"])
     with col4:
-        permit_rate = (
-            df_sample.filter(pl.col("action") == "PERMIT").height / df_sample.height
-        ) * 100
+        permit_rate = summary["actions"].get("PERMIT", 0.0)
         st.metric("Taux d'autorisation", f"{permit_rate:.1f}%")
+    if approx:
+        errors = summary["errors"]
+        st.caption(
+            f"IP uniques estimées à ±{100 * errors['distinct_error']:.1f} % (écart type relatif). "
+            f"Les compteurs des classements sont des majorants, avec leur erreur maximale ; "
+            f"une IP absente du classement apparaît au plus {errors['sources_bound']:,} fois."
+        )
 
     ################################# Top 5 des IP Sources les plus émettrices
     st.subheader("Top 5 des IP Sources les plus émettrices")
-    top_ips = (
-        df_sample.select(pl.col("IPsrc"))
-        .group_by("IPsrc")
-        .count()
-        .sort("count", descending=True)
-        .limit(5)
-    )
+    top_ips = ip_stats.select("IPsrc", pl.col("total_count").alias("count")).limit(5)
 
     if top_ips.height > 0:
         fig_top_ips = px.bar(
@@ -393,7 +252,7 @@ def render_global_analysis(df_sample):
 
     ################################# Top 10 des ports inférieurs à 1024 avec accès autorisé
     st.subheader("Top 10 des ports inférieurs à 1024 avec accès autorisé")
-    top_ports = calculate_top_ports(df_sample)
+    top_ports = client.query("top_ports", n=sample_size, approx=approx)
 
     # st.write(top_ports)
 
@@ -429,22 +288,18 @@ def render_global_analysis(df_sample):
 
     ################################ Classification des IPs (internes/externes)
     st.subheader("Analyse des flux réseau (interne/externe)")
-    df_with_network_info = calculate_network_info(df_sample)
+    # Pas de sketch pour les flux interne/externe : calcul exact en mode approximatif
+    network_flows = client.query("network_flows", n=sample_size)
+    network_types = network_flows.with_columns(
+        pl.when(pl.col("is_src_internal")).then(pl.lit("Interne")).otherwise(pl.lit("Externe")).alias("type_source"),
+        pl.when(pl.col("is_dst_internal")).then(pl.lit("Interne")).otherwise(pl.lit("Externe")).alias("type_destination"),
+    )
 
     # Distribution interne/externe
     int_ext_col1, int_ext_col2 = st.columns(2)
 
     with int_ext_col1:
-        src_type_counts = (
-            df_with_network_info.select(
-                pl.when(pl.col("is_src_internal"))
-                .then(pl.lit("Interne"))
-                .otherwise(pl.lit("Externe"))
-                .alias("type_source")
-            )
-            .group_by("type_source")
-            .count()
-        )
+        src_type_counts = network_types.group_by("type_source").agg(pl.col("count").sum())
 
         fig_src_type = px.pie(
             src_type_counts.to_pandas(),
@@ -456,16 +311,7 @@ def render_global_analysis(df_sample):
         st.plotly_chart(fig_src_type, use_container_width=True)
 
     with int_ext_col2:
-        dst_type_counts = (
-            df_with_network_info.select(
-                pl.when(pl.col("is_dst_internal"))
-                .then(pl.lit("Interne"))
-                .otherwise(pl.lit("Externe"))
-                .alias("type_destination")
-            )
-            .group_by("type_destination")
-            .count()
-        )
+        dst_type_counts = network_types.group_by("type_destination").agg(pl.col("count").sum())
 
         fig_dst_type = px.pie(
             dst_type_counts.to_pandas(),
@@ -478,17 +324,13 @@ def render_global_analysis(df_sample):
 
     # Diagramme Sankey des flux réseau
     flux_data = (
-        df_with_network_info.select(
-            [
-                pl.when(pl.col("is_src_internal"))
-                .then(pl.lit("IP Interne"))
-                .otherwise(pl.lit("IP Externe"))
-                .alias("source"),
-                pl.col("action").alias("target"),
-            ]
+        network_types.select(
+            ("IP " + pl.col("type_source")).alias("source"),
+            pl.col("action").alias("target"),
+            "count",
         )
         .group_by(["source", "target"])
-        .count()
+        .agg(pl.col("count").sum())
         .sort("count", descending=True)
     )
 
@@ -563,24 +405,25 @@ def render_global_analysis(df_sample):
 
     # Détail des IPs externes
     st.subheader("Détail des IPs externes")
-    external_ips = (
-        df_with_network_info.filter(pl.col("is_src_internal") == False)
-        .group_by(["IPsrc", "action"])
-        .agg(pl.count().alias("nombre_tentatives"))
-        .sort("nombre_tentatives", descending=True)
-    )
+    external_ips = client.query("external_sources", limit=EXTERNAL_SOURCES_LIMIT, n=sample_size, approx=approx)
 
     if external_ips.height > 0:
+        st.caption(f"{EXTERNAL_SOURCES_LIMIT} couples (IP, action) les plus fréquents au maximum")
         st.dataframe(external_ips)
     else:
-        st.info("Aucune IP externe détectée dans l'échantillon")
+        st.info("Aucune IP externe détectée")
 
 
 def analyze_logs():
 
-    # Chargement des données
-    df = load_parquet_data()
-    if df is None:
+    # Chargement des données via l'API analytique
+    client = get_client()
+    try:
+        info = client.query("info")
+    except Exception as e:
+        st.error(f"Erreur lors de la lecture des données: {e}")
+        return
+    if not info["sample_rows"]:
         st.error("Impossible de charger les données. Vérifiez le fichier logs.parquet.")
         return
 
@@ -588,60 +431,93 @@ def analyze_logs():
     with st.sidebar:
         st.header("Filtres")
 
-        # Option pour échantillonner les données
-        sample_size = st.slider(
-            "Nombre d'entrées à analyser (échantillon)",
-            min_value=1000,
-            max_value=min(100000, df.height),
-            value=10000,
-            step=1000,
+        # Statistiques exactes sur tout le store, ou aperçu rapide sur un échantillon
+        mode = st.radio(
+            "Mode de calcul",
+            [EXACT_MODE, APPROX_MODE, PREVIEW_MODE],
+            help=(
+                "Le mode approximatif lit les sketches maintenus à l'ingestion : instantané, avec des bornes "
+                "d'erreur connues. L'aperçu rapide est approximatif : les attaquants rares peuvent ne pas "
+                "apparaître dans l'échantillon."
+            ),
         )
+        approx = mode == APPROX_MODE
+        sample_size = None
+        if mode == PREVIEW_MODE:
+            # L'échantillon est borné par le service (sample_limit)
+            max_sample = max(1, min(info["sample_limit"], info["sample_rows"]))
+            sample_size = st.slider(
+                "Nombre d'entrées à analyser (échantillon)",
+                min_value=min(1000, max_sample),
+                max_value=max_sample,
+                value=min(10000, max_sample),
+                step=min(1000, max_sample),
+            )
 
-        # Échantillonnage des données
-        df_sample = sample_data(df, n=sample_size)
-
-        # Calcul des statistiques IP
-        ip_stats = calculate_ip_stats(df_sample)
+        # Statistiques IP (les plus actives, pour la sélection)
+        ip_stats = client.query("ip_stats", n=sample_size, limit=IP_OPTIONS_LIMIT, approx=approx)
 
         # Sélection de l'IP source (pour l'onglet analyse IP)
+        connections = dict(zip(ip_stats["IPsrc"].to_list(), ip_stats["total_count"].to_list()))
         selected_ip = st.selectbox(
             "Sélectionner une IP source",
-            options=ip_stats["IPsrc"].to_list(),
-            format_func=lambda x: f"{x} ({ip_stats.filter(pl.col('IPsrc') == x)['total_count'].item()} connexions)",
+            options=list(connections),
+            format_func=lambda x: f"{x} ({connections[x]} connexions)",
             key="ip_selector",
         )
 
         # Filtre de période pour l'analyse temporelle
-        ip_details = get_ip_details(df_sample, selected_ip)
-        ip_details_pd = ip_details.to_pandas()
-        ip_details_pd["Date"] = pd.to_datetime(ip_details_pd["Date"])
-
-        if not ip_details_pd.empty:
+        # Agrégats des connexions de l'IP, calculés par le service (jamais toutes ses lignes)
+        ip_summary = client.query("ip_summary", ip=selected_ip, n=sample_size)
+        since = until = None
+        if ip_summary["connections"]:
+            first_day = datetime.fromisoformat(ip_summary["first"]).date()
+            last_day = datetime.fromisoformat(ip_summary["last"]).date()
             date_range = st.date_input(
                 "Sélectionner la période d'analyse",
-                value=(
-                    ip_details_pd["Date"].min().date(),
-                    ip_details_pd["Date"].max().date(),
-                ),
-                min_value=ip_details_pd["Date"].min().date(),
-                max_value=ip_details_pd["Date"].max().date(),
+                value=(first_day, last_day),
+                min_value=first_day,
+                max_value=last_day,
             )
+            if len(date_range) == 2:
+                start_date, end_date = date_range
+                # Zoom horaire sur une journée : la série passe à la minute
+                hours = (0, 24)
+                if start_date == end_date:
+                    hours = st.slider("Plage horaire", 0, 24, (0, 24), format="%dh")
+                since = datetime.combine(start_date, time()) + timedelta(hours=hours[0])
+                until = datetime.combine(end_date, time()) + timedelta(hours=hours[1]) - timedelta(microseconds=1)
         else:
             st.warning(f"Aucune donnée trouvée pour l'IP {selected_ip}")
-            date_range = None
+
+        # Série temporelle de l'IP, lue dans les agrégats pré-calculés de tout le store
+        activity = client.query("activity", ip=selected_ip, since=since, until=until, points=ACTIVITY_POINTS)
 
         st.markdown("---")
 
+    if approx:
+        st.caption(
+            f"Statistiques estimées à partir des sketches des {info['rows']:,} logs du store ; "
+            "l'analyse d'une IP et les flux interne/externe restent exacts."
+        )
+    elif sample_size is None:
+        st.caption(f"Statistiques exactes calculées sur les {info['rows']:,} logs du store.")
+    else:
+        st.warning(
+            f"Aperçu rapide : statistiques calculées sur un échantillon de {sample_size:,} logs "
+            f"(sur {info['rows']:,}), approximatives."
+        )
+
     # Création des onglets
     tab1, tab2 = st.tabs(["🔍 Analyse d'une adresse IP", "📊 Vue d'ensemble du réseau"])
 
     # Contenu de l'onglet 1: Analyse d'une adresse IP spécifique
     with tab1:
-        render_ip_analysis(df_sample, ip_stats, selected_ip, date_range)
+        render_ip_analysis(ip_summary, selected_ip, activity, sampled=sample_size is not None)
 
     # Contenu de l'onglet 2: Analyse de toutes les adresses
     with tab2:
-        render_global_analysis(df_sample)
+        render_global_analysis(client, sample_size, ip_stats, approx)
 
 
 if __name__ == "__main__":
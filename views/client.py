@@ -0,0 +1,51 @@
+import streamlit as st
+
+from analytics.client import default_client
+
+
+@st.cache_resource
+def shared_client():
+    """
+    Client de l'API analytique partagé par les pages : distant si OPSIE_API_URL
+    est défini (python -m analytics.server), en mémoire sinon.
+    """
+    return default_client()
+
+
+class FirewallClient:
+    """Client limité au pare-feu choisi dans la barre latérale (tous si aucun)"""
+
+    def __init__(self, client, firewall=None):
+        self.client = client
+        self.firewall = firewall
+
+    def query(self, endpoint, **params):
+        if self.firewall is not None and endpoint != "firewalls":
+            params.setdefault("firewall", self.firewall)
+        return self.client.query(endpoint, **params)
+
+
+def get_client():
+    """Client des pages, restreint au pare-feu sélectionné (st.session_state["firewall"])"""
+    return FirewallClient(shared_client(), st.session_state.get("firewall"))
+
+
+def firewall_selector():
+    """Choix du pare-feu dans la barre latérale ; toutes les pages filtrent sur ce choix"""
+    try:
+        devices = shared_client().query("firewalls")
+    except Exception:
+        return
+    ids = [firewall for firewall in devices["firewall"].to_list() if firewall is not None]
+    if not ids:
+        st.session_state.pop("firewall", None)
+        return
+    options = ["Tous"] + ids
+    current = st.session_state.get("firewall")
+    choice = st.selectbox(
+        "Pare-feu",
+        options,
+        index=options.index(current) if current in options else 0,
+        format_func=lambda option: option if option == "Tous" else f"Pare-feu {option}",
+    )
+    st.session_state["firewall"] = None if choice == "Tous" else choice
@@ -3,54 +3,66 @@ import polars as pl
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
-from db import LogDatabase
+from analytics.filters import Filters, FilterEngine
+from monitoring.profiling import profiled
+from views.client import get_client
 
 # Configuration de la page
 st.set_page_config(page_title="Analyse des logs de firewall", layout="wide")
 
+@profiled("data.load_data")
 def load_data():
-    """Fonction pour charger et préparer les données."""
+    """
+    Fonction pour charger les données (échantillon du store) via l'API analytique.
+    Le moteur de filtres est conservé dans la session tant que la version des
+    données ne change pas : l'échantillon et les valeurs des filtres ne sont
+    pas rechargés à chaque interaction.
+    """
     try:
-        db = LogDatabase()
-        
-        df = db.get_logs_sample()
-        
-        return df
+        client = get_client()
+        version = client.query("info")["version"]
+        engine = st.session_state.get("data_filter_engine")
+        if engine is None or engine.version != version:
+            engine = FilterEngine(client.query("sample"), version)
+            st.session_state["data_filter_engine"] = engine
+        return engine
     except Exception as e:
         st.error(f"Erreur lors de la lecture du fichier: {e}")
         return None
 
-def render_data_explorer(df):
-    """Fonction pour explorer les données avec des filtres."""
+def render_data_explorer(engine):
+    """Fonction pour explorer les données avec des filtres (engine : FilterEngine de l'échantillon)."""
+    df = engine.df
     
-    # Section des filtres dans la sidebar
+    # Section des filtres dans la sidebar : un formulaire, les filtres ne
+    # sont appliqués qu'à la validation et non à chaque changement de widget
     st.sidebar.subheader("Filtres")
+    form = st.sidebar.form("data_filters")
     
     # Filtre par action (PERMIT/DENY)
     selected_action = "Tous"
     if "action" in df.columns:
-        actions = ["Tous"] + df["action"].unique().to_list()
-        selected_action = st.sidebar.selectbox("Action", actions)
+        actions = ["Tous"] + engine.options("action")
+        selected_action = form.selectbox("Action", actions)
     
     # Filtre par Protocol
     selected_protocol = "Tous"
     if "Protocole" in df.columns:
-        protocols = ["Tous"] + df["Protocole"].unique().to_list()
-        selected_protocol = st.sidebar.selectbox("Protocole", protocols)
+        protocols = ["Tous"] + engine.options("Protocole")
+        selected_protocol = form.selectbox("Protocole", protocols)
     
     # Filtre par port de destination
     selected_dst_port = "Tous"
     if "Port_dst" in df.columns:
-        dst_ports = ["Tous"] + df["Port_dst"].unique().to_list()
-        selected_dst_port = st.sidebar.selectbox("Port de destination", dst_ports)
+        dst_ports = ["Tous"] + engine.options("Port_dst")
+        selected_dst_port = form.selectbox("Port de destination", dst_ports)
     
     # Filtre par plage de temps
-    date_range = [df["Date"].min().date(), df["Date"].max().date()]
+    date_range = []
     if "Date" in df.columns:
-        min_date = df["Date"].min().date()
-        max_date = df["Date"].max().date()
+        min_date, max_date = (bound.date() for bound in engine.date_bounds())
         
-        date_range = st.sidebar.date_input(
+        date_range = form.date_input(
             "Plage de dates",
             [min_date, max_date],
             min_value=min_date,
@@ -58,40 +70,29 @@ def render_data_explorer(df):
         )
     
     # Filtre pour le nombre de lignes à afficher
-    max_rows = st.sidebar.slider(
+    max_rows = form.slider(
         "Nombre de lignes à afficher",
         min_value=1,
         max_value=df.height,
         value=min(100, df.height)  # Valeur par défaut : 100 ou moins si le DataFrame est plus petit
     )
-    
-    # Appliquer les filtres
-    filtered_df = df.clone()
-    
-    # Filtre par action
-    if "action" in df.columns and selected_action != "Tous":
-        filtered_df = filtered_df.filter(pl.col("action") == selected_action)
-    
-    # Filtre par Protocol
-    if "Protocole" in df.columns and selected_protocol != "Tous":
-        filtered_df = filtered_df.filter(pl.col("Protocole") == selected_protocol)
-    
-    # Filtre par port de destination
-    if "Port_dst" in df.columns and selected_dst_port != "Tous":
-        filtered_df = filtered_df.filter(pl.col("Port_dst") == selected_dst_port)
-    
-    # Filtre par plage de temps
-    if "Date" in df.columns and len(date_range) == 2:
-        start_date = date_range[0]
-        end_date = date_range[1]
-        
-        start_datetime = datetime.combine(start_date, datetime.min.time())
-        end_datetime = datetime.combine(end_date, datetime.max.time())
-        
-        filtered_df = filtered_df.filter(
-            (pl.col("Date") >= start_datetime) & 
-            (pl.col("Date") <= end_datetime)
+    form.form_submit_button("Appliquer")
+    
+    # Appliquer les filtres, en une seule expression ; un filtre resserré
+    # repart du résultat précédent au lieu de tout l'échantillon
+    start_datetime = end_datetime = None
+    if len(date_range) == 2:
+        start_datetime = datetime.combine(date_range[0], datetime.min.time())
+        end_datetime = datetime.combine(date_range[1], datetime.max.time())
+    filtered_df = engine.apply(
+        Filters(
+            action=None if selected_action == "Tous" else selected_action,
+            protocol=None if selected_protocol == "Tous" else selected_protocol,
+            port_dst=None if selected_dst_port == "Tous" else selected_dst_port,
+            start=start_datetime,
+            end=end_datetime,
         )
+    )
     
     # Limiter le nombre de lignes affichées selon le filtre
     limited_df = filtered_df.head(max_rows)
@@ -109,7 +110,7 @@ def render_data_explorer(df):
     
     with col1:
         if "action" in df.columns:
-            action_counts = filtered_df.group_by("action").agg(pl.count()).sort("count", descending=True)
+            action_counts = filtered_df.group_by("action").agg(pl.len().alias("count")).sort("count", descending=True)
             st.write("Répartition des actions:")
             
             # Créer un graphique avec Plotly
@@ -124,7 +125,7 @@ def render_data_explorer(df):
     
     with col2:
         if "IPsrc" in df.columns:
-            ip_counts = filtered_df.group_by("IPsrc").agg(pl.count()).sort("count", descending=True).head(10)
+            ip_counts = filtered_df.group_by("IPsrc").agg(pl.len().alias("count")).sort("count", descending=True).head(10)
             st.write("Top 10 des IPs sources:")
             
             fig = px.bar(
@@ -140,11 +141,11 @@ def explore_data():
     """Fonction principale pour afficher les données sous forme de tableau et analyses."""
     try:
         # Lire les données à partir du fichier
-        df = load_data()
+        engine = load_data()
         
-        if df is not None:
+        if engine is not None:
             # Afficher uniquement l'explorateur de données
-            render_data_explorer(df)
+            render_data_explorer(engine)
     except Exception as e:
         st.error(f"Erreur lors de l'analyse des données: {e}")
 
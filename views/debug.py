@@ -0,0 +1,80 @@
+import math
+import os
+
+import streamlit as st
+
+from monitoring.profiling import PROFILER, current_session_id
+
+
+def debug_enabled():
+    """Le panneau de debug est optionnel : OPSIE_DEBUG=1 ou ?debug=1 dans l'URL"""
+    return os.environ.get("OPSIE_DEBUG") == "1" or st.query_params.get("debug") == "1"
+
+
+def _format_bytes(value):
+    if value is None or math.isnan(value):
+        return ""
+    for unit in ("o", "Ko", "Mo", "Go"):
+        if abs(value) < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} To"
+
+
+def debug_panel():
+    """Affiche le temps passé par fonction lors du dernier rerun de la page"""
+    # pandas n'est chargé que si le panneau est affiché
+    import pandas as pd
+
+    with st.sidebar.expander("🐞 Profilage", expanded=False):
+        enabled = st.toggle("Activer le profilage", value=PROFILER.enabled, key="profiling_enabled")
+        if enabled and not PROFILER.enabled:
+            PROFILER.enable()
+        elif not enabled and PROFILER.enabled:
+            PROFILER.disable()
+        if st.button("Vider les mesures"):
+            PROFILER.clear()
+
+    if not PROFILER.enabled:
+        return
+
+    session = current_session_id()
+    run = PROFILER.current_run(session)
+    records = PROFILER.select(session, run)
+
+    st.markdown("---")
+    st.subheader(f"🐞 Profilage du rerun n°{run}")
+    if not records:
+        st.info("Aucun appel mesuré pendant ce rerun.")
+        return
+
+    calls = pd.DataFrame([record.to_dict() for record in records])
+    calls["start"] = calls["start"] - calls["start"].min()
+    calls["ms"] = calls["seconds"] * 1000
+    calls["fonction"] = ["  " * depth + name for depth, name in zip(calls["depth"], calls["name"])]
+    calls["cache"] = calls["cache_hit"].map({True: "hit", False: "miss"}).fillna("")
+    calls["mémoire pic"] = calls["peak_memory"].map(_format_bytes)
+    calls["Δ RSS"] = calls["rss_delta"].map(_format_bytes)
+    st.caption(f"Total mesuré (appels de premier niveau) : {calls.loc[calls['depth'] == 0, 'ms'].sum():.0f} ms")
+    st.dataframe(
+        calls[["fonction", "ms", "rows_in", "rows_out", "cache", "mémoire pic", "Δ RSS", "error"]],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    with st.expander("Cumul depuis le démarrage de la session"):
+        st.dataframe(pd.DataFrame(PROFILER.summary(PROFILER.select(session))), use_container_width=True, hide_index=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            "Exporter en JSON", PROFILER.to_json(records), file_name=f"profil-rerun-{run}.json", mime="application/json"
+        )
+    with col2:
+        st.download_button(
+            "Exporter en trace Chrome",
+            PROFILER.to_chrome_trace(PROFILER.select(session)),
+            file_name="profil-trace.json",
+            mime="application/json",
+            help="À ouvrir dans chrome://tracing ou https://ui.perfetto.dev",
+        )
@@ -1,98 +1,90 @@
 import streamlit as st
 import pandas as pd
-import ipaddress
-from db import LogDatabase
+from analytics.anomalies import perform_isolation_forest, perform_pca, preprocess_logs
+from monitoring.profiling import profiled
+from views.client import get_client
 import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import IsolationForest
 from matplotlib.lines import Line2D
-import seaborn as sns
 
 
-@st.cache_data
-def get_logs():
-    return LogDatabase().get_logs()
+def load_and_preprocess_data():
+    logs = get_client().query("sample")
+    return preprocess_logs(logs)
 
-def perform_isolation_forest(pca_df, contamination=0.01):
-    print(f"Training Isolation Forest with contamination={contamination}...")
-    
-    # Initialize and fit the model
-    iso_forest = IsolationForest(
-        n_estimators=100,
-        max_samples='auto',
-        contamination=contamination,
-        random_state=42
+# Budget de points normaux dessinés un par un ; au-delà, ils sont agrégés
+# dans une grille de taille fixe pour que le coût de rendu reste constant.
+SCATTER_POINT_BUDGET = 20000
+RASTER_SHAPE = (320, 240)
+
+
+def rasterize_points(x, y, shape=RASTER_SHAPE, extent=None):
+    """Agrège des points dans une grille de densité de taille fixe (style datashader)"""
+    width, height = shape
+    if extent is None:
+        extent = ((float(np.min(x)), float(np.max(x))), (float(np.min(y)), float(np.max(y))))
+    # Évite une plage vide quand tous les points ont la même coordonnée
+    extent = tuple((low, high) if high > low else (low - 0.5, low + 0.5) for low, high in extent)
+    (x_min, x_max), (y_min, y_max) = extent
+    # Indices de cellule calculés directement puis comptés avec bincount,
+    # nettement plus rapide que np.histogram2d sur des millions de points
+    col = ((np.asarray(x) - x_min) * (width / (x_max - x_min))).astype(np.int64)
+    row = ((np.asarray(y) - y_min) * (height / (y_max - y_min))).astype(np.int64)
+    np.clip(col, 0, width - 1, out=col)
+    np.clip(row, 0, height - 1, out=row)
+    counts = np.bincount(row * width + col, minlength=width * height)
+    # imshow attend les lignes selon l'axe y
+    return counts.reshape(height, width), (x_min, x_max, y_min, y_max)
+
+
+@profiled("ml.build_anomaly_figure")
+def build_anomaly_figure(pca_df, point_budget=SCATTER_POINT_BUDGET, shape=RASTER_SHAPE):
+    """
+    Construit la figure ACP avec les anomalies en surbrillance.
+    Les anomalies sont toujours dessinées individuellement ; les points normaux
+    sont dessinés tels quels sous le budget, sinon agrégés en carte de densité.
+    """
+    x = pca_df['PC1'].to_numpy()
+    y = pca_df['PC2'].to_numpy()
+    is_anomaly = pca_df['is_anomaly'].to_numpy(dtype=bool)
+    normal_x, normal_y = x[~is_anomaly], y[~is_anomaly]
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+
+    if len(normal_x) <= point_budget:
+        ax.scatter(normal_x, normal_y, s=12, c='blue', alpha=0.5, label='False')
+    elif len(normal_x) > 0:
+        extent = ((float(x.min()), float(x.max())), (float(y.min()), float(y.max())))
+        counts, bounds = rasterize_points(normal_x, normal_y, shape=shape, extent=extent)
+        masked = np.ma.masked_equal(counts, 0)
+        image = ax.imshow(
+            np.ma.log10(masked),
+            origin='lower',
+            extent=bounds,
+            aspect='auto',
+            cmap='Blues',
+            interpolation='nearest',
+        )
+        fig.colorbar(image, ax=ax, label='log10(points normaux par cellule)')
+        ax.plot([], [], 's', color='blue', alpha=0.5, label=f'False (densité, {len(normal_x)} points)')
+
+    ax.scatter(
+        x[is_anomaly], y[is_anomaly], s=12, c='red', alpha=0.8, label='True', rasterized=True
     )
-    
-    # Fit and predict
-    pca_df['anomaly'] = iso_forest.fit_predict(pca_df)
-    
-    # Convert predictions: -1 for anomalies, 1 for normal points
-    # Convert to boolean for easier interpretation
-    pca_df['is_anomaly'] = pca_df['anomaly'] == -1
-    
-    # Count anomalies
-    anomaly_count = pca_df['is_anomaly'].sum()
-    print(f"Detected {anomaly_count} anomalies out of {len(pca_df)} data points ({anomaly_count/len(pca_df)*100:.2f}%)")
-    
-    return pca_df, iso_forest
 
-def load_and_preprocess_data():
-    db = LogDatabase()
-    logs = db.get_logs_sample()
-    print(type(logs))
-    df = logs.to_pandas()
-    
-    # Convert date to datetime
-    df['Date'] = pd.to_datetime(df['Date'])
-    
-    # Extract time features
-    df['hour'] = df['Date'].dt.hour
-    df['day_of_week'] = df['Date'].dt.dayofweek
-    
-    # Convert IP addresses to numerical values
-    def ip_to_int(ip):
-        try:
-            return int(ipaddress.ip_address(ip))
-        except:
-            return np.nan
-    
-    print("Converting IP addresses...")
-    df['IPsrc_int'] = df['IPsrc'].apply(ip_to_int)
-    df['IPdst_int'] = df['IPdst'].apply(ip_to_int)
-    
-    # One-hot encode categorical features
-    print("Encoding categorical features...")
-    df = pd.get_dummies(df, columns=['Protocole', 'action'], drop_first=True)
-    
-    # Handle missing values
-    df = df.fillna(0)
-    
-    return df
+    ax.set_title('PCA with Anomalies Highlighted')
+    ax.set_xlabel('Principal Component 1')
+    ax.set_ylabel('Principal Component 2')
+    ax.legend(title='Anomaly')
+    fig.tight_layout()
+    return fig
+
 
 def visualize_results(pca_df, original_df=None):
     # Plot PCA with anomalies highlighted
-    plt.figure(figsize=(12, 8))
-    
-    # Create scatter plot
-    sns.scatterplot(
-        data=pca_df,
-        x='PC1',
-        y='PC2',
-        hue='is_anomaly',
-        palette={True: 'red', False: 'blue'},
-        alpha=0.5
-    )
-    
-    plt.title('PCA with Anomalies Highlighted')
-    plt.xlabel('Principal Component 1')
-    plt.ylabel('Principal Component 2')
-    plt.legend(title='Anomaly')
-    
-    plt.tight_layout()
-    st.pyplot(plt)
+    fig = build_anomaly_figure(pca_df)
+    st.pyplot(fig)
+    plt.close(fig)
     
     # If original data is provided, analyze anomalies in original context
     if original_df is not None and not pca_df['is_anomaly'].empty:
@@ -121,18 +113,6 @@ def machine_learning_page():
     
     import matplotlib.pyplot as plt
 
-    def perform_pca(df, n_components):
-        feature_cols = df.select_dtypes(include=[np.number]).columns
-        scaler = StandardScaler()
-        scaled_data = scaler.fit_transform(df[feature_cols])
-        
-        pca = PCA(n_components=n_components)
-        pca_data = pca.fit_transform(scaled_data)
-        
-        pca_df = pd.DataFrame(data=pca_data, columns=[f'PC{i+1}' for i in range(n_components)])
-        
-        return pca_df, pca, scaler, feature_cols
-
     def plot_pca_results(df, n_components=5):
         pca_df, pca, scaler, feature_cols = perform_pca(df, n_components)
         
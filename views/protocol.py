@@ -1,9 +1,13 @@
+import math
+
 import streamlit as st
 import polars as pl
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 from datetime import datetime
-from db import LogDatabase
+from monitoring.profiling import profiled
+from views.client import get_client
 
 # Définition des plages de ports selon la RFC 6056 et options complémentaires
 RFC_PORT_RANGES = {
@@ -15,36 +19,15 @@ RFC_PORT_RANGES = {
 }
 
 
-@st.cache_data
-def load_data():
-    """
-    Charge les données depuis un fichier CSV (ou TXT) et effectue les conversions nécessaires.
-    Le fichier doit contenir les colonnes suivantes (sans header) : 
-    Date;IPsrc;IPdst;Protocol;Port_src;Port_dst;idRegle;action;interface_entrée;interface_sortie
-    """
-    try:
-        db = LogDatabase()
-        
-        df = db.get_logs_sample()
-        # df = db.get_logs()
-        # df = df.to_panadas()
-
-        # st.write("Aperçu des données:")
-        # st.write(df.head(5))
-        # Conversion de la date au format datetime
-        # df = df.with_columns(pl.col("Date").str.to_datetime("%Y-%m-%d %H:%M:%S"))
-        # Conversion des ports en entiers
-        df = df.with_columns([
-            pl.col("Port_src").cast(pl.Int32),
-            pl.col("Port_dst").cast(pl.Int32)
-        ])
-        return df
-    except Exception as e:
-        st.error(f"Erreur lors du chargement du fichier : {e}")
-        return None
+# Correspondance entre les libellés de la page et les paramètres de l'API
+PORT_TYPES = {"Source": "src", "Destination": "dst", "Les deux": "both"}
+
+# Libellés du sens des connexions -> paramètre direction de l'API
+GRAPH_DIRECTIONS = {"Les deux": "both", "Sortantes (fan-out)": "out", "Entrantes (fan-in)": "in"}
+
 
-def apply_filters(df):
-    """Applique les filtres via la sidebar."""
+def apply_filters(info):
+    """Construit les filtres via la sidebar (info : bornes des données, cf. endpoint "info")."""
     st.sidebar.header("Filtres")
     
     # Filtre par Protocol (on se focalise sur TCP et UDP)
@@ -67,50 +50,39 @@ def apply_filters(df):
     port_type = st.sidebar.selectbox("Type de port à filtrer", ["Source", "Destination", "Les deux"])
     
     # Filtre par plage de dates
-    min_date = df["Date"].min().date()
-    max_date = df["Date"].max().date()
+    min_date = datetime.fromisoformat(info["date_min"]).date()
+    max_date = datetime.fromisoformat(info["date_max"]).date()
     date_range = st.sidebar.date_input("Plage de dates", [min_date, max_date],
                                          min_value=min_date, max_value=max_date)
     
-    filtered_df = df.clone()
-    
-    # Filtre sur le Protocol
-    if selected_protocol != "Tous":
-        filtered_df = filtered_df.filter(pl.col("Protocole") == selected_protocol)
-    
-    # Filtre sur l'action (autorisé vs rejeté)
-    if selected_action != "Tous":
-        filtered_df = filtered_df.filter(pl.col("action") == selected_action)
-    
-    # Filtre sur la plage de ports
-    if selected_range != "Tous":  # N'applique le filtrage que si "Tous" n'est pas sélectionné
-        min_port, max_port = custom_port_range
-        if port_type in ["Source", "Les deux"]:
-            filtered_df = filtered_df.filter((pl.col("Port_src") >= min_port) & (pl.col("Port_src") <= max_port))
-        if port_type in ["Destination", "Les deux"]:
-            filtered_df = filtered_df.filter((pl.col("Port_dst") >= min_port) & (pl.col("Port_dst") <= max_port))
-    
+    port_range = custom_port_range if selected_range != "Tous" else None
+    return flow_filters(selected_protocol, selected_action, port_range, port_type, date_range)
+
+def flow_filters(protocol="Tous", action="Tous", port_range=None, port_type="Les deux", date_range=()):
+    """Traduit les choix de la page en paramètres de l'endpoint "flows" de l'API analytique."""
+    filters = {
+        "protocol": None if protocol == "Tous" else protocol,
+        "action": None if action == "Tous" else action,
+        "port_type": PORT_TYPES[port_type],
+    }
+    # Filtre sur la plage de ports (None : toutes les plages)
+    if port_range is not None:
+        filters["min_port"], filters["max_port"] = port_range
     # Filtre sur la période
     if len(date_range) == 2:
-        start_date = datetime.combine(date_range[0], datetime.min.time())
-        end_date = datetime.combine(date_range[1], datetime.max.time())
-        filtered_df = filtered_df.filter((pl.col("Date") >= start_date) & (pl.col("Date") <= end_date))
-    
-    return filtered_df
+        filters["start"], filters["end"] = date_range
+    return filters
 
-def plot_analysis(filtered_df):
-    """Réalise l'analyse descriptive et affiche des graphiques avancés."""
+@profiled("protocol.plot_analysis")
+def plot_analysis(filtered_df, summary):
+    """Réalise l'analyse descriptive et affiche des graphiques avancés (summary : endpoint "flow_summary")."""
     df_pd = filtered_df.to_pandas()
     
-    total_flows = len(df_pd)
-    
     # 1. Métriques pour les pourcentages par action
     st.subheader("Métriques des Flux")
     
-    action_counts = df_pd["action"].value_counts(normalize=True) * 100
-    protocol_counts = df_pd["Protocole"].value_counts(normalize=True) * 100
-    source_counts = df_pd["IPsrc"].value_counts(normalize=True) * 100
-    destination_counts = df_pd["IPdst"].value_counts(normalize=True) * 100
+    action_counts = summary["actions"]
+    protocol_counts = summary["protocols"]
     
     st.markdown(
         """
@@ -150,10 +122,10 @@ def plot_analysis(filtered_df):
             deny=action_counts.get('DENY', 0),
             tcp=protocol_counts.get('TCP', 0),
             udp=protocol_counts.get('UDP', 0),
-            top_source=source_counts.iloc[0],
-            top_source_ip=source_counts.index[0],
-            top_dest=destination_counts.iloc[0],
-            top_dest_ip=destination_counts.index[0]
+            top_source=summary["top_source"]["share"],
+            top_source_ip=summary["top_source"]["ip"],
+            top_dest=summary["top_destination"]["share"],
+            top_dest_ip=summary["top_destination"]["ip"]
         ),
         unsafe_allow_html=True
     )
@@ -181,25 +153,135 @@ def plot_analysis(filtered_df):
         title="Distribution des ports sources par Protocole et action"
     )
     st.plotly_chart(fig_violin, use_container_width=True)
-    
-    # 4. Heatmap
-    st.subheader("Heatmap : Flux entre IP source et IP destination")
-    heatmap_data = df_pd.groupby(["IPsrc", "IPdst"]).size().unstack(fill_value=0)
-    fig_heatmap = px.imshow(
-        heatmap_data,
-        labels=dict(x="IP Destination", y="IP Source", color="Nombre de flux"),
-        title="Flux entre IP source et IP destination"
+
+
+def radial_layout(edges):
+    """
+    Positions des nœuds d'un sous-graphe (endpoint "graph_subgraph") : l'adresse
+    centrale à l'origine, les nœuds à k sauts sur le cercle de rayon k.
+    """
+    nodes = (
+        pl.concat([
+            edges.select(pl.col("IPsrc").alias("ip"), pl.col("src_hop").alias("hop")),
+            edges.select(pl.col("IPdst").alias("ip"), pl.col("dst_hop").alias("hop")),
+        ])
+        .unique()
+        .sort(["hop", "ip"])
+    )
+    rank = pl.int_range(pl.len()).over("hop")
+    angle = 2 * math.pi * rank / pl.len().over("hop")
+    return nodes.with_columns(
+        (pl.col("hop") * angle.cos()).alias("x"),
+        (pl.col("hop") * angle.sin()).alias("y"),
+    )
+
+
+def graph_figure(edges, center):
+    """Figure Plotly d'un sous-graphe : arêtes refusées en rouge, nœuds colorés par nombre de sauts"""
+    positions = radial_layout(edges)
+    coords = {ip: (x, y) for ip, x, y in positions.select("ip", "x", "y").iter_rows()}
+    fig = go.Figure()
+    for label, color, denied in (("Majoritairement autorisées", "#2ecc71", False), ("Majoritairement refusées", "#e74c3c", True)):
+        subset = edges.filter((pl.col("deny") * 2 > pl.col("count")) == denied)
+        xs, ys = [], []
+        for src, dst in subset.select("IPsrc", "IPdst").iter_rows():
+            xs += [coords[src][0], coords[dst][0], None]
+            ys += [coords[src][1], coords[dst][1], None]
+        fig.add_trace(go.Scatter(x=xs, y=ys, mode="lines", line=dict(width=1, color=color), name=label, hoverinfo="skip"))
+    degree = pl.concat([edges["IPsrc"], edges["IPdst"]]).value_counts(name="liens").rename({"IPsrc": "ip"})
+    nodes = positions.join(degree, on="ip", how="left")
+    fig.add_trace(
+        go.Scatter(
+            x=nodes["x"].to_list(),
+            y=nodes["y"].to_list(),
+            mode="markers",
+            marker=dict(
+                size=[8 + 4 * math.log1p(n) for n in nodes["liens"].to_list()],
+                color=nodes["hop"].to_list(),
+                colorscale="Viridis",
+                line=dict(width=1, color="white"),
+            ),
+            text=[f"{ip} ({n} liens)" for ip, n in nodes.select("ip", "liens").iter_rows()],
+            hoverinfo="text",
+            name="Adresses",
+        )
+    )
+    fig.update_layout(
+        title=f"Voisinage de {center}",
+        showlegend=True,
+        height=600,
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False, scaleanchor="x"),
+    )
+    return fig
+
+
+def plot_connection_graph(client):
+    """Graphe des connexions : seul le sous-graphe demandé est extrait de l'index et affiché."""
+    st.subheader("Graphe des connexions entre IP source et IP destination")
+    info = client.query("graph_info")
+    st.caption(
+        f"Index des connexions de tout le store : {info['nodes']:,} adresses, {info['edges']:,} liens "
+        "(les filtres de la barre latérale ne s'appliquent pas au graphe)."
     )
-    st.plotly_chart(fig_heatmap, use_container_width=True)
+    if not info["edges"]:
+        return
+    top = client.query("graph_top", direction="both", limit=20)
+    degrees = {ip: (out, into) for ip, out, into in top.select("ip", "out_degree", "in_degree").iter_rows()}
+    col1, col2 = st.columns(2)
+    with col1:
+        center = st.selectbox(
+            "Adresse centrale (plus grand nombre de liens)",
+            list(degrees),
+            format_func=lambda ip: f"{ip} ({degrees[ip][0]} sortants, {degrees[ip][1]} entrants)",
+        )
+        other = st.text_input("Ou une autre adresse", "")
+        center = other.strip() or center
+    with col2:
+        direction = st.radio("Connexions", list(GRAPH_DIRECTIONS), horizontal=True)
+        hops = st.slider("Nombre de sauts", 1, 3, 1)
+        max_nodes = st.slider("Nombre maximal d'adresses", 10, 300, 60, step=10)
+
+    edges = client.query(
+        "graph_subgraph", ip=center, hops=hops, direction=GRAPH_DIRECTIONS[direction], max_nodes=max_nodes
+    )
+    if edges.is_empty():
+        st.info(f"Aucune connexion pour l'adresse {center}.")
+        return
+    st.plotly_chart(graph_figure(edges, center), use_container_width=True)
+
+    with st.expander("Connexions de l'adresse centrale"):
+        fan_out, fan_in = st.columns(2)
+        fan_out.markdown("**Sortantes**")
+        fan_out.dataframe(
+            client.query("graph_neighbors", ip=center, direction="out", limit=100).to_pandas(),
+            use_container_width=True, hide_index=True,
+        )
+        fan_in.markdown("**Entrantes**")
+        fan_in.dataframe(
+            client.query("graph_neighbors", ip=center, direction="in", limit=100).to_pandas(),
+            use_container_width=True, hide_index=True,
+        )
 
 
 def analyze_flows():
-    """Charge les données et applique l'analyse descriptive avec filtres."""
-    df = load_data()   
-    if df is None:
+    """Charge les données via l'API analytique et applique l'analyse descriptive avec filtres."""
+    client = get_client()
+    try:
+        info = client.query("info")
+    except Exception as e:
+        st.error(f"Erreur lors du chargement des données : {e}")
+        return
+    if not info["sample_rows"]:
         return
     
-    filtered_df = apply_filters(df)
+    filters = apply_filters(info)
+    filtered_df = client.query("flows", **filters)
     
     if not filtered_df.is_empty():
-        plot_analysis(filtered_df)
\ No newline at end of file
+        st.caption(
+            f"Métriques exactes sur les {info['rows']:,} logs du store ; "
+            f"graphiques sur un échantillon de {info['sample_rows']:,} logs."
+        )
+        plot_analysis(filtered_df, client.query("flow_summary", **filters))
+    plot_connection_graph(client)
@@ -0,0 +1,96 @@
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+from views.client import get_client
+
+# Couleurs des actions, comme sur la page d'analyse
+ACTION_COLORS = {"PERMIT": "#2ecc71", "DENY": "#e74c3c"}
+
+
+def rules_page():
+    """
+    Analyse des règles du pare-feu (idRegle) : lue uniquement dans les compteurs
+    pré-calculés à l'ingestion, la page ne parcourt jamais les logs.
+    """
+    st.title("Règles du pare-feu")
+    client = get_client()
+
+    overall = client.query("rules")
+    if overall.height == 0:
+        st.info("Aucun log dans le store : importez des logs depuis la page Upload.")
+        return
+
+    first_day, last_day = overall["first_day"].min(), overall["last_seen"].max()
+    period = st.date_input(
+        "Période",
+        value=(first_day, last_day),
+        min_value=first_day,
+        max_value=last_day,
+    )
+    start, end = period if len(period) == 2 else (first_day, last_day)
+    summary = client.query("rules", start=start, end=end)
+    active = summary.filter(~summary["silent"])
+    silent = summary.filter(summary["silent"])
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Règles connues", summary.height)
+    col2.metric("Règles déclenchées", active.height)
+    col3.metric("Règles silencieuses", silent.height)
+    col4.metric("Refus de sources externes", f"{summary['external_DENY'].sum():,}")
+
+    st.subheader("Déclenchements par règle")
+    fig = go.Figure()
+    for action, color in ACTION_COLORS.items():
+        fig.add_trace(
+            go.Bar(
+                x=active["idRegle"].cast(str).to_list(),
+                y=active[action].to_list(),
+                name=action,
+                marker_color=color,
+            )
+        )
+    fig.update_layout(barmode="stack", xaxis_title="idRegle", yaxis_title="Connexions", xaxis_type="category")
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(summary.to_pandas(), use_container_width=True, hide_index=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Règles refusant le plus de trafic externe")
+        external = active.filter(active["external_DENY"] > 0).sort("external_DENY", descending=True).head(10)
+        if external.height:
+            fig_external = px.bar(
+                external.to_pandas(),
+                x="external_DENY",
+                y=external["idRegle"].cast(str).to_list(),
+                orientation="h",
+                labels={"external_DENY": "Refus externes", "y": "idRegle"},
+            )
+            fig_external.update_layout(yaxis={"categoryorder": "total ascending"})
+            st.plotly_chart(fig_external, use_container_width=True)
+        else:
+            st.write("Aucun refus de source externe sur la période.")
+    with col2:
+        st.subheader("Règles silencieuses")
+        if silent.height:
+            st.caption("Règles vues dans le store mais sans déclenchement sur la période.")
+            st.dataframe(
+                silent.select("idRegle", "last_seen").to_pandas(), use_container_width=True, hide_index=True
+            )
+        else:
+            st.write("Toutes les règles connues se sont déclenchées sur la période.")
+
+    st.subheader("Détail d'une règle")
+    if active.height == 0:
+        return
+    rule_id = st.selectbox("idRegle", active["idRegle"].to_list())
+    activity = client.query("rule_activity", rule_id=rule_id, start=start, end=end)
+    fig_days = go.Figure()
+    for action, color in ACTION_COLORS.items():
+        fig_days.add_trace(
+            go.Scatter(x=activity["day"].to_list(), y=activity[action].to_list(), name=action, line=dict(color=color))
+        )
+    fig_days.update_layout(title=f"Déclenchements par jour de la règle {rule_id}", hovermode="x unified")
+    st.plotly_chart(fig_days, use_container_width=True)
+    ports = client.query("rule_ports", rule_id=rule_id, start=start, end=end, limit=20)
+    st.dataframe(ports.to_pandas(), use_container_width=True, hide_index=True)
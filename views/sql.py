@@ -0,0 +1,75 @@
+import streamlit as st
+
+from analytics.service import ServiceError
+from views.client import get_client
+
+EXAMPLE_QUERY = """SELECT EXTRACT(hour FROM Date) AS heure, count(*) AS refus
+FROM logs
+WHERE action = 'DENY' AND Port_dst = 22 AND IPsrc NOT LIKE '10.70.%'
+GROUP BY heure
+ORDER BY heure"""
+
+
+def run_page(query, page, page_size):
+    """Exécute une page de la requête : une ligne de plus que la page indique s'il en reste"""
+    rows = get_client().query("sql", query=query, offset=page * page_size, limit=page_size + 1)
+    return rows.head(page_size), rows.height > page_size
+
+
+def sql_page():
+    """Requêtes SQL libres (lecture seule) sur tout le store, résultat paginé"""
+    st.title("Requêtes SQL")
+    info = get_client().query("sql_info")
+    st.write(
+        f"Interrogez la table `{info['table']}` (tous les logs du store, pas un échantillon). "
+        f"Moteur : **{info['backend']}**, lecture seule, requêtes annulées après {info['timeout']:g} s "
+        f"et limitées à {info['max_rows']:,} lignes."
+    )
+    with st.expander("Colonnes de la table"):
+        st.table({"colonne": list(info["columns"]), "type": list(info["columns"].values())})
+
+    with st.form("sql_form"):
+        query = st.text_area("Requête", value=st.session_state.get("sql_query", EXAMPLE_QUERY), height=180)
+        page_size = st.selectbox("Lignes par page", [100, 500, 1000, 5000], index=1)
+        submitted = st.form_submit_button("Exécuter")
+    if submitted:
+        st.session_state.sql_query = query
+        st.session_state.sql_page = 0
+        st.session_state.sql_page_size = page_size
+
+    query = st.session_state.get("sql_query")
+    if not query:
+        return
+    page = st.session_state.get("sql_page", 0)
+    page_size = st.session_state.get("sql_page_size", page_size)
+
+    try:
+        with st.spinner("Exécution de la requête..."):
+            rows, has_more = run_page(query, page, page_size)
+    except ServiceError as e:
+        st.error(f"Requête refusée ou invalide : {e}")
+        return
+    except Exception as e:
+        st.error(f"Erreur lors de l'exécution de la requête : {e}")
+        return
+
+    first = page * page_size
+    st.caption(f"Lignes {first + 1 if rows.height else 0} à {first + rows.height}")
+    st.dataframe(rows.to_pandas(), use_container_width=True, hide_index=True)
+    if not has_more and first + rows.height >= info["max_rows"]:
+        st.warning(f"Résultat tronqué à {info['max_rows']:,} lignes : ajoutez un filtre ou une agrégation.")
+
+    previous, current, following = st.columns([1, 2, 1])
+    if previous.button("◀ Page précédente", disabled=page == 0):
+        st.session_state.sql_page = page - 1
+        st.rerun()
+    current.write(f"Page {page + 1}")
+    if following.button("Page suivante ▶", disabled=not has_more):
+        st.session_state.sql_page = page + 1
+        st.rerun()
+    st.download_button(
+        "Télécharger la page (CSV)",
+        rows.write_csv(),
+        file_name=f"requete-page-{page + 1}.csv",
+        mime="text/csv",
+    )
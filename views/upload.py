@@ -2,21 +2,33 @@ import streamlit as st
 from db import LogDatabase
 import pandas as pd
 import polars as pl
+from ingest.archives import ARCHIVE_TYPES, ingest_archives
+from ingest.parser import read_log_stream
+
+
+@st.cache_resource
+def get_log_database():
+    """Store des logs partagé par les sessions, créé au premier affichage de la page (et non à l'import)"""
+    return LogDatabase()
 
-db = LogDatabase()
 
 def upload_page():
 
     st.header("Upload Logs Data")
-    st.write("Upload a CSV or Parquet file to replace the current logs database.")
+    st.write("Upload a CSV or Parquet file to replace the current logs database, or compressed log archives to append to it.")
 
     left, middle, right = st.columns(3, vertical_alignment="bottom")
 
-    file_type = left.selectbox("File Type", ["csv", "parquet"])
+    file_type = left.selectbox("File Type", ["csv", "parquet", "archive"])
     if file_type == "csv":
         st.write("type file csv")
         separator = middle.selectbox("Separator", [";", ","], index=0)
     
+    if file_type == "archive":
+        archive_upload_section(separator=";")
+        live_ingestion_section()
+        return
+
     uploaded_file = st.file_uploader(f"Choose a {file_type} file.", type=file_type)
 
     if uploaded_file is not None:
@@ -45,11 +57,11 @@ def upload_page():
             "action",
             "interface_entrée",
             "interface_sortie",
-            # "Firewall",
+            "firewall",
         ]
         if file_type == "csv":
-            df = pl.read_csv(uploaded_file, separator=separator, has_header=False)
-            df.columns = columns
+            # Dedicated parser for the fixed firewall log format (11 fields)
+            df = read_log_stream(uploaded_file, separator=separator)
         elif file_type == "parquet":
             df = pl.read_parquet(uploaded_file)
             # Renommage des colonnes pour l'affichage
@@ -58,8 +70,8 @@ def upload_page():
         st.subheader("Preview of uploaded file:")
         st.dataframe(df.head(10).to_pandas())
         
-        # Select only the columns specified in 'columns'
-        df = df.select(columns)
+        # Select only the columns specified in 'columns' (older parquet files have no firewall)
+        df = df.select([col for col in columns if col in df.columns])
         
         # Show basic file stats
         st.subheader("File Statistics:")
@@ -71,8 +83,87 @@ def upload_page():
 
         # Upload button
         if st.button("Replace Database with This File"):
-            success, message = db.upload_csv_to_logs(df)
+            success, message = get_log_database().upload_csv_to_logs(df)
             if success:
                 st.success(message)
             else:
-                st.error(message)
\ No newline at end of file
+                st.error(message)
+
+    live_ingestion_section()
+
+def archive_upload_section(separator):
+    """Ajout d'archives compressées (.gz, .bz2, .zst, tarballs) décompressées à la volée"""
+    uploaded_files = st.file_uploader(
+        "Choose compressed log files or tarballs (.gz, .bz2, .zst, .tar, .tgz).",
+        type=ARCHIVE_TYPES,
+        accept_multiple_files=True,
+    )
+    if uploaded_files and st.button("Append Archives to Database"):
+        with st.spinner("Decompressing and ingesting archives..."):
+            try:
+                results = ingest_archives(uploaded_files, db=get_log_database(), separator=separator)
+            except Exception as e:
+                st.error(f"Error ingesting archives: {e}")
+                return
+        for stats in results:
+            st.success(
+                f"{stats.name}: {stats.rows} records from {stats.members} file(s) "
+                f"in {stats.seconds:.1f}s"
+            )
+
+
+@st.cache_resource
+def get_ingest_workers():
+    """Registre des workers d'ingestion en continu, partagé entre les sessions"""
+    return {}
+
+
+def live_ingestion_section():
+    """Démarrage et suivi des workers d'ingestion en continu (fichier ou syslog)"""
+    from ingest.tail import syslog_worker, tail_file_worker
+
+    st.header("Live Ingestion")
+    st.write("Follow a growing log file or a local syslog socket and append micro-batches to the logs database.")
+
+    workers = get_ingest_workers()
+
+    left, middle, right = st.columns(3, vertical_alignment="bottom")
+    source_type = left.selectbox("Source", ["Log file", "Syslog UDP", "Syslog Unix socket"])
+    batch_rows = middle.number_input("Batch rows", min_value=1, value=10000, step=1000)
+    batch_seconds = right.number_input("Batch seconds", min_value=0.5, value=5.0, step=0.5)
+    target = st.text_input(
+        "Path or host:port",
+        value={"Log file": "data/logs.csv", "Syslog UDP": "127.0.0.1:5514"}.get(source_type, "/tmp/opsie-syslog.sock"),
+    )
+
+    if st.button("Start ingestion") and target not in workers:
+        options = {"max_rows": int(batch_rows), "max_seconds": float(batch_seconds)}
+        if source_type == "Log file":
+            worker = tail_file_worker(target, **options)
+        elif source_type == "Syslog UDP":
+            host, port = target.rsplit(":", 1)
+            worker = syslog_worker(udp_address=(host, int(port)), **options)
+        else:
+            worker = syslog_worker(unix_path=target, **options)
+        worker.start()
+        workers[target] = worker
+
+    for target, worker in list(workers.items()):
+        stats = worker.stats.snapshot()
+        st.subheader(worker.name)
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Rows ingested", stats["rows_total"])
+        col2.metric("Rows/s", f"{stats['rows_per_second']:.1f}")
+        lag = stats["lag_seconds"]
+        col3.metric("Lag", "-" if lag is None else f"{lag:.1f} s")
+        col4.metric("Status", "running" if worker.is_alive() else "stopped")
+        if worker.error is not None:
+            st.error(f"Ingestion error: {worker.error}")
+        if stats["last_error"] is not None:
+            st.warning(
+                f"Write errors: {stats['write_errors']} (last: {stats['last_error']}), "
+                f"{stats['lines_dead_lettered']} lines moved to the dead-letter file"
+            )
+        if worker.is_alive() and st.button("Stop", key=f"stop-{target}"):
+            worker.stop(timeout=10)
+            del workers[target]
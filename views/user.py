@@ -1,13 +1,28 @@
+import importlib
+
 import streamlit as st
 from streamlit_option_menu import option_menu
-from db import Database, LogDatabase
-from views.analysis import analyze_logs  #
-from views.data import explore_data  
-from views.protocol import analyze_flows 
-from views.upload import upload_page 
-from views.machine_learning import machine_learning_page
+from views.debug import debug_enabled, debug_panel
+
+# Pages chargées à la première navigation : leurs dépendances (scikit-learn,
+# matplotlib, Plotly, pandas...) ne ralentissent pas le démarrage de l'application.
+# Onglet -> (module, fonction de la page, titre affiché avant la page)
+PAGES = {
+    "Upload": ("views.upload", "upload_page", None),
+    "Analysis": ("views.analysis", "analyze_logs", "Analyse des logs de sécurité"),
+    "Datasets": ("views.data", "explore_data", "Exploration des données"),
+    "Protocol": ("views.protocol", "analyze_flows", "Statistiques des flux réseau par Protocol"),
+    "Machine Learning": ("views.machine_learning", "machine_learning_page", None),
+    "SQL": ("views.sql", "sql_page", None),
+    "Rules": ("views.rules", "rules_page", None),
+    "Alerts": ("views.alerts", "alerts_page", None),
+}
 
-from db import LogDatabase
+
+def load_page(tab):
+    """Importe le module de la page à la demande (mis en cache par Python après le premier import)"""
+    module, function, _ = PAGES[tab]
+    return getattr(importlib.import_module(module), function)
 
 
 def user_page():
@@ -20,8 +35,8 @@ def user_page():
         # Navigation menu with icons
         selected_tab = option_menu(
             menu_title=None,  # Added menu_title parameter
-            options=["Home", "Upload", "Analysis", "Datasets", "Protocol", "Machine Learning"],
-            icons=["house", "arrow-up", "bar-chart", "search", "robot", "cpu"],
+            options=["Home", "Upload", "Analysis", "Datasets", "Protocol", "Machine Learning", "SQL", "Rules", "Alerts"],
+            icons=["house", "arrow-up", "bar-chart", "search", "robot", "cpu", "terminal", "shield", "bell"],
             menu_icon="cast",
             default_index=0,
             styles={
@@ -31,6 +46,10 @@ def user_page():
             "nav-link-selected": {"background-color": "#4CAF50", "color": "white"},
             }
         )
+        # Pare-feu analysé par toutes les pages (import différé : client analytique et polars)
+        from views.client import firewall_selector
+
+        firewall_selector()
 
     # Content based on selection
     if selected_tab == "Home":
@@ -43,21 +62,17 @@ def user_page():
             - Apply machine learning models
         """)
 
-    elif selected_tab == "Upload":
-        upload_page()
-    elif selected_tab == "Analysis":
-        st.title("Analyse des logs de sécurité")
-        analyze_logs()
-        
-    elif selected_tab == "Datasets":
-        st.title("Exploration des données")
-        explore_data()
-    elif selected_tab == "Protocol":  # Fixed typo in "Protocol"
-        st.title("Statistiques des flux réseau par Protocol")
-        analyze_flows()
+    elif selected_tab in PAGES:
+        title = PAGES[selected_tab][2]
+        if title:
+            st.title(title)
+        with st.spinner("Chargement de la page..."):
+            page = load_page(selected_tab)
+        page()
 
-    elif selected_tab == "Machine Learning":
-        machine_learning_page()
+    # Panneau de profilage (optionnel)
+    if debug_enabled():
+        debug_panel()
     
    # Quick links section after filters and content
     st.markdown("---")